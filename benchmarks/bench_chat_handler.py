@@ -0,0 +1,62 @@
+"""
+ChatHandler热路径：流式回复的逐块处理循环、响应结构校验以及终端着色
+"""
+import io
+from contextlib import redirect_stdout
+import pytest
+from src.handler.color_handler import ColorHandler
+from src.handler.reasoning_handler import ReasoningDisplay
+from tests.helpers import IdleInputHandler, make_chat_handler
+
+
+@pytest.fixture
+def chat_handler(reasoner_api, monkeypatch):
+    monkeypatch.setattr("src.handler.input_handler.InputHandler", IdleInputHandler)
+    # 不写会话日志和全文索引，只测量逐块处理本身
+    handler = make_chat_handler(reasoner_api)
+    handler.model = "deepseek-reasoner"
+    return handler
+
+
+def bench_stream_reply_loop(benchmark, chat_handler):
+    """get_assistant_reply(stream=True)：逐块校验、着色输出并拼接回复"""
+    def reply():
+        chat_handler.messages = [{"role": "user", "content": "解释一下流式解析"}]
+        chat_handler.reasoning = {}
+        with redirect_stdout(io.StringIO()):
+            return chat_handler.get_assistant_reply(stream=True)
+
+    assert benchmark(reply)
+
+
+@pytest.mark.parametrize("mode", ["hidden", "tail"])
+def bench_stream_reply_loop_reasoning_display(benchmark, chat_handler, monkeypatch, mode):
+    """非full显示模式：推理内容只进入固定行数的窗口，终端按固定频率重绘"""
+    monkeypatch.setattr(ReasoningDisplay, "_mode", mode)
+
+    def reply():
+        chat_handler.messages = [{"role": "user", "content": "解释一下流式解析"}]
+        chat_handler.reasoning = {}
+        with redirect_stdout(io.StringIO()):
+            return chat_handler.get_assistant_reply(stream=True)
+
+    assert benchmark(reply)
+
+
+@pytest.mark.parametrize("stream", [True, False])
+def bench_validate_response_structure(benchmark, chat_handler, stream):
+    key = "delta" if stream else "message"
+    response = {"choices": [{key: {"content": "回答内容", "reasoning_content": "推理内容"}}]}
+    assert benchmark(chat_handler.validate_response_structure, response, stream)
+
+
+def bench_color_wrapping(benchmark):
+    """流式输出时每个数据块都会经过ColorHandler着色"""
+    tokens = ["推理", "内容", " token", "。"] * 250
+
+    def wrap():
+        for token in tokens:
+            ColorHandler.reasoning_text(token)
+            ColorHandler.assistant_text(token)
+
+    benchmark(wrap)
@@ -0,0 +1,88 @@
+"""
+对话历史在不同长度下的序列化开销：构建请求体以及会话日志读写
+"""
+import json
+import pytest
+from src.api.token_counter import TokenCounter
+from src.handler.chat_handler import ChatHandler
+from src.handler.conversation_handler import ConversationStore
+from src.handler.journal_handler import JournalHandler
+
+HISTORY_SIZES = [10, 100, 1000]
+
+
+def make_history(size):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"第{i}条消息，" + "内容" * 40}
+            for i in range(size)]
+
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def bench_request_payload(benchmark, size):
+    """request_messages() 加上requests对请求体的JSON编码"""
+    handler = ChatHandler()
+    handler.journal = None
+    handler.messages = make_history(size)
+
+    def serialize():
+        payload = {"model": handler.model, "messages": handler.request_messages(),
+                   "temperature": handler.temperature, "stream": True}
+        return json.dumps(payload, allow_nan=False)
+
+    assert benchmark(serialize)
+
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def bench_request_payload_spilled(benchmark, size):
+    """同上，但除最近约16KB外的消息都已溢出到磁盘段文件"""
+    handler = ChatHandler()
+    handler.journal = None
+    handler.messages = ConversationStore(make_history(size), hot_bytes=16 * 1024)
+
+    def serialize():
+        payload = {"model": handler.model, "messages": handler.request_messages(),
+                   "temperature": handler.temperature, "stream": True}
+        return json.dumps(payload, allow_nan=False)
+
+    assert benchmark(serialize)
+    handler.messages.close()
+
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+@pytest.mark.parametrize("cached", [False, True])
+def bench_token_estimate(benchmark, size, cached):
+    """估算整段对话历史的token数：cached为True时除最后一条外都已计数过（对话增长时的情形）"""
+    history = make_history(size)
+    counter = TokenCounter(tokenizer_file=None)
+    counter.count_messages(history[:-1])
+
+    def estimate():
+        if not cached:
+            counter._cache.clear()
+        return counter.count_messages(history)
+
+    assert benchmark(estimate) > size
+
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def bench_journal_load(benchmark, tmp_path, size):
+    """按索引加载会话日志"""
+    journal = JournalHandler("bench", journal_dir=str(tmp_path), fsync_policy="never")
+    for message in make_history(size):
+        journal.append(message)
+    journal.close()
+    assert len(benchmark(journal.load, "bench")) == size
+
+
+@pytest.mark.parametrize("size", HISTORY_SIZES)
+def bench_journal_append(benchmark, tmp_path, size):
+    """逐条追加写入会话日志（不fsync）"""
+    history = make_history(size)
+    rounds = iter(range(1000000))
+
+    def append_all():
+        journal = JournalHandler(f"bench-{next(rounds)}", journal_dir=str(tmp_path), fsync_policy="never")
+        for message in history:
+            journal.append(message)
+        journal.close()
+
+    benchmark(append_all)
@@ -0,0 +1,29 @@
+"""
+命令行启动耗时：在独立子进程中测量，包含解释器启动和模块导入
+"""
+import os
+import sys
+import subprocess
+from conftest import project_root
+
+ENV = dict(os.environ, DEEPSEEK_API_KEY="bench-key")
+
+
+def run(*args):
+    subprocess.run([sys.executable, *args], cwd=str(project_root), env=ENV, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+def bench_startup_python(benchmark):
+    """基线：空解释器启动"""
+    benchmark.pedantic(run, args=("-c", "pass"), rounds=5, iterations=1)
+
+
+def bench_startup_entry_help(benchmark):
+    """dscli --help：轻量入口，管道模式和子命令共享的启动路径"""
+    benchmark.pedantic(run, args=("src/cli/main.py", "--help"), rounds=5, iterations=1)
+
+
+def bench_startup_interactive_import(benchmark):
+    """导入交互模式依赖（rich、readline和全部处理器）"""
+    benchmark.pedantic(run, args=("-c", "import src.cli.deepseek_client"), rounds=5, iterations=1)
@@ -0,0 +1,69 @@
+"""
+流式响应热路径：SSE逐行解析与数据块规范化
+"""
+import json
+from conftest import make_api
+
+MESSAGES = [{"role": "user", "content": "解释一下流式解析"}]
+
+
+def bench_sse_line_parsing(benchmark, sse_body):
+    """基线：只做iter_lines切行和json解析，不经过DeepSeekAPI的规范化"""
+    api = make_api(sse_body)
+
+    def parse():
+        count = 0
+        with api.session.post(f"{api.base_url}/chat/completions", json={}, stream=True) as response:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                decoded_line = line.decode("utf-8")
+                if decoded_line.startswith("data: ") and decoded_line[6:] != "[DONE]":
+                    json.loads(decoded_line[6:])
+                    count += 1
+        return count
+
+    assert benchmark(parse) > 0
+
+
+def bench_chat_completion_stream(benchmark, sse_body):
+    """完整的chat_completion_stream：消息校验、SSE解析和数据块规范化"""
+    api = make_api(sse_body)
+
+    def consume():
+        return sum(1 for _ in api.chat_completion_stream(messages=[dict(m) for m in MESSAGES],
+                                                         model="deepseek-reasoner", temperature=0.7))
+
+    assert benchmark(consume) > 0
+
+
+STRUCTURED = json.dumps({"items": [{"id": i, "title": f"记录{i}", "score": i / 7, "tags": ["a", "b"]}
+                                   for i in range(200)]}, ensure_ascii=False)
+STRUCTURED_CHUNKS = [STRUCTURED[i:i + 12] for i in range(0, len(STRUCTURED), 12)]
+
+
+def bench_json_incremental_parse(benchmark):
+    """结构化输出：按模型数据块大小增量解析，逐条产生记录"""
+    from src.api.json_stream import IncrementalJSONParser
+
+    def parse():
+        parser = IncrementalJSONParser(max_depth=2)
+        count = 0
+        for chunk in STRUCTURED_CHUNKS:
+            count += len(parser.feed(chunk))
+        parser.close()
+        return count
+
+    assert benchmark(parse) > 200
+
+
+def bench_json_buffer_then_loads(benchmark):
+    """基线：拼接全部数据块后一次json.loads"""
+
+    def parse():
+        buffer = []
+        for chunk in STRUCTURED_CHUNKS:
+            buffer.append(chunk)
+        return len(json.loads("".join(buffer))["items"])
+
+    assert benchmark(parse) == 200
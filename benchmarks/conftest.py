@@ -0,0 +1,65 @@
+"""
+基准测试公共夹具：离线的假传输层和录制的SSE响应，不访问网络也不需要真实API密钥
+"""
+import io
+import os
+import sys
+from pathlib import Path
+import pytest
+import requests
+from requests.adapters import BaseAdapter
+
+project_root = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(project_root))
+# ChatHandler初始化时会读取API密钥，避免交互式提示
+os.environ.setdefault("DEEPSEEK_API_KEY", "bench-key")
+
+from src.api.deepseek_api import DeepSeekAPI  # noqa: E402
+
+FIXTURE_DIR = Path(__file__).resolve().parent / "fixtures"
+BENCH_BASE_URL = "https://bench.invalid/v1"
+
+
+class FakeTransport(BaseAdapter):
+    """挂载到requests.Session上的假传输层，每次请求都返回同一段录制的响应体"""
+
+    def __init__(self, body: bytes, content_type: str = "text/event-stream"):
+        super().__init__()
+        self.body = body
+        self.content_type = content_type
+        self.requests = 0
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        self.requests += 1
+        response = requests.Response()
+        response.status_code = 200
+        response.headers["Content-Type"] = self.content_type
+        response.raw = io.BytesIO(self.body)
+        response.url = request.url
+        response.request = request
+        response.encoding = "utf-8"
+        return response
+
+    def close(self):
+        pass
+
+
+def load_fixture(name: str) -> bytes:
+    return (FIXTURE_DIR / name).read_bytes()
+
+
+def make_api(body: bytes, content_type: str = "text/event-stream") -> DeepSeekAPI:
+    """创建使用假传输层的API客户端"""
+    api = DeepSeekAPI("bench-key", base_url=BENCH_BASE_URL, transport="http1")
+    api.session.mount("https://", FakeTransport(body, content_type))
+    return api
+
+
+@pytest.fixture(params=["chat_stream.sse", "reasoner_stream.sse"])
+def sse_body(request) -> bytes:
+    return load_fixture(request.param)
+
+
+@pytest.fixture
+def reasoner_api() -> DeepSeekAPI:
+    return make_api(load_fixture("reasoner_stream.sse"))
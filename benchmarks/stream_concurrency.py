@@ -0,0 +1,213 @@
+"""
+并发流式请求的传输层对比：HTTP/1.1(requests) 与 HTTP/2(httpx) 在不同并发流数量下的连接数、内存和吞吐
+
+本地桩服务分别在两个端口上提供HTTP/1.1和h2c（明文HTTP/2），每个流返回相同的SSE数据块序列。
+内存为客户端进程中由tracemalloc统计的Python堆峰值。需要安装httpx[http2]。
+
+用法: python benchmarks/stream_concurrency.py [--concurrency 1 10 100] [--chunks 200] [--interval 0.005]
+"""
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import tracemalloc
+from pathlib import Path
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.api.deepseek_api import DeepSeekAPI  # noqa: E402
+from src.api.transport import HTTP2Session, HTTP2_AVAILABLE  # noqa: E402
+
+if HTTP2_AVAILABLE:
+    import h2.config
+    import h2.connection
+    import h2.events
+    import h2.settings
+
+
+def sse_events(chunks: int):
+    """桩服务返回的SSE事件序列"""
+    for i in range(chunks):
+        data = {"id": "bench", "object": "chat.completion.chunk", "model": "deepseek-chat",
+                "choices": [{"index": 0, "delta": {"content": f"token{i} "}, "finish_reason": None}]}
+        yield f"data: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+    yield b"data: [DONE]\n\n"
+
+
+class HTTP1Stub(ThreadingHTTPServer):
+    """HTTP/1.1 SSE桩服务，统计接受的TCP连接数"""
+
+    daemon_threads = True
+
+    def __init__(self, chunks: int, interval: float):
+        self.chunks = chunks
+        self.interval = interval
+        self.connections = 0
+        super().__init__(("127.0.0.1", 0), HTTP1StubHandler)
+
+    def get_request(self):
+        self.connections += 1
+        return super().get_request()
+
+    def handle_error(self, request, client_address):
+        # 客户端关闭连接池时断开的空闲连接不属于错误
+        pass
+
+
+class HTTP1StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in sse_events(self.server.chunks):
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+            self.wfile.flush()
+            time.sleep(self.server.interval)
+        self.wfile.write(b"0\r\n\r\n")
+
+
+class H2CStub:
+    """基于h2的明文HTTP/2 SSE桩服务，统计接受的TCP连接数"""
+
+    def __init__(self, chunks: int, interval: float):
+        self.chunks = chunks
+        self.interval = interval
+        self.connections = 0
+        self.sock = socket.socket()
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind(("127.0.0.1", 0))
+        self.sock.listen(128)
+        self.server_port = self.sock.getsockname()[1]
+
+    def serve_forever(self):
+        while True:
+            try:
+                client, _ = self.sock.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._serve_connection, args=(client,), daemon=True).start()
+
+    def shutdown(self):
+        self.sock.close()
+
+    def _serve_connection(self, client):
+        conn = h2.connection.H2Connection(h2.config.H2Configuration(client_side=False))
+        cond = threading.Condition()
+        with cond:
+            conn.initiate_connection()
+            conn.update_settings({h2.settings.SettingCodes.MAX_CONCURRENT_STREAMS: 1000})
+            client.sendall(conn.data_to_send())
+        while True:
+            try:
+                data = client.recv(65536)
+            except OSError:
+                break
+            if not data:
+                break
+            with cond:
+                for event in conn.receive_data(data):
+                    if isinstance(event, h2.events.StreamEnded):
+                        threading.Thread(target=self._send_stream, args=(conn, cond, client, event.stream_id),
+                                         daemon=True).start()
+                    elif isinstance(event, h2.events.DataReceived):
+                        conn.acknowledge_received_data(event.flow_controlled_length, event.stream_id)
+                    elif isinstance(event, h2.events.ConnectionTerminated):
+                        client.close()
+                        return
+                client.sendall(conn.data_to_send())
+                cond.notify_all()
+        client.close()
+
+    def _send_stream(self, conn, cond, client, stream_id):
+        try:
+            with cond:
+                conn.send_headers(stream_id, [(":status", "200"), ("content-type", "text/event-stream")])
+                client.sendall(conn.data_to_send())
+            for event in sse_events(self.chunks):
+                with cond:
+                    # 遵守流级和连接级的流量控制窗口，等待客户端的WINDOW_UPDATE
+                    while conn.local_flow_control_window(stream_id) < len(event):
+                        cond.wait()
+                    conn.send_data(stream_id, event)
+                    client.sendall(conn.data_to_send())
+                time.sleep(self.interval)
+            with cond:
+                conn.end_stream(stream_id)
+                client.sendall(conn.data_to_send())
+        except OSError:
+            pass
+
+
+def run_streams(api: DeepSeekAPI, concurrency: int):
+    """并发消费concurrency个流，返回(数据块总数, 耗时)"""
+    counts = [0] * concurrency
+    errors = []
+
+    def consume(slot):
+        try:
+            for _ in api.chat_completion_stream(messages=[{"role": "user", "content": "bench"}]):
+                counts[slot] += 1
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=consume, args=(slot,)) for slot in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if errors:
+        raise errors[0]
+    return sum(counts), time.perf_counter() - start
+
+
+def measure(protocol: str, concurrency: int, chunks: int, interval: float) -> dict:
+    server = H2CStub(chunks, interval) if protocol == "HTTP/2" else HTTP1Stub(chunks, interval)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = DeepSeekAPI("bench-key", base_url=f"http://127.0.0.1:{server.server_port}",
+                      transport="http1", pool_maxsize=concurrency)
+    if protocol == "HTTP/2":
+        api.session = HTTP2Session(pool_maxsize=concurrency, prior_knowledge=True)
+    tracemalloc.start()
+    try:
+        received, elapsed = run_streams(api, concurrency)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+        api.session.close()
+        server.shutdown()
+    return {"protocol": protocol, "concurrency": concurrency, "connections": server.connections,
+            "peak_kb": peak / 1024, "chunks_per_sec": received / elapsed, "elapsed": elapsed}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="对比HTTP/1.1与HTTP/2在并发流式请求下的连接数、内存和吞吐")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 100], help="并发流数量")
+    parser.add_argument("--chunks", type=int, default=200, help="每个流的数据块数")
+    parser.add_argument("--interval", type=float, default=0.005, help="桩服务发送数据块的间隔(秒)")
+    args = parser.parse_args(argv)
+    if not HTTP2_AVAILABLE:
+        print("需要安装httpx[http2]: pip install 'httpx[http2]'", file=sys.stderr)
+        return 2
+    print(f"{'协议':<8}{'并发流':>8}{'TCP连接':>10}{'内存峰值(KB)':>16}{'吞吐(块/秒)':>14}{'耗时(秒)':>10}")
+    for concurrency in args.concurrency:
+        for protocol in ("HTTP/1.1", "HTTP/2"):
+            result = measure(protocol, concurrency, args.chunks, args.interval)
+            print(f"{result['protocol']:<10}{result['concurrency']:>8}{result['connections']:>10}"
+                  f"{result['peak_kb']:>16.1f}{result['chunks_per_sec']:>16.1f}{result['elapsed']:>12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
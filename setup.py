@@ -6,6 +6,13 @@ setup(
     packages=find_packages(where='src'),
     package_dir={'': 'src'},
     install_requires=['requests', 'urllib3<2.0'],
+    extras_require={
+        'http2': ['httpx[http2]'],
+        'zstd': ['zstandard'],
+        'parquet': ['pyarrow'],
+        'tokenizers': ['tokenizers'],
+        'all': ['httpx[http2]', 'zstandard', 'pyarrow', 'tokenizers'],
+    },
     author="coodar",
     author_email="coodar@gmail.com",
     description="A Python package for interacting with DeepSeek API",
@@ -20,7 +27,7 @@ setup(
     python_requires='>=3.6',
     entry_points={
         'console_scripts': [
-            'dscli=cli.deepseek_client:main',
+            'dscli=cli.main:main',
         ],
     },
     package_data={
@@ -0,0 +1,175 @@
+"""
+熔断模块，按端点/模型统计滚动窗口内的失败率，上游故障期间快速失败
+
+状态流转:
+  closed    - 正常放行，窗口内请求数达到下限且失败率超过阈值时转为open
+  open      - 直接拒绝请求（抛出CircuitOpenError），冷却时间结束后转为half_open
+  half_open - 只放行有限数量的探测请求，探测成功则恢复closed，失败则重新open
+只有连接失败、超时和5xx计为失败；4xx说明上游可用，计为成功。
+"""
+import time
+import logging
+import threading
+from collections import deque
+from typing import Dict
+# 尝试不同的导入路径，以支持开发模式和包模式
+try:
+    # 包模式导入
+    from config.setting import (CIRCUIT_FAILURE_RATE, CIRCUIT_MIN_REQUESTS, CIRCUIT_WINDOW, CIRCUIT_COOLDOWN,
+                                CIRCUIT_HALF_OPEN_PROBES)
+except ImportError:
+    # 开发模式导入
+    from src.config.setting import (CIRCUIT_FAILURE_RATE, CIRCUIT_MIN_REQUESTS, CIRCUIT_WINDOW, CIRCUIT_COOLDOWN,
+                                    CIRCUIT_HALF_OPEN_PROBES)
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求未发送即被拒绝"""
+
+    def __init__(self, name: str, retry_after: float):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"上游 {name} 已熔断，{retry_after:.1f}秒后允许探测请求")
+
+
+class CircuitBreaker:
+    """单个端点/模型的熔断器，线程安全"""
+
+    def __init__(self, name: str, failure_rate: float = CIRCUIT_FAILURE_RATE,
+                 min_requests: int = CIRCUIT_MIN_REQUESTS, window: float = CIRCUIT_WINDOW,
+                 cooldown: float = CIRCUIT_COOLDOWN, half_open_probes: int = CIRCUIT_HALF_OPEN_PROBES):
+        """
+        初始化熔断器
+        :param name: 名称（端点/模型），用于日志和统计
+        :param failure_rate: 触发熔断的失败率阈值(0~1)
+        :param min_requests: 窗口内至少有这么多请求才判断失败率，避免少量请求误触发
+        :param window: 滚动统计窗口(秒)
+        :param cooldown: 打开后多久允许探测(秒)
+        :param half_open_probes: 半开状态下同时放行的探测请求数
+        """
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.cooldown = cooldown
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._outcomes = deque()  # (时间, 是否成功)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.stats = {"rejected": 0, "opened": 0}
+
+    def _trim(self, now: float) -> None:
+        while self._outcomes and self._outcomes[0][0] < now - self.window:
+            self._outcomes.popleft()
+
+    def _transition(self, state: str, reason: str) -> None:
+        """切换状态并记录日志，调用方需持有锁"""
+        if state == self.state:
+            return
+        log = logger.warning if state == OPEN else logger.info
+        log(f"熔断器 {self.name}: {self.state} -> {state} ({reason})")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+            self.stats["opened"] += 1
+        self._probes = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+
+    def allow(self) -> None:
+        """
+        请求前调用，不允许发送时抛出CircuitOpenError；
+        放行后调用方必须调用record_success或record_failure之一
+        """
+        with self._lock:
+            if self.state == OPEN:
+                remaining = self._opened_at + self.cooldown - time.monotonic()
+                if remaining > 0:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, remaining)
+                self._transition(HALF_OPEN, "冷却结束，开始探测")
+            if self.state == HALF_OPEN:
+                if self._probes >= self.half_open_probes:
+                    self.stats["rejected"] += 1
+                    raise CircuitOpenError(self.name, 0.0)
+                self._probes += 1
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED, "探测请求成功")
+                return
+            now = time.monotonic()
+            self._outcomes.append((now, True))
+            self._trim(now)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(OPEN, "探测请求失败")
+                return
+            if self.state == OPEN:
+                return
+            now = time.monotonic()
+            self._outcomes.append((now, False))
+            self._trim(now)
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            if total >= self.min_requests and failures / total >= self.failure_rate:
+                self._transition(OPEN, f"{self.window:.0f}秒内失败{failures}/{total}")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            total = len(self._outcomes)
+            failures = sum(1 for _, ok in self._outcomes if not ok)
+            return {
+                "state": self.state,
+                "requests": total,
+                "failures": failures,
+                "failure_rate": round(failures / total, 3) if total else 0.0,
+                "retry_after": round(max(0.0, self._opened_at + self.cooldown - now), 1) if self.state == OPEN else 0.0,
+                **self.stats,
+            }
+
+
+class CircuitBreakerRegistry:
+    """按端点/模型划分的熔断器集合，首次使用时创建"""
+
+    def __init__(self, enabled: bool = True, **options):
+        """
+        :param enabled: 为False时get返回None，调用方不做熔断
+        :param options: 传给每个CircuitBreaker的参数
+        """
+        self.enabled = enabled
+        self.options = options
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_name(endpoint: str, model: str = None) -> str:
+        return f"{endpoint}:{model}" if model else endpoint
+
+    def get(self, endpoint: str, model: str = None):
+        if not self.enabled:
+            return None
+        name = self.make_name(endpoint, model)
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, **self.options)
+            return breaker
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return {breaker.name: breaker.snapshot() for breaker in breakers}
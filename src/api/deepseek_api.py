@@ -2,18 +2,45 @@ import requests
 import os
 import json
 import logging
+import socket
+import threading
+import time
+from urllib.parse import urlparse
 
 # 尝试不同的导入路径，以支持开发模式和包模式
 try:
     # 包模式导入
-    from config.setting import BASE_URL
+    from config.setting import (BASE_URL, WARMUP_PROBE, WARMUP_TIMEOUT, HTTP_TRANSPORT, CIRCUIT_ENABLED,
+                                PREFLIGHT_CHECK, API_TOKENS_PER_MINUTE)
+    from api.transport import create_session
+    from api.circuit_breaker import CircuitBreakerRegistry
+    from api.rate_limiter import RateLimiter
+    from api.token_counter import TokenCounter
+    from api.request_compression import RequestCompressor
 except ImportError:
     try:
         # 开发模式导入
-        from src.config.setting import BASE_URL
+        from src.config.setting import (BASE_URL, WARMUP_PROBE, WARMUP_TIMEOUT, HTTP_TRANSPORT, CIRCUIT_ENABLED,
+                                        PREFLIGHT_CHECK, API_TOKENS_PER_MINUTE)
+        from src.api.transport import create_session
+        from src.api.circuit_breaker import CircuitBreakerRegistry
+        from src.api.rate_limiter import RateLimiter
+        from src.api.token_counter import TokenCounter
+        from src.api.request_compression import RequestCompressor
     except ImportError:
         # 如果都失败，设置默认值
         BASE_URL = "https://api.deepseek.com/v1"
+        WARMUP_PROBE = True
+        WARMUP_TIMEOUT = 5.0
+        HTTP_TRANSPORT = "http1"
+        CIRCUIT_ENABLED = False
+        PREFLIGHT_CHECK = False
+        API_TOKENS_PER_MINUTE = 0
+        create_session = None
+        CircuitBreakerRegistry = None
+        RateLimiter = None
+        TokenCounter = None
+        RequestCompressor = None
 
 logger = logging.getLogger(__name__)
 
@@ -31,10 +58,17 @@ class DeepSeekAPI:
             except Exception:
                 api_key = input('请输入DeepSeek API密钥: ')
         return api_key
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, pool_maxsize=None, base_url=None, transport=None, circuit_breaker=None,
+                 tokens_per_minute=None, compression=None):
         """
         初始化DeepSeek API客户端
         :param api_key: DeepSeek API密钥，如果为None则尝试从环境变量、配置文件或用户输入获取
+        :param pool_maxsize: 连接池大小，并发请求数超过默认值(10)时需要相应调大
+        :param base_url: API基础地址，默认使用配置中的BASE_URL
+        :param transport: 传输方式 auto/http2/http1，默认使用配置中的HTTP_TRANSPORT
+        :param circuit_breaker: 是否按端点/模型熔断，默认使用配置中的CIRCUIT_ENABLED
+        :param tokens_per_minute: 每分钟token预算，默认使用配置中的API_TOKENS_PER_MINUTE，0表示不限制
+        :param compression: 请求体压缩方式 off/auto/gzip/zstd，默认使用配置中的REQUEST_COMPRESSION
         """
         if api_key is None:
             api_key = self.get_api_key()
@@ -42,52 +76,273 @@ class DeepSeekAPI:
         if not api_key:
             raise ValueError("未设置API密钥，请通过以下方式设置:\n1. 设置环境变量DEEPSEEK_API_KEY\n2. 配置文件中设置API_KEY\n3. 运行时输入API密钥\n4. 通过api_key参数传入")
         self.api_key = api_key
-        self.base_url = BASE_URL
+        self.base_url = (base_url or BASE_URL).rstrip('/')
+        # 使用Session复用连接池，预热建立的连接可被后续请求直接使用
+        if create_session is not None:
+            self.session = create_session(transport or HTTP_TRANSPORT, pool_maxsize)
+        else:
+            self.session = requests.Session()
+        enabled = CIRCUIT_ENABLED if circuit_breaker is None else circuit_breaker
+        self.breakers = CircuitBreakerRegistry(enabled) if CircuitBreakerRegistry is not None else None
+        # 请求前估算token数：预检上下文上限并扣减token预算，共享同一客户端的会话共用计数缓存和预算
+        self.tokens = TokenCounter() if TokenCounter is not None else None
+        tokens_per_minute = API_TOKENS_PER_MINUTE if tokens_per_minute is None else tokens_per_minute
+        self.token_budget = (RateLimiter(tokens_per_minute / 60.0, burst=tokens_per_minute)
+                             if RateLimiter is not None and tokens_per_minute > 0 else None)
+        if RequestCompressor is not None:
+            self.compressor = RequestCompressor(compression) if compression else RequestCompressor()
+        else:
+            self.compressor = None
+        self.warmup_result = None
+        self.first_request_warm = None
+        self._warmup_thread = None
+
+    def warmup(self, probe=WARMUP_PROBE, timeout=WARMUP_TIMEOUT):
+        """
+        预热到BASE_URL的连接：DNS解析、TCP/TLS握手，以及可选的轻量鉴权探测
+        :param probe: 是否请求/models端点以提前校验API密钥
+        :param timeout: 请求超时时间(秒)
+        :return: 预热结果字典
+        """
+        result = {"dns": False, "connected": False, "auth_ok": None, "error": None, "elapsed": 0.0}
+        start = time.perf_counter()
+        parsed = urlparse(self.base_url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        try:
+            socket.getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+            result["dns"] = True
+            if probe:
+                response = self.session.get(f"{self.base_url}/models", headers=self._headers(), timeout=timeout)
+                result["auth_ok"] = response.status_code != 401
+            else:
+                response = self.session.head(self.base_url, timeout=timeout)
+            # 读取完响应后连接会归还到连接池，供首个正式请求复用
+            response.close()
+            result["connected"] = True
+        except (OSError, requests.exceptions.RequestException) as e:
+            result["error"] = str(e)
+        result["elapsed"] = time.perf_counter() - start
+        logger.debug(f"连接预热结果: {result}")
+        self.warmup_result = result
+        return result
+
+    def start_warmup(self, probe=WARMUP_PROBE, timeout=WARMUP_TIMEOUT):
+        """
+        在后台线程中执行连接预热
+        :return: 预热线程
+        """
+        if self._warmup_thread is None:
+            self._warmup_thread = threading.Thread(
+                target=self.warmup, kwargs={"probe": probe, "timeout": timeout}, daemon=True
+            )
+            self._warmup_thread.start()
+        return self._warmup_thread
+
+    def _headers(self, stream=False):
+        """构建请求头"""
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        if stream:
+            headers["Accept"] = "text/event-stream"
+        return headers
+
+    def _connection_is_warm(self, url):
+        """检查连接池中是否已有可复用的空闲连接"""
+        if hasattr(self.session, 'is_warm'):
+            return self.session.is_warm(url)
+        parsed = urlparse(url)
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        # 以下读取的是urllib3连接池的内部结构，不同版本可能变化，读取失败时按未命中处理
+        try:
+            pools = self.session.get_adapter(url).poolmanager.pools
+            for key in pools.keys():
+                if (key.key_scheme, key.key_host, key.key_port) != (parsed.scheme, parsed.hostname, port):
+                    continue
+                if any(conn is not None and getattr(conn, 'sock', None) is not None for conn in list(pools[key].pool.queue)):
+                    return True
+        except (AttributeError, TypeError, KeyError, requests.exceptions.InvalidSchema) as e:
+            logger.debug(f"无法读取连接池状态，按未命中预热连接处理: {type(e).__name__}: {str(e)}")
+        return False
+
+    def _note_first_request(self, url):
+        """在首个正式请求前等待预热完成，并记录该请求是否命中预热连接"""
+        if self.first_request_warm is not None:
+            return
+        if self._warmup_thread is not None and self._warmup_thread.is_alive():
+            self._warmup_thread.join(WARMUP_TIMEOUT)
+        self.first_request_warm = self._connection_is_warm(url)
+        logger.info(f"首个请求{'命中' if self.first_request_warm else '未命中'}预热连接")
+
+    def _acquire_breaker(self, endpoint, model=None):
+        """
+        获取端点/模型对应的熔断器并申请放行，熔断中直接抛出CircuitOpenError
+        :return: 熔断器，未启用熔断时为None
+        """
+        breaker = self.breakers.get(endpoint, model) if self.breakers is not None else None
+        if breaker is not None:
+            breaker.allow()
+        return breaker
+
+    @staticmethod
+    def _record_outcome(breaker, status_code=None, error=None):
+        """记录请求结果：连接失败、超时和5xx计为上游故障，其余（包括4xx）说明上游可用"""
+        if breaker is None:
+            return
+        if error is not None:
+            response = getattr(error, 'response', None)
+            status_code = getattr(response, 'status_code', None)
+            failed = status_code is None or status_code >= 500
+        else:
+            failed = status_code >= 500
+        if failed:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    def _send(self, method, url, headers, data=None, stream=False, timeout=None):
+        """
+        发送请求：请求体按UTF-8紧凑编码（中文不转义为\\uXXXX），超过阈值时按配置压缩；
+        端点尚未确认支持压缩且拒绝了压缩的请求体时，以原始请求体重发一次
+        :return: requests响应对象
+        """
+        if data is None:
+            return self.session.request(method=method, url=url, headers=headers, stream=stream, timeout=timeout)
+        body = json.dumps(data, ensure_ascii=False, separators=(',', ':'), allow_nan=False).encode('utf-8')
+        payload, encoding = self.compressor.encode(url, body) if self.compressor is not None else (body, None)
+        if encoding:
+            compressed_headers = dict(headers, **{"Content-Encoding": encoding})
+            response = self.session.request(method=method, url=url, headers=compressed_headers, data=payload,
+                                            stream=stream, timeout=timeout)
+            if not self.compressor.should_fallback(url, response.status_code):
+                return response
+            response.close()
+            logger.debug(f"压缩的请求体被拒绝(HTTP {response.status_code})，以原始请求体重发")
+        response = self.session.request(method=method, url=url, headers=headers, data=body, stream=stream,
+                                        timeout=timeout)
+        if encoding:
+            self.compressor.record_fallback(url, response.status_code)
+        return response
+
+    def compression_stats(self):
+        """返回请求体压缩的统计快照（压缩次数、节省的字节数、CPU时间、各端点是否接受压缩）"""
+        return self.compressor.snapshot() if self.compressor is not None else {}
+
+    def _preflight(self, messages, model):
+        """
+        发送前估算请求的token数，超出模型上下文上限时抛出ContextLimitError
+        :return: 估算的token数，未启用估算时为None
+        """
+        if self.tokens is None:
+            return None
+        return self.tokens.check(messages, model) if PREFLIGHT_CHECK else self.tokens.count_messages(messages)
+
+    def _reserve_budget(self, estimate):
+        """熔断器放行后按估算值扣减token预算（不足时等待），熔断中被拒绝的请求不占用预算"""
+        if estimate is not None and self.token_budget is not None:
+            self.token_budget.acquire(estimate)
+
+    def _refund_budget(self, estimate):
+        """请求失败、没有返回用量时退还预扣的估算值"""
+        if estimate is not None and self.token_budget is not None:
+            self.token_budget.consume(-estimate)
+
+    def _settle_usage(self, estimate, usage):
+        """收到上游用量后校准估算比例，并按实际消耗（含回复）补扣或退还token预算"""
+        if estimate is None or not usage:
+            return
+        self.tokens.calibrate(estimate, usage.get('prompt_tokens'))
+        if self.token_budget is not None:
+            actual = (usage.get('prompt_tokens') or estimate) + (usage.get('completion_tokens') or 0)
+            self.token_budget.consume(actual - estimate)
+
+    def token_stats(self):
+        """返回token估算缓存和预算的状态快照"""
+        stats = self.tokens.snapshot() if self.tokens is not None else {}
+        if self.token_budget is not None:
+            stats["budget"] = self.token_budget.snapshot()
+        return stats
+
+    def circuit_stats(self):
+        """返回各端点/模型熔断器的状态快照"""
+        return self.breakers.snapshot() if self.breakers is not None else {}
         
-    def _make_request(self, endpoint, method="POST", data=None):
+    def _make_request(self, endpoint, method="POST", data=None, breaker=None):
         """
         发送API请求
         :param endpoint: API端点路径
         :param method: HTTP方法
         :param data: 请求数据
+        :param breaker: 调用方已申请放行的熔断器，为None时在此申请
         :return: 响应数据
         """
         url = f"{self.base_url}/{endpoint}"
         # 添加调试日志
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        headers = self._headers()
         logger.debug(f"API请求URL: {url}")
         logger.debug(f"请求头: {headers}")
         logger.debug(f"请求体: {data}")
+        self._note_first_request(url)
+        if breaker is None:
+            breaker = self._acquire_breaker(endpoint, (data or {}).get('model'))
         
         try:
-            response = requests.request(
-                method=method,
-                url=url,
-                headers=headers,
-                json=data
-            )
+            try:
+                response = self._send(method, url, headers, data)
+            except requests.exceptions.RequestException as e:
+                self._record_outcome(breaker, error=e)
+                raise
+            self._record_outcome(breaker, response.status_code)
             response.raise_for_status()
             response_data = response.json()
+            message = response_data.get('choices', [{}])[0].get('message', {})
+            normalized = {
+                "reasoning_content": message.get('reasoning_content', ''),
+                "content": message.get('content', '')
+            }
+            if message.get('tool_calls'):
+                normalized["tool_calls"] = message['tool_calls']
             return {
                 "choices": [{
-                    "message": {
-                        "reasoning_content": response_data.get('choices', [{}])[0].get('message', {}).get('reasoning_content', ''),
-                        "content": response_data.get('choices', [{}])[0].get('message', {}).get('content', '')
-                    }
-                }]
+                    "message": normalized
+                }],
+                "usage": response_data.get('usage')
             }
         except requests.exceptions.RequestException as e:
             raise Exception(f"API请求失败: {str(e)}")
     
-    def chat_completion(self, messages, model="deepseek-chat", temperature=0.7):
+    def raw_request(self, endpoint, data=None, method="POST", stream=False, timeout=None):
+        """
+        发送原始API请求，返回未经处理的响应对象（不检查状态码），供网关透传使用
+        :param endpoint: API端点路径
+        :param data: 请求数据
+        :param method: HTTP方法
+        :param stream: 是否以流式方式读取响应
+        :param timeout: 超时时间(秒)
+        :return: requests响应对象，调用方负责关闭
+        """
+        url = f"{self.base_url}/{endpoint}"
+        self._note_first_request(url)
+        breaker = self._acquire_breaker(endpoint, (data or {}).get('model'))
+        try:
+            response = self._send(method, url, self._headers(stream=stream), data, stream=stream, timeout=timeout)
+        except requests.exceptions.RequestException as e:
+            self._record_outcome(breaker, error=e)
+            raise
+        self._record_outcome(breaker, response.status_code)
+        return response
+    
+    def chat_completion(self, messages, model="deepseek-chat", temperature=0.7, tools=None, tool_choice=None,
+                        response_format=None):
         """
         调用聊天补全API
         :param messages: 对话消息列表
         :param model: 使用的模型名称
         :param temperature: 生成温度
+        :param tools: 可供模型调用的工具定义列表
+        :param tool_choice: 工具选择策略（auto/none/指定工具）
+        :param response_format: 结构化输出格式，如 {"type": "json_object"}
         :return: API响应
         """
 
@@ -98,23 +353,47 @@ class DeepSeekAPI:
             "messages": messages,
             "temperature": temperature
         }
-        response = self._make_request(endpoint, data=data)
+        if tools:
+            data["tools"] = tools
+            if tool_choice:
+                data["tool_choice"] = tool_choice
+        if response_format:
+            data["response_format"] = response_format
+        estimate = self._preflight(messages, model)
+        # 先检查熔断再扣减预算，熔断中直接失败的请求不占用预算
+        breaker = self._acquire_breaker(endpoint, model)
+        self._reserve_budget(estimate)
+        try:
+            response = self._make_request(endpoint, data=data, breaker=breaker)
+        except Exception:
+            self._refund_budget(estimate)
+            raise
+        self._settle_usage(estimate, response.get('usage'))
+        message = response.get('choices', [{}])[0].get('message', {})
+        normalized = {
+            "reasoning_content": message.get('reasoning_content', ''),
+            "content": message.get('content', '')
+        }
+        if message.get('tool_calls'):
+            normalized["tool_calls"] = message['tool_calls']
         return {
             "choices": [{
-                "message": {
-                    "reasoning_content": response.get('choices', [{}])[0].get('message', {}).get('reasoning_content', ''),
-                    "content": response.get('choices', [{}])[0].get('message', {}).get('content', '')
-                }
-            }]
+                "message": normalized
+            }],
+            "usage": response.get('usage')
         }
         
-    def chat_completion_stream(self, messages, model="deepseek-chat", temperature=0.7):
+    def chat_completion_stream(self, messages, model="deepseek-chat", temperature=0.7, tools=None, tool_choice=None,
+                               response_format=None):
         """
         调用流式聊天补全API
         :param messages: 对话消息列表
         :param model: 使用的模型名称（支持 deepseek-chat 和 deepseek-reasoner）
         :param temperature: 生成温度
-        :return: 生成器，每次yield一个响应块
+        :param tools: 可供模型调用的工具定义列表
+        :param tool_choice: 工具选择策略（auto/none/指定工具）
+        :param response_format: 结构化输出格式，如 {"type": "json_object"}
+        :return: 生成器，每次yield一个响应块；工具调用以增量形式出现在delta.tool_calls中
         """
         
         if messages is None or not isinstance(messages, list) or len(messages) == 0:
@@ -126,10 +405,11 @@ class DeepSeekAPI:
         prev_role = None
         for msg in messages:
             current_role = msg.get('role')
-            if not current_role or current_role not in ['system', 'user', 'assistant']:
-                raise ValueError(f"无效的消息角色: {current_role}，允许的角色: system/user/assistant")
+            if not current_role or current_role not in ['system', 'user', 'assistant', 'tool']:
+                raise ValueError(f"无效的消息角色: {current_role}，允许的角色: system/user/assistant/tool")
             
-            if prev_role == current_role:
+            # 同一轮的多个工具结果可以连续出现
+            if prev_role == current_role and current_role != 'tool':
                 raise ValueError(f"连续重复的消息角色: {current_role}，消息应当交替来自用户和助手")
             
             prev_role = current_role
@@ -143,18 +423,35 @@ class DeepSeekAPI:
             "model": model,
             "messages": messages,
             "temperature": temperature,
-            "stream": True
+            "stream": True,
+            # 让上游在流末尾返回本次请求的token用量
+            "stream_options": {"include_usage": True}
         }
+        if tools:
+            data["tools"] = tools
+            if tool_choice:
+                data["tool_choice"] = tool_choice
+        if response_format:
+            data["response_format"] = response_format
         endpoint = "chat/completions"
         url = f"{self.base_url}/{endpoint}"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "Accept": "text/event-stream"
-        }
+        headers = self._headers(stream=True)
+        estimate = self._preflight(messages, model)
+        self._note_first_request(url)
+        breaker = self._acquire_breaker(endpoint, model)
+        self._reserve_budget(estimate)
+        response = None
+        settled = False
         
         try:
-            with requests.post(url, headers=headers, json=data, stream=True) as response:
+            try:
+                response = self._send("POST", url, headers, data, stream=True)
+            except requests.exceptions.RequestException as e:
+                self._record_outcome(breaker, error=e)
+                raise
+            # 收到响应头即记录结果，流被调用方提前关闭时也不会遗漏半开探测的结果
+            self._record_outcome(breaker, response.status_code)
+            with response:
                 logger.debug(f"响应状态码: {response.status_code}")
                 response.raise_for_status()
                 
@@ -171,22 +468,35 @@ class DeepSeekAPI:
                                 break
                             try:
                                 chunk_data = json.loads(json_str)
+                                # 携带用量的最后一个数据块choices可能为空
+                                delta = ((chunk_data.get('choices') or [{}])[0].get('delta')) or {}
                                 
                                 # 结构化响应数据
-                                yield {
+                                normalized = {
                                     "choices": [{
                                         "delta": {
-                                            "reasoning_content": chunk_data.get('choices', [{}])[0].get('delta', {}).get('reasoning_content', ''),
-                                            "content": chunk_data.get('choices', [{}])[0].get('delta', {}).get('content', '')
+                                            "reasoning_content": delta.get('reasoning_content', ''),
+                                            "content": delta.get('content', '')
                                         }
                                     }]
                                 }
+                                if delta.get('tool_calls'):
+                                    normalized["choices"][0]["delta"]["tool_calls"] = delta['tool_calls']
+                                if chunk_data.get('usage'):
+                                    normalized["usage"] = chunk_data['usage']
+                                    self._settle_usage(estimate, chunk_data['usage'])
+                                    settled = True
+                                yield normalized
                             except json.JSONDecodeError:
                                 continue
         except requests.exceptions.HTTPError as e:
+            if not settled:
+                self._refund_budget(estimate)
             error_detail = f"HTTP状态码: {response.status_code if response else '无'}\n响应头: {response.headers if response else '无'}\n响应内容: {response.text if response else '无'}"
             logger.error(f"流式API请求失败: {str(e)}\n请求头: {headers}\n请求体: {json.dumps(data)}\n{error_detail}")
             raise Exception(f"流式API请求失败: {str(e)}") from e
         except requests.exceptions.RequestException as e:
+            if not settled:
+                self._refund_budget(estimate)
             logger.error(f"网络请求异常: {str(e)}")
             raise Exception(f"网络请求异常: {str(e)}")
\ No newline at end of file
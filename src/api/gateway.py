@@ -0,0 +1,338 @@
+"""
+本地网关模块，提供兼容OpenAI的 /v1/chat/completions 端点
+
+所有本地客户端的请求汇聚到同一个DeepSeekAPI实例，共享上游连接池、重试、响应缓存和限流状态。
+其他端点:
+  GET /v1/models - 透传上游模型列表
+  GET /metrics   - 网关自身的吞吐与延迟指标及上游熔断状态(JSON)
+  GET /health    - 健康检查
+客户端请求体可以用 Content-Encoding: gzip/zstd 压缩（zstd需要安装zstandard），不支持的编码返回415。
+"""
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Optional, Tuple
+import requests
+# 尝试不同的导入路径，以支持开发模式和包模式
+try:
+    # 包模式导入
+    from api.metrics import Metrics
+    from api.circuit_breaker import CircuitOpenError
+    from api.rate_limiter import RateLimiter
+    from api.request_compression import decompress, supported_encodings
+    from config.setting import (GATEWAY_TOKEN, GATEWAY_MAX_RETRIES, GATEWAY_CACHE_SIZE, GATEWAY_CACHE_TTL,
+                                GATEWAY_CACHE_ALL, GATEWAY_RATE_LIMIT)
+except ImportError:
+    # 开发模式导入
+    from src.api.metrics import Metrics
+    from src.api.circuit_breaker import CircuitOpenError
+    from src.api.rate_limiter import RateLimiter
+    from src.api.request_compression import decompress, supported_encodings
+    from src.config.setting import (GATEWAY_TOKEN, GATEWAY_MAX_RETRIES, GATEWAY_CACHE_SIZE, GATEWAY_CACHE_TTL,
+                                    GATEWAY_CACHE_ALL, GATEWAY_RATE_LIMIT)
+
+logger = logging.getLogger(__name__)
+
+# 上游返回这些状态码时可以安全重试
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class ResponseCache:
+    """带过期时间的LRU响应缓存"""
+
+    def __init__(self, max_entries: int = GATEWAY_CACHE_SIZE, ttl: float = GATEWAY_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(payload: dict) -> str:
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[Tuple[int, bytes]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Tuple[int, bytes]) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class GatewayServer(ThreadingHTTPServer):
+    """网关服务器，持有所有请求共享的上游客户端、缓存、限流器和指标"""
+
+    daemon_threads = True
+
+    def __init__(self, address, api, token: Optional[str] = GATEWAY_TOKEN, max_retries: int = GATEWAY_MAX_RETRIES,
+                 cache: Optional[ResponseCache] = None, rate_limiter: Optional[RateLimiter] = None):
+        """
+        初始化网关
+        :param address: 监听地址 (host, port)
+        :param api: 上游DeepSeekAPI实例
+        :param token: 客户端访问令牌，为None时不校验
+        :param max_retries: 上游请求最大重试次数
+        :param cache: 非流式响应缓存
+        :param rate_limiter: 上游请求限流器
+        """
+        super().__init__(address, GatewayRequestHandler)
+        self.api = api
+        self.token = token
+        self.max_retries = max_retries
+        self.cache = cache if cache is not None else ResponseCache()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter(GATEWAY_RATE_LIMIT)
+        self.metrics = Metrics()
+
+    def should_cache(self, payload: dict) -> bool:
+        if self.cache.max_entries <= 0 or payload.get('stream'):
+            return False
+        return GATEWAY_CACHE_ALL or payload.get('temperature', 1.0) == 0
+
+    def upstream(self, endpoint: str, payload: Optional[dict], method: str = "POST", stream: bool = False):
+        """
+        发送上游请求，连接失败、429和5xx时按退避策略重试
+        :return: 上游响应对象（最后一次尝试的结果）
+        """
+        retry_count = 0
+        while True:
+            self.rate_limiter.acquire()
+            try:
+                response = self.api.raw_request(endpoint, data=payload, method=method, stream=stream)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                self.metrics.incr("upstream_errors")
+                if retry_count >= self.max_retries:
+                    raise
+                logger.warning(f"上游连接失败，准备重试: {str(e)}")
+            else:
+                if response.status_code not in RETRYABLE_STATUS or retry_count >= self.max_retries:
+                    return response
+                self.metrics.incr(f"upstream_status_{response.status_code}")
+                retry_after = response.headers.get('Retry-After')
+                response.close()
+                if response.status_code == 429:
+                    # 共享的限流器让所有客户端一起退避，而不是各自撞上限
+                    self.rate_limiter.pause(float(retry_after) if retry_after and retry_after.isdigit() else 1.0)
+            retry_count += 1
+            self.metrics.incr("upstream_retries")
+            time.sleep(min(2 ** retry_count * 0.25, 8.0))
+
+
+class GatewayRequestHandler(BaseHTTPRequestHandler):
+    """处理单个客户端连接上的请求"""
+
+    protocol_version = "HTTP/1.1"
+    server: GatewayServer
+
+    def log_message(self, format, *args):
+        logger.debug("%s - %s" % (self.address_string(), format % args))
+
+    def _send_json(self, status: int, body: dict, extra_headers: Optional[dict] = None) -> None:
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self._send_bytes(status, data, "application/json", extra_headers)
+
+    def _send_bytes(self, status: int, data: bytes, content_type: str, extra_headers: Optional[dict] = None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.metrics.incr("bytes_out", len(data))
+
+    def _send_error(self, status: int, message: str, error_type: str = "gateway_error",
+                    extra_headers: Optional[dict] = None) -> None:
+        self._send_json(status, {"error": {"message": message, "type": error_type}}, extra_headers)
+
+    def _send_circuit_open(self, error: CircuitOpenError) -> None:
+        """上游熔断中，立即返回503，由客户端按Retry-After退避"""
+        self.server.metrics.incr("circuit_rejected")
+        self._send_error(503, str(error), "circuit_open", {"Retry-After": str(max(1, int(error.retry_after + 0.999)))})
+
+    def _authorized(self) -> bool:
+        if not self.server.token:
+            return True
+        return self.headers.get("Authorization", "") == f"Bearer {self.server.token}"
+
+    def do_GET(self):
+        metrics = self.server.metrics
+        if self.path == "/health":
+            self._send_json(200, {"status": "ok"})
+        elif self.path == "/metrics":
+            snapshot = metrics.snapshot()
+            snapshot["cache_entries"] = len(self.server.cache)
+            snapshot["rate_limiter"] = self.server.rate_limiter.snapshot()
+            snapshot["circuits"] = self.server.api.circuit_stats()
+            snapshot["upstream_compression"] = self.server.api.compression_stats()
+            if hasattr(self.server.api, 'upstream_stats'):
+                snapshot["upstreams"] = self.server.api.upstream_stats()
+            self._send_json(200, snapshot)
+        elif self.path == "/v1/models":
+            if not self._authorized():
+                self._send_error(401, "无效的访问令牌", "authentication_error")
+                return
+            try:
+                response = self.server.upstream("models", None, method="GET")
+            except CircuitOpenError as e:
+                self._send_circuit_open(e)
+                return
+            except requests.exceptions.RequestException as e:
+                self._send_error(502, f"上游请求失败: {str(e)}", "upstream_error")
+                return
+            self._send_bytes(response.status_code, response.content,
+                             response.headers.get("Content-Type", "application/json"))
+        else:
+            self._send_error(404, f"未知路径: {self.path}")
+
+    def do_POST(self):
+        if self.path not in ("/v1/chat/completions", "/chat/completions"):
+            self._send_error(404, f"未知路径: {self.path}")
+            return
+        if not self._authorized():
+            self._send_error(401, "无效的访问令牌", "authentication_error")
+            return
+        encoding = (self.headers.get("Content-Encoding") or "identity").strip().lower()
+        if encoding not in supported_encodings():
+            # 客户端据此判断网关不接受该压缩方式，改为发送原始请求体
+            self._send_error(415, f"不支持的Content-Encoding: {encoding}", "invalid_request_error")
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            if encoding != "identity":
+                raw_length = len(body)
+                body = decompress(body, encoding)
+                self.server.metrics.incr("compressed_requests")
+                self.server.metrics.incr("request_bytes_saved", len(body) - raw_length)
+            payload = json.loads(body)
+            if not isinstance(payload, dict):
+                raise ValueError("请求体必须是JSON对象")
+        except ValueError as e:
+            self._send_error(400, f"无效的请求体: {str(e)}", "invalid_request_error")
+            return
+
+        metrics = self.server.metrics
+        # 流式响应的状态行和头部发出后不能再发送新的响应
+        self.stream_started = False
+        metrics.incr("requests")
+        metrics.incr("active_requests")
+        metrics.mark("requests")
+        start = time.perf_counter()
+        try:
+            if payload.get("stream"):
+                self._proxy_stream(payload, start)
+            else:
+                self._proxy_json(payload, start)
+        except CircuitOpenError as e:
+            metrics.incr("failed_requests")
+            self._send_circuit_open(e)
+        except requests.exceptions.RequestException as e:
+            metrics.incr("failed_requests")
+            if self.stream_started:
+                self._abort_stream(e)
+            else:
+                self._send_error(502, f"上游请求失败: {str(e)}", "upstream_error")
+        except (BrokenPipeError, ConnectionResetError):
+            metrics.incr("client_disconnects")
+        finally:
+            metrics.incr("active_requests", -1)
+            metrics.observe("request_seconds", time.perf_counter() - start)
+
+    def _proxy_json(self, payload: dict, start: float) -> None:
+        """非流式请求：先查缓存，未命中则请求上游并按需写入缓存"""
+        server = self.server
+        cache_key = ResponseCache.make_key(payload) if server.should_cache(payload) else None
+        if cache_key:
+            cached = server.cache.get(cache_key)
+            if cached:
+                server.metrics.incr("cache_hits")
+                self._send_bytes(cached[0], cached[1], "application/json", {"X-Gateway-Cache": "hit"})
+                return
+            server.metrics.incr("cache_misses")
+        response = server.upstream("chat/completions", payload)
+        body = response.content
+        server.metrics.observe("upstream_seconds", time.perf_counter() - start)
+        if cache_key and response.status_code == 200:
+            server.cache.put(cache_key, (response.status_code, body))
+        self._send_bytes(response.status_code, body, response.headers.get("Content-Type", "application/json"),
+                         {"X-Gateway-Cache": "miss"} if cache_key else None)
+
+    def _proxy_stream(self, payload: dict, start: float) -> None:
+        """流式请求：上游字节块原样以chunked编码转发，不逐条解析SSE"""
+        server = self.server
+        with server.upstream("chat/completions", payload, stream=True) as response:
+            if response.status_code != 200:
+                self._send_bytes(response.status_code, response.content,
+                                 response.headers.get("Content-Type", "application/json"))
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", response.headers.get("Content-Type", "text/event-stream"))
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            self.stream_started = True
+            first = True
+            sent = 0
+            for block in response.iter_content(chunk_size=None):
+                if not block:
+                    continue
+                if first:
+                    server.metrics.observe("ttfb_seconds", time.perf_counter() - start)
+                    first = False
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(block), block))
+                self.wfile.flush()
+                sent += len(block)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+            server.metrics.incr("bytes_out", sent)
+            server.metrics.incr("streams")
+
+    def _abort_stream(self, error: Exception) -> None:
+        """流式转发中途上游出错：以SSE error事件告知客户端，结束chunked响应并关闭连接"""
+        self.server.metrics.incr("stream_errors")
+        self.close_connection = True
+        event = json.dumps({"error": {"message": f"上游请求失败: {str(error)}", "type": "upstream_error"}},
+                           ensure_ascii=False)
+        data = f"event: error\ndata: {event}\n\n".encode('utf-8')
+        try:
+            self.wfile.write(b"%x\r\n%s\r\n0\r\n\r\n" % (len(data), data))
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.metrics.incr("client_disconnects")
+
+
+def serve(api, host: str, port: int, **kwargs) -> None:
+    """
+    启动网关并阻塞运行，Ctrl+C退出
+    :param api: 上游DeepSeekAPI实例
+    :param host: 监听地址
+    :param port: 监听端口
+    """
+    server = GatewayServer((host, port), api, **kwargs)
+    print(f"DeepSeek网关已启动: http://{host}:{server.server_port}/v1 (上游: {api.base_url})", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
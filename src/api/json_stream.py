@@ -0,0 +1,257 @@
+"""
+增量JSON解析模块，用于结构化输出（response_format）的流式回复
+
+随着数据块到达逐步解析JSON文本，每当一个字段值或数组元素完整时立即产生事件，
+下游无需等待整个回复结束就可以处理前面的记录。数字按正则整段匹配，只有结构字符逐个处理；
+未结束的字符串按片段暂存，每次只扫描新到达的文本，长字符串值的解析耗时与长度成线性关系。
+"""
+import re
+import json
+from typing import Any, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+QUOTE_OR_ESCAPE = re.compile(r'["\\]')
+NUMBER = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?')
+NUMBER_CHARS = re.compile(r'[-+0-9.eE]+')
+LITERALS = {'true': True, 'false': False, 'null': None}
+
+# 容器解析状态
+EXPECT_KEY = 'key'          # 对象中等待键或'}'
+EXPECT_COLON = 'colon'
+EXPECT_VALUE = 'value'      # 等待值（数组中也可以是']'）
+EXPECT_COMMA = 'comma'      # 等待','或结束符
+
+
+class JSONEvent(NamedTuple):
+    """一个完整的JSON值：path为从根开始的键/下标序列，根值的path为空元组"""
+    path: Tuple[Any, ...]
+    value: Any
+
+
+class _Frame:
+    __slots__ = ('container', 'key', 'state')
+
+    def __init__(self, container):
+        self.container = container
+        self.key = None
+        self.state = EXPECT_KEY if isinstance(container, dict) else EXPECT_VALUE
+
+
+class IncrementalJSONParser:
+    def __init__(self, max_depth: Optional[int] = None, skip_prefix: bool = True):
+        """
+        初始化增量解析器
+        :param max_depth: 只产生路径深度不超过该值的事件（1为顶层字段/元素），None表示全部
+        :param skip_prefix: 忽略第一个'{'或'['之前的文本（如模型输出的```json代码块标记）
+        """
+        self.max_depth = max_depth
+        self.skip_prefix = skip_prefix
+        self._buf = ''
+        self._pos = 0
+        self._stack: List[_Frame] = []
+        self._started = False
+        # 未结束的字符串（从开头的引号起）的片段，以及片段末尾是否停在转义符之后
+        self._open_string: Optional[List[str]] = None
+        self._escaped = False
+        self.done = False
+        self.result = None
+
+    def feed(self, text: str) -> List[JSONEvent]:
+        """
+        输入一段文本
+        :return: 本次输入后新完成的值
+        """
+        if self.done or not text:
+            return []
+        events = []
+        if self._open_string is not None:
+            # 只在新文本中继续查找结束引号，已扫描的部分不再重复扫描和复制
+            end = self._scan_string(text, 0)
+            if end < 0:
+                self._open_string.append(text)
+                return events
+            self._open_string.append(text[:end + 1])
+            raw, self._open_string = ''.join(self._open_string), None
+            self._finish_string(raw, events)
+            self._buf, self._pos = text[end + 1:], 0
+        else:
+            self._buf = self._buf[self._pos:] + text
+            self._pos = 0
+        self._parse(events, final=False)
+        return events
+
+    def close(self) -> List[JSONEvent]:
+        """
+        输入结束，解析缓冲区中剩余的内容（如末尾的数字）
+        :return: 最后完成的值
+        :raises ValueError: JSON不完整
+        """
+        events = []
+        if not self.done:
+            self._parse(events, final=True)
+        if not self.done:
+            raise ValueError("JSON不完整：回复在结构结束前中断" if self._started else "回复中没有JSON内容")
+        return events
+
+    def _error(self, expected: str) -> ValueError:
+        found = self._buf[self._pos:self._pos + 20]
+        return ValueError(f"无效的JSON: 期望{expected}，实际为 {found!r}")
+
+    def _path(self) -> Tuple[Any, ...]:
+        return tuple(frame.key for frame in self._stack)
+
+    def _scan_string(self, text: str, start: int) -> int:
+        """从start开始查找字符串的结束引号，返回其下标，未找到时返回-1并记录是否停在转义符之后"""
+        pos = start
+        if self._escaped:
+            if pos >= len(text):
+                return -1
+            self._escaped = False
+            pos += 1
+        while True:
+            match = QUOTE_OR_ESCAPE.search(text, pos)
+            if match is None:
+                return -1
+            if match.group() == '"':
+                return match.start()
+            if match.end() >= len(text):
+                self._escaped = True
+                return -1
+            pos = match.end() + 1
+
+    def _string(self, buf: str, pos: int, events: List[JSONEvent]) -> bool:
+        """解析从pos处引号开始的字符串，未结束时暂存并返回False等待更多输入"""
+        end = self._scan_string(buf, pos + 1)
+        if end < 0:
+            self._open_string = [buf[pos:]]
+            self._buf, self._pos = '', 0
+            return False
+        self._pos = end + 1
+        self._finish_string(buf[pos:end + 1], events)
+        return True
+
+    def _finish_string(self, raw: str, events: List[JSONEvent]) -> None:
+        """完整的字符串：对象中等待键时作为字段名，否则作为值"""
+        value = json.loads(raw)
+        frame = self._stack[-1] if self._stack else None
+        if frame is not None and frame.state == EXPECT_KEY:
+            frame.key = value
+            frame.state = EXPECT_COLON
+        else:
+            self._complete(value, events)
+
+    def _complete(self, value, events: List[JSONEvent]) -> None:
+        """一个值解析完成：放入所在容器并产生事件"""
+        if not self._stack:
+            self.result = value
+            self.done = True
+            events.append(JSONEvent((), value))
+            return
+        frame = self._stack[-1]
+        if isinstance(frame.container, dict):
+            frame.container[frame.key] = value
+        else:
+            frame.key = len(frame.container)
+            frame.container.append(value)
+        frame.state = EXPECT_COMMA
+        if self.max_depth is None or len(self._stack) <= self.max_depth:
+            events.append(JSONEvent(self._path(), value))
+
+    def _parse(self, events: List[JSONEvent], final: bool) -> None:
+        buf = self._buf
+        end = len(buf)
+        while not self.done:
+            pos = WHITESPACE.match(buf, self._pos).end()
+            self._pos = pos
+            if pos >= end:
+                return
+            char = buf[pos]
+            if not self._started:
+                if char not in '{[':
+                    if not self.skip_prefix:
+                        raise self._error("'{'或'['")
+                    next_start = min((i for i in (buf.find('{', pos), buf.find('[', pos)) if i >= 0), default=end)
+                    self._pos = next_start
+                    continue
+                self._started = True
+            frame = self._stack[-1] if self._stack else None
+            state = frame.state if frame else EXPECT_VALUE
+
+            if state == EXPECT_KEY:
+                if char == '}' and not frame.container:
+                    self._pos = pos + 1
+                    self._stack.pop()
+                    self._complete(frame.container, events)
+                    continue
+                if char != '"':
+                    raise self._error("字段名")
+                if not self._string(buf, pos, events):
+                    return
+            elif state == EXPECT_COLON:
+                if char != ':':
+                    raise self._error("':'")
+                frame.state = EXPECT_VALUE
+                self._pos = pos + 1
+            elif state == EXPECT_COMMA:
+                closer = '}' if isinstance(frame.container, dict) else ']'
+                if char == ',':
+                    frame.state = EXPECT_KEY if closer == '}' else EXPECT_VALUE
+                    self._pos = pos + 1
+                elif char == closer:
+                    self._pos = pos + 1
+                    self._stack.pop()
+                    self._complete(frame.container, events)
+                else:
+                    raise self._error(f"','或'{closer}'")
+            else:
+                if char == ']' and frame is not None and isinstance(frame.container, list) and not frame.container:
+                    self._pos = pos + 1
+                    self._stack.pop()
+                    self._complete(frame.container, events)
+                    continue
+                if not self._parse_value(buf, pos, char, events, final):
+                    return
+
+    def _parse_value(self, buf: str, pos: int, char: str, events: List[JSONEvent], final: bool) -> bool:
+        """解析一个值的开头，数据不足以判断时返回False等待更多输入"""
+        if char == '{' or char == '[':
+            if self._stack and isinstance(self._stack[-1].container, list):
+                self._stack[-1].key = len(self._stack[-1].container)
+            self._stack.append(_Frame({} if char == '{' else []))
+            self._pos = pos + 1
+            return True
+        if char == '"':
+            return self._string(buf, pos, events)
+        if char == '-' or char.isdigit():
+            token = NUMBER_CHARS.match(buf, pos).group()
+            # 数字后面出现其他字符才能确定已经完整（"12"之后可能还有".5"）
+            if pos + len(token) == len(buf) and not final:
+                return False
+            if not NUMBER.fullmatch(token):
+                raise self._error("数字")
+            self._pos = pos + len(token)
+            self._complete(json.loads(token), events)
+            return True
+        for literal, value in LITERALS.items():
+            if buf.startswith(literal, pos):
+                self._pos = pos + len(literal)
+                self._complete(value, events)
+                return True
+            if literal.startswith(buf[pos:]):
+                return False
+        raise self._error("JSON值")
+
+
+def iter_json_events(chunks: Iterable[dict], max_depth: Optional[int] = None) -> Iterator[JSONEvent]:
+    """
+    把chat_completion_stream产生的数据块中的正式内容送入增量解析器
+    :param chunks: 流式数据块
+    :param max_depth: 只产生路径深度不超过该值的事件
+    :return: JSON事件生成器，最后一个事件为完整的根值
+    """
+    parser = IncrementalJSONParser(max_depth=max_depth)
+    for chunk in chunks:
+        content = chunk['choices'][0]['delta'].get('content')
+        if content:
+            yield from parser.feed(content)
+    yield from parser.close()
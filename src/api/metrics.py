@@ -0,0 +1,102 @@
+"""
+指标统计模块，提供线程安全的计数器、滑动窗口延迟分位数和吞吐率统计
+"""
+import time
+import threading
+from collections import defaultdict, deque
+from typing import Dict
+
+
+class LatencyWindow:
+    """滑动窗口延迟统计，保留最近size个样本用于计算分位数"""
+
+    def __init__(self, size: int = 1024):
+        self._samples = deque(maxlen=size)
+        self._count = 0
+        self._total = 0.0
+
+    def add(self, value: float) -> None:
+        self._samples.append(value)
+        self._count += 1
+        self._total += value
+
+    def snapshot(self) -> Dict[str, float]:
+        """返回样本总数、平均值以及窗口内的p50/p95/p99（单位与输入一致）"""
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": 0}
+
+        def percentile(p):
+            return samples[min(len(samples) - 1, int(p * len(samples)))]
+
+        return {
+            "count": self._count,
+            "avg": round(self._total / self._count, 4),
+            "p50": round(percentile(0.50), 4),
+            "p95": round(percentile(0.95), 4),
+            "p99": round(percentile(0.99), 4),
+        }
+
+
+class Metrics:
+    """线程安全的指标集合"""
+
+    def __init__(self, rate_window: float = 60.0):
+        """
+        初始化指标集合
+        :param rate_window: 计算吞吐率的时间窗口(秒)
+        """
+        self._lock = threading.Lock()
+        self._counters = defaultdict(int)
+        self._latencies = defaultdict(LatencyWindow)
+        self._events = defaultdict(lambda: deque(maxlen=100000))
+        self.rate_window = rate_window
+        self.started = time.time()
+
+    def incr(self, name: str, value: int = 1) -> None:
+        """累加计数器"""
+        with self._lock:
+            self._counters[name] += value
+
+    def observe(self, name: str, value: float) -> None:
+        """记录一个延迟（或其他数值）样本"""
+        with self._lock:
+            self._latencies[name].add(value)
+
+    def mark(self, name: str) -> None:
+        """记录一次事件，用于计算窗口内的速率"""
+        with self._lock:
+            self._events[name].append(time.monotonic())
+
+    def get(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def latency(self, name: str) -> Dict[str, float]:
+        """返回单项延迟统计"""
+        with self._lock:
+            return self._latencies[name].snapshot() if name in self._latencies else {"count": 0}
+
+    def rate(self, name: str) -> float:
+        """返回窗口内每秒事件数"""
+        cutoff = time.monotonic() - self.rate_window
+        with self._lock:
+            events = self._events.get(name)
+            if not events:
+                return 0.0
+            while events and events[0] < cutoff:
+                events.popleft()
+            return len(events) / self.rate_window
+
+    def snapshot(self) -> Dict[str, object]:
+        """导出全部指标"""
+        with self._lock:
+            counters = dict(self._counters)
+            latencies = {name: window.snapshot() for name, window in self._latencies.items()}
+            names = list(self._events.keys())
+        return {
+            "uptime": round(time.time() - self.started, 1),
+            "counters": counters,
+            "latency": latencies,
+            "rate_per_sec": {name: round(self.rate(name), 3) for name in names},
+        }
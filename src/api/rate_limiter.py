@@ -0,0 +1,73 @@
+"""
+限流模块，提供在多个调用方之间共享的令牌桶
+"""
+import time
+import threading
+
+
+class RateLimiter:
+    """令牌桶限流器，同时支持上游返回429时的全局暂停"""
+
+    def __init__(self, rate: float, burst: float = None):
+        """
+        初始化限流器
+        :param rate: 每秒补充的令牌数，<=0表示不限流
+        :param burst: 桶容量，默认等于rate
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds: float) -> None:
+        """上游要求退避时（如Retry-After），暂停所有调用方"""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self, cost: float = 1.0, timeout: float = None) -> bool:
+        """
+        获取令牌，不足时阻塞等待
+        :param cost: 本次消耗的令牌数
+        :param timeout: 最长等待时间(秒)，None表示一直等待
+        :return: 是否获取成功
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self.rate <= 0:
+                        return True
+                    self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    # 单次消耗超过桶容量时按桶满放行，避免永远无法获取
+                    if self._tokens >= min(cost, self.capacity):
+                        self._tokens -= cost
+                        return True
+                    wait = (min(cost, self.capacity) - self._tokens) / self.rate
+            if deadline is not None and time.monotonic() + wait > deadline:
+                return False
+            time.sleep(wait)
+
+    def consume(self, cost: float) -> None:
+        """
+        不等待直接扣减令牌（可扣成负数，由后续调用方等待补足），用于请求完成后按实际用量补扣
+        :param cost: 扣减的令牌数，负数表示退还
+        """
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate - cost)
+            self._updated = now
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "rate": self.rate,
+                "tokens": round(self._tokens, 2),
+                "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            }
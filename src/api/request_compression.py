@@ -0,0 +1,187 @@
+"""
+请求体压缩模块，为较大的chat/completions请求体添加 Content-Encoding: gzip/zstd
+
+长对话和附件使每次请求的请求体达到数百KB，出口带宽受限时上传耗时占主导。
+压缩按端点（scheme://host:port）探测：首个压缩请求被拒绝（400/415）时以未压缩的请求体重发，
+重发成功则记住该端点不接受压缩，之后直接发送原始请求体；压缩请求成功则记住该端点接受压缩。
+zstd需要安装zstandard，未安装时回退到gzip。
+"""
+import gzip
+import sys
+import time
+import importlib.util
+import zlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+# 尝试不同的导入路径，以支持开发模式和包模式
+try:
+    # 包模式导入
+    from config.setting import REQUEST_COMPRESSION, REQUEST_COMPRESSION_MIN_BYTES, REQUEST_COMPRESSION_LEVELS
+except ImportError:
+    # 开发模式导入
+    from src.config.setting import REQUEST_COMPRESSION, REQUEST_COMPRESSION_MIN_BYTES, REQUEST_COMPRESSION_LEVELS
+
+# 只检查是否已安装，zstandard在第一次zstd压缩/解压时才导入，未启用压缩时不承担其导入开销
+ZSTD_AVAILABLE = importlib.util.find_spec('zstandard') is not None
+
+logger = logging.getLogger(__name__)
+
+MODES = ('off', 'auto', 'gzip', 'zstd')
+ENCODINGS = ('gzip', 'zstd')
+# 端点不支持压缩请求体时的常见响应状态码
+REJECTED_STATUS = {400, 415}
+# 压缩后仍大于原始大小的该比例时视为不可压缩，发送原始请求体
+MIN_RATIO = 0.95
+
+UNKNOWN = "unknown"
+ACCEPTED = "accepted"
+REJECTED = "rejected"
+
+
+def compress(body: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    """按Content-Encoding压缩数据"""
+    level = REQUEST_COMPRESSION_LEVELS.get(encoding) if level is None else level
+    if encoding == 'gzip':
+        # mtime固定为0，相同请求体的压缩结果相同
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    if encoding == 'zstd':
+        if not ZSTD_AVAILABLE:
+            raise RuntimeError("zstd压缩需要安装zstandard: pip install zstandard")
+        import zstandard
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    raise ValueError(f"不支持的Content-Encoding: {encoding}")
+
+
+def supported_encodings() -> Tuple[str, ...]:
+    """本机可以解压的Content-Encoding"""
+    return ('identity', 'gzip', 'zstd') if ZSTD_AVAILABLE else ('identity', 'gzip')
+
+
+def decompress(body: bytes, encoding: str, max_size: int = 64 << 20) -> bytes:
+    """
+    按Content-Encoding解压请求体（网关接收压缩请求时使用）
+    :param max_size: 解压后的最大字节数，防止压缩炸弹
+    """
+    encoding = (encoding or 'identity').strip().lower()
+    if encoding == 'identity':
+        return body
+    try:
+        if encoding == 'gzip':
+            # 限制输出大小，超出部分不再解压
+            data = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(body, max_size + 1)
+        elif encoding == 'zstd' and ZSTD_AVAILABLE:
+            import zstandard
+            data = zstandard.ZstdDecompressor().decompress(body, max_output_size=max_size + 1)
+        else:
+            raise ValueError(f"不支持的Content-Encoding: {encoding}")
+    except zlib.error as e:
+        raise ValueError(f"gzip解压失败: {str(e)}") from e
+    except Exception as e:
+        zstandard = sys.modules.get('zstandard')
+        if zstandard is not None and isinstance(e, zstandard.ZstdError):
+            raise ValueError(f"zstd解压失败: {str(e)}") from e
+        raise
+    if len(data) > max_size:
+        raise ValueError(f"解压后的请求体超过{max_size}字节")
+    return data
+
+
+def resolve_encoding(mode: str) -> Optional[str]:
+    """把配置的压缩模式转换为实际使用的编码，off返回None"""
+    if mode not in MODES:
+        raise ValueError(f"无效的请求压缩方式: {mode}，可选: {'/'.join(MODES)}")
+    if mode == 'off':
+        return None
+    if mode == 'auto':
+        return 'zstd' if ZSTD_AVAILABLE else 'gzip'
+    if mode == 'zstd' and not ZSTD_AVAILABLE:
+        logger.warning("未安装zstandard，请求压缩回退到gzip")
+        return 'gzip'
+    return mode
+
+
+class RequestCompressor:
+    """请求体压缩器，按端点记录是否接受压缩，并统计节省的字节数和压缩耗费的CPU时间，线程安全"""
+
+    def __init__(self, mode: str = REQUEST_COMPRESSION, min_bytes: int = REQUEST_COMPRESSION_MIN_BYTES,
+                 level: Optional[int] = None):
+        """
+        初始化压缩器
+        :param mode: off / auto(优先zstd) / gzip / zstd
+        :param min_bytes: 请求体小于该字节数时不压缩
+        :param level: 压缩级别，默认使用配置中对应编码的级别
+        """
+        self.encoding = resolve_encoding(mode)
+        self.min_bytes = min_bytes
+        self.level = level
+        self._origins: Dict[str, str] = {}
+        self._lock = threading.Lock()
+        self.stats = {"compressed": 0, "skipped": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0,
+                      "rejected": 0, "fallbacks": 0}
+
+    @staticmethod
+    def origin(url: str) -> str:
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.hostname}:{parsed.port or (443 if parsed.scheme == 'https' else 80)}"
+
+    def state(self, url: str) -> str:
+        """端点是否接受压缩请求体: unknown / accepted / rejected"""
+        with self._lock:
+            return self._origins.get(self.origin(url), UNKNOWN)
+
+    def encode(self, url: str, body: bytes) -> Tuple[bytes, Optional[str]]:
+        """
+        按需压缩请求体
+        :return: (请求体, Content-Encoding)，未压缩时编码为None
+        """
+        if self.encoding is None or len(body) < self.min_bytes or self.state(url) == REJECTED:
+            with self._lock:
+                self.stats["skipped"] += 1
+            return body, None
+        # 压缩在调用线程中执行，用线程CPU时间衡量开销，不受其他会话并发请求的影响
+        started = time.thread_time()
+        compressed = compress(body, self.encoding, self.level)
+        cpu = time.thread_time() - started
+        with self._lock:
+            self.stats["cpu_seconds"] += cpu
+            if len(compressed) >= len(body) * MIN_RATIO:
+                self.stats["skipped"] += 1
+                return body, None
+            self.stats["compressed"] += 1
+            self.stats["bytes_in"] += len(body)
+            self.stats["bytes_out"] += len(compressed)
+        return compressed, self.encoding
+
+    def should_fallback(self, url: str, status_code: int) -> bool:
+        """压缩请求的响应状态码表明端点可能不接受压缩时返回True，调用方应以原始请求体重发一次"""
+        origin = self.origin(url)
+        with self._lock:
+            if self._origins.get(origin, UNKNOWN) != UNKNOWN:
+                return False
+            if status_code in REJECTED_STATUS:
+                self.stats["rejected"] += 1
+                return True
+            if status_code < 400:
+                self._origins[origin] = ACCEPTED
+                logger.info(f"端点 {origin} 接受{self.encoding}压缩的请求体")
+            return False
+
+    def record_fallback(self, url: str, status_code: int) -> None:
+        """记录重发原始请求体的结果：重发成功说明被拒绝的原因是压缩，此后不再压缩发往该端点的请求"""
+        if status_code >= 400:
+            # 原始请求体同样被拒绝（请求本身的问题），或遇到限流/服务端错误等暂时性故障，无法判断，下次仍会探测
+            return
+        origin = self.origin(url)
+        with self._lock:
+            self._origins[origin] = REJECTED
+            self.stats["fallbacks"] += 1
+        logger.info(f"端点 {origin} 不接受压缩的请求体，后续请求不再压缩")
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            stats = dict(self.stats, encoding=self.encoding or "off", origins=dict(self._origins))
+        stats["bytes_saved"] = stats["bytes_in"] - stats["bytes_out"]
+        stats["cpu_seconds"] = round(stats["cpu_seconds"], 4)
+        return stats
@@ -0,0 +1,217 @@
+"""
+单飞合并模块：相同的并发流式请求只发起一次上游调用，数据块扇出给所有订阅者
+
+每个订阅者有独立的有界缓冲区；迟到的订阅者先回放已收到的数据块，再接收后续数据。
+订阅者消费过慢导致缓冲区写满时，分发最多等待put_timeout（同一数据块上写满的订阅者共用这段等待），
+之后该订阅者改为从回放记录中追赶，不再拖慢其他订阅者。
+订阅和上游调用都在首次迭代时才发生，创建后从未迭代的生成器不会发起或占住上游调用。
+"""
+import copy
+import json
+import queue
+import hashlib
+import logging
+import threading
+import time
+from typing import Callable, Dict, Iterator
+# 尝试不同的导入路径，以支持开发模式和包模式
+try:
+    # 包模式导入
+    from config.setting import SINGLE_FLIGHT_BUFFER, SINGLE_FLIGHT_PUT_TIMEOUT
+except ImportError:
+    # 开发模式导入
+    from src.config.setting import SINGLE_FLIGHT_BUFFER, SINGLE_FLIGHT_PUT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+# 队列中表示上游结束的哨兵
+_END = object()
+
+
+class _Subscriber:
+    def __init__(self, buffer_size: int):
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.lagging = False
+
+
+class _Flight:
+    """一次进行中的上游调用"""
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.chunks = []
+        self.subscribers = []
+        self.done = False
+        self.cancelled = False
+        self.error = None
+
+
+class SingleFlight:
+    """按请求键合并并发的流式调用"""
+
+    def __init__(self, buffer_size: int = SINGLE_FLIGHT_BUFFER, put_timeout: float = SINGLE_FLIGHT_PUT_TIMEOUT):
+        """
+        初始化单飞合并器
+        :param buffer_size: 每个订阅者的缓冲区大小
+        :param put_timeout: 缓冲区满时等待订阅者消费的最长时间(秒)
+        """
+        self.buffer_size = buffer_size
+        self.put_timeout = put_timeout
+        self._flights: Dict[str, _Flight] = {}
+        self._lock = threading.Lock()
+        self.stats = {"flights": 0, "joined": 0, "late_joined": 0, "lagging": 0}
+
+    @staticmethod
+    def make_key(**request) -> str:
+        """根据请求参数生成合并键"""
+        return hashlib.sha256(json.dumps(request, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def stream(self, key: str, factory: Callable[[], Iterator]) -> Iterator:
+        """
+        订阅键对应的流，不存在进行中的调用时由factory发起上游调用
+        :param key: 请求合并键
+        :param factory: 返回上游数据块迭代器的函数
+        :return: 数据块生成器，首次迭代时才订阅
+        """
+        return self._consume(key, factory)
+
+    def _subscribe(self, key: str, factory: Callable[[], Iterator]):
+        """登记订阅者，不存在进行中的调用时启动后台线程发起上游调用"""
+        subscriber = _Subscriber(self.buffer_size)
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._flights[key] = flight
+                self.stats["flights"] += 1
+            else:
+                self.stats["joined"] += 1
+            with flight.cond:
+                replay = list(flight.chunks)
+                live = not flight.done
+                if live:
+                    flight.subscribers.append(subscriber)
+            if replay:
+                self.stats["late_joined"] += 1
+        if leader:
+            threading.Thread(target=self._run, args=(key, flight, factory), daemon=True).start()
+        return flight, subscriber, replay, live
+
+    def _run(self, key: str, flight: _Flight, factory: Callable[[], Iterator]) -> None:
+        """后台拉取上游数据并分发给订阅者"""
+        upstream = None
+        try:
+            upstream = factory()
+            for chunk in upstream:
+                with flight.cond:
+                    if flight.cancelled:
+                        break
+                    flight.chunks.append(chunk)
+                    subscribers = list(flight.subscribers)
+                    flight.cond.notify_all()
+                self._offer(flight, subscribers, chunk)
+        except Exception as e:
+            flight.error = e
+        finally:
+            if upstream is not None and hasattr(upstream, 'close'):
+                upstream.close()
+            with self._lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+            with flight.cond:
+                flight.done = True
+                subscribers = list(flight.subscribers)
+                flight.cond.notify_all()
+            self._offer(flight, subscribers, _END)
+
+    def _offer(self, flight: _Flight, subscribers: list, item) -> None:
+        """
+        向订阅者缓冲区投递数据：先不等待地投递，缓冲区已满的订阅者共用一个put_timeout的等待期限，
+        超时的订阅者标记为追赶模式，慢订阅者再多，每个数据块最多等待put_timeout
+        """
+        full = []
+        for subscriber in subscribers:
+            if subscriber.lagging:
+                continue
+            try:
+                subscriber.queue.put_nowait(item)
+            except queue.Full:
+                full.append(subscriber)
+        deadline = time.monotonic() + self.put_timeout
+        for subscriber in full:
+            try:
+                subscriber.queue.put(item, timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Full:
+                self._mark_lagging(flight, subscriber)
+
+    def _mark_lagging(self, flight: _Flight, subscriber: _Subscriber) -> None:
+        """订阅者改为从回放记录追赶，不再接收投递"""
+        with flight.cond:
+            subscriber.lagging = True
+            if subscriber in flight.subscribers:
+                flight.subscribers.remove(subscriber)
+        with self._lock:
+            self.stats["lagging"] += 1
+        logger.debug("订阅者缓冲区已满，改为从回放记录追赶")
+
+    def _consume(self, key: str, factory: Callable[[], Iterator]) -> Iterator:
+        """订阅者一侧：先回放，再读取自己的缓冲区，被标记为追赶模式后改读回放记录"""
+        flight, subscriber, replay, live = self._subscribe(key, factory)
+        position = len(replay)
+        try:
+            yield from replay
+            # 实时阶段：从自己的缓冲区读取；只有缓冲区写满时才会被标记为追赶模式
+            while live:
+                if subscriber.lagging and subscriber.queue.empty():
+                    break
+                item = subscriber.queue.get()
+                if item is _END:
+                    break
+                position += 1
+                yield item
+            # 追赶阶段：直接从回放记录读取剩余数据，直到上游结束
+            while True:
+                with flight.cond:
+                    while position >= len(flight.chunks) and not flight.done:
+                        flight.cond.wait()
+                    pending = flight.chunks[position:]
+                    finished = flight.done
+                for chunk in pending:
+                    position += 1
+                    yield chunk
+                if finished:
+                    break
+            if flight.error is not None:
+                raise flight.error
+        finally:
+            with flight.cond:
+                if subscriber in flight.subscribers:
+                    flight.subscribers.remove(subscriber)
+                # 所有订阅者都已离开时停止上游调用
+                if not flight.subscribers and not flight.done:
+                    flight.cancelled = True
+
+
+class SingleFlightAPI:
+    """在DeepSeekAPI前增加单飞合并层，只作用于chat_completion_stream，其余属性透传"""
+
+    def __init__(self, api, buffer_size: int = SINGLE_FLIGHT_BUFFER, put_timeout: float = SINGLE_FLIGHT_PUT_TIMEOUT):
+        self.api = api
+        self.single_flight = SingleFlight(buffer_size, put_timeout)
+
+    def chat_completion_stream(self, messages, model="deepseek-chat", temperature=0.7, tools=None, tool_choice=None,
+                               response_format=None):
+        """与DeepSeekAPI.chat_completion_stream相同，请求参数完全相同的并发请求共享一次上游调用"""
+        key = SingleFlight.make_key(model=model, messages=messages, temperature=temperature,
+                                    tools=tools, tool_choice=tool_choice, response_format=response_format)
+        # 上游调用会就地规范化消息内容，使用副本避免影响调用方
+        request_messages = copy.deepcopy(messages)
+        return self.single_flight.stream(
+            key, lambda: self.api.chat_completion_stream(messages=request_messages, model=model, temperature=temperature,
+                                                         tools=tools, tool_choice=tool_choice,
+                                                         response_format=response_format)
+        )
+
+    def __getattr__(self, name):
+        return getattr(self.api, name)
@@ -0,0 +1,171 @@
+"""
+本地token估算模块，在请求发送前估算消息的token数
+
+两种估算方式:
+  近似估算 - 按中文/非中文字符数加权，无额外依赖，并根据上游返回的实际用量自动校准比例
+  分词器   - 安装tokenizers并配置TOKENIZER_FILE（模型的tokenizer.json）时使用，结果与上游一致
+每条消息的token数按内容缓存，对话历史增长时重新估算只需计算新增的消息。
+"""
+import re
+import json
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+# 尝试不同的导入路径，以支持开发模式和包模式
+try:
+    # 包模式导入
+    from config.setting import (TOKENIZER_FILE, TOKEN_CACHE_SIZE, MODEL_CONTEXT_LIMITS, DEFAULT_CONTEXT_LIMIT,
+                                CONTEXT_OUTPUT_RESERVE)
+except ImportError:
+    # 开发模式导入
+    from src.config.setting import (TOKENIZER_FILE, TOKEN_CACHE_SIZE, MODEL_CONTEXT_LIMITS, DEFAULT_CONTEXT_LIMIT,
+                                    CONTEXT_OUTPUT_RESERVE)
+
+try:
+    from tokenizers import Tokenizer
+    TOKENIZERS_AVAILABLE = True
+except ImportError:
+    Tokenizer = None
+    TOKENIZERS_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+CJK_PATTERN = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+# 每条消息的角色标记等格式开销，以及回复开头的固定开销
+MESSAGE_OVERHEAD = 4
+REPLY_OVERHEAD = 3
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数：中文字符约0.6个token，其他字符约0.3个token"""
+    cjk = len(CJK_PATTERN.findall(text))
+    return int(cjk * 0.6 + (len(text) - cjk) * 0.3) + 1
+
+
+class ContextLimitError(Exception):
+    """估算的请求token数超出模型上下文上限，请求未发送即被拒绝"""
+
+    def __init__(self, model: str, tokens: int, limit: int):
+        self.model = model
+        self.tokens = tokens
+        self.limit = limit
+        super().__init__(f"请求约{tokens} tokens，超出模型 {model} 的上下文上限{limit}（已预留回复空间）")
+
+
+def context_limit(model: str) -> int:
+    """模型的上下文长度上限(tokens)"""
+    return MODEL_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMIT)
+
+
+class TokenCounter:
+    """消息token计数器，按消息内容缓存计数结果，线程安全（多个会话共享）"""
+
+    def __init__(self, tokenizer_file: Optional[str] = TOKENIZER_FILE, cache_size: int = TOKEN_CACHE_SIZE):
+        """
+        初始化计数器
+        :param tokenizer_file: tokenizer.json路径，未安装tokenizers或未配置时使用近似估算
+        :param cache_size: 缓存的消息计数条数
+        """
+        self.tokenizer = None
+        if tokenizer_file:
+            if TOKENIZERS_AVAILABLE:
+                self.tokenizer = Tokenizer.from_file(tokenizer_file)
+            else:
+                logger.warning("已配置TOKENIZER_FILE但未安装tokenizers，使用近似估算")
+        self.cache_size = cache_size
+        # 近似估算的校准比例：实际用量/估算值的指数滑动平均
+        self.scale = 1.0
+        self._cache: "OrderedDict[tuple, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    @property
+    def backend(self) -> str:
+        return "tokenizer" if self.tokenizer is not None else "estimate"
+
+    def count_text(self, text: str) -> int:
+        """计算一段文本的token数（近似估算时未经校准）"""
+        if not text:
+            return 0
+        if self.tokenizer is not None:
+            return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+        return estimate_tokens(text)
+
+    @staticmethod
+    def _key(message: Dict[str, object]) -> tuple:
+        # 用内容的哈希而非内容本身作为键：字符串的哈希值缓存在对象上，同一条消息重复计数时无需重新扫描，
+        # 缓存也不会持有已溢出到磁盘的消息内容；估算场景下哈希碰撞的影响可以忽略
+        content = message.get('content') or ''
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        tool_calls = message.get('tool_calls')
+        return (message.get('role'), hash(content), len(content), message.get('tool_call_id'),
+                hash(json.dumps(tool_calls, sort_keys=True)) if tool_calls else None)
+
+    def count_message(self, message: Dict[str, object]) -> int:
+        """计算单条消息的token数（含格式开销），结果按内容缓存"""
+        key = self._key(message)
+        with self._lock:
+            tokens = self._cache.get(key)
+            if tokens is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+                return tokens
+            self.stats["misses"] += 1
+        content = message.get('content') or ''
+        if not isinstance(content, str):
+            content = json.dumps(content, ensure_ascii=False)
+        tokens = MESSAGE_OVERHEAD + self.count_text(content)
+        if message.get('tool_calls'):
+            tokens += self.count_text(json.dumps(message['tool_calls'], ensure_ascii=False))
+        with self._lock:
+            self._cache[key] = tokens
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return tokens
+
+    def count_messages(self, messages: Iterable[Dict[str, object]]) -> int:
+        """估算一次请求中全部消息的token数，近似估算时按上游实际用量校准"""
+        total = REPLY_OVERHEAD + sum(self.count_message(message) for message in messages)
+        return total if self.tokenizer is not None else int(total * self.scale)
+
+    def breakdown(self, messages: Iterable[Dict[str, object]]) -> Dict[str, int]:
+        """按角色汇总消息的token数（与count_messages使用相同的校准比例）"""
+        totals: Dict[str, int] = {}
+        for message in messages:
+            role = message.get('role') or 'unknown'
+            totals[role] = totals.get(role, 0) + self.count_message(message)
+        scale = 1.0 if self.tokenizer is not None else self.scale
+        return {role: int(tokens * scale) for role, tokens in totals.items()}
+
+    def calibrate(self, estimated: int, actual: Optional[int], weight: float = 0.2) -> None:
+        """
+        用上游返回的实际prompt_tokens校准近似估算
+        :param estimated: 请求前的估算值（已乘以当前比例）
+        :param actual: 上游返回的实际用量
+        :param weight: 本次样本的权重
+        """
+        if self.tokenizer is not None or not actual or estimated <= 0:
+            return
+        ratio = actual / (estimated / self.scale)
+        with self._lock:
+            # 限制单个样本的影响范围，避免异常用量把比例带偏
+            self.scale += weight * (min(max(ratio, 0.25), 4.0) - self.scale)
+
+    def check(self, messages: Iterable[Dict[str, object]], model: str,
+              reserve: int = CONTEXT_OUTPUT_RESERVE) -> int:
+        """
+        发送前检查请求是否超出模型上下文上限
+        :param reserve: 为回复预留的token数
+        :return: 估算的请求token数
+        """
+        tokens = self.count_messages(messages)
+        limit = context_limit(model)
+        if tokens + reserve > limit:
+            raise ContextLimitError(model, tokens, limit - reserve)
+        return tokens
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return dict(self.stats, backend=self.backend, scale=round(self.scale, 3), cached=len(self._cache))
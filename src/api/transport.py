@@ -0,0 +1,174 @@
+"""
+传输层模块，为DeepSeekAPI提供可替换的HTTP会话
+
+默认的requests.Session基于HTTP/1.1，每个并发的流式请求都占用一条独立的TCP/TLS连接。
+安装httpx[http2]后可使用HTTP2Session：多个并发流复用同一条连接，各自独立做流量控制。
+HTTP2Session实现了DeepSeekAPI用到的requests.Session接口子集，并把httpx异常转换为requests异常，
+因此重试、错误分类等上层逻辑无需区分传输层。服务端不支持HTTP/2时通过ALPN协商自动回退到HTTP/1.1。
+"""
+import logging
+import importlib.util
+from contextlib import contextmanager
+from urllib.parse import urlparse
+import requests
+# 尝试不同的导入路径，以支持开发模式和包模式
+try:
+    # 包模式导入
+    from config.setting import HTTP_TRANSPORT
+except ImportError:
+    # 开发模式导入
+    from src.config.setting import HTTP_TRANSPORT
+
+# 只检查是否已安装，httpx（及其HTTP/2支持依赖的h2）在真正创建HTTP/2会话时才导入，
+# 使用HTTP/1.1传输或管道模式等只需快速启动的场景不承担其导入开销
+HTTP2_AVAILABLE = all(importlib.util.find_spec(name) is not None for name in ('httpx', 'h2'))
+
+logger = logging.getLogger(__name__)
+
+TRANSPORTS = ('auto', 'http2', 'http1')
+
+
+@contextmanager
+def _translate_errors():
+    """把httpx异常转换为对应的requests异常"""
+    import httpx
+    try:
+        yield
+    except httpx.TimeoutException as e:
+        raise requests.exceptions.Timeout(str(e)) from e
+    except httpx.TransportError as e:
+        raise requests.exceptions.ConnectionError(str(e)) from e
+
+
+class HTTP2Response:
+    """包装httpx.Response，提供DeepSeekAPI和网关用到的requests.Response接口"""
+
+    def __init__(self, response):
+        self._response = response
+        self.status_code = response.status_code
+        self.headers = response.headers
+        self.url = str(response.url)
+        self.http_version = response.http_version
+
+    def __bool__(self):
+        return self.status_code < 400
+
+    @property
+    def content(self) -> bytes:
+        with _translate_errors():
+            return self._response.read()
+
+    @property
+    def text(self) -> str:
+        with _translate_errors():
+            self._response.read()
+        return self._response.text
+
+    def json(self):
+        with _translate_errors():
+            self._response.read()
+        return self._response.json()
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            kind = "Client" if self.status_code < 500 else "Server"
+            raise requests.exceptions.HTTPError(
+                f"{self.status_code} {kind} Error: {self._response.reason_phrase} for url: {self.url}", response=self
+            )
+
+    def iter_content(self, chunk_size=None):
+        with _translate_errors():
+            yield from self._response.iter_bytes(chunk_size)
+
+    def iter_lines(self):
+        """与requests一致，按行产出bytes（不含换行符）"""
+        pending = b''
+        for block in self.iter_content():
+            lines = (pending + block).split(b'\n')
+            pending = lines.pop()
+            for line in lines:
+                yield line.rstrip(b'\r')
+        if pending:
+            yield pending
+
+    def close(self):
+        self._response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class HTTP2Session:
+    """基于httpx.Client的会话，接口与DeepSeekAPI使用的requests.Session方法保持一致"""
+
+    def __init__(self, pool_maxsize=None, prior_knowledge=False):
+        """
+        初始化HTTP/2会话
+        :param pool_maxsize: 最大连接数，HTTP/2下一条连接即可承载大量并发流
+        :param prior_knowledge: 对http://地址直接使用HTTP/2（h2c），仅用于支持h2c的本地服务
+        """
+        if not HTTP2_AVAILABLE:
+            raise RuntimeError("HTTP/2传输需要安装httpx[http2]: pip install 'httpx[http2]'")
+        import httpx
+        limits = httpx.Limits(max_connections=pool_maxsize, max_keepalive_connections=pool_maxsize or 20)
+        # 与requests保持一致：不设置默认超时，流式回复可能持续很久
+        self.client = httpx.Client(http1=not prior_knowledge, http2=True, limits=limits, timeout=None)
+
+    def request(self, method, url, headers=None, json=None, data=None, stream=False, timeout=None):
+        kwargs = {"timeout": timeout} if timeout is not None else {}
+        with _translate_errors():
+            request = self.client.build_request(method, url, headers=headers, json=json, content=data, **kwargs)
+            response = self.client.send(request, stream=stream)
+        return HTTP2Response(response)
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs):
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def is_warm(self, url) -> bool:
+        """检查连接池中是否已有到目标地址的可用连接"""
+        parsed = urlparse(url)
+        host = parsed.hostname.encode('ascii')
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        try:
+            for connection in self.client._transport._pool.connections:
+                origin = connection._origin
+                if (origin.host, origin.port) == (host, port) and not connection.is_closed():
+                    return True
+        except AttributeError as e:
+            # httpx/httpcore连接池的内部结构，不同版本可能变化，读取失败时按未命中处理
+            logger.debug(f"无法读取连接池状态，按未命中预热连接处理: {str(e)}")
+        return False
+
+    def close(self):
+        self.client.close()
+
+
+def create_session(transport: str = HTTP_TRANSPORT, pool_maxsize=None):
+    """
+    按配置创建HTTP会话
+    :param transport: auto(已安装httpx[http2]时使用HTTP/2) / http2 / http1
+    :param pool_maxsize: 连接池大小
+    :return: requests.Session或HTTP2Session
+    """
+    if transport not in TRANSPORTS:
+        raise ValueError(f"无效的传输方式: {transport}，可选: {'/'.join(TRANSPORTS)}")
+    if transport in ('auto', 'http2'):
+        if HTTP2_AVAILABLE:
+            return HTTP2Session(pool_maxsize)
+        if transport == 'http2':
+            logger.warning("未安装httpx[http2]，回退到HTTP/1.1传输")
+    session = requests.Session()
+    if pool_maxsize:
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+    return session
@@ -0,0 +1,356 @@
+"""
+多上游负载均衡模块：由多个(base_url, api_key)组成上游池，接口与DeepSeekAPI一致
+
+每个上游是独立的DeepSeekAPI（独立的连接池、熔断器和token预算），吞吐不再受单个账号的限流约束。
+  选择策略   - least_outstanding: 按权重归一化的进行中请求数最少；weighted: 平滑加权轮询
+  会话粘性   - 同一对话（从开头到第一条用户消息的前缀相同）固定发往同一上游，保持上游前缀缓存的命中
+  剔除与切换 - 连接失败、超时、5xx和429计为上游故障，连续失败达到阈值后暂时剔除（时长指数增长），
+               请求在尚未收到任何数据时切换到其他上游重试
+  指标       - 每个上游单独统计请求数、失败数、进行中请求数、剔除次数和耗时
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional
+import requests
+# 尝试不同的导入路径，以支持开发模式和包模式
+try:
+    # 包模式导入
+    from api.deepseek_api import DeepSeekAPI
+    from api.circuit_breaker import CircuitOpenError
+    from api.metrics import Metrics
+    from config.setting import (UPSTREAMS, UPSTREAM_POLICY, UPSTREAM_EJECT_FAILURES, UPSTREAM_EJECT_BASE,
+                                UPSTREAM_EJECT_MAX, UPSTREAM_AFFINITY_SIZE)
+except ImportError:
+    # 开发模式导入
+    from src.api.deepseek_api import DeepSeekAPI
+    from src.api.circuit_breaker import CircuitOpenError
+    from src.api.metrics import Metrics
+    from src.config.setting import (UPSTREAMS, UPSTREAM_POLICY, UPSTREAM_EJECT_FAILURES, UPSTREAM_EJECT_BASE,
+                                    UPSTREAM_EJECT_MAX, UPSTREAM_AFFINITY_SIZE)
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ('least_outstanding', 'weighted')
+# 上游返回这些状态码时计为上游故障
+FAULT_STATUS = {429, 500, 502, 503, 504}
+
+
+def load_upstreams(spec: Optional[str] = UPSTREAMS) -> List[Dict[str, object]]:
+    """
+    解析上游配置
+    :param spec: JSON数组，或包含JSON数组的文件路径；每项包含base_url、api_key或api_key_env，可选weight和name
+    :return: 上游配置列表
+    """
+    if not spec:
+        return []
+    text = spec.strip()
+    if not text.startswith('['):
+        with open(text, 'r', encoding='utf-8') as f:
+            text = f.read()
+    upstreams = json.loads(text)
+    if not isinstance(upstreams, list) or not upstreams:
+        raise ValueError("上游配置必须是非空的JSON数组")
+    return upstreams
+
+
+def affinity_key(messages) -> Optional[str]:
+    """
+    会话粘性键：对话开头到第一条用户消息为止的前缀，同一对话后续请求的该前缀不变
+    :return: 前缀的哈希，消息为空时返回None
+    """
+    prefix = []
+    for message in messages or []:
+        prefix.append((message.get('role'), message.get('content')))
+        if message.get('role') == 'user':
+            break
+    if not prefix:
+        return None
+    return hashlib.sha1(json.dumps(prefix, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def upstream_fault(error: BaseException):
+    """
+    判断异常是否由上游故障引起
+    :return: (是否为上游故障, 上游建议的重试等待秒数)
+    """
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        if isinstance(error, CircuitOpenError):
+            return True, error.retry_after
+        if isinstance(error, (requests.exceptions.ConnectionError, requests.exceptions.Timeout)):
+            return True, None
+        if isinstance(error, requests.exceptions.HTTPError):
+            response = getattr(error, 'response', None)
+            status_code = getattr(response, 'status_code', None)
+            if status_code in FAULT_STATUS:
+                retry_after = response.headers.get('Retry-After') if response is not None else None
+                return True, float(retry_after) if retry_after and retry_after.isdigit() else None
+            return False, None
+        # DeepSeekAPI把requests异常包装为通用异常，原始异常保存在__cause__/__context__中
+        error = error.__cause__ or error.__context__
+    return False, None
+
+
+class Upstream:
+    """上游池中的一个上游"""
+
+    def __init__(self, name: str, api, weight: float = 1.0):
+        self.name = name
+        self.api = api
+        self.weight = weight
+        self.outstanding = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+        self.ejections = 0
+        # 平滑加权轮询的当前权重
+        self.current_weight = 0.0
+        self.metrics = Metrics()
+
+    def healthy(self, now: float) -> bool:
+        return self.ejected_until <= now
+
+    def snapshot(self, now: float) -> Dict[str, object]:
+        metrics = self.metrics.snapshot()
+        return {
+            "base_url": self.api.base_url,
+            "weight": self.weight,
+            "outstanding": self.outstanding,
+            "ejected_for": round(max(0.0, self.ejected_until - now), 1),
+            "ejections": self.ejections,
+            "requests": metrics["counters"].get("requests", 0),
+            "failures": metrics["counters"].get("failures", 0),
+            "failovers": metrics["counters"].get("failovers", 0),
+            "latency": metrics["latency"].get("request_seconds", {"count": 0}),
+        }
+
+
+class UpstreamPool:
+    """多上游负载均衡，可替代DeepSeekAPI传给ChatHandler、批处理和网关，其余属性透传给第一个上游"""
+
+    def __init__(self, upstreams: List[Dict[str, object]], policy: str = UPSTREAM_POLICY,
+                 eject_failures: int = UPSTREAM_EJECT_FAILURES, eject_base: float = UPSTREAM_EJECT_BASE,
+                 eject_max: float = UPSTREAM_EJECT_MAX, affinity_size: int = UPSTREAM_AFFINITY_SIZE, **api_options):
+        """
+        初始化上游池
+        :param upstreams: 上游配置列表，每项包含base_url、api_key或api_key_env，可选weight和name；
+                          也可以直接传入api（DeepSeekAPI实例）
+        :param policy: 选择策略 least_outstanding / weighted
+        :param eject_failures: 连续失败该次数后剔除上游
+        :param eject_base: 首次剔除时长(秒)，同一上游连续被剔除时加倍
+        :param eject_max: 剔除时长上限(秒)
+        :param affinity_size: 记录的会话-上游绑定数
+        :param api_options: 创建DeepSeekAPI时的其他参数（如pool_maxsize）
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"无效的负载均衡策略: {policy}，可选: {'/'.join(POLICIES)}")
+        if not upstreams:
+            raise ValueError("上游池至少需要一个上游")
+        self.policy = policy
+        self.eject_failures = eject_failures
+        self.eject_base = eject_base
+        self.eject_max = eject_max
+        self.affinity_size = affinity_size
+        self.upstreams: List[Upstream] = []
+        for index, config in enumerate(upstreams):
+            api = config.get('api')
+            if api is None:
+                api_key = config.get('api_key') or (os.getenv(config['api_key_env']) if config.get('api_key_env')
+                                                    else None)
+                if not api_key:
+                    raise ValueError(f"上游 {config.get('name') or index} 未设置API密钥（api_key或api_key_env）")
+                api = DeepSeekAPI(api_key, base_url=config.get('base_url'), **api_options)
+            self.upstreams.append(Upstream(config.get('name') or f"upstream-{index + 1}", api,
+                                           float(config.get('weight', 1.0))))
+        # 所有上游共用一个token计数器，同一条消息只估算一次
+        shared_tokens = getattr(self.upstreams[0].api, 'tokens', None)
+        for upstream in self.upstreams[1:]:
+            if getattr(upstream.api, 'tokens', None) is not None and shared_tokens is not None:
+                upstream.api.tokens = shared_tokens
+        self._affinity: "OrderedDict[str, Upstream]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, spec: Optional[str] = UPSTREAMS, **options) -> "UpstreamPool":
+        """按配置（DEEPSEEK_UPSTREAMS）创建上游池"""
+        return cls(load_upstreams(spec), **options)
+
+    def _pick(self, key: Optional[str], exclude) -> Upstream:
+        """选择上游：已绑定且健康的上游优先，否则按策略从健康的上游中选择并记录绑定"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = [upstream for upstream in self.upstreams if upstream not in exclude]
+            if not candidates:
+                raise RuntimeError("没有可用的上游")
+            healthy = [upstream for upstream in candidates if upstream.healthy(now)]
+            if not healthy:
+                # 全部被剔除时选择最早恢复的上游，而不是直接拒绝请求
+                chosen = min(candidates, key=lambda upstream: upstream.ejected_until)
+            elif key is not None and self._affinity.get(key) in healthy:
+                chosen = self._affinity[key]
+                self._affinity.move_to_end(key)
+            elif self.policy == 'weighted':
+                # 平滑加权轮询：权重高的上游被选中的次数成比例地多，且不会连续集中
+                total = sum(upstream.weight for upstream in healthy)
+                for upstream in healthy:
+                    upstream.current_weight += upstream.weight
+                chosen = max(healthy, key=lambda upstream: upstream.current_weight)
+                chosen.current_weight -= total
+            else:
+                chosen = min(healthy, key=lambda upstream: ((upstream.outstanding + 1) / upstream.weight,
+                                                            upstream.metrics.get("requests")))
+            if key is not None and healthy and self._affinity.get(key) is not chosen:
+                self._affinity[key] = chosen
+                self._affinity.move_to_end(key)
+                while len(self._affinity) > self.affinity_size:
+                    self._affinity.popitem(last=False)
+            chosen.outstanding += 1
+        chosen.metrics.incr("requests")
+        return chosen
+
+    def _release(self, upstream: Upstream, started: float, error: Optional[BaseException] = None,
+                 status_code: Optional[int] = None) -> bool:
+        """
+        请求结束，更新上游的健康状态和指标
+        :return: 是否为上游故障（调用方可切换到其他上游重试）
+        """
+        if error is not None:
+            fault, retry_after = upstream_fault(error)
+        else:
+            fault, retry_after = status_code in FAULT_STATUS, None
+        upstream.metrics.observe("request_seconds", time.perf_counter() - started)
+        with self._lock:
+            upstream.outstanding -= 1
+            if not fault:
+                # 请求成功（或失败原因与上游无关）说明上游已恢复
+                upstream.failures = 0
+                upstream.ejections = 0
+                upstream.ejected_until = 0.0
+                return False
+            upstream.failures += 1
+            if upstream.failures >= self.eject_failures or retry_after:
+                duration = min(self.eject_max, max(retry_after or 0.0, self.eject_base * 2 ** upstream.ejections))
+                upstream.ejected_until = time.monotonic() + duration
+                upstream.ejections += 1
+                upstream.failures = 0
+                upstream.metrics.incr("ejections")
+                logger.warning(f"上游 {upstream.name} 连续出错，暂时剔除{duration:.0f}秒")
+        upstream.metrics.incr("failures")
+        return True
+
+    def chat_completion(self, messages, **kwargs):
+        """与DeepSeekAPI.chat_completion相同，上游故障时切换到其他上游重试"""
+        key = affinity_key(messages)
+        tried = []
+        for attempt in range(len(self.upstreams)):
+            upstream = self._pick(key, tried)
+            started = time.perf_counter()
+            try:
+                response = upstream.api.chat_completion(messages, **kwargs)
+            except Exception as e:
+                if not self._release(upstream, started, error=e) or attempt == len(self.upstreams) - 1:
+                    raise
+                tried.append(upstream)
+                upstream.metrics.incr("failovers")
+                logger.info(f"上游 {upstream.name} 请求失败，切换上游重试: {str(e)}")
+                continue
+            self._release(upstream, started)
+            return response
+
+    def chat_completion_stream(self, messages, **kwargs) -> Iterator[dict]:
+        """与DeepSeekAPI.chat_completion_stream相同，尚未收到数据时上游故障会切换到其他上游重试"""
+        key = affinity_key(messages)
+        tried = []
+        for attempt in range(len(self.upstreams)):
+            upstream = self._pick(key, tried)
+            started = time.perf_counter()
+            received = False
+            try:
+                for chunk in upstream.api.chat_completion_stream(messages, **kwargs):
+                    received = True
+                    yield chunk
+            except GeneratorExit:
+                self._release(upstream, started)
+                raise
+            except Exception as e:
+                fault = self._release(upstream, started, error=e)
+                if not fault or received or attempt == len(self.upstreams) - 1:
+                    raise
+                tried.append(upstream)
+                upstream.metrics.incr("failovers")
+                logger.info(f"上游 {upstream.name} 流式请求失败，切换上游重试: {str(e)}")
+                continue
+            self._release(upstream, started)
+            return
+
+    def raw_request(self, endpoint, data=None, method="POST", stream=False, timeout=None):
+        """与DeepSeekAPI.raw_request相同（供网关使用），连接失败时切换上游；返回的5xx/429计入上游健康状态"""
+        key = affinity_key((data or {}).get('messages'))
+        tried = []
+        for attempt in range(len(self.upstreams)):
+            upstream = self._pick(key, tried)
+            started = time.perf_counter()
+            try:
+                response = upstream.api.raw_request(endpoint, data=data, method=method, stream=stream,
+                                                    timeout=timeout)
+            except Exception as e:
+                if not self._release(upstream, started, error=e) or attempt == len(self.upstreams) - 1:
+                    raise
+                tried.append(upstream)
+                upstream.metrics.incr("failovers")
+                logger.info(f"上游 {upstream.name} 请求失败，切换上游重试: {str(e)}")
+                continue
+            self._release(upstream, started, status_code=response.status_code)
+            return response
+
+    def start_warmup(self, *args, **kwargs):
+        """预热所有上游的连接，返回第一个上游的预热线程"""
+        threads = [upstream.api.start_warmup(*args, **kwargs) for upstream in self.upstreams]
+        return threads[0]
+
+    def circuit_stats(self):
+        """各上游熔断器的状态，名称前加上游名"""
+        return {f"{upstream.name}/{name}": stats for upstream in self.upstreams
+                for name, stats in upstream.api.circuit_stats().items()}
+
+    def compression_stats(self):
+        """汇总各上游的请求体压缩统计"""
+        stats = {}
+        for upstream in self.upstreams:
+            for name, value in upstream.api.compression_stats().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    stats[name] = stats.get(name, 0) + value
+                elif name == "origins":
+                    stats.setdefault(name, {}).update(value)
+                else:
+                    stats.setdefault(name, value)
+        return stats
+
+    def upstream_stats(self) -> Dict[str, Dict[str, object]]:
+        """各上游的负载、健康状态和指标"""
+        now = time.monotonic()
+        with self._lock:
+            return {upstream.name: upstream.snapshot(now) for upstream in self.upstreams}
+
+    def __getattr__(self, name):
+        # 在__init__完成前访问属性时避免无限递归
+        if name == 'upstreams':
+            raise AttributeError(name)
+        return getattr(self.upstreams[0].api, name)
+
+
+def create_api(api_key: Optional[str] = None, **options):
+    """
+    按配置创建API客户端：配置了DEEPSEEK_UPSTREAMS时返回上游池，否则返回单个DeepSeekAPI
+    :param api_key: 单上游时使用的API密钥，为None时按DeepSeekAPI.get_api_key获取
+    :param options: 传给DeepSeekAPI的参数；指定了base_url时始终使用单个上游
+    """
+    if UPSTREAMS and not options.get('base_url'):
+        options.pop('base_url', None)
+        return UpstreamPool.from_config(UPSTREAMS, **options)
+    return DeepSeekAPI(api_key or DeepSeekAPI.get_api_key(), **options)
@@ -9,9 +9,12 @@ try:
     # 尝试直接导入（包模式）
     from handler.chat_handler import ChatHandler
     from handler.command_handler import CommandHandler
+    from handler.session_handler import SessionManager
+    from handler.router_handler import ModelRouter
+    from handler.reasoning_handler import ReasoningDisplay
     from handler.color_handler import ColorHandler
-    from api.deepseek_api import DeepSeekAPI
-    from config.setting import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+    from api.upstream_pool import create_api
+    from config.setting import WARMUP_ENABLED
     from handler.debug_handler import DebugHandler
 except ImportError:
     # 开发模式下调整导入路径
@@ -22,9 +25,12 @@ except ImportError:
     # 重新导入
     from src.handler.chat_handler import ChatHandler
     from src.handler.command_handler import CommandHandler
+    from src.handler.session_handler import SessionManager
+    from src.handler.router_handler import ModelRouter
+    from src.handler.reasoning_handler import ReasoningDisplay
     from src.handler.color_handler import ColorHandler
-    from src.api.deepseek_api import DeepSeekAPI
-    from src.config.setting import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+    from src.api.upstream_pool import create_api
+    from src.config.setting import WARMUP_ENABLED
     from src.handler.debug_handler import DebugHandler
     
     # 确保后续导入也能找到handler模块
@@ -42,33 +48,102 @@ DEEPSEEK_CLIENT_ART = r"""
 """
 # --- End ASCII Art ---
 class DeepSeekCLI:
-    def __init__(self):
-        """初始化DeepSeek CLI客户端"""
-        self.dialog_handler = ChatHandler()
-        self.command_handler = CommandHandler(chat_handler=self.dialog_handler)
+    def __init__(self, tee: str = None, tee_format: str = None, model: str = None, temperature: float = None):
+        """
+        初始化DeepSeek CLI客户端
+        :param tee: 对话记录输出文件（--tee），为None时不输出
+        :param tee_format: 对话记录格式 markdown / text
+        :param model: 会话使用的模型（--model），为None时使用配置中的DEFAULT_MODEL
+        :param temperature: 生成温度（--temperature），为None时使用配置中的DEFAULT_TEMPERATURE
+        """
+        # 所有会话共享同一个API客户端（连接池、预热连接和熔断状态），配置了多个上游时为上游池
+        api = create_api()
+        # 自动模型路由的延迟统计同样在会话间共享
+        router = ModelRouter()
+
+        def new_handler() -> ChatHandler:
+            # 启动参数指定的模型和温度作用于所有会话（包括 /session new 新建的）
+            handler = ChatHandler(api=api, router=router)
+            if model:
+                handler.model = model
+            if temperature is not None:
+                handler.temperature = temperature
+            return handler
+
+        self.sessions = SessionManager(new_handler, new_handler())
+        self.command_handler = CommandHandler(chat_handler=self.dialog_handler, session_manager=self.sessions)
+        if tee:
+            # 对话记录由会话管理器持有，之后 /session new 新建的会话也写入同一个文件
+            self.sessions.start_tee(tee, tee_format)
+        self._warmup_reported = False
+        self._first_request_reported = False
+
+    @property
+    def dialog_handler(self) -> ChatHandler:
+        """当前会话的对话处理器"""
+        return self.sessions.current.chat_handler
+
+    def _report_finished_sessions(self):
+        """在提示输入前展示后台完成的回复：当前会话直接显示，其他会话只提示"""
+        for name in self.sessions.drain_finished():
+            session = self.sessions.get(name)
+            if session is self.sessions.current:
+                self.command_handler.show_session_results(session, self.sessions.take_completed(session))
+            elif session.completed:
+                print(ColorHandler.system_text(f"[会话 {name} 已完成回复，使用 /session switch {name} 查看]"))
+
+    def _report_warmup(self):
+        """报告后台连接预热结果（只报告一次）"""
+        api = self.dialog_handler.api
+        if not self._warmup_reported and api.warmup_result is not None:
+            self._warmup_reported = True
+            result = api.warmup_result
+            DebugHandler.debug(f"连接预热完成: {result}")
+            if result["auth_ok"] is False:
+                print(ColorHandler.error_text("API密钥校验失败，请检查环境变量DEEPSEEK_API_KEY"))
+        if not self._first_request_reported and api.first_request_warm is not None:
+            self._first_request_reported = True
+            DebugHandler.debug(f"首个请求{'命中' if api.first_request_warm else '未命中'}预热连接")
     
     def run(self):
+        # 在渲染欢迎界面和等待用户输入的同时，后台预热DNS/TCP/TLS连接
+        if WARMUP_ENABLED:
+            self.dialog_handler.api.start_warmup()
         console = Console()
         console.clear()
         console.print(DEEPSEEK_CLIENT_ART)
-        console.print(f"[bold green]DeepSeek Client 初始化完成，模型: {DEFAULT_MODEL}[/bold green]")
+        console.print(f"[bold green]DeepSeek Client 初始化完成，模型: {self.dialog_handler.model}[/bold green]")
         """运行CLI交互循环"""
-        DebugHandler.debug(f"DeepSeekCLI 初始化完成，模型: {DEFAULT_MODEL}, 温度: {DEFAULT_TEMPERATURE}")
+        DebugHandler.debug(f"DeepSeekCLI 初始化完成，模型: {self.dialog_handler.model}, "
+                           f"温度: {self.dialog_handler.temperature}")
         help_text = f"""
 可用命令:
   [cyan]/help[/cyan]   - 显示详细帮助信息
   [cyan]/quit[/cyan]   - 退出交互
   [cyan]/stream[/cyan] - 切换流式输出模式（默认开启）
   [cyan]/multi[/cyan]  - 进入多行输入模式（使用/eof结束输入）
-  [cyan]/model[/cyan]  - 切换AI模型（DeepSeek Chat/Reasoner）
+  [cyan]/model[/cyan]  - 切换AI模型（DeepSeek Chat/Reasoner/auto自动选择，@reasoner 前缀仅本轮生效）
   [cyan]/reset[/cyan]  - 重置对话历史
   [cyan]/stop[/cyan]   - 中断当前输出（也可使用Ctrl+S快捷键）
   [cyan]/debug[/cyan]  - 切换调试模式
+  [cyan]/save[/cyan]   - 保存当前会话（/save <ID> 另存为）
+  [cyan]/load[/cyan]   - 加载已保存的会话（/load <ID>）
+  [cyan]/sessions[/cyan] - 列出已保存的会话
+  [cyan]/search[/cyan] - 全文检索历史对话（/search <关键词>）
+  [cyan]/open[/cyan]   - 打开检索结果对应的会话（/open <序号>）
+  [cyan]/compare[/cyan] - 多模型并排对比（/compare <提示>）
+  [cyan]/reasoning[/cyan] - 查看最近一次回复的推理过程（/reasoning full|hidden|tail|collapse 设置显示模式）
+  [cyan]/attach[/cyan] - 附加文件随下一条消息发送（/attach <路径>，/detach 清空）
+  [cyan]/stats[/cyan]  - 查看传输协议、预热结果和上游熔断状态
+  [cyan]/tee[/cyan]    - 把对话记录追加写入文件（/tee <路径>，/tee off 停止）
+  [cyan]/session[/cyan] - 多会话（new/switch/list，/session bg <提示> 后台生成）
 """
         console.print(Panel(help_text, title="帮助信息", border_style="blue", expand=False))
         
         while True:
             try:
+                self._report_warmup()
+                self._report_finished_sessions()
                 # 处理多行输入模式
                 if self.dialog_handler.multi_mode:
                     lines = []
@@ -86,7 +161,9 @@ class DeepSeekCLI:
                     print(ColorHandler.system_text(f"已收到{len(lines)}行输入"))
                     self.dialog_handler.multi_mode = False  # 自动退出多行模式
                 else:
-                    prompt = f'[{self.dialog_handler.model}][{"流式" if self.command_handler.stream_mode else "非流式"}] > '
+                    session = self.sessions.current
+                    session_tag = f'[{session.name}]' if len(self.sessions.sessions) > 1 else ''
+                    prompt = f'{session_tag}[{self.dialog_handler.model}][{"流式" if self.command_handler.stream_mode else "非流式"}] > '
                     user_input = input(prompt)
                 
                 DebugHandler.debug(f"用户输入: {user_input}")
@@ -96,6 +173,10 @@ class DeepSeekCLI:
                     self.dialog_handler.handle_multi()
                     continue
                     
+                if self.sessions.current.busy and not self.command_handler.is_allowed_while_busy(user_input):
+                    print(ColorHandler.system_text("当前会话正在后台生成回复，请稍候，或使用 /session 切换到其他会话"))
+                    continue
+                
                 # 处理命令，如果返回False则退出，如果返回None则表示命令已处理但继续对话
                 command_result = self.command_handler.handle_command(user_input)
                 if command_result is False:
@@ -110,15 +191,17 @@ class DeepSeekCLI:
                 self.dialog_handler.add_user_message(user_input)
                 
                 DebugHandler.debug(f"获取助手回复 (流式模式: {self.command_handler.stream_mode})")
+                message_count = len(self.dialog_handler.messages)
                 assistant_reply = self.dialog_handler.get_assistant_reply(stream=self.command_handler.stream_mode)
                 
                 if not self.command_handler.stream_mode:
-                    if '最终回复：' in assistant_reply:
-                        reasoning, answer = assistant_reply.split('最终回复：', 1)
-                        console.print("推理过程:")
-                        console.print(Markdown(ColorHandler.reasoning_text(reasoning)))
+                    # 请求失败时本轮没有追加助手回复，不能显示上一轮的推理过程
+                    replied = len(self.dialog_handler.messages) > message_count
+                    reasoning = self.dialog_handler.get_reasoning() if replied else ''
+                    if reasoning:
+                        ReasoningDisplay(console=console).show(reasoning)
                         console.print("最终回复:")
-                        console.print(Markdown(ColorHandler.assistant_text(answer)))
+                        console.print(Markdown(ColorHandler.assistant_text(assistant_reply)))
                     else:
                         console.print("助手:")
                         console.print(Markdown(ColorHandler.assistant_text(assistant_reply)))
@@ -127,9 +210,15 @@ class DeepSeekCLI:
             except KeyboardInterrupt:
                 console.print("\n[yellow]Session interrupted. Exiting.[/yellow]")
                 break
-def main():
-    cli = DeepSeekCLI()
-    cli.run()
+        # 退出前将所有会话的日志落盘
+        self.sessions.close()
+def main(argv=None):
+    # 参数解析与分派统一由轻量入口模块处理
+    try:
+        from cli.main import main as entry_main
+    except ImportError:
+        from src.cli.main import main as entry_main
+    entry_main(argv)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,150 @@
+"""
+命令行入口模块，负责解析参数并分派到交互模式、管道模式或子命令
+
+各模式所需的模块在分派后才导入，管道模式因此不会加载rich、readline等交互依赖
+"""
+import sys
+import argparse
+from pathlib import Path
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from config.setting import (DEFAULT_MODEL, DEFAULT_TEMPERATURE, UPSTREAM_BASE_URL,
+                                GATEWAY_HOST, GATEWAY_PORT, GATEWAY_POOL_SIZE, JOURNAL_DIR,
+                                EXPORT_FORMAT, EXPORT_ROW_GROUP_ROWS)
+except ImportError:
+    # 开发模式导入
+    current_file = Path(__file__).resolve()
+    project_root = current_file.parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+    from src.config.setting import (DEFAULT_MODEL, DEFAULT_TEMPERATURE, UPSTREAM_BASE_URL,
+                                    GATEWAY_HOST, GATEWAY_PORT, GATEWAY_POOL_SIZE, JOURNAL_DIR,
+                                    EXPORT_FORMAT, EXPORT_ROW_GROUP_ROWS)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建命令行参数解析器"""
+    parser = argparse.ArgumentParser(prog="dscli", description="DeepSeek命令行客户端，不带参数时进入交互模式")
+    parser.add_argument("-p", "--print", dest="print_prompt", nargs="?", const="", default=None, metavar="PROMPT",
+                        help="单次管道模式：从参数或标准输入读取提示，回复原样输出到标准输出后退出")
+    parser.add_argument("--model", default=DEFAULT_MODEL, help=f"使用的模型（默认{DEFAULT_MODEL}）")
+    parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE, help="生成温度")
+    parser.add_argument("--reasoning", action="store_true", help="管道模式下将推理过程输出到标准错误")
+    parser.add_argument("--json", dest="json_depth", nargs="?", type=int, const=1, default=None, metavar="DEPTH",
+                        help="管道模式下请求JSON对象输出，生成过程中每完成一个深度为DEPTH（默认1）的字段或数组元素"
+                             "就输出一行 {\"path\": [...], \"value\": ...}；提示中需要包含\"json\"字样")
+    parser.add_argument("--tee", metavar="PATH", help="交互模式下把对话记录（不含终端颜色）追加写入文件，同 /tee")
+    parser.add_argument("--tee-format", choices=["markdown", "text"], default=None, help="对话记录格式（默认markdown）")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch_parser = subparsers.add_parser("batch", help="非交互批处理JSONL提示文件")
+    batch_parser.add_argument("input", help="输入JSONL文件，每行包含id以及prompt或messages")
+    batch_parser.add_argument("-o", "--output", required=True, help="输出JSONL文件，结果按完成顺序追加写入")
+    batch_parser.add_argument("--concurrency", type=int, default=4, help="并发请求数（默认4）")
+    batch_parser.add_argument("--model", default=DEFAULT_MODEL, help=f"默认模型（默认{DEFAULT_MODEL}）")
+    batch_parser.add_argument("--temperature", type=float, default=DEFAULT_TEMPERATURE, help="默认生成温度")
+    batch_parser.add_argument("--checkpoint", help="检查点文件路径（默认为输出文件加.ckpt后缀）")
+
+    serve_parser = subparsers.add_parser("serve", help="启动本地OpenAI兼容网关，多个进程共享上游连接")
+    serve_parser.add_argument("--host", default=GATEWAY_HOST, help=f"监听地址（默认{GATEWAY_HOST}）")
+    serve_parser.add_argument("--port", type=int, default=GATEWAY_PORT, help=f"监听端口（默认{GATEWAY_PORT}）")
+    serve_parser.add_argument("--upstream", default=None,
+                              help=f"上游API地址（默认{UPSTREAM_BASE_URL}，配置了DEEPSEEK_UPSTREAMS时默认使用上游池）")
+    serve_parser.add_argument("--pool-size", type=int, default=GATEWAY_POOL_SIZE, help="上游连接池大小")
+
+    export_parser = subparsers.add_parser("export", help="把会话日志按轮增量导出为Parquet/Arrow列式文件")
+    export_parser.add_argument("output", help="输出目录，每次导出追加一个分片文件，可用DuckDB/pandas直接查询")
+    export_parser.add_argument("--format", choices=["parquet", "arrow"], default=EXPORT_FORMAT,
+                               help=f"文件格式（默认{EXPORT_FORMAT}）")
+    export_parser.add_argument("--session", action="append", dest="sessions", metavar="ID",
+                               help="只导出指定会话，可重复使用（默认全部会话）")
+    export_parser.add_argument("--reasoning", action="store_true", help="同时导出推理过程全文（默认只导出长度）")
+    export_parser.add_argument("--row-group-rows", type=int, default=EXPORT_ROW_GROUP_ROWS,
+                               help=f"每个行组的最大行数（默认{EXPORT_ROW_GROUP_ROWS}）")
+    export_parser.add_argument("--journal-dir", default=JOURNAL_DIR, help=f"会话日志目录（默认{JOURNAL_DIR}）")
+    return parser
+
+
+def run_batch(args) -> int:
+    """执行batch子命令"""
+    try:
+        from api.upstream_pool import create_api
+        from handler.batch_handler import BatchHandler
+    except ImportError:
+        from src.api.upstream_pool import create_api
+        from src.handler.batch_handler import BatchHandler
+    api = create_api(pool_maxsize=args.concurrency)
+    handler = BatchHandler(api, args.input, args.output, concurrency=args.concurrency,
+                           model=args.model, temperature=args.temperature, checkpoint_path=args.checkpoint)
+    stats = handler.run()
+    return 1 if stats["failed"] else 0
+
+
+def run_serve(args) -> int:
+    """执行serve子命令"""
+    try:
+        from api.upstream_pool import create_api
+        from api.gateway import serve
+        from config.setting import UPSTREAMS
+    except ImportError:
+        from src.api.upstream_pool import create_api
+        from src.api.gateway import serve
+        from src.config.setting import UPSTREAMS
+    # 不使用BASE_URL作为默认上游，避免DEEPSEEK_BASE_URL指向网关自身时形成回环
+    base_url = args.upstream or (None if UPSTREAMS else UPSTREAM_BASE_URL)
+    api = create_api(pool_maxsize=args.pool_size, base_url=base_url)
+    serve(api, args.host, args.port)
+    return 0
+
+
+def run_export(args) -> int:
+    """执行export子命令"""
+    try:
+        from handler.journal_handler import JournalHandler
+        from handler.export_handler import ExportHandler
+    except ImportError:
+        from src.handler.journal_handler import JournalHandler
+        from src.handler.export_handler import ExportHandler
+    journal = JournalHandler(journal_dir=args.journal_dir)
+    try:
+        exporter = ExportHandler(args.output, fmt=args.format, row_group_rows=args.row_group_rows,
+                                 include_reasoning=args.reasoning)
+        with exporter:
+            exporter.export_journal(journal, args.sessions)
+    except (RuntimeError, ValueError, OSError) as e:
+        print(f"导出失败: {e}", file=sys.stderr)
+        return 1
+    stats = exporter.stats
+    if not stats["turns"]:
+        print("没有新的对话需要导出")
+    else:
+        print(f"已导出{stats['turns']}轮对话（{stats['sessions']}个会话，{stats['row_groups']}个行组）"
+              f"到 {args.output}/{exporter.part_name}")
+    return 0
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.print_prompt is not None:
+        try:
+            from cli.print_mode import run_print
+        except ImportError:
+            from src.cli.print_mode import run_print
+        sys.exit(run_print(args))
+    if args.command == "batch":
+        sys.exit(run_batch(args))
+    if args.command == "serve":
+        sys.exit(run_serve(args))
+    if args.command == "export":
+        sys.exit(run_export(args))
+    try:
+        from cli.deepseek_client import DeepSeekCLI
+    except ImportError:
+        from src.cli.deepseek_client import DeepSeekCLI
+    cli = DeepSeekCLI(tee=args.tee, tee_format=args.tee_format, model=args.model, temperature=args.temperature)
+    cli.run()
+
+
+if __name__ == "__main__":
+    main()
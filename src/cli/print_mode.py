@@ -0,0 +1,151 @@
+"""
+单次管道模式，用于在shell脚本中调用
+
+不使用rich、readline和InputHandler：提示从参数或标准输入读取，回复内容原样流式写到标准输出，
+推理过程可选写到标准错误，并以退出码区分错误类型。
+"""
+import os
+import sys
+import json
+import logging
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from api.upstream_pool import create_api
+    from api.json_stream import iter_json_events
+    from handler.error_handler import ErrorHandler
+    from config.setting import UPSTREAMS
+except ImportError:
+    # 开发模式导入
+    from pathlib import Path
+    current_file = Path(__file__).resolve()
+    project_root = current_file.parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+    from src.api.upstream_pool import create_api
+    from src.api.json_stream import iter_json_events
+    from src.handler.error_handler import ErrorHandler
+    from src.config.setting import UPSTREAMS
+
+# 退出码
+EXIT_OK = 0
+EXIT_API_ERROR = 1        # 其他API或网络错误
+EXIT_USAGE = 2            # 参数错误或提示为空（与argparse一致）
+EXIT_AUTH = 3             # 未设置API密钥或密钥无效
+EXIT_BAD_REQUEST = 4      # 请求参数无效（如模型名称错误）
+EXIT_UNAVAILABLE = 5      # 连接失败或超时
+EXIT_INTERRUPTED = 130    # 被Ctrl+C中断
+
+ERROR_EXIT_CODES = {
+    'auth_error': EXIT_AUTH,
+    'bad_request': EXIT_BAD_REQUEST,
+    'context_limit': EXIT_BAD_REQUEST,
+    'connection_error': EXIT_UNAVAILABLE,
+    'timeout_error': EXIT_UNAVAILABLE,
+    'circuit_open': EXIT_UNAVAILABLE,
+}
+
+
+def read_prompt(prompt: str) -> str:
+    """
+    组合命令行提示和标准输入内容
+    :param prompt: -p参数给出的提示，可为空
+    :return: 最终提示；两者都有时标准输入内容附加在提示之后
+    """
+    piped = '' if sys.stdin.isatty() else sys.stdin.read()
+    if prompt and piped:
+        return f"{prompt}\n\n{piped}"
+    return prompt or piped
+
+
+def _reasoning_to_stderr(chunks, enabled: bool):
+    """透传数据块，按需把推理过程写到标准错误"""
+    for chunk in chunks:
+        reasoning = chunk['choices'][0]['delta'].get('reasoning_content')
+        if reasoning and enabled:
+            sys.stderr.write(reasoning)
+            sys.stderr.flush()
+        yield chunk
+
+
+def write_json_events(chunks, depth: int, out) -> None:
+    """
+    结构化输出模式：回复仍在生成时，每完成一个深度为depth的字段或数组元素就输出一行JSON
+    :param chunks: 流式数据块
+    :param depth: 输出的路径深度，0表示只在结束时输出完整的根值
+    :param out: 输出流
+    """
+    for event in iter_json_events(chunks, max_depth=depth):
+        if len(event.path) == depth:
+            out.write(json.dumps({"path": list(event.path), "value": event.value}, ensure_ascii=False) + '\n')
+            out.flush()
+
+
+def run_print(args) -> int:
+    """
+    执行管道模式
+    :param args: 命令行参数，使用print_prompt/model/temperature/reasoning/json_depth
+    :return: 进程退出码
+    """
+    prompt = read_prompt(args.print_prompt)
+    if not prompt.strip():
+        sys.stderr.write("错误: 提示为空，请通过 -p \"提示\" 或标准输入提供\n")
+        return EXIT_USAGE
+    # 标准输入已被用作提示，不能再交互式询问API密钥
+    # 配置了多个上游时各上游的密钥在上游配置中指定
+    api_key = os.getenv('DEEPSEEK_API_KEY')
+    if not api_key and not UPSTREAMS:
+        sys.stderr.write("错误: 未设置环境变量DEEPSEEK_API_KEY\n")
+        return EXIT_AUTH
+
+    # 错误已通过退出码和简短信息报告，不再输出库内部的详细日志
+    logging.getLogger().addHandler(logging.NullHandler())
+    try:
+        api = create_api(api_key)
+    except ValueError as e:
+        sys.stderr.write(f"错误: {str(e)}\n")
+        return EXIT_AUTH
+    out = sys.stdout
+    wrote_content = False
+    last_char = ''
+    json_depth = getattr(args, 'json_depth', None)
+    try:
+        if json_depth is not None:
+            chunks = api.chat_completion_stream(
+                messages=[{"role": "user", "content": prompt}],
+                model=args.model,
+                temperature=args.temperature,
+                response_format={"type": "json_object"}
+            )
+            write_json_events(_reasoning_to_stderr(chunks, args.reasoning), json_depth, out)
+            return EXIT_OK
+        for chunk in api.chat_completion_stream(
+            messages=[{"role": "user", "content": prompt}],
+            model=args.model,
+            temperature=args.temperature
+        ):
+            delta = chunk['choices'][0]['delta']
+            reasoning = delta.get('reasoning_content')
+            content = delta.get('content')
+            if reasoning and args.reasoning:
+                sys.stderr.write(reasoning)
+                sys.stderr.flush()
+            if content:
+                out.write(content)
+                out.flush()
+                wrote_content = True
+                last_char = content[-1]
+        if wrote_content and last_char != '\n' and out.isatty():
+            out.write('\n')
+        return EXIT_OK
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # 下游提前关闭管道（如 | head），避免解释器退出时再次报错
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        return EXIT_OK
+    except Exception as e:
+        error_handler = ErrorHandler()
+        error_type = error_handler.classify_error(e.__cause__ or e.__context__ or e)
+        sys.stderr.write(f"错误: {error_handler.format_error_message(error_type, e)}\n")
+        return ERROR_EXIT_CODES.get(error_type, EXIT_API_ERROR)
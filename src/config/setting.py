@@ -1,9 +1,28 @@
 """
 DeepSeek API配置模块
 """
+import os
 
 # API基础配置
-BASE_URL = "https://api.deepseek.com/v1"
+UPSTREAM_BASE_URL = "https://api.deepseek.com/v1"
+# 可通过环境变量指向本地网关（dscli serve），使多个进程共享上游连接
+BASE_URL = os.getenv("DEEPSEEK_BASE_URL", UPSTREAM_BASE_URL)
+# HTTP传输方式: auto(已安装httpx[http2]时使用HTTP/2，否则HTTP/1.1) / http2 / http1
+HTTP_TRANSPORT = os.getenv("DEEPSEEK_HTTP_TRANSPORT", "auto")
+# 请求体压缩: off / auto(已安装zstandard时使用zstd，否则gzip) / gzip / zstd，按端点探测是否接受，不接受时自动停用
+REQUEST_COMPRESSION = os.getenv("DEEPSEEK_REQUEST_COMPRESSION", "off")
+REQUEST_COMPRESSION_MIN_BYTES = 16 * 1024  # 请求体小于该字节数时不压缩
+REQUEST_COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+
+# 多上游负载均衡配置（多个账号/端点），未配置时只使用BASE_URL和DEEPSEEK_API_KEY
+# JSON数组或包含JSON数组的文件路径，每项包含base_url、api_key或api_key_env（从该环境变量读取密钥），可选weight和name，例如
+# [{"base_url": "https://api.deepseek.com/v1", "api_key_env": "DEEPSEEK_API_KEY"}, {"base_url": "...", "api_key_env": "KEY_2", "weight": 2}]
+UPSTREAMS = os.getenv("DEEPSEEK_UPSTREAMS")
+UPSTREAM_POLICY = os.getenv("DEEPSEEK_UPSTREAM_POLICY", "least_outstanding")  # least_outstanding / weighted
+UPSTREAM_EJECT_FAILURES = 2     # 连续出现该次数的上游故障（连接失败、超时、5xx、429）后暂时剔除该上游
+UPSTREAM_EJECT_BASE = 10.0      # 首次剔除时长(秒)，恢复后再次被剔除时加倍
+UPSTREAM_EJECT_MAX = 300.0      # 剔除时长上限(秒)
+UPSTREAM_AFFINITY_SIZE = 4096   # 记录的对话-上游绑定数（同一对话固定发往同一上游以命中前缀缓存）
 
 # 可用模型
 AVAILABLE_MODELS = {
@@ -12,4 +31,106 @@ AVAILABLE_MODELS = {
 }
 
 DEFAULT_MODEL = "deepseek-chat"
-DEFAULT_TEMPERATURE = 0.7
\ No newline at end of file
+DEFAULT_TEMPERATURE = 0.7
+
+# 连接预热配置
+WARMUP_ENABLED = True   # 启动REPL时是否在后台预热连接
+WARMUP_PROBE = True     # 预热时是否发送轻量鉴权探测请求（同时提前校验API密钥）
+WARMUP_TIMEOUT = 5.0    # 预热请求超时时间(秒)
+
+# 熔断配置（按端点/模型统计，上游故障期间快速失败，不再经历完整的连接和重试等待）
+CIRCUIT_ENABLED = True
+CIRCUIT_FAILURE_RATE = 0.5      # 滚动窗口内失败率达到该值时熔断
+CIRCUIT_MIN_REQUESTS = 5        # 窗口内请求数达到该值后才判断失败率
+CIRCUIT_WINDOW = 60.0           # 滚动统计窗口(秒)
+CIRCUIT_COOLDOWN = 30.0         # 熔断后多久放行探测请求(秒)
+CIRCUIT_HALF_OPEN_PROBES = 1    # 半开状态下同时放行的探测请求数
+
+# token估算与请求预检配置
+# 模型的tokenizer.json路径，安装tokenizers后按实际分词计数，未配置时按字符数近似估算
+TOKENIZER_FILE = os.getenv("DEEPSEEK_TOKENIZER_FILE")
+TOKEN_CACHE_SIZE = 8192         # 按内容缓存的单条消息计数条数
+PREFLIGHT_CHECK = True          # 发送前估算请求大小，超出模型上下文上限时直接报错而不发送
+MODEL_CONTEXT_LIMITS = {"deepseek-chat": 131072, "deepseek-reasoner": 131072}  # 各模型的上下文长度(tokens)
+DEFAULT_CONTEXT_LIMIT = 65536   # 未知模型的上下文长度
+CONTEXT_OUTPUT_RESERVE = 4096   # 预检时为回复预留的token数
+# 每分钟token预算（请求前按估算值扣减，收到用量后按实际值补扣），0表示不限制
+API_TOKENS_PER_MINUTE = int(os.getenv("DEEPSEEK_TOKENS_PER_MINUTE", "0"))
+
+# 会话日志配置
+JOURNAL_ENABLED = True  # 是否将每轮对话追加写入磁盘日志
+JOURNAL_DIR = os.getenv("DEEPSEEK_SESSION_DIR", os.path.expanduser("~/.deepseek_client/sessions"))
+JOURNAL_FSYNC = "turn"  # fsync策略: always(每条消息) / turn(每轮回复后) / interval(按时间间隔) / never
+JOURNAL_FSYNC_INTERVAL = 1.0  # interval策略下的fsync最小间隔(秒)
+
+# 对话记录输出配置（/tee、--tee），由后台线程批量写入，不阻塞流式输出
+TEE_FORMAT = "markdown"         # markdown / text，均不含ANSI控制字符
+TEE_QUEUE_SIZE = 8192           # 待写入队列的最大条目数（流式回复每个数据块一条）
+TEE_OVERFLOW = "drop"           # 队列已满时: drop(丢弃数据块并在记录中注明数量) / block(等待写入线程)
+TEE_BATCH_BYTES = 64 * 1024     # 缓冲达到该字节数时写入文件
+TEE_FLUSH_INTERVAL = 0.5        # 数据在缓冲中的最长停留时间(秒)
+TEE_FSYNC = "turn"              # fsync策略: always / turn / interval / never
+TEE_FSYNC_INTERVAL = 1.0        # interval策略下的fsync最小间隔(秒)
+
+# 推理过程配置（推理过程与正式回复分开保存，只有正式回复会作为上下文发送给API）
+REASONING_IN_MEMORY = True  # 为False时推理过程只写入会话日志，需要时从磁盘读取
+# 流式回复时推理过程的终端显示模式: full(全部输出) / hidden(只显示进度) / tail(滚动显示最后几行) / collapse(结束后折叠)
+REASONING_DISPLAY = os.getenv("DEEPSEEK_REASONING_DISPLAY", "full")
+REASONING_TAIL_LINES = 8            # tail/collapse模式下窗口显示的行数
+REASONING_REFRESH_PER_SECOND = 8    # 非full模式下窗口的重绘频率，决定终端写入量的上限
+
+# 对话历史内存配置（较早的消息溢出到磁盘段文件，按需加载）
+CONVERSATION_HOT_BYTES = 1 << 20   # 内存中保留的最近消息的字节预算
+CONVERSATION_SPILL_DIR = os.getenv("DEEPSEEK_SPILL_DIR")  # 段文件目录，默认使用系统临时目录
+
+# 自动模型路由配置（/model auto）
+AUTO_MODEL = "auto"
+ROUTER_FAST_MODEL = "deepseek-chat"
+ROUTER_REASONING_MODEL = "deepseek-reasoner"
+ROUTER_THRESHOLD = 2.0          # 提示特征得分达到该值（再加上延迟惩罚）时使用推理模型
+ROUTER_LATENCY_WEIGHT = 0.03    # 推理模型比快速模型每多1秒预期耗时，阈值提高的分数
+ROUTER_STATS_WINDOW = 20        # 每个模型保留的最近请求耗时样本数
+ROUTER_PRIOR_LATENCY = {"deepseek-chat": 4.0, "deepseek-reasoner": 30.0}  # 尚无样本时的预期耗时(秒)
+# 单轮覆盖：消息以这些前缀开头时本轮使用指定模型（前缀不会发送给模型）
+ROUTER_OVERRIDES = {"@chat": "deepseek-chat", "@reasoner": "deepseek-reasoner", "@auto": AUTO_MODEL}
+
+# 多会话配置（/session）
+SESSION_MAX_WORKERS = 4  # 同时在后台生成回复的会话数上限，超出的排队等待
+
+# 导出配置（dscli export）
+EXPORT_FORMAT = "parquet"           # parquet / arrow（Arrow IPC文件）
+EXPORT_ROW_GROUP_ROWS = 65536       # 每个行组（Arrow记录批次）的最大行数
+EXPORT_ROW_GROUP_BYTES = 32 << 20   # 每个行组中文本内容的字节预算，与行数先到先写出，决定导出时的内存上限
+EXPORT_COMPRESSION = "zstd"         # Parquet列压缩算法
+
+# 全文检索配置
+SEARCH_ENABLED = True   # 是否在每轮对话完成后更新本地全文索引
+SEARCH_INDEX_PATH = os.getenv("DEEPSEEK_SEARCH_INDEX", os.path.expanduser("~/.deepseek_client/search.db"))
+SEARCH_TOKENIZER = "trigram"  # FTS5分词器，trigram支持中文子串检索；旧版SQLite会自动回退到unicode61
+SEARCH_RESULT_LIMIT = 10
+
+# 本地网关配置（dscli serve）
+GATEWAY_HOST = "127.0.0.1"
+GATEWAY_PORT = 8787
+GATEWAY_TOKEN = os.getenv("DEEPSEEK_GATEWAY_TOKEN")  # 设置后客户端必须携带 Authorization: Bearer <token>
+GATEWAY_POOL_SIZE = 64      # 上游连接池大小
+GATEWAY_MAX_RETRIES = 3     # 上游连接失败、429和5xx时的重试次数（仅在尚未向客户端发送数据时重试）
+GATEWAY_CACHE_SIZE = 512    # 非流式响应缓存条数，0表示关闭缓存
+GATEWAY_CACHE_TTL = 600     # 缓存有效期(秒)
+GATEWAY_CACHE_ALL = False   # 默认只缓存temperature为0的请求，开启后缓存所有非流式请求
+GATEWAY_RATE_LIMIT = 0      # 全局上游请求速率上限(次/秒)，0表示不限制
+
+# 单飞合并配置（相同的并发流式请求只发起一次上游调用）
+SINGLE_FLIGHT_BUFFER = 256       # 每个订阅者的缓冲区大小（数据块数）
+SINGLE_FLIGHT_PUT_TIMEOUT = 1.0  # 订阅者缓冲区满时每个数据块的最长等待时间(秒，写满的订阅者共用)，超时后改为从回放记录追赶
+
+# 工具调用配置
+TOOL_TIMEOUT = 30.0     # 单个工具的默认执行超时(秒)
+TOOL_MAX_WORKERS = 8    # 并发执行工具的线程数
+TOOL_MAX_ROUNDS = 8     # 单轮对话中连续工具调用的最大轮数，超过后不再向模型提供工具
+
+# 附件配置（/attach）
+ATTACH_CHUNK_CHARS = 8000      # 单个附件分块的最大字符数，分块尽量在行边界切分
+ATTACH_BUDGET_CHARS = 64000    # 单条消息中附件内容的字符预算，超出部分可按块序号继续附加
+ATTACH_CACHE_SIZE = 16         # 按内容哈希缓存的已解码附件数量
+ATTACH_READ_BLOCK = 1 << 20    # 解码时每次从内存映射中读取的字节数
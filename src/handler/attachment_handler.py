@@ -0,0 +1,179 @@
+"""
+附件处理模块，通过内存映射读取大文件，检测编码并按字符预算分块
+
+附件按内容哈希去重：同一内容只读取、解码和估算一次token，重复附加未修改的文件时连哈希都不必重新计算。
+"""
+import os
+import mmap
+import codecs
+import hashlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from handler.debug_handler import DebugHandler
+    from api.token_counter import estimate_tokens
+    from config.setting import ATTACH_CHUNK_CHARS, ATTACH_CACHE_SIZE, ATTACH_READ_BLOCK
+except ImportError:
+    # 开发模式导入
+    from src.handler.debug_handler import DebugHandler
+    from src.api.token_counter import estimate_tokens
+    from src.config.setting import ATTACH_CHUNK_CHARS, ATTACH_CACHE_SIZE, ATTACH_READ_BLOCK
+
+# 按顺序尝试的编码，带BOM的文件直接使用BOM对应的编码
+BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+FALLBACK_ENCODINGS = ('utf-8', 'gb18030')
+
+
+class Attachment:
+    """已解码并分块的附件内容，按内容哈希共享"""
+
+    def __init__(self, digest: str, size: int, encoding: str, chunks: List[str]):
+        self.digest = digest
+        self.size = size
+        self.encoding = encoding
+        self.chunks = chunks
+        # token估算随内容缓存，重复附加时不再计算
+        self.chunk_tokens = [estimate_tokens(chunk) for chunk in chunks]
+
+    @property
+    def tokens(self) -> int:
+        return sum(self.chunk_tokens)
+
+
+class AttachmentHandler:
+    def __init__(self, chunk_chars: int = ATTACH_CHUNK_CHARS, cache_size: int = ATTACH_CACHE_SIZE,
+                 read_block: int = ATTACH_READ_BLOCK):
+        """
+        初始化附件处理器
+        :param chunk_chars: 单个分块的最大字符数
+        :param cache_size: 按内容哈希缓存的附件数量
+        :param read_block: 解码时每次读取的字节数
+        """
+        self.chunk_chars = chunk_chars
+        self.cache_size = cache_size
+        self.read_block = read_block
+        self._by_digest: "OrderedDict[str, Attachment]" = OrderedDict()
+        # 文件路径 -> (大小, 修改时间, inode, 内容哈希)，文件未修改时跳过读取
+        self._by_path: Dict[str, Tuple[int, int, int, str]] = {}
+        self.stats = {"reads": 0, "hits": 0}
+
+    def load(self, path: str) -> Tuple[Attachment, bool]:
+        """
+        读取附件
+        :param path: 文件路径
+        :return: (附件, 是否命中缓存)
+        """
+        path = os.path.abspath(os.path.expanduser(path))
+        stat = os.stat(path)
+        if not os.path.isfile(path):
+            raise ValueError(f"不是普通文件: {path}")
+        signature = (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+        known = self._by_path.get(path)
+        if known and known[:3] == signature and known[3] in self._by_digest:
+            return self._hit(known[3]), True
+
+        with open(path, 'rb') as f:
+            if stat.st_size == 0:
+                attachment, cached = self._from_buffer(b'')
+            else:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    attachment, cached = self._from_buffer(mapped)
+        self._by_path[path] = signature + (attachment.digest,)
+        return attachment, cached
+
+    def _hit(self, digest: str) -> Attachment:
+        self.stats["hits"] += 1
+        self._by_digest.move_to_end(digest)
+        return self._by_digest[digest]
+
+    def _from_buffer(self, buffer) -> Tuple[Attachment, bool]:
+        """按内容哈希查找缓存，未命中时解码并分块"""
+        digest = hashlib.sha256(buffer).hexdigest()
+        if digest in self._by_digest:
+            # 内容相同的不同文件（或被touch过的同一文件）也不再重复解码
+            return self._hit(digest), True
+        self.stats["reads"] += 1
+        if b'\x00' in buffer[:8192] and not any(buffer[:len(bom)] == bom for bom, _ in BOMS[1:]):
+            raise ValueError("疑似二进制文件，无法作为文本附加")
+        encoding, chunks = self._decode_chunks(buffer)
+        attachment = Attachment(digest, len(buffer), encoding, chunks)
+        self._by_digest[digest] = attachment
+        while len(self._by_digest) > self.cache_size:
+            self._by_digest.popitem(last=False)
+        DebugHandler.debug(f"附件已解码: {len(buffer)}字节, 编码{encoding}, {len(chunks)}块")
+        return attachment, False
+
+    def _decode_chunks(self, buffer) -> Tuple[str, List[str]]:
+        """检测编码并分块解码，失败时换下一种编码重试，最后以utf-8替换非法字节"""
+        for bom, encoding in BOMS:
+            if buffer[:len(bom)] == bom:
+                return encoding, self._chunk(buffer, encoding, 'replace')
+        for encoding in FALLBACK_ENCODINGS:
+            try:
+                return encoding, self._chunk(buffer, encoding, 'strict')
+            except UnicodeDecodeError:
+                continue
+        return 'utf-8', self._chunk(buffer, 'utf-8', 'replace')
+
+    def _chunk(self, buffer, encoding: str, errors: str) -> List[str]:
+        """逐块增量解码，按行边界把文本切成不超过chunk_chars的分块"""
+        decoder = codecs.getincrementaldecoder(encoding)(errors=errors)
+        chunks = []
+        current = []
+        current_len = 0
+        pending = ''
+        size = len(buffer)
+        for offset in range(0, size or 1, self.read_block):
+            final = offset + self.read_block >= size
+            pending += decoder.decode(buffer[offset:offset + self.read_block], final=final)
+            lines = pending.splitlines(keepends=True)
+            # 最后一行可能不完整（包括\r\n被块边界切开的情况），留到下一块
+            pending = lines.pop() if lines and not final and not lines[-1].endswith('\n') else ''
+            for line in lines:
+                while len(line) > self.chunk_chars:
+                    # 超长的单行强制切分
+                    if current:
+                        chunks.append(''.join(current))
+                        current, current_len = [], 0
+                    chunks.append(line[:self.chunk_chars])
+                    line = line[self.chunk_chars:]
+                if not line:
+                    continue
+                if current_len + len(line) > self.chunk_chars:
+                    chunks.append(''.join(current))
+                    current, current_len = [], 0
+                current.append(line)
+                current_len += len(line)
+        if current:
+            chunks.append(''.join(current))
+        return chunks
+
+    @staticmethod
+    def select_chunks(attachment: Attachment, start: int, budget: int) -> range:
+        """从第start块开始选取总字符数不超过预算的分块（至少一块）"""
+        end = start
+        used = 0
+        while end < len(attachment.chunks):
+            length = len(attachment.chunks[end])
+            if end > start and used + length > budget:
+                break
+            used += length
+            end += 1
+        return range(start, end)
+
+    @staticmethod
+    def render(name: str, attachment: Attachment, index: int, duplicate: bool = False) -> str:
+        """把附件的一个分块渲染为消息中的文本段，已发送过的分块只保留引用"""
+        header = f"[附件: {name} | 第{index + 1}/{len(attachment.chunks)}块 | sha256:{attachment.digest[:12]}"
+        if duplicate:
+            return header + " | 内容与上文已发送的同一分块相同]"
+        return f"{header}]\n{attachment.chunks[index]}\n[附件结束: {name}]"
+
+    def get(self, digest: str) -> Optional[Attachment]:
+        return self._by_digest.get(digest)
@@ -0,0 +1,241 @@
+"""
+批处理模块，以非交互方式并发处理JSONL格式的提示集合
+
+输入文件每行一个JSON对象:
+  {"id": "q1", "prompt": "..."} 或 {"id": "q1", "messages": [...]}，可选字段 model / temperature
+输出文件每行一个结果，按完成顺序写入，并带上输入id和行号。
+检查点文件记录已完成的位置，中断后使用相同命令即可从断点继续。
+"""
+import os
+import sys
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from handler.error_handler import ErrorHandler
+    from config.setting import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+except ImportError:
+    # 开发模式导入
+    from pathlib import Path
+    current_file = Path(__file__).resolve()
+    project_root = current_file.parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+    from src.handler.error_handler import ErrorHandler
+    from src.config.setting import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+
+
+class BatchHandler:
+    """批处理器：流式读取输入、线程池并发请求、按完成顺序写出结果并维护检查点"""
+
+    def __init__(self, api, input_path: str, output_path: str, concurrency: int = 4,
+                 model: str = DEFAULT_MODEL, temperature: float = DEFAULT_TEMPERATURE,
+                 checkpoint_path: Optional[str] = None, checkpoint_interval: float = 2.0):
+        """
+        初始化批处理器
+        :param api: DeepSeekAPI实例，所有工作线程共享其连接池
+        :param input_path: 输入JSONL文件路径
+        :param output_path: 输出JSONL文件路径
+        :param concurrency: 并发请求数
+        :param model: 默认模型（输入行未指定model时使用）
+        :param temperature: 默认温度
+        :param checkpoint_path: 检查点文件路径，默认为输出文件路径加.ckpt后缀
+        :param checkpoint_interval: 两次写检查点的最小间隔(秒)
+        """
+        if concurrency < 1:
+            raise ValueError("concurrency必须大于0")
+        self.api = api
+        self.input_path = input_path
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.model = model
+        self.temperature = temperature
+        self.checkpoint_path = checkpoint_path or f"{output_path}.ckpt"
+        self.checkpoint_interval = checkpoint_interval
+        self.error_handler = ErrorHandler()
+
+        self._lock = threading.Lock()
+        # 已提交但尚未完成的任务数上限，保证内存占用与输入规模无关
+        self._slots = threading.BoundedSemaphore(concurrency * 2)
+        self._output = None
+        self._watermark = 0          # 行号小于watermark的输入均已完成
+        self._resume_point = (0, 0)  # (行号, 字节偏移)：该行之前的输入均已完成，恢复时从此处读取
+        self._done_above = set()     # watermark之后已完成的行号
+        self._line_offsets: Dict[int, int] = {}
+        self._last_checkpoint = 0.0
+        self.stats = {"completed": 0, "failed": 0, "skipped": 0}
+
+    def _load_checkpoint(self) -> None:
+        """读取检查点，并根据检查点之后写入的输出补全已完成集合"""
+        if not os.path.exists(self.checkpoint_path):
+            return
+        with open(self.checkpoint_path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get("input") != os.path.abspath(self.input_path):
+            raise ValueError(f"检查点 {self.checkpoint_path} 属于另一个输入文件: {state.get('input')}")
+        self._watermark = state["watermark"]
+        self._resume_point = (state["resume_line"], state["resume_offset"])
+        self._done_above = set(state["done_above"])
+        self._line_offsets = {int(k): v for k, v in state.get("line_offsets", {}).items()}
+        if not os.path.exists(self.output_path):
+            return
+        # 检查点之后可能还有已写出的结果，只扫描这一段输出
+        with open(self.output_path, 'r+b') as f:
+            f.seek(state["output_offset"])
+            offset = state["output_offset"]
+            for raw in f:
+                if not raw.endswith(b'\n'):
+                    f.truncate(offset)
+                    break
+                offset += len(raw)
+                try:
+                    self._done_above.add(json.loads(raw)["line"])
+                except (ValueError, KeyError):
+                    continue
+        self._advance_watermark()
+
+    def _advance_watermark(self) -> None:
+        """推进watermark，使已完成集合只保留乱序完成的少量行号"""
+        while self._watermark in self._done_above:
+            self._done_above.discard(self._watermark)
+            self._line_offsets.pop(self._watermark, None)
+            self._watermark += 1
+        if self._watermark in self._line_offsets:
+            self._resume_point = (self._watermark, self._line_offsets[self._watermark])
+
+    def _write_checkpoint(self, force: bool = False) -> None:
+        """原子地写入检查点（调用方需持有锁）"""
+        now = time.monotonic()
+        if not force and now - self._last_checkpoint < self.checkpoint_interval:
+            return
+        self._output.flush()
+        state = {
+            "input": os.path.abspath(self.input_path),
+            "watermark": self._watermark,
+            "resume_line": self._resume_point[0],
+            "resume_offset": self._resume_point[1],
+            "done_above": sorted(self._done_above),
+            "line_offsets": {str(k): v for k, v in self._line_offsets.items()},
+            "output_offset": self._output.tell(),
+            "stats": self.stats,
+        }
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self._last_checkpoint = now
+
+    def _complete(self, line_no: int, result: Optional[Dict[str, object]]) -> None:
+        """记录一行已完成：写出结果、推进watermark并按需写检查点"""
+        with self._lock:
+            if result is not None:
+                self._output.write(json.dumps(result, ensure_ascii=False).encode('utf-8') + b'\n')
+                self.stats["failed" if result.get("error") else "completed"] += 1
+            else:
+                self.stats["skipped"] += 1
+            self._done_above.add(line_no)
+            self._advance_watermark()
+            self._write_checkpoint()
+
+    def _process(self, line_no: int, item: Dict[str, object]) -> Dict[str, object]:
+        """处理单个输入项，按ErrorHandler的策略重试"""
+        item_id = item.get("id", line_no)
+        model = item.get("model", self.model)
+        messages = item.get("messages") or [{"role": "user", "content": item.get("prompt", "")}]
+        temperature = item.get("temperature", self.temperature)
+        start = time.perf_counter()
+        retry_count = 0
+        while True:
+            try:
+                response = self.api.chat_completion(messages=messages, model=model, temperature=temperature)
+                message = response['choices'][0]['message']
+                return {
+                    "id": item_id, "line": line_no, "model": model,
+                    "content": message.get('content', ''),
+                    "reasoning_content": message.get('reasoning_content', ''),
+                    "usage": response.get('usage'),
+                    "latency": round(time.perf_counter() - start, 3),
+                    "error": None,
+                }
+            except Exception as e:
+                error_info = self.error_handler.handle_error(e, retry_count)
+                if not error_info['should_retry']:
+                    return {"id": item_id, "line": line_no, "model": model, "content": None,
+                            "latency": round(time.perf_counter() - start, 3), "error": error_info['message']}
+                retry_count += 1
+
+    def _run_item(self, line_no: int, item: Dict[str, object]) -> None:
+        try:
+            self._complete(line_no, self._process(line_no, item))
+        finally:
+            self._slots.release()
+
+    def _report(self, started: float) -> None:
+        elapsed = time.perf_counter() - started
+        finished = self.stats["completed"] + self.stats["failed"]
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        print(f"[batch] 完成 {self.stats['completed']}，失败 {self.stats['failed']}，"
+              f"跳过 {self.stats['skipped']}，{rate:.1f} 条/秒", file=sys.stderr)
+
+    def run(self, progress_interval: float = 5.0) -> Dict[str, int]:
+        """
+        执行批处理，已完成的输入（根据检查点）不会重复处理
+        :param progress_interval: 进度输出间隔(秒)
+        :return: 统计信息
+        """
+        self._load_checkpoint()
+        if self._watermark or self._done_above:
+            print(f"[batch] 从检查点恢复: 前{self._watermark}行已完成", file=sys.stderr)
+        started = time.perf_counter()
+        last_report = started
+        self._output = open(self.output_path, 'ab')
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            with open(self.input_path, 'rb') as f:
+                # 直接定位到恢复点，不再读取已完成的部分
+                line_no, offset = self._resume_point
+                f.seek(offset)
+                for raw in iter(f.readline, b''):
+                    current, line_offset = line_no, offset
+                    line_no += 1
+                    offset += len(raw)
+                    with self._lock:
+                        if current < self._watermark or current in self._done_above:
+                            continue
+                        self._line_offsets[current] = line_offset
+                        if current == self._watermark:
+                            self._resume_point = (current, line_offset)
+                    if not raw.strip():
+                        self._complete(current, None)
+                        continue
+                    try:
+                        item = json.loads(raw)
+                        if not isinstance(item, dict):
+                            raise ValueError("输入行必须是JSON对象")
+                    except ValueError as e:
+                        self._complete(current, {"id": None, "line": current, "content": None,
+                                                 "error": f"无效的输入行: {str(e)}"})
+                        continue
+                    self._slots.acquire()
+                    executor.submit(self._run_item, current, item)
+                    if time.perf_counter() - last_report >= progress_interval:
+                        self._report(started)
+                        last_report = time.perf_counter()
+                # 记录文件末尾位置，全部完成后恢复点落在文件末尾
+                with self._lock:
+                    self._line_offsets[line_no] = offset
+                    if line_no == self._watermark:
+                        self._resume_point = (line_no, offset)
+        except KeyboardInterrupt:
+            print("[batch] 已中断，等待进行中的请求完成后保存检查点，使用相同命令可继续执行", file=sys.stderr)
+        finally:
+            executor.shutdown(wait=True)
+            with self._lock:
+                self._write_checkpoint(force=True)
+            self._output.close()
+        self._report(started)
+        return self.stats
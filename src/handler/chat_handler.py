@@ -2,15 +2,30 @@
 对话处理模块，封装与DeepSeek API的交互逻辑
 """
 import io
+import os
 import json
-from typing import List, Dict
+import time
+import sqlite3
+from typing import List, Dict, Optional, Tuple
 import readline
 # 尝试兼容包模式和开发模式的导入
 try:
     # 包模式导入
     from api.deepseek_api import DeepSeekAPI
     from handler.color_handler import ColorHandler
-    from config.setting import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+    from handler.debug_handler import DebugHandler
+    from handler.journal_handler import JournalHandler
+    from handler.search_handler import SearchHandler
+    from handler.tool_handler import ToolHandler, ToolCallAssembler
+    from handler.attachment_handler import AttachmentHandler, Attachment
+    from handler.conversation_handler import ConversationStore
+    from handler.router_handler import ModelRouter
+    from handler.reasoning_handler import ReasoningDisplay
+    from handler.tee_handler import TranscriptTee
+    from handler.attachment_handler import estimate_tokens
+    from api.token_counter import TokenCounter, context_limit
+    from config.setting import (DEFAULT_MODEL, DEFAULT_TEMPERATURE, JOURNAL_ENABLED, SEARCH_ENABLED,
+                                REASONING_IN_MEMORY, TOOL_MAX_ROUNDS, ATTACH_BUDGET_CHARS, AUTO_MODEL)
 except ImportError:
     # 开发模式导入
     import sys
@@ -21,25 +36,307 @@ except ImportError:
     
     from src.api.deepseek_api import DeepSeekAPI
     from src.handler.color_handler import ColorHandler
-    from src.config.setting import DEFAULT_MODEL, DEFAULT_TEMPERATURE
+    from src.handler.debug_handler import DebugHandler
+    from src.handler.journal_handler import JournalHandler
+    from src.handler.search_handler import SearchHandler
+    from src.handler.tool_handler import ToolHandler, ToolCallAssembler
+    from src.handler.attachment_handler import AttachmentHandler, Attachment
+    from src.handler.conversation_handler import ConversationStore
+    from src.handler.router_handler import ModelRouter
+    from src.handler.reasoning_handler import ReasoningDisplay
+    from src.handler.tee_handler import TranscriptTee
+    from src.handler.attachment_handler import estimate_tokens
+    from src.api.token_counter import TokenCounter, context_limit
+    from src.config.setting import (DEFAULT_MODEL, DEFAULT_TEMPERATURE, JOURNAL_ENABLED, SEARCH_ENABLED,
+                                    REASONING_IN_MEMORY, TOOL_MAX_ROUNDS, ATTACH_BUDGET_CHARS,
+                                    AUTO_MODEL)
 from rich.markdown import Markdown
 from rich.console import Console
 console = Console()
 class ChatHandler:
-    def __init__(self):
+    def __init__(self, api: Optional[DeepSeekAPI] = None, router: Optional[ModelRouter] = None):
         """
         初始化对话处理器
+        :param api: API客户端，多个会话可共享同一个客户端（及其连接池和熔断状态），为None时新建
+        :param router: 自动模型路由器，多个会话可共享（及其延迟统计），为None时新建
         """
-        self.api = DeepSeekAPI(DeepSeekAPI.get_api_key())
+        self.api = api or DeepSeekAPI(DeepSeekAPI.get_api_key())
+        # 与API客户端共用计数缓存，/tokens 与发送前预检不会重复计算同一条消息
+        self.tokens = getattr(self.api, 'tokens', None) or TokenCounter()
         self.model = DEFAULT_MODEL
+        # model为auto时每轮由路由器选择模型
+        self.router = router or ModelRouter()
+        self.turn_prompt = ''
+        self.turn_override: Optional[str] = None
+        # 本轮实际使用的模型，添加用户消息时确定，auto模式下为路由结果
+        self.turn_model: Optional[str] = None
+        self.last_route: Optional[str] = None
         self.temperature = DEFAULT_TEMPERATURE
-        self.messages: List[Dict[str, str]] = []
+        # 超出内存预算的早期消息溢出到磁盘，接口与列表一致
+        self.messages = ConversationStore()
+        # 推理过程按消息序号单独保存，不进入发送给API的对话历史
+        self.reasoning: Dict[int, str] = {}
         self.multi_mode = False
         self.interrupt_flag = False
-    def add_user_message(self, content: str) -> None:
-        """添加用户消息到对话历史"""
-        self.messages.append({"role": "user", "content": content})
+        # 后台生成时不直接打印提示，改为收集到notices中，由会话管理器在切换时展示
+        self.quiet = False
+        self.notices: List[str] = []
+        self.journal = JournalHandler() if JOURNAL_ENABLED else None
+        # 对话记录输出（/tee），流式回复时只入队，由后台线程写入文件
+        self.tee: Optional[TranscriptTee] = None
+        # 多个会话共用对话记录输出时，在每轮开头标注的会话名称
+        self.tee_session: Optional[str] = None
+        self._search_index = None
+        self.tools = ToolHandler()
+        self.attachments = AttachmentHandler()
+        # 等待随下一条用户消息发送的附件: (文件名, 附件, 分块范围)
+        self.pending_attachments: List[Tuple[str, Attachment, range]] = []
+        # 本次对话中已发送过的附件分块 (内容哈希, 块序号)，重复附加时只发送引用
+        self.sent_chunks = set()
+
+    def add_tool(self, name: str, func, description: str = '', parameters: dict = None, timeout: float = None) -> None:
+        """
+        添加可供模型调用的本地工具
+        :param name: 工具名称
+        :param func: 工具函数，以关键字参数接收模型给出的参数
+        :param description: 工具说明，默认使用函数的文档字符串
+        :param parameters: 参数的JSON Schema
+        :param timeout: 执行超时(秒)
+        """
+        self.tools.add_tool(name, func, description, parameters, timeout)
+
+    def _tool_options(self, tool_rounds: int) -> Dict[str, object]:
+        """构建请求中的工具参数，连续工具调用超过上限后不再提供工具，促使模型给出最终回复"""
+        if not self.tools or tool_rounds >= TOOL_MAX_ROUNDS:
+            return {}
+        return {"tools": self.tools.schemas()}
+
+    def _run_tool_calls(self, tool_calls: List[dict], content: str = '', reasoning: str = None,
+                        model: str = None) -> None:
+        """记录模型发起的工具调用，并发执行后把结果写回对话历史"""
+        self._append_message({"role": "assistant", "content": content, "tool_calls": tool_calls}, model=model,
+                             reasoning=reasoning)
+        names = ', '.join(call['function']['name'] for call in tool_calls)
+        self._notify(f"\n[调用工具: {names}]")
+        if self.tee:
+            self.tee.note(f"[调用工具: {names}]", session=self.tee_session)
+        start = time.perf_counter()
+        for message in self.tools.execute(tool_calls):
+            self._append_message(message, model=model)
+        DebugHandler.debug(f"{len(tool_calls)}个工具执行完成，耗时{time.perf_counter() - start:.2f}秒")
+
+    def _notify(self, message: str, error: bool = False) -> None:
+        """输出提示信息，后台生成时暂存到notices"""
+        if self.quiet:
+            self.notices.append(message.strip())
+        else:
+            print(ColorHandler.error_text(message) if error else ColorHandler.system_text(message))
+
+    def start_tee(self, path: str, fmt: Optional[str] = None) -> TranscriptTee:
+        """开始把对话记录追加写入文件，已在输出时先关闭原来的文件"""
+        self.stop_tee()
+        self.tee = TranscriptTee(path, fmt) if fmt else TranscriptTee(path)
+        return self.tee
+
+    def stop_tee(self) -> Optional[TranscriptTee]:
+        """停止输出对话记录，写入剩余内容后关闭文件"""
+        tee, self.tee = self.tee, None
+        if tee:
+            tee.close()
+        return tee
+
+    def close(self) -> None:
+        """释放会话占用的资源：关闭会话日志、对话记录输出、工具线程池、全文索引和对话历史的溢出文件"""
+        if self.journal:
+            self.journal.close()
+        self.stop_tee()
+        self.tools.close()
+        if self._search_index is not None:
+            self._search_index.close()
+            self._search_index = None
+        if isinstance(self.messages, ConversationStore):
+            self.messages.close()
+
+    def get_search_index(self) -> SearchHandler:
+        """获取全文索引（首次使用时打开）"""
+        if self._search_index is None:
+            self._search_index = SearchHandler()
+        return self._search_index
+
+    def _append_message(self, message: Dict[str, str], end_of_turn: bool = False, model: str = None,
+                        reasoning: str = None, metrics: Optional[Dict[str, object]] = None) -> None:
+        """添加消息到对话历史，并同步追加到会话日志；推理过程和耗时/用量只写入日志和本地缓存"""
+        self.messages.append(message)
+        if reasoning and REASONING_IN_MEMORY:
+            self.reasoning[len(self.messages) - 1] = reasoning
+        self._evict_reasoning()
+        if self.journal:
+            meta = {"reasoning_content": reasoning} if reasoning else {}
+            meta.update(metrics or {})
+            try:
+                self.journal.append(message, end_of_turn=end_of_turn, model=model or self.model, **meta)
+            except OSError as e:
+                DebugHandler.debug(f"写入会话日志失败: {str(e)}")
+        if end_of_turn:
+            self._update_search_index()
+
+    def _evict_reasoning(self) -> None:
+        """消息溢出到磁盘后，其推理过程也不再常驻内存，需要时从会话日志读取"""
+        hot_start = getattr(self.messages, 'hot_start', 0)
+        if self.journal and self.reasoning and min(self.reasoning) < hot_start:
+            self.reasoning = {index: text for index, text in self.reasoning.items() if index >= hot_start}
+
+    def _update_search_index(self) -> None:
+        """一轮对话完成后，把本会话日志中新增的记录增量写入全文索引"""
+        if not (SEARCH_ENABLED and self.journal):
+            return
+        try:
+            index = self.get_search_index()
+            session_id = self.journal.session_id
+            indexed = index.indexed_count(session_id)
+            # 索引序号以会话日志为准：加载其他地方保存的会话后，内存中的序号不一定与日志一致
+            index.add_messages(session_id, indexed, self.journal.read_records(session_id, indexed))
+        except (sqlite3.Error, RuntimeError, OSError, ValueError) as e:
+            DebugHandler.debug(f"更新全文索引失败: {str(e)}")
+
+    def search_history(self, query: str) -> List[Dict[str, object]]:
+        """
+        检索历史对话
+        :param query: 检索关键词
+        :return: 检索结果列表
+        """
+        index = self.get_search_index()
+        if self.journal:
+            # 补充索引其他进程写入或索引功能启用前保存的会话
+            index.sync_journals(self.journal)
+        return index.search(query)
+
+    def request_messages(self) -> List[Dict[str, str]]:
+        """构建发送给API的消息列表，只包含角色、正式内容和工具调用字段"""
+        return [{key: message[key] for key in ("role", "content", "tool_calls", "tool_call_id") if key in message}
+                for message in self.messages]
+
+    def attach(self, path: str, start: int = 0) -> Tuple[Attachment, range, bool]:
+        """
+        附加文件，随下一条用户消息发送
+        :param path: 文件路径
+        :param start: 起始块序号，文件超出字符预算时可分多次附加
+        :return: (附件, 本次附加的分块范围, 是否命中缓存)
+        """
+        attachment, cached = self.attachments.load(path)
+        if not attachment.chunks:
+            raise ValueError("附件内容为空")
+        if not 0 <= start < len(attachment.chunks):
+            raise ValueError(f"块序号超出范围，该附件共{len(attachment.chunks)}块")
+        budget = ATTACH_BUDGET_CHARS - sum(len(a.chunks[i]) for _, a, r in self.pending_attachments for i in r)
+        chunk_range = self.attachments.select_chunks(attachment, start, budget)
+        self.pending_attachments.append((os.path.basename(path), attachment, chunk_range))
+        return attachment, chunk_range, cached
+
+    def clear_attachments(self) -> None:
+        """清空尚未发送的附件"""
+        self.pending_attachments = []
+
+    def _render_attachments(self) -> str:
+        """把待发送附件渲染为文本，本次对话中已发送过的分块只保留引用"""
+        parts = []
+        for name, attachment, chunk_range in self.pending_attachments:
+            for index in chunk_range:
+                key = (attachment.digest, index)
+                parts.append(self.attachments.render(name, attachment, index, duplicate=key in self.sent_chunks))
+                self.sent_chunks.add(key)
+        self.pending_attachments = []
+        return "\n\n".join(parts)
+
+    def token_usage(self) -> Dict[str, object]:
+        """
+        估算当前对话的token占用，每条消息的计数有缓存，重复调用只计算新增的消息
+        :return: 包含总数、按角色汇总、待发送附件、上下文上限的字典
+        """
+        messages = self.request_messages()
+        # auto模式下按两个候选模型中较小的上下文上限计算
+        models = [self.router.fast_model, self.router.reasoning_model] if self.model == AUTO_MODEL else [self.model]
+        return {
+            "total": self.tokens.count_messages(messages),
+            "by_role": self.tokens.breakdown(messages),
+            "attachments": sum(attachment.chunk_tokens[i] for _, attachment, chunk_range in self.pending_attachments
+                               for i in chunk_range),
+            "limit": min(context_limit(model) for model in models),
+        }
+
+    def add_user_message(self, content: str, model: Optional[str] = None, raw: bool = False) -> None:
+        """
+        添加用户消息到对话历史，待发送的附件拼接在消息前；消息开头的模型前缀（如@reasoner）只作用于本轮
+        :param model: 本轮已确定的模型（如多模型对比中选中的回复），为None时按当前模型和路由选择
+        :param raw: 原样写入已经发送过的消息，不解析模型前缀、不拼接待发送的附件
+        """
+        if raw:
+            self.turn_override = None
+        else:
+            content, self.turn_override = self.router.parse_override(content)
+        self.turn_prompt = content
+        # 先确定本轮模型，用户消息与回复在会话日志中记录同一个实际模型（auto模式下不记录为auto）
+        self.turn_model = model or self._select_model()
+        if self.pending_attachments and not raw:
+            content = self._render_attachments() + "\n\n" + content
+        self._append_message({"role": "user", "content": content}, model=self.turn_model)
     
+    def add_assistant_message(self, content: str, model: str = None, reasoning: str = None,
+                              metrics: Optional[Dict[str, object]] = None) -> None:
+        """
+        添加助手回复到对话历史并结束本轮对话
+        :param content: 正式回复内容
+        :param model: 生成该回复的模型，默认为当前模型
+        :param reasoning: 推理过程，单独保存，不会在后续请求中重新发送
+        :param metrics: 请求耗时和token用量（latency/ttft/prompt_tokens/completion_tokens），只写入会话日志
+        """
+        self._append_message({"role": "assistant", "content": content}, end_of_turn=True, model=model,
+                             reasoning=reasoning, metrics=metrics)
+        self.turn_model = None
+
+    @staticmethod
+    def _reply_metrics(latency: float, ttft: Optional[float], usage: Optional[dict]) -> Dict[str, object]:
+        """整理一次回复的耗时和用量，写入会话日志供导出分析"""
+        usage = usage or {}
+        metrics = {"latency": round(latency, 3), "ttft": round(ttft, 3) if ttft is not None else None,
+                   "prompt_tokens": usage.get('prompt_tokens'), "completion_tokens": usage.get('completion_tokens')}
+        return {key: value for key, value in metrics.items() if value is not None}
+
+    def get_reasoning(self, index: Optional[int] = None) -> str:
+        """
+        获取助手回复的推理过程，内存中没有时从会话日志读取
+        :param index: 消息序号，为None时取最后一条助手回复
+        :return: 推理过程，没有时返回空字符串
+        """
+        if index is None:
+            index = next((i for i in range(len(self.messages) - 1, -1, -1)
+                          if self.messages[i]["role"] == "assistant"), None)
+            if index is None:
+                return ''
+        if index in self.reasoning:
+            return self.reasoning[index]
+        if not self.journal or not 0 <= index < len(self.messages):
+            return ''
+        try:
+            record = self.journal.read_record(self.journal.session_id, index)
+        except (OSError, ValueError) as e:
+            DebugHandler.debug(f"读取推理过程失败: {str(e)}")
+            return ''
+        return record.get("reasoning_content", '') if record else ''
+    
+    def _select_model(self) -> str:
+        """确定本轮使用的模型：单轮覆盖优先，当前模型为auto时由路由器按提示特征和延迟统计选择"""
+        override, self.turn_override = self.turn_override, None
+        mode = override or self.model
+        if mode != AUTO_MODEL:
+            if override:
+                self.router.override(override)
+            return mode
+        decision = self.router.route(self.turn_prompt, previous=self.last_route, api=self.api)
+        self.last_route = decision.model
+        self._notify(f"[自动选择模型: {decision.model}]")
+        return decision.model
+
     def get_assistant_reply(self, stream: bool = False) -> str:
         """
         获取助手回复
@@ -47,20 +344,30 @@ class ChatHandler:
         :return: 助手回复内容
         """
         from .error_handler import ErrorHandler
-        from .debug_handler import DebugHandler
         from .input_handler import InputHandler
         error_handler = ErrorHandler()
         retry_count = 0
+        tool_rounds = 0
+        # 通常已在add_user_message中确定
+        model, self.turn_model = self.turn_model or self._select_model(), None
+        if self.tee:
+            self.tee.begin_turn(model, self.turn_prompt, session=self.tee_session)
         
         while True:
             try:
                 if stream:
                     import sys
                     full_reply = io.StringIO()
-                    DebugHandler.debug(f"开始获取流式回复，使用模型: {self.model}")
+                    full_reasoning = io.StringIO()
+                    tool_calls = ToolCallAssembler()
+                    interrupted = False
+                    DebugHandler.debug(f"开始获取流式回复，使用模型: {model}")
+                    start = time.perf_counter()
+                    ttft = None
+                    usage = None
                     try:
-                        # 添加标志变量，用于跟踪是否已经输出了第一个推理块和内容块的前缀
-                        first_reasoning_chunk = True
+                        # 推理过程按显示模式输出，标志变量用于跟踪是否已经输出了第一个内容块的前缀
+                        reasoning_display = ReasoningDisplay(console=console)
                         first_content_chunk = True
                         
                         # 初始化输入处理器，用于检测用户输入
@@ -69,22 +376,28 @@ class ChatHandler:
                         DebugHandler.debug("已启动输入监听器")
                         
                         for chunk in self.api.chat_completion_stream(
-                            messages=self.messages,
-                            model=self.model,
-                            temperature=self.temperature
+                            messages=self.request_messages(),
+                            model=model,
+                            temperature=self.temperature,
+                            **self._tool_options(tool_rounds)
                         ):
                             # 检查中断标志或输入中的/stop命令
                             if self.interrupt_flag or input_handler.check_for_stop_command():
                                 DebugHandler.debug("检测到中断标志或/stop命令，停止输出")
                                 print(ColorHandler.system_text("\n[输出已中断]\n"))
                                 self.interrupt_flag = False  # 重置中断标志
+                                if self.tee:
+                                    self.tee.note("[输出已中断]", session=self.tee_session)
                                 # 确保在中断后停止输入监听器
                                 input_handler.stop_listening()
+                                interrupted = True
                                 break
                                 
                             if not isinstance(chunk, dict):
                                 DebugHandler.debug("无效的chunk类型，跳过")
                                 continue
+                            if chunk.get('usage'):
+                                usage = chunk['usage']
                             if not chunk.get('choices') or not isinstance(chunk['choices'], list) or len(chunk['choices']) == 0:
                                 DebugHandler.debug("chunk中缺少有效的choices数组，跳过")
                                 continue
@@ -92,6 +405,8 @@ class ChatHandler:
                             if 'delta' not in first_choice or not isinstance(first_choice['delta'], dict):
                                 DebugHandler.debug("choice中缺少delta字段，跳过")
                                 continue
+                            if first_choice['delta'].get('tool_calls'):
+                                tool_calls.add(first_choice['delta']['tool_calls'])
                             reasoning_chunk = first_choice['delta'].get('reasoning_content', '')
                             content_chunk = first_choice['delta'].get('content', '')
                             
@@ -103,19 +418,18 @@ class ChatHandler:
                                 continue
                             
                             DebugHandler.debug(f"获取推理内容: {repr(reasoning_chunk)}, 正式内容: {repr(content_chunk)}")
+                            if self.tee:
+                                self.tee.write(content_chunk, reasoning_chunk, session=self.tee_session)
                             
                             # 打印推理过程（灰色）和正式回答（原色）
-                            if self.model != 'deepseek-chat' and reasoning_chunk:
-                                # 只在第一个推理块前添加前缀
-                                if first_reasoning_chunk:
-                                    console.print(f"推理过程：\n")
-                                    first_reasoning_chunk = False
-                                sys.stdout.write(ColorHandler.reasoning_text(reasoning_chunk))
-                                sys.stdout.flush()
+                            if model != 'deepseek-chat' and reasoning_chunk:
+                                reasoning_display.write(reasoning_chunk)
                             if content_chunk:
                                 # 只在第一个内容块前添加前缀
                                 if first_content_chunk:
-                                    if self.model != 'deepseek-chat':
+                                    ttft = time.perf_counter() - start
+                                    reasoning_display.finish()
+                                    if model != 'deepseek-chat' and reasoning_display.mode == "full":
                                         sys.stdout.write("\n")
                                         sys.stdout.flush()
                                     console.print(f"最终回复：\n")
@@ -124,7 +438,17 @@ class ChatHandler:
                                 sys.stdout.write(ColorHandler.assistant_text(content_chunk))
                                 sys.stdout.flush()
                             
-                            full_reply.write(content_chunk if self.model == 'deepseek-chat' else reasoning_chunk + content_chunk)
+                            full_reply.write(content_chunk)
+                            full_reasoning.write(reasoning_chunk)
+                        
+                        reasoning_display.finish()
+                        if tool_calls and not interrupted:
+                            # 执行工具并把结果发回模型，继续获取回复
+                            input_handler.stop_listening()
+                            self._run_tool_calls(tool_calls.calls(), full_reply.getvalue(), full_reasoning.getvalue(),
+                                                 model=model)
+                            tool_rounds += 1
+                            continue
                         
                         # 更新验证逻辑
                         full_reply_str = full_reply.getvalue()
@@ -132,7 +456,15 @@ class ChatHandler:
                         if not full_reply_str.strip():
                             full_reply_str = "抱歉，未能获取有效回复，请稍后重试"
                         print()
-                        self.messages.append({"role": "assistant", "content": full_reply_str})
+                        latency = time.perf_counter() - start
+                        if not interrupted:
+                            self.router.record(model, ttft, latency,
+                                               estimate_tokens(full_reply.getvalue() + full_reasoning.getvalue()))
+                        metrics = self._reply_metrics(latency, ttft, usage)
+                        self.add_assistant_message(full_reply_str, model=model, reasoning=full_reasoning.getvalue(),
+                                                   metrics=metrics)
+                        if self.tee:
+                            self.tee.end_turn(metrics, session=self.tee_session)
                         DebugHandler.debug("流式回复完成")
                         
                         # 停止输入监听器
@@ -144,6 +476,7 @@ class ChatHandler:
                     except Exception as e:
                         # 流式请求出错，记录错误并继续处理
                         DebugHandler.debug(f"流式请求出错: {str(e)}")
+                        reasoning_display.finish()
                         # 确保停止输入监听器
                         try:
                             input_handler.stop_listening()
@@ -152,30 +485,43 @@ class ChatHandler:
                             DebugHandler.debug(f"停止输入监听器时出错: {str(input_ex)}")
                         raise e
                 else:
-                    DebugHandler.debug(f"开始获取非流式回复，使用模型: {self.model}")
+                    DebugHandler.debug(f"开始获取非流式回复，使用模型: {model}")
+                    start = time.perf_counter()
                     response = self.api.chat_completion(
-                        messages=self.messages,
-                        model=self.model,
-                        temperature=self.temperature
+                        messages=self.request_messages(),
+                        model=model,
+                        temperature=self.temperature,
+                        **self._tool_options(tool_rounds)
                     )
-                    if not self.validate_response_structure(response, stream=False):
+                    tool_call_message = (response.get('choices') or [{}])[0].get('message', {})
+                    if tool_call_message.get('tool_calls'):
+                        self._run_tool_calls(tool_call_message['tool_calls'], tool_call_message.get('content') or '',
+                                             tool_call_message.get('reasoning_content'), model=model)
+                        tool_rounds += 1
+                        continue
+                    if not self.validate_response_structure(response, stream=False, model=model):
                         raise ValueError("无效的API响应结构")
                     message = response['choices'][0]['message']
                     reasoning_content = message.get('reasoning_content', '')
                     content = message.get('content', '')
                     
-                    # 根据模型类型构建回复内容
-                    if self.model == 'deepseek-chat':
-                        assistant_reply = content
-                    else:
-                        # 添加分隔符，与流式模式保持一致
-                        assistant_reply = reasoning_content + '最终回复：' + content
+                    # 推理过程与正式回复分开保存，对话历史中只保留正式回复
+                    assistant_reply = content
                     
                     # 处理空响应的情况
                     if not assistant_reply.strip():
                         assistant_reply = "抱歉，未能获取有效回复，请稍后重试"
                     
-                    self.messages.append({"role": "assistant", "content": assistant_reply})
+                    usage = response.get('usage') or {}
+                    latency = time.perf_counter() - start
+                    self.router.record(model, None, latency,
+                                       usage.get('completion_tokens') or estimate_tokens(content + (reasoning_content or '')))
+                    metrics = self._reply_metrics(latency, None, usage)
+                    self.add_assistant_message(assistant_reply, model=model, reasoning=reasoning_content,
+                                               metrics=metrics)
+                    if self.tee:
+                        self.tee.write(content, reasoning_content or '', session=self.tee_session)
+                        self.tee.end_turn(metrics, session=self.tee_session)
                     DebugHandler.debug("非流式回复完成")
                     return assistant_reply
             except Exception as e:
@@ -183,21 +529,30 @@ class ChatHandler:
                 error_info = error_handler.handle_error(e, retry_count)
                 full_reply = io.StringIO()  # 清空临时缓存
                 if not error_info['should_retry']:
-                    print(ColorHandler.error_text(f"错误: {error_info['message']}"))
+                    self._notify(f"错误: {error_info['message']}", error=True)
+                    if self.tee:
+                        self.tee.end_turn(error=error_info['message'], session=self.tee_session)
                     return "抱歉，处理您的请求时出错"
+                if self.tee:
+                    self.tee.note(f"[请求出错，第{retry_count + 1}次重试: {error_info['message']}]",
+                                  session=self.tee_session)
                 
                 retry_count += 1
                 DebugHandler.debug(f"重试请求 (第{retry_count}次)")
     
-    def validate_response_structure(self, data: dict, stream: bool) -> bool:
-        """验证API响应结构"""
+    def validate_response_structure(self, data: dict, stream: bool, model: Optional[str] = None) -> bool:
+        """
+        验证API响应结构
+        :param model: 本轮实际使用的模型，推理模型的回复必须包含reasoning_content，默认为当前模型
+        """
+        model = model or self.model
         required_keys = {
             'choices': [
                 lambda x: isinstance(x, list) and len(x) > 0,
                 {
                     'delta' if stream else 'message': {
                         'content': lambda x: isinstance(x, str),
-                        'reasoning_content': lambda x: isinstance(x, str) if self.model == 'deepseek-reasoner' else True
+                        'reasoning_content': lambda x: isinstance(x, str) if model == 'deepseek-reasoner' else True
                     }
                 }
             ]
@@ -235,7 +590,62 @@ class ChatHandler:
 
     def reset_conversation(self) -> None:
         """重置对话历史"""
-        self.messages = []
+        self._clear_messages()
+        self.reasoning = {}
+        self.sent_chunks = set()
+        if self.journal:
+            # 重置后的对话记录到新的会话日志中
+            self.journal.switch()
+
+    def save_session(self, session_id: str = None) -> str:
+        """
+        保存当前会话
+        :param session_id: 另存为的会话ID，为None时只将当前会话日志落盘
+        :return: 会话ID
+        """
+        if not self.journal:
+            raise RuntimeError("会话日志未启用，请在config/setting.py中设置JOURNAL_ENABLED")
+        if session_id:
+            if SEARCH_ENABLED:
+                # 覆盖保存同名会话时清除其旧索引
+                self.get_search_index().remove_session(session_id)
+            return self.journal.save_as(session_id, self._journal_messages())
+        self.journal.sync()
+        return self.journal.session_id
+
+    def load_session(self, session_id: str) -> int:
+        """
+        加载已保存的会话，后续对话继续追加到该会话日志
+        :param session_id: 会话ID
+        :return: 加载的消息数量
+        """
+        if not self.journal:
+            raise RuntimeError("会话日志未启用，请在config/setting.py中设置JOURNAL_ENABLED")
+        messages = self.journal.load(session_id)
+        self.journal.switch(session_id)
+        self._clear_messages()
+        self.messages.extend(messages)
+        # 已加载会话的推理过程按需从会话日志读取
+        self.reasoning = {}
+        self.sent_chunks = set()
+        return len(messages)
+
+    def _clear_messages(self) -> None:
+        if isinstance(self.messages, ConversationStore):
+            self.messages.clear()
+        else:
+            self.messages = ConversationStore()
+
+    def _journal_messages(self) -> List[Dict[str, object]]:
+        """当前对话的完整记录（含推理过程和模型），用于另存为"""
+        try:
+            records = self.journal.read_records(self.journal.session_id)
+        except (OSError, ValueError):
+            records = []
+        if len(records) == len(self.messages):
+            return [{key: value for key, value in record.items() if key != "ts"} for record in records]
+        return [dict(message, reasoning_content=self.reasoning[index]) if index in self.reasoning else message
+                for index, message in enumerate(self.messages)]
         
     def interrupt_output(self) -> None:
         """中断当前输出"""
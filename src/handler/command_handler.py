@@ -1,17 +1,26 @@
 """
 命令处理模块，专门处理用户输入的命令
 """
+import os
 import json
+import time
+import inspect
 from typing import List, Dict
 from rich.console import Console
 from rich.panel import Panel
 from rich.markdown import Markdown
+from rich.markup import escape
+from rich.table import Table
 # 尝试兼容包模式和开发模式的导入
 try:
     # 包模式导入
     from handler.debug_handler import DebugHandler
     from handler.color_handler import ColorHandler
-    from config.setting import AVAILABLE_MODELS
+    from handler.search_handler import HIGHLIGHT_START, HIGHLIGHT_END
+    from handler.compare_handler import CompareHandler
+    from handler.reasoning_handler import ReasoningDisplay, DISPLAY_MODES
+    from handler.tee_handler import FORMATS as TEE_FORMATS
+    from config.setting import AVAILABLE_MODELS, AUTO_MODEL
 except ImportError:
     # 开发模式导入
     import sys
@@ -22,13 +31,20 @@ except ImportError:
     
     from src.handler.debug_handler import DebugHandler
     from src.handler.color_handler import ColorHandler
-    from src.config.setting import AVAILABLE_MODELS
+    from src.handler.search_handler import HIGHLIGHT_START, HIGHLIGHT_END
+    from src.handler.compare_handler import CompareHandler
+    from src.handler.reasoning_handler import ReasoningDisplay, DISPLAY_MODES
+    from src.handler.tee_handler import FORMATS as TEE_FORMATS
+    from src.config.setting import AVAILABLE_MODELS, AUTO_MODEL
 
 DebugHandler.debug(f"json模块已导入，版本: {json.__version__}")
 console = Console()
+# 当前会话正在后台生成回复时仍可使用的命令（不修改该会话的对话历史）
+BUSY_SAFE_COMMANDS = {'/session', '/help', '/quit', '/debug', '/stream', '/stats', '/sessions', '/search', '/tokens'}
 class CommandHandler:
-    def __init__(self, chat_handler=None):
+    def __init__(self, chat_handler=None, session_manager=None):
         self.chat_handler = chat_handler
+        self.session_manager = session_manager
         self.commands = {
             '/quit': self.handle_quit,
             '/stream': self.handle_stream_mode,
@@ -37,8 +53,22 @@ class CommandHandler:
             '/multi': self.handle_multi,
             '/model': self.handle_model,
             '/reset': self.handle_reset,
-            '/stop': self.handle_interrupt
+            '/stop': self.handle_interrupt,
+            '/save': self.handle_save,
+            '/load': self.handle_load,
+            '/sessions': self.handle_sessions,
+            '/search': self.handle_search,
+            '/open': self.handle_open,
+            '/compare': self.handle_compare,
+            '/reasoning': self.handle_reasoning,
+            '/attach': self.handle_attach,
+            '/detach': self.handle_detach,
+            '/stats': self.handle_stats,
+            '/tokens': self.handle_tokens,
+            '/tee': self.handle_tee,
+            '/session': self.handle_session
         }
+        self.last_search_results = []
         self.stream_mode = False
         
         # 初始化命令自动补全
@@ -71,11 +101,19 @@ class CommandHandler:
         if not normalized_input.startswith('/'):
             return True
             
+        # 命令名与参数以第一个空白分隔，参数保留原始大小写
+        parts = user_input.strip().split(maxsplit=1)
+        command_name = parts[0].lower()
+        args = parts[1] if len(parts) > 1 else ''
+            
         # 优先处理本地命令
-        command_func = self.commands.get(normalized_input)
-        DebugHandler.debug(f"查找命令处理函数，命令: '{normalized_input}', 找到函数: {command_func}")
+        command_func = self.commands.get(command_name)
+        DebugHandler.debug(f"查找命令处理函数，命令: '{command_name}', 参数: '{args}', 找到函数: {command_func}")
+        if command_func and args and not inspect.signature(command_func).parameters:
+            # 不接受参数的命令带了参数，按普通输入处理
+            command_func = None
         if command_func:
-            result = command_func()
+            result = command_func(args) if args else command_func()
             if not result:  # 如果命令处理返回false，阻止后续流程
                 return False
             return None  # 返回None表示命令已处理但继续对话
@@ -120,8 +158,9 @@ class CommandHandler:
     用法: 输入 /multi 进入多行模式，输入内容后使用 /eof 结束输入
 
 [cyan]/model[/cyan] - 切换AI模型
-    说明: 在可用模型之间切换
-    用法: 输入 /model 然后输入数字或模型ID
+    说明: 在可用模型之间切换，auto表示每轮按提示特征和延迟统计自动选择
+    用法: /model 依次切换，/model <模型ID或auto> 直接指定；
+          消息以 @chat 或 @reasoner 开头时只有本轮使用该模型
     当前模型: %s
 
 [cyan]/reset[/cyan] - 重置对话历史
@@ -132,6 +171,65 @@ class CommandHandler:
     说明: 在流式输出过程中立即停止输出
     用法: 直接输入 /stop
 
+[cyan]/save[/cyan] - 保存当前会话
+    说明: 对话会自动追加写入会话日志，/save 立即落盘，也可指定ID另存为
+    用法: 输入 /save 或 /save <会话ID>
+
+[cyan]/load[/cyan] - 加载已保存的会话
+    说明: 恢复指定会话的对话历史，后续对话继续记录到该会话
+    用法: 输入 /load <会话ID>
+
+[cyan]/sessions[/cyan] - 列出已保存的会话
+    说明: 显示所有会话ID、消息数量和最后修改时间
+    用法: 直接输入 /sessions
+
+[cyan]/search[/cyan] - 全文检索历史对话
+    说明: 在所有已保存会话中检索关键词，按相关度显示高亮摘要
+    用法: 输入 /search <关键词>
+
+[cyan]/open[/cyan] - 打开检索结果对应的会话
+    说明: 加载最近一次检索结果中指定序号所在的会话
+    用法: 输入 /open <序号>
+
+[cyan]/compare[/cyan] - 多模型并排对比
+    说明: 将当前对话同时发送给所有可用模型，并排显示回复及首字延迟、总延迟和token数，
+          结束后选择一个回复写入对话历史（Ctrl+C中断）
+    用法: 输入 /compare <提示>，或直接输入 /compare 对比尚未回复的用户消息
+
+[cyan]/reasoning[/cyan] - 查看推理过程
+    说明: 推理过程与正式回复分开保存，不会作为上下文重新发送；此命令显示指定回复的推理过程
+    用法: 输入 /reasoning 查看最近一次回复，或 /reasoning <消息序号>
+          /reasoning full|hidden|tail|collapse 设置流式输出时推理过程的显示方式：
+          全部输出 / 只显示进度和token数 / 滚动显示最后几行 / 结束后折叠为一行
+
+[cyan]/attach[/cyan] - 附加文件
+    说明: 以内存映射方式读取文件并自动检测编码，按大小分块后随下一条消息发送；
+          相同内容按哈希去重，重复附加不会重复读取，已发送过的分块只发送引用
+    用法: 输入 /attach <文件路径>，超出预算时使用 /attach <文件路径> <起始块> 继续附加
+
+[cyan]/detach[/cyan] - 清空待发送的附件
+    用法: 直接输入 /detach
+
+[cyan]/stats[/cyan] - 查看连接状态
+    说明: 显示传输协议、连接预热结果、请求体压缩节省的字节数、对话历史的内存占用，以及各端点/模型熔断器的状态、窗口内失败率和拒绝次数
+    用法: 直接输入 /stats
+
+[cyan]/tokens[/cyan] - 查看token占用
+    说明: 在本地估算当前对话（含待发送附件）的token数及占模型上下文上限的比例，不发送请求；
+          请求发送前也会按同样的估算预检，超出上限时直接提示而不发送
+    用法: 直接输入 /tokens
+
+[cyan]/tee[/cyan] - 输出对话记录
+    说明: 把所有会话（包括之后新建的）此后的每轮对话（用户消息、推理过程、回复，以及每轮的时间、
+          耗时和token用量）追加写入同一个文本或Markdown文件，每轮标注会话名称，不含终端颜色；
+          由后台线程批量写入，不拖慢流式输出
+    用法: /tee <文件路径> [markdown|text] 开始输出，/tee 查看状态，/tee off 停止
+
+[cyan]/session[/cyan] - 管理多个并行会话
+    说明: 每个会话有独立的对话历史和模型；/session bg 在后台生成回复，期间可切换到其他会话继续对话，
+          后台完成的回复会在切换回该会话时显示
+    用法: /session new [名称] | /session switch <名称> | /session list | /session bg <提示>
+
 [cyan]/help[/cyan] - 显示此帮助信息
     说明: 显示所有可用命令的详细说明
     用法: 直接输入 /help
@@ -153,13 +251,18 @@ class CommandHandler:
             print(ColorHandler.system_text("已进入多行输入模式"))
         return True
         
-    def handle_model(self) -> bool:
-        """切换模型"""
+    def handle_model(self, args: str = '') -> bool:
+        """切换模型，不带参数时在可用模型和auto之间依次切换"""
         if self.chat_handler:
             current_model = self.chat_handler.model
-            model_list = list(AVAILABLE_MODELS.keys())
+            model_list = list(AVAILABLE_MODELS.keys()) + [AUTO_MODEL]
             
-            if current_model in model_list:
+            if args:
+                selected_model = args.strip().lower()
+                if selected_model not in model_list:
+                    print(ColorHandler.error_text(f"未知模型: {args.strip()}，可选: {', '.join(model_list)}"))
+                    return True
+            elif current_model in model_list:
                 current_index = model_list.index(current_model)
                 next_index = (current_index + 1) % len(model_list)
                 selected_model = model_list[next_index]
@@ -167,7 +270,7 @@ class CommandHandler:
                 selected_model = model_list[0]
                 
             self.chat_handler.model = selected_model
-            print(ColorHandler.system_text(f"已切换到模型: {AVAILABLE_MODELS[selected_model]}"))
+            print(ColorHandler.system_text(f"已切换到模型: {AVAILABLE_MODELS.get(selected_model, '自动选择')}"))
             print(ColorHandler.system_text("对话历史已保留，您可以继续之前的对话"))
         return True
         
@@ -185,6 +288,395 @@ class CommandHandler:
             print(ColorHandler.system_text("已发送中断信号"))
         return True
     
+    def handle_save(self, session_id: str = '') -> bool:
+        """保存当前会话，可指定会话ID另存为"""
+        if self.chat_handler:
+            try:
+                saved_id = self.chat_handler.save_session(session_id.strip() or None)
+                print(ColorHandler.system_text(f"会话已保存: {saved_id}"))
+            except (RuntimeError, ValueError, OSError) as e:
+                print(ColorHandler.error_text(f"保存会话失败: {str(e)}"))
+        return True
+
+    def handle_load(self, session_id: str = '') -> bool:
+        """加载已保存的会话"""
+        if not session_id.strip():
+            print(ColorHandler.system_text("用法: /load <会话ID>，可使用 /sessions 查看已保存的会话"))
+            return True
+        if self.chat_handler:
+            self._load_session(session_id.strip())
+        return True
+
+    def _load_session(self, session_id: str) -> bool:
+        """加载会话并提示结果，返回是否加载成功（命令处理函数的返回值表示是否继续运行，不能用于表示失败）"""
+        try:
+            count = self.chat_handler.load_session(session_id)
+        except (RuntimeError, ValueError, OSError) as e:
+            print(ColorHandler.error_text(f"加载会话失败: {str(e)}"))
+            return False
+        print(ColorHandler.system_text(f"已加载会话 {session_id}，共{count}条消息"))
+        return True
+
+    def handle_sessions(self) -> bool:
+        """列出已保存的会话"""
+        journal = self.chat_handler.journal if self.chat_handler else None
+        if not journal:
+            print(ColorHandler.system_text("会话日志未启用"))
+            return True
+        sessions = journal.list_sessions()
+        if not sessions:
+            print(ColorHandler.system_text("暂无已保存的会话"))
+            return True
+        for session in sessions:
+            current = " (当前)" if session["session_id"] == journal.session_id else ""
+            modified = time.strftime('%Y-%m-%d %H:%M', time.localtime(session["mtime"]))
+            print(ColorHandler.system_text(f"{session['session_id']}  {session['messages']}条消息  {modified}{current}"))
+        return True
+    
+    def handle_search(self, query: str = '') -> bool:
+        """全文检索历史对话"""
+        if not query.strip():
+            print(ColorHandler.system_text("用法: /search <关键词>，多个关键词以空格分隔"))
+            return True
+        if self.chat_handler:
+            start = time.perf_counter()
+            try:
+                results = self.chat_handler.search_history(query.strip())
+            except Exception as e:
+                print(ColorHandler.error_text(f"检索失败: {str(e)}"))
+                return True
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.last_search_results = results
+            if not results:
+                print(ColorHandler.system_text(f"未找到匹配的消息 ({elapsed_ms:.1f}ms)"))
+                return True
+            console.print(f"[dim]找到{len(results)}条结果 ({elapsed_ms:.1f}ms)，使用 /open <序号> 打开对应会话[/dim]")
+            for number, result in enumerate(results, 1):
+                snippet = escape(result["snippet"].replace('\n', ' '))
+                snippet = snippet.replace(HIGHLIGHT_START, '[bold yellow]').replace(HIGHLIGHT_END, '[/bold yellow]')
+                modified = time.strftime('%Y-%m-%d %H:%M', time.localtime(result["ts"])) if result["ts"] else ''
+                console.print(f"[cyan]{number:>2}.[/cyan] [dim]{escape(result['session_id'])} #{result['msg_index']} "
+                              f"{result['role']} {modified}[/dim]\n    {snippet}")
+        return True
+
+    def handle_open(self, number: str = '') -> bool:
+        """打开最近一次检索结果对应的会话"""
+        if not number.strip().isdigit() or not 1 <= int(number) <= len(self.last_search_results):
+            print(ColorHandler.system_text("用法: /open <序号>，序号来自最近一次 /search 的结果"))
+            return True
+        result = self.last_search_results[int(number) - 1]
+        # 加载失败时当前对话保持不变，不能把其中的消息当作检索结果展示
+        if not self.chat_handler or not self._load_session(result["session_id"]):
+            return True
+        messages = self.chat_handler.messages
+        if result["msg_index"] < len(messages):
+            matched = messages[result["msg_index"]]
+            console.print(Panel(escape(matched["content"]), title=f"#{result['msg_index']} {matched['role']}",
+                                border_style="cyan", expand=False))
+        return True
+    
+    def handle_compare(self, prompt: str = '') -> bool:
+        """并发请求所有模型并排对比，选择一个回复写入对话历史"""
+        if not self.chat_handler:
+            return True
+        compare_handler = CompareHandler(self.chat_handler, console=console)
+        prompt = prompt.strip() or None
+        try:
+            results = compare_handler.run(prompt)
+        except ValueError as e:
+            print(ColorHandler.system_text(str(e)))
+            return True
+        compare_handler.print_summary(results)
+        candidates = [number for number, result in enumerate(results, 1)
+                      if not result.error and result.content.getvalue().strip()]
+        if not candidates:
+            print(ColorHandler.error_text("没有可用的回复，对话历史未改变"))
+            return True
+        try:
+            choice = console.input(f"选择要写入对话历史的回复 {candidates}，直接回车放弃: ").strip()
+        except (KeyboardInterrupt, EOFError):
+            choice = ''
+        if not choice.isdigit() or int(choice) not in candidates:
+            print(ColorHandler.system_text("未选择回复，对话历史未改变"))
+            return True
+        selected = results[int(choice) - 1]
+        compare_handler.commit(selected, prompt)
+        print(ColorHandler.system_text(f"已将 {AVAILABLE_MODELS.get(selected.model, selected.model)} 的回复写入对话历史"))
+        return True
+    
+    def handle_reasoning(self, index: str = '') -> bool:
+        """显示助手回复的推理过程，或设置推理过程的显示模式"""
+        if not self.chat_handler:
+            return True
+        if index.strip().lower() in DISPLAY_MODES:
+            ReasoningDisplay.set_mode(index.strip().lower())
+            print(ColorHandler.system_text(f"推理过程显示模式: {ReasoningDisplay.get_mode()}"))
+            return True
+        if index.strip() and not index.strip().isdigit():
+            print(ColorHandler.system_text(f"用法: /reasoning、/reasoning <消息序号> 或 /reasoning <{'|'.join(DISPLAY_MODES)}>"))
+            return True
+        reasoning = self.chat_handler.get_reasoning(int(index) if index.strip() else None)
+        if not reasoning:
+            print(ColorHandler.system_text("该回复没有推理过程"))
+            return True
+        console.print(Panel(escape(reasoning), title="推理过程", border_style="dim", expand=False))
+        return True
+    
+    def handle_attach(self, args: str = '') -> bool:
+        """附加文件，随下一条消息发送"""
+        if not self.chat_handler:
+            return True
+        if not args.strip():
+            pending = self.chat_handler.pending_attachments
+            if not pending:
+                print(ColorHandler.system_text("用法: /attach <文件路径> [起始块]，当前没有待发送的附件"))
+            for name, attachment, chunk_range in pending:
+                print(ColorHandler.system_text(f"待发送: {name} 第{chunk_range.start + 1}-{chunk_range.stop}块"))
+            return True
+        path, start = args.strip(), 0
+        parts = path.rsplit(maxsplit=1)
+        if len(parts) == 2 and parts[1].isdigit() and not os.path.exists(os.path.expanduser(path)):
+            path, start = parts[0], int(parts[1]) - 1
+        try:
+            attachment, chunk_range, cached = self.chat_handler.attach(path, max(0, start))
+        except (OSError, ValueError) as e:
+            print(ColorHandler.error_text(f"附加文件失败: {str(e)}"))
+            return True
+        tokens = sum(attachment.chunk_tokens[i] for i in chunk_range)
+        print(ColorHandler.system_text(
+            f"已附加 {os.path.basename(path)}: {attachment.size / 1024:.1f}KB, 编码{attachment.encoding}, "
+            f"第{chunk_range.start + 1}-{chunk_range.stop}/{len(attachment.chunks)}块, 约{tokens} tokens"
+            f"{'（命中缓存）' if cached else ''}，将随下一条消息发送"))
+        if chunk_range.stop < len(attachment.chunks):
+            print(ColorHandler.system_text(
+                f"超出单条消息的附件预算，可使用 /attach {path} {chunk_range.stop + 1} 继续附加剩余分块"))
+        return True
+
+    def handle_detach(self) -> bool:
+        """清空待发送的附件"""
+        if self.chat_handler:
+            self.chat_handler.clear_attachments()
+            print(ColorHandler.system_text("已清空待发送的附件"))
+        return True
+    
+    def handle_stats(self) -> bool:
+        """显示连接与熔断状态"""
+        api = self.chat_handler.api if self.chat_handler else None
+        if api is None:
+            return True
+        transport = "HTTP/2" if hasattr(api.session, 'is_warm') else "HTTP/1.1"
+        warm = {None: "未知", True: "命中", False: "未命中"}[api.first_request_warm]
+        print(ColorHandler.system_text(f"上游: {api.base_url}  传输: {transport}  首个请求{warm}预热连接"))
+        if hasattr(self.chat_handler.messages, 'memory_stats'):
+            memory = self.chat_handler.messages.memory_stats()
+            print(ColorHandler.system_text(
+                f"对话历史: {memory['messages']}条，内存中{memory['hot_messages']}条({memory['hot_bytes'] / 1024:.1f}KB)，"
+                f"已溢出到磁盘{memory['cold_messages']}条({memory['cold_bytes'] / 1024:.1f}KB)"))
+        compression = api.compression_stats() if hasattr(api, 'compression_stats') else {}
+        if compression.get("encoding", "off") != "off":
+            print(ColorHandler.system_text(
+                f"请求体压缩({compression['encoding']}): 已压缩{compression['compressed']}次，"
+                f"节省{compression['bytes_saved'] / 1024:.1f}KB，CPU耗时{compression['cpu_seconds'] * 1000:.1f}ms，"
+                f"端点被拒后回退{compression['fallbacks']}次"))
+        self._show_router_stats()
+        self._show_upstream_stats(api)
+        circuits = api.circuit_stats()
+        if not circuits:
+            print(ColorHandler.system_text("暂无熔断统计（尚未发送请求或熔断未启用）"))
+            return True
+        table = Table(title="熔断器状态")
+        table.add_column("端点/模型", no_wrap=True)
+        table.add_column("状态")
+        table.add_column("窗口内请求", justify="right")
+        table.add_column("失败率", justify="right")
+        table.add_column("熔断次数", justify="right")
+        table.add_column("已拒绝", justify="right")
+        table.add_column("恢复探测", justify="right")
+        styles = {"closed": "green", "half_open": "yellow", "open": "red"}
+        for name, circuit in sorted(circuits.items()):
+            table.add_row(
+                name,
+                f"[{styles[circuit['state']]}]{circuit['state']}[/]",
+                str(circuit["requests"]),
+                f"{circuit['failure_rate']:.0%}",
+                str(circuit["opened"]),
+                str(circuit["rejected"]),
+                f"{circuit['retry_after']:.0f}s" if circuit["state"] == "open" else "-",
+            )
+        console.print(table)
+        return True
+    
+    def _show_upstream_stats(self, api) -> None:
+        """配置了多个上游时显示各上游的负载和健康状态"""
+        if not hasattr(api, 'upstream_stats'):
+            return
+        table = Table(title=f"上游池（{api.policy}）")
+        table.add_column("上游", no_wrap=True)
+        table.add_column("地址")
+        table.add_column("权重", justify="right")
+        table.add_column("进行中", justify="right")
+        table.add_column("请求", justify="right")
+        table.add_column("失败", justify="right")
+        table.add_column("切换", justify="right")
+        table.add_column("平均耗时", justify="right")
+        table.add_column("状态")
+        for name, upstream in api.upstream_stats().items():
+            latency = upstream["latency"]
+            table.add_row(
+                name,
+                upstream["base_url"],
+                f"{upstream['weight']:g}",
+                str(upstream["outstanding"]),
+                str(upstream["requests"]),
+                str(upstream["failures"]),
+                str(upstream["failovers"]),
+                f"{latency['avg']:.2f}s" if latency.get("count") else "-",
+                f"[red]剔除中 {upstream['ejected_for']:.0f}s[/]" if upstream["ejected_for"] else "[green]正常[/]",
+            )
+        console.print(table)
+
+    def handle_tee(self, args: str = '') -> bool:
+        """开始或停止把对话记录写入文件，不带参数时显示输出状态"""
+        if not self.chat_handler:
+            return True
+        arg = args.strip()
+        # 有会话管理器时由其持有输出器，所有会话写入同一个文件
+        owner = self.session_manager or self.chat_handler
+        if not arg:
+            tee = owner.tee
+            if tee is None:
+                print(ColorHandler.system_text(f"未输出对话记录，用法: /tee <文件路径> [{'|'.join(TEE_FORMATS)}]，/tee off 停止"))
+                return True
+            stats = tee.snapshot()
+            print(ColorHandler.system_text(
+                f"对话记录输出到 {stats['path']}（{stats['format']}）: {stats['turns']}轮，已写入{stats['bytes'] / 1024:.1f}KB"
+                f"（{stats['batches']}批，fsync {stats['fsyncs']}次），队列中{stats['queued']}条，"
+                f"丢弃{stats['dropped']}个数据块"))
+            if stats["error"]:
+                print(ColorHandler.error_text(f"写入出错{stats['errors']}次，最近一次: {stats['error']}"))
+            return True
+        if arg.lower() == 'off':
+            tee = owner.stop_tee()
+            print(ColorHandler.system_text(f"已停止输出对话记录: {tee.path}" if tee else "未输出对话记录"))
+            return True
+        path, fmt = arg, None
+        parts = arg.rsplit(maxsplit=1)
+        if len(parts) == 2 and parts[1].lower() in TEE_FORMATS:
+            path, fmt = parts[0], parts[1].lower()
+        try:
+            tee = owner.start_tee(path, fmt)
+        except (OSError, ValueError) as e:
+            print(ColorHandler.error_text(f"无法输出对话记录: {str(e)}"))
+            return True
+        print(ColorHandler.system_text(f"之后的对话将追加写入 {tee.path}（{tee.format}）"))
+        return True
+
+    def handle_tokens(self) -> bool:
+        """显示当前对话的token估算"""
+        if not self.chat_handler:
+            return True
+        usage = self.chat_handler.token_usage()
+        used = usage["total"] + usage["attachments"]
+        roles = {"system": "系统", "user": "用户", "assistant": "助手", "tool": "工具"}
+        by_role = "，".join(f"{roles.get(role, role)}{tokens}" for role, tokens in usage["by_role"].items())
+        print(ColorHandler.system_text(f"对话历史约{usage['total']} tokens" + (f"（{by_role}）" if by_role else "")
+                                       + (f"，待发送附件约{usage['attachments']} tokens" if usage["attachments"] else "")))
+        print(ColorHandler.system_text(f"上下文上限{usage['limit']} tokens，已用{used / usage['limit']:.1%}，"
+                                       f"剩余约{max(0, usage['limit'] - used)} tokens"))
+        stats = self.chat_handler.tokens.snapshot()
+        lookups = stats["hits"] + stats["misses"]
+        backend = "分词器" if stats["backend"] == "tokenizer" else f"近似估算（校准比例{stats['scale']}）"
+        print(ColorHandler.system_text(f"估算方式: {backend}，消息计数缓存命中{stats['hits']}/{lookups}"))
+        budget = getattr(self.chat_handler.api, 'token_budget', None)
+        if budget is not None:
+            snapshot = budget.snapshot()
+            print(ColorHandler.system_text(f"token预算: 剩余{snapshot['tokens']:.0f}，每分钟补充{snapshot['rate'] * 60:.0f}"))
+        return True
+
+    def _show_router_stats(self) -> None:
+        """显示各模型的延迟统计和最近的自动路由决策"""
+        router = self.chat_handler.router
+        stats = router.stats()
+        if not stats:
+            return
+        table = Table(title="模型延迟（最近请求中位数）")
+        table.add_column("模型", no_wrap=True)
+        table.add_column("样本", justify="right")
+        table.add_column("首字延迟", justify="right")
+        table.add_column("总耗时", justify="right")
+        table.add_column("tokens/s", justify="right")
+        for model, summary in sorted(stats.items()):
+            table.add_row(
+                model,
+                str(summary["samples"]),
+                f"{summary['ttft']:.2f}s" if summary["ttft"] is not None else "-",
+                f"{summary['latency']:.2f}s",
+                f"{summary['tokens_per_second']:.1f}" if summary["tokens_per_second"] is not None else "-",
+            )
+        console.print(table)
+        for _, decision in list(router.decisions)[-3:]:
+            print(ColorHandler.system_text(f"自动路由 -> {decision.model}: {decision.reason}"))
+
+    def is_allowed_while_busy(self, user_input: str) -> bool:
+        """当前会话正在后台生成时，只允许不修改对话历史的命令"""
+        parts = user_input.strip().split(maxsplit=1)
+        return bool(parts) and parts[0].lower() in BUSY_SAFE_COMMANDS
+
+    def handle_session(self, args: str = '') -> bool:
+        """新建、切换、列出会话，或在后台生成当前会话的回复"""
+        manager = self.session_manager
+        if manager is None:
+            print(ColorHandler.system_text("会话管理未启用"))
+            return True
+        parts = args.strip().split(maxsplit=1)
+        action = parts[0].lower() if parts else 'list'
+        value = parts[1].strip() if len(parts) > 1 else ''
+        try:
+            if action == 'new':
+                session = manager.new(value or None)
+                self.chat_handler = session.chat_handler
+                print(ColorHandler.system_text(f"已新建并切换到会话 {session.name}"))
+            elif action == 'switch' and value:
+                session, results = manager.switch(value)
+                self.chat_handler = session.chat_handler
+                print(ColorHandler.system_text(f"已切换到会话 {session.name} ({len(session.chat_handler.messages)}条消息)"))
+                self.show_session_results(session, results)
+                if session.busy:
+                    print(ColorHandler.system_text(f"该会话正在后台生成回复 ({session.status})"))
+            elif action == 'list':
+                for info in manager.list_sessions():
+                    current = " (当前)" if info["current"] else ""
+                    print(ColorHandler.system_text(
+                        f"{info['name']}{current}  {AVAILABLE_MODELS.get(info['model'], info['model'])}  "
+                        f"{info['messages']}条消息  {info['status']}"))
+            elif action == 'bg' and value:
+                session = manager.submit(value)
+                print(ColorHandler.system_text(f"会话 {session.name} 已在后台生成回复，可使用 /session new 或 "
+                                               f"/session switch 继续其他对话"))
+            else:
+                print(ColorHandler.system_text(
+                    "用法: /session new [名称] | /session switch <名称> | /session list | /session bg <提示>"))
+        except (KeyError, ValueError, RuntimeError) as e:
+            print(ColorHandler.error_text(str(e).strip("'")))
+        return True
+
+    def show_session_results(self, session, results: List[Dict[str, object]]) -> None:
+        """展示会话在后台完成的回复"""
+        for result in results:
+            console.print(f"[dim]会话 {escape(session.name)} 的后台回复 ({result['elapsed']:.1f}s) - "
+                          f"{escape(result['prompt'][:40])}[/dim]")
+            for notice in result["notices"]:
+                print(ColorHandler.system_text(notice))
+            if result["error"]:
+                print(ColorHandler.error_text(f"错误: {result['error']}"))
+                continue
+            if result["reasoning"]:
+                ReasoningDisplay(console=console).show(result["reasoning"])
+                console.print("最终回复:")
+            else:
+                console.print("助手:")
+            console.print(Markdown(ColorHandler.assistant_text(result["reply"])))
+
     def add_command(self, command_name: str, command_func):
         """
         添加自定义命令
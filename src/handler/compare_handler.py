@@ -0,0 +1,213 @@
+"""
+多模型对比模块，把当前对话并发发送给多个模型，以并排窗格流式显示各自的回复
+"""
+import io
+import copy
+import time
+import threading
+from typing import Dict, List, Optional
+from rich.console import Console
+from rich.live import Live
+from rich.panel import Panel
+from rich.table import Table
+from rich.text import Text
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from handler.debug_handler import DebugHandler
+    from config.setting import AVAILABLE_MODELS
+except ImportError:
+    # 开发模式导入
+    from src.handler.debug_handler import DebugHandler
+    from src.config.setting import AVAILABLE_MODELS
+
+
+class CompareResult:
+    """单个模型的对比结果"""
+
+    def __init__(self, model: str):
+        self.model = model
+        self.reasoning = io.StringIO()
+        self.content = io.StringIO()
+        self.ttft: Optional[float] = None
+        self.latency: Optional[float] = None
+        self.usage: Optional[Dict[str, int]] = None
+        self.chunks = 0
+        self.error: Optional[str] = None
+        self.done = False
+
+    @property
+    def completion_tokens(self) -> int:
+        """输出token数，上游未返回用量时以数据块数量近似"""
+        if self.usage and self.usage.get('completion_tokens') is not None:
+            return self.usage['completion_tokens']
+        return self.chunks
+
+    @property
+    def status(self) -> str:
+        if self.error:
+            return "出错"
+        if not self.done:
+            return "生成中" if self.ttft is not None else "等待首字"
+        return "完成"
+
+
+class CompareHandler:
+    def __init__(self, chat_handler, models: Optional[List[str]] = None, console: Optional[Console] = None):
+        """
+        初始化对比处理器
+        :param chat_handler: 对话处理器，提供API客户端、对话历史和温度
+        :param models: 参与对比的模型，默认为全部可用模型
+        :param console: 输出用的控制台
+        """
+        self.chat_handler = chat_handler
+        self.models = models or list(AVAILABLE_MODELS.keys())
+        self.console = console or Console()
+        self._stop = threading.Event()
+        # 最近一次对比实际发送的用户消息，选中回复后原样写入对话历史
+        self.compared_message: Optional[Dict[str, str]] = None
+
+    def build_messages(self, prompt: Optional[str] = None) -> List[Dict[str, str]]:
+        """
+        构建发送给各模型的消息列表
+        :param prompt: 新的用户提示，为None时直接使用以用户消息结尾的当前对话
+        """
+        messages = self.chat_handler.request_messages()
+        if prompt:
+            if messages and messages[-1]['role'] == 'user':
+                raise ValueError("当前对话以未回复的用户消息结尾，请直接输入 /compare 对比该消息")
+            messages.append({"role": "user", "content": prompt})
+        elif not messages or messages[-1]['role'] != 'user':
+            raise ValueError("当前对话没有待回复的用户消息，请使用 /compare <提示>")
+        return messages
+
+    def run(self, prompt: Optional[str] = None) -> List[CompareResult]:
+        """
+        并发请求所有模型并实时渲染，Ctrl+C中断全部请求
+        :param prompt: 新的用户提示
+        :return: 各模型的对比结果
+        """
+        messages = self.build_messages(prompt)
+        self.compared_message = dict(messages[-1])
+        results = [CompareResult(model) for model in self.models]
+        self._stop.clear()
+        threads = []
+        for result in results:
+            # 上游调用会就地规范化消息内容，每个线程使用独立副本
+            thread = threading.Thread(target=self._worker, args=(result, copy.deepcopy(messages)), daemon=True)
+            thread.start()
+            threads.append(thread)
+
+        with Live(self.render(results), console=self.console, refresh_per_second=10) as live:
+            try:
+                while any(thread.is_alive() for thread in threads):
+                    time.sleep(0.1)
+                    live.update(self.render(results))
+            except KeyboardInterrupt:
+                DebugHandler.debug("对比被用户中断")
+                self._stop.set()
+                for thread in threads:
+                    thread.join(timeout=1.0)
+                for result in results:
+                    if not result.done:
+                        result.error = "已中断"
+            live.update(self.render(results))
+        return results
+
+    def _worker(self, result: CompareResult, messages: List[Dict[str, str]]) -> None:
+        """在后台线程中读取单个模型的流式回复"""
+        api = self.chat_handler.api
+        start = time.perf_counter()
+        stream = None
+        try:
+            stream = api.chat_completion_stream(messages=messages, model=result.model,
+                                                temperature=self.chat_handler.temperature)
+            for chunk in stream:
+                if self._stop.is_set():
+                    break
+                if chunk.get('usage'):
+                    result.usage = chunk['usage']
+                delta = chunk['choices'][0]['delta']
+                reasoning_chunk = delta.get('reasoning_content') or ''
+                content_chunk = delta.get('content') or ''
+                if not reasoning_chunk and not content_chunk:
+                    continue
+                if result.ttft is None:
+                    result.ttft = time.perf_counter() - start
+                result.chunks += 1
+                result.reasoning.write(reasoning_chunk)
+                result.content.write(content_chunk)
+        except Exception as e:
+            DebugHandler.debug(f"模型 {result.model} 对比请求出错: {str(e)}")
+            result.error = str(e)
+        finally:
+            if stream is not None and hasattr(stream, 'close'):
+                stream.close()
+            result.latency = time.perf_counter() - start
+            result.done = True
+
+    def render(self, results: List[CompareResult]) -> Table:
+        """渲染并排窗格，每个窗格只显示能放下的最后若干行"""
+        width = max(20, self.console.width // len(results) - 4)
+        height = max(5, self.console.height - 6)
+        grid = Table.grid(expand=True)
+        for _ in results:
+            grid.add_column(ratio=1)
+        panes = []
+        for result in results:
+            text = Text(result.reasoning.getvalue(), style="dim italic")
+            if text and result.content.tell():
+                text.append("\n\n")
+            text.append(result.content.getvalue())
+            if result.error:
+                text.append(f"\n{result.error}", style="red")
+            lines = text.wrap(self.console, width)
+            visible = Text("\n").join(lines[-height:]) if len(lines) > height else text
+            title = AVAILABLE_MODELS.get(result.model, result.model)
+            panes.append(Panel(visible, title=title, subtitle=self._format_stats(result),
+                               border_style="green" if result.done and not result.error else "blue",
+                               height=height + 2))
+        grid.add_row(*panes)
+        return grid
+
+    @staticmethod
+    def _format_stats(result: CompareResult) -> str:
+        ttft = f"{result.ttft:.2f}s" if result.ttft is not None else "-"
+        latency = f"{result.latency:.2f}s" if result.latency is not None else "-"
+        return f"{result.status} 首字{ttft} 总计{latency} {result.completion_tokens} tokens"
+
+    def print_summary(self, results: List[CompareResult]) -> None:
+        """输出各模型的延迟与token统计"""
+        table = Table(title="对比结果")
+        table.add_column("序号", justify="right")
+        table.add_column("模型")
+        table.add_column("首字延迟", justify="right")
+        table.add_column("总延迟", justify="right")
+        table.add_column("输出tokens", justify="right")
+        table.add_column("tokens/s", justify="right")
+        table.add_column("状态")
+        for number, result in enumerate(results, 1):
+            rate = result.completion_tokens / result.latency if result.latency else 0.0
+            table.add_row(
+                str(number),
+                AVAILABLE_MODELS.get(result.model, result.model),
+                f"{result.ttft:.2f}s" if result.ttft is not None else "-",
+                f"{result.latency:.2f}s" if result.latency is not None else "-",
+                f"{result.completion_tokens}{'' if result.usage else ' (估算)'}",
+                f"{rate:.1f}",
+                result.error or result.status,
+            )
+        self.console.print(table)
+
+    def commit(self, result: CompareResult, prompt: Optional[str] = None) -> None:
+        """
+        把选中的回复写入对话历史
+        :param result: 选中的对比结果
+        :param prompt: 发起对比时的新用户提示，对比前尚未写入历史
+        """
+        if prompt:
+            # 写入各模型实际收到的消息：不再解析模型前缀或拼接待发送的附件（附件仍留到下一轮发送）
+            content = self.compared_message["content"] if self.compared_message else prompt
+            self.chat_handler.add_user_message(content, model=result.model, raw=True)
+        self.chat_handler.add_assistant_message(result.content.getvalue(), model=result.model,
+                                                reasoning=result.reasoning.getvalue())
@@ -0,0 +1,164 @@
+"""
+对话存储模块，按内存预算保留最近的消息，较早的消息溢出到磁盘段文件
+
+消息按序号分为两段:
+  冷段 [0, hot_start)      - 已写入段文件，内存中只保留紧凑的偏移量/长度索引（array），读取时按需加载
+  热段 [hot_start, len)    - 保存在内存中，总大小超过预算时从最早的消息开始溢出
+无论会话多长，常驻内存只有热段消息和每条消息12字节的索引。
+"""
+import json
+import tempfile
+from array import array
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, Optional
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from handler.debug_handler import DebugHandler
+    from config.setting import CONVERSATION_HOT_BYTES, CONVERSATION_SPILL_DIR
+except ImportError:
+    # 开发模式导入
+    from src.handler.debug_handler import DebugHandler
+    from src.config.setting import CONVERSATION_HOT_BYTES, CONVERSATION_SPILL_DIR
+
+
+def _encode(message: Dict[str, object]) -> bytes:
+    return json.dumps(message, ensure_ascii=False).encode('utf-8')
+
+
+class ConversationStore:
+    """
+    有内存上限的对话历史，接口与消息列表一致（append/extend/len/下标/切片/迭代）
+
+    溢出到磁盘的消息每次读取都返回新解码的字典，修改返回值不会影响存储内容。
+    """
+
+    def __init__(self, messages: Optional[Iterable[Dict[str, object]]] = None,
+                 hot_bytes: int = CONVERSATION_HOT_BYTES, spill_dir: Optional[str] = CONVERSATION_SPILL_DIR):
+        """
+        初始化对话存储
+        :param messages: 初始消息
+        :param hot_bytes: 热段消息的内存预算(字节，按JSON编码后的长度估算)，最近一条消息始终保留在内存中
+        :param spill_dir: 段文件所在目录，默认使用系统临时目录
+        """
+        self.hot_bytes = hot_bytes
+        self.spill_dir = spill_dir
+        self._hot = deque()
+        self._hot_sizes = deque()
+        self._hot_total = 0
+        # 冷段索引：第i条消息在段文件中的偏移量和长度
+        self._offsets = array('Q')
+        self._lengths = array('I')
+        self._segment = None
+        self._segment_end = 0
+        if messages:
+            self.extend(messages)
+
+    @property
+    def hot_start(self) -> int:
+        """第一条仍在内存中的消息序号"""
+        return len(self._offsets)
+
+    def append(self, message: Dict[str, object]) -> None:
+        size = len(_encode(message))
+        self._hot.append(message)
+        self._hot_sizes.append(size)
+        self._hot_total += size
+        self._spill()
+
+    def extend(self, messages: Iterable[Dict[str, object]]) -> None:
+        for message in messages:
+            self.append(message)
+
+    def _spill(self) -> None:
+        """热段超出预算时把最早的消息写入段文件"""
+        if self._hot_total <= self.hot_bytes or len(self._hot) <= 1:
+            return
+        if self._segment is None:
+            # 匿名临时文件，关闭后自动删除
+            self._segment = tempfile.TemporaryFile(prefix="deepseek-conversation-", dir=self.spill_dir)
+        lines = []
+        while self._hot_total > self.hot_bytes and len(self._hot) > 1:
+            # 每条记录以换行结尾（JSON编码后的字符串中不会出现原始换行符），便于批量解码
+            data = _encode(self._hot.popleft()) + b'\n'
+            self._hot_total -= self._hot_sizes.popleft()
+            self._offsets.append(self._segment_end)
+            self._lengths.append(len(data))
+            self._segment_end += len(data)
+            lines.append(data)
+        self._segment.seek(0, 2)
+        self._segment.write(b''.join(lines))
+        self._segment.flush()
+        DebugHandler.debug(f"对话历史溢出{len(lines)}条消息到磁盘，冷段共{self.hot_start}条")
+
+    def _read_cold(self, start: int, stop: int) -> List[Dict[str, object]]:
+        """一次读取冷段中连续的[start, stop)条消息"""
+        if start >= stop:
+            return []
+        first = self._offsets[start]
+        self._segment.seek(first)
+        data = self._segment.read(self._offsets[stop - 1] + self._lengths[stop - 1] - first)
+        # 连续的记录拼成一个JSON数组一次解码，比逐条json.loads快得多
+        return json.loads(b'[' + data[:-1].replace(b'\n', b',') + b']')
+
+    def __len__(self) -> int:
+        return len(self._offsets) + len(self._hot)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[i] for i in range(start, stop, step)]
+            if start >= stop:
+                return []
+            cold = self._read_cold(start, min(stop, self.hot_start))
+            hot_start = self.hot_start
+            return cold + [self._hot[i - hot_start] for i in range(max(start, hot_start), stop)]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("对话历史下标越界")
+        if index >= self.hot_start:
+            return self._hot[index - self.hot_start]
+        return self._read_cold(index, index + 1)[0]
+
+    def __iter__(self) -> Iterator[Dict[str, object]]:
+        # 冷段按块顺序读取，避免一次性把整段历史载入内存
+        block = 256
+        for start in range(0, self.hot_start, block):
+            yield from self._read_cold(start, min(start + block, self.hot_start))
+        yield from list(self._hot)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, (ConversationStore, list)):
+            return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        return f"ConversationStore({len(self)}条消息, 内存中{len(self._hot)}条)"
+
+    def memory_stats(self) -> Dict[str, int]:
+        """热段与冷段的消息数和字节数"""
+        return {
+            "messages": len(self),
+            "hot_messages": len(self._hot),
+            "hot_bytes": self._hot_total,
+            "cold_messages": self.hot_start,
+            "cold_bytes": self._segment_end,
+            "index_bytes": self._offsets.itemsize * len(self._offsets) + self._lengths.itemsize * len(self._lengths),
+        }
+
+    def clear(self) -> None:
+        """清空对话并删除段文件"""
+        self.close()
+        self._hot.clear()
+        self._hot_sizes.clear()
+        self._hot_total = 0
+        self._offsets = array('Q')
+        self._lengths = array('I')
+        self._segment_end = 0
+
+    def close(self) -> None:
+        if self._segment is not None:
+            self._segment.close()
+            self._segment = None
@@ -1,7 +1,15 @@
 """调试处理模块，用于控制调试输出"""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
 
 class DebugHandler:
     _debug_mode = False
+    # 后台线程（如后台会话生成）的调试信息写入日志，避免打乱前台终端输出
+    _local = threading.local()
+    _print_lock = threading.Lock()
     
     @classmethod
     def is_debug_mode(cls) -> bool:
@@ -29,10 +37,21 @@ class DebugHandler:
         """
         cls._debug_mode = enabled
     
+    @classmethod
+    def set_background(cls, background: bool = True) -> None:
+        """标记当前线程为后台线程，其调试信息改为写入日志而不是打印到终端
+        :param background: 是否为后台线程
+        """
+        cls._local.background = background
+    
     @classmethod
     def debug(cls, message: str) -> None:
         """输出调试信息，仅在调试模式下有效
         :param message: 调试信息
         """
         if cls._debug_mode:
-            print(f"[DEBUG] {message}")
\ No newline at end of file
+            if getattr(cls._local, 'background', False):
+                logger.debug(f"[{threading.current_thread().name}] {message}")
+                return
+            with cls._print_lock:
+                print(f"[DEBUG] {message}")
\ No newline at end of file
@@ -25,6 +25,10 @@ class ErrorHandler:
             return 'connection_error'
         elif error_name == 'TimeoutError':
             return 'timeout_error'
+        elif error_name == 'CircuitOpenError':
+            return 'circuit_open'
+        elif error_name == 'ContextLimitError':
+            return 'context_limit'
         elif 'HTTPError' in error_name:
             status_code = getattr(error.response, 'status_code', None)
             if status_code == 401:
@@ -48,6 +52,8 @@ class ErrorHandler:
             'http_error': f'HTTP错误: {str(error)}',
             'auth_error': '认证错误: API密钥无效或未设置，请检查config/setting.py中的API_KEY配置',
             'bad_request': '无效请求参数: 请检查模型名称、消息格式和API端点',
+            'circuit_open': f'服务暂不可用: 上游连续出错已熔断，{getattr(error, "retry_after", 0):.0f}秒后自动探测恢复',
+            'context_limit': f'请求过长: {str(error)}，请缩短对话历史或减少附件',
             'unknown_error': f'未知错误: {str(error)}'
         }
         return messages.get(error_type, '未知错误')
@@ -0,0 +1,304 @@
+"""
+导出模块，把会话日志中的对话按轮导出为Parquet或Arrow IPC列式文件，供DuckDB/pandas分析
+
+每轮（一条用户消息及其最终回复）导出为一行：会话ID、轮次、时间、模型、提示、回复、推理过程、工具调用数、
+耗时和token用量。会话记录按块流式读取，行缓冲达到行数或字节预算时写出一个行组，内存占用与导出规模无关。
+
+增量导出：每次导出在输出目录中写入一个新的分片文件（part-*.parquet），_export_state.json记录各会话已导出到的
+消息序号，再次导出只处理新增的完整轮次。分片先写为临时文件，导出状态提交后才改为正式文件名，
+中断的导出既不会丢失也不会重复。
+查询示例: duckdb.sql("SELECT model, avg(latency_s) FROM 'out/*.parquet' GROUP BY model")
+"""
+import os
+import json
+import time
+import uuid
+import logging
+from typing import Dict, Iterable, Iterator, Optional, Tuple
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from handler.debug_handler import DebugHandler
+    from config.setting import EXPORT_FORMAT, EXPORT_ROW_GROUP_ROWS, EXPORT_ROW_GROUP_BYTES, EXPORT_COMPRESSION
+except ImportError:
+    # 开发模式导入
+    from src.handler.debug_handler import DebugHandler
+    from src.config.setting import EXPORT_FORMAT, EXPORT_ROW_GROUP_ROWS, EXPORT_ROW_GROUP_BYTES, EXPORT_COMPRESSION
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc  # noqa: F401
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pa = None
+    PYARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+STATE_FILE = "_export_state.json"
+PART_PREFIX = "part-"
+TMP_SUFFIX = ".tmp"
+# 文本列，计入行组的字节预算
+TEXT_COLUMNS = ("prompt", "reply", "reasoning")
+
+
+def _schema():
+    return pa.schema([
+        ("session_id", pa.string()),
+        ("turn", pa.int32()),
+        ("message_index", pa.int32()),
+        ("ts", pa.timestamp("ms", tz="UTC")),
+        ("model", pa.string()),
+        ("prompt", pa.string()),
+        ("reply", pa.string()),
+        ("reasoning", pa.string()),
+        ("reasoning_chars", pa.int32()),
+        ("tool_calls", pa.int16()),
+        ("latency_s", pa.float64()),
+        ("ttft_s", pa.float64()),
+        ("prompt_tokens", pa.int32()),
+        ("completion_tokens", pa.int32()),
+    ])
+
+
+def iter_turns(records: Iterable[Dict[str, object]], start: int = 0) -> Iterator[Tuple[Dict[str, object], int]]:
+    """
+    把消息记录按轮分组，每次只持有当前一轮
+    :param records: 从第start条开始的消息记录（会话日志记录，包含ts、model等元数据）
+    :param start: 第一条记录的消息序号
+    :return: (轮次数据, 该轮之后的消息序号)；末尾尚未得到回复的用户消息不产生轮次，留待下次导出
+    """
+    turn = None
+    for index, record in enumerate(records, start):
+        role = record.get("role")
+        if role == "user":
+            if turn is not None:
+                # 上一条用户消息没有得到回复（请求失败），作为无回复的一轮导出
+                yield turn, index
+            turn = {"message_index": index, "prompt": record.get("content") or '', "ts": record.get("ts"),
+                    "tool_calls": 0}
+        elif role == "assistant":
+            if turn is None:
+                turn = {"message_index": index, "prompt": None, "ts": record.get("ts"), "tool_calls": 0}
+            if record.get("tool_calls"):
+                turn["tool_calls"] += len(record["tool_calls"])
+                continue
+            turn.update(reply=record.get("content"), model=record.get("model"),
+                        reasoning=record.get("reasoning_content"), latency=record.get("latency"),
+                        ttft=record.get("ttft"), prompt_tokens=record.get("prompt_tokens"),
+                        completion_tokens=record.get("completion_tokens"))
+            yield turn, index + 1
+            turn = None
+
+
+class ExportHandler:
+    """列式导出器：流式写出行组，关闭时提交分片文件和导出状态"""
+
+    def __init__(self, out_dir: str, fmt: str = EXPORT_FORMAT, row_group_rows: int = EXPORT_ROW_GROUP_ROWS,
+                 row_group_bytes: int = EXPORT_ROW_GROUP_BYTES, include_reasoning: bool = False,
+                 compression: str = EXPORT_COMPRESSION):
+        """
+        初始化导出器
+        :param out_dir: 输出目录，存放分片文件和导出状态
+        :param fmt: parquet 或 arrow（Arrow IPC文件），同一目录只能使用一种格式
+        :param row_group_rows: 每个行组的最大行数
+        :param row_group_bytes: 每个行组中文本内容的字节预算
+        :param include_reasoning: 是否导出推理过程全文（始终导出推理过程长度）
+        :param compression: Parquet列压缩算法
+        """
+        if not PYARROW_AVAILABLE:
+            raise RuntimeError("导出需要安装pyarrow: pip install pyarrow")
+        if fmt not in FORMATS:
+            raise ValueError(f"不支持的导出格式: {fmt}，可选: {', '.join(FORMATS)}")
+        if row_group_rows < 1:
+            raise ValueError("row_group_rows必须大于0")
+        self.out_dir = out_dir
+        self.fmt = fmt
+        self.row_group_rows = row_group_rows
+        self.row_group_bytes = row_group_bytes
+        self.include_reasoning = include_reasoning
+        self.compression = compression
+        self._schema = _schema()
+        os.makedirs(out_dir, exist_ok=True)
+        self._state = self._load_state()
+        # 本次导出推进的位置，关闭时与分片文件一起提交
+        self._pending: Dict[str, Dict[str, int]] = {}
+        self._columns = {name: [] for name in self._schema.names}
+        self._rows = 0
+        self._bytes = 0
+        self._writer = None
+        self.part_name: Optional[str] = None
+        self.stats = {"sessions": 0, "turns": 0, "row_groups": 0}
+
+    @property
+    def _state_path(self) -> str:
+        return os.path.join(self.out_dir, STATE_FILE)
+
+    def _load_state(self) -> Dict[str, object]:
+        state = {"format": self.fmt, "sessions": {}, "parts": []}
+        if os.path.exists(self._state_path):
+            with open(self._state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get("format") != self.fmt:
+                raise ValueError(f"输出目录已包含{state.get('format')}格式的导出，不能追加{self.fmt}格式")
+        committed = set(state["parts"])
+        for name in committed:
+            # 状态已提交但分片尚未改名时中断，补完改名
+            path = os.path.join(self.out_dir, name)
+            if not os.path.exists(path) and os.path.exists(path + TMP_SUFFIX):
+                os.replace(path + TMP_SUFFIX, path)
+        # 清理中断的导出留下的临时文件和未提交的分片
+        for name in os.listdir(self.out_dir):
+            if name.startswith(PART_PREFIX) and (name.endswith(TMP_SUFFIX) or name not in committed):
+                os.remove(os.path.join(self.out_dir, name))
+                DebugHandler.debug(f"已清理未提交的导出分片: {name}")
+        return state
+
+    def position(self, session_id: str) -> Dict[str, int]:
+        """会话已导出到的位置: {"messages": 消息序号, "turns": 轮次数}"""
+        return dict(self._pending.get(session_id) or self._state["sessions"].get(session_id)
+                    or {"messages": 0, "turns": 0})
+
+    def export_session(self, journal, session_id: str) -> int:
+        """
+        增量导出会话日志中的一个会话
+        :param journal: JournalHandler，提供会话日志目录
+        :return: 本次导出的轮数
+        """
+        position = self.position(session_id)
+        count = journal.message_count(session_id)
+        if count < position["messages"]:
+            # 会话被覆盖保存（/save同名），无法区分哪些轮次已导出，从头重新导出
+            logger.warning(f"会话 {session_id} 的消息数少于上次导出位置，将从头重新导出")
+            position = {"messages": 0, "turns": 0}
+        if count == position["messages"]:
+            return 0
+        return self.add_records(session_id, journal.iter_records(session_id, position["messages"]), position)
+
+    def export_journal(self, journal, session_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        增量导出多个会话，默认为日志目录中的全部会话
+        :return: 本次导出的轮数
+        """
+        if session_ids is None:
+            session_ids = [s["session_id"] for s in sorted(journal.list_sessions(), key=lambda s: s["mtime"])]
+        else:
+            session_ids = list(session_ids)
+            for session_id in session_ids:
+                if not journal.exists(session_id):
+                    raise FileNotFoundError(f"会话不存在: {session_id}")
+        return sum(self.export_session(journal, session_id) for session_id in session_ids)
+
+    def export_chat_handler(self, chat_handler) -> int:
+        """导出ChatHandler当前对话（通过其会话日志读取，包含模型、耗时等元数据）"""
+        if not chat_handler.journal:
+            raise RuntimeError("会话日志未启用，请在config/setting.py中设置JOURNAL_ENABLED")
+        chat_handler.journal.sync()
+        return self.export_session(chat_handler.journal, chat_handler.journal.session_id)
+
+    def add_records(self, session_id: str, records: Iterable[Dict[str, object]],
+                    position: Optional[Dict[str, int]] = None) -> int:
+        """
+        导出一个会话的消息记录
+        :param session_id: 会话ID
+        :param records: 从position["messages"]开始的消息记录
+        :param position: 记录之前已导出的位置，默认为会话开头
+        :return: 导出的轮数
+        """
+        position = dict(position or {"messages": 0, "turns": 0})
+        exported = 0
+        for turn, next_index in iter_turns(records, position["messages"]):
+            self._add_row(session_id, position["turns"], turn)
+            position = {"messages": next_index, "turns": position["turns"] + 1}
+            exported += 1
+        if exported:
+            self._pending[session_id] = position
+            self.stats["sessions"] += 1
+            self.stats["turns"] += exported
+        return exported
+
+    def _add_row(self, session_id: str, turn_number: int, turn: Dict[str, object]) -> None:
+        reasoning = turn.get("reasoning") or ''
+        row = {
+            "session_id": session_id,
+            "turn": turn_number,
+            "message_index": turn["message_index"],
+            "ts": int(turn["ts"] * 1000) if turn.get("ts") is not None else None,
+            "model": turn.get("model"),
+            "prompt": turn["prompt"],
+            "reply": turn.get("reply"),
+            "reasoning": reasoning if self.include_reasoning else None,
+            "reasoning_chars": len(reasoning),
+            "tool_calls": turn["tool_calls"],
+            "latency_s": turn.get("latency"),
+            "ttft_s": turn.get("ttft"),
+            "prompt_tokens": turn.get("prompt_tokens"),
+            "completion_tokens": turn.get("completion_tokens"),
+        }
+        for name, value in row.items():
+            self._columns[name].append(value)
+        self._rows += 1
+        self._bytes += sum(len(row[name].encode('utf-8')) for name in TEXT_COLUMNS if row[name])
+        if self._rows >= self.row_group_rows or self._bytes >= self.row_group_bytes:
+            self._flush()
+
+    def _flush(self) -> None:
+        """把缓冲的行写出为一个行组"""
+        if not self._rows:
+            return
+        batch = pa.RecordBatch.from_pydict(self._columns, schema=self._schema)
+        if self._writer is None:
+            self.part_name = f"{PART_PREFIX}{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}{FORMATS[self.fmt]}"
+            tmp_path = os.path.join(self.out_dir, self.part_name + TMP_SUFFIX)
+            if self.fmt == "parquet":
+                self._writer = pq.ParquetWriter(tmp_path, self._schema, compression=self.compression)
+            else:
+                self._writer = pa.ipc.new_file(tmp_path, self._schema)
+        self._writer.write_batch(batch)
+        self.stats["row_groups"] += 1
+        DebugHandler.debug(f"导出行组: {self._rows}行，文本{self._bytes / 1024:.0f}KB")
+        self._columns = {name: [] for name in self._schema.names}
+        self._rows = 0
+        self._bytes = 0
+
+    def close(self) -> Dict[str, int]:
+        """写出剩余的行，提交分片文件和导出状态"""
+        self._flush()
+        if self._writer is None:
+            return self.stats
+        self._writer.close()
+        self._writer = None
+        state = {
+            "format": self.fmt,
+            "sessions": dict(self._state["sessions"], **self._pending),
+            "parts": self._state["parts"] + [self.part_name],
+        }
+        # 先提交状态再把分片改为正式文件名：提交前中断则分片被清理、下次重新导出，提交后中断则下次补完改名
+        tmp_state = self._state_path + TMP_SUFFIX
+        with open(tmp_state, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_state, self._state_path)
+        part_path = os.path.join(self.out_dir, self.part_name)
+        os.replace(part_path + TMP_SUFFIX, part_path)
+        self._state = state
+        self._pending = {}
+        return self.stats
+
+    def abort(self) -> None:
+        """放弃本次导出，删除临时分片，导出状态保持不变"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            os.remove(os.path.join(self.out_dir, self.part_name + TMP_SUFFIX))
+        self._pending = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,317 @@
+"""
+会话日志模块，将每轮对话以追加方式写入按会话划分的JSONL日志
+
+每个会话对应两个文件:
+  <session_id>.jsonl - 每行一条消息记录
+  <session_id>.idx   - 定长索引，每条记录为(偏移量, 长度)，加载时按索引直接切片读取
+"""
+import os
+import re
+import json
+import time
+import uuid
+import struct
+from typing import Dict, Iterator, List, Optional
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from config.setting import JOURNAL_DIR, JOURNAL_FSYNC, JOURNAL_FSYNC_INTERVAL
+except ImportError:
+    # 开发模式导入
+    import sys
+    from pathlib import Path
+    current_file = Path(__file__).resolve()
+    project_root = current_file.parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+    from src.config.setting import JOURNAL_DIR, JOURNAL_FSYNC, JOURNAL_FSYNC_INTERVAL
+
+# 索引记录格式: 8字节偏移量 + 4字节长度（小端）
+INDEX_RECORD = struct.Struct('<QI')
+FSYNC_POLICIES = ('always', 'turn', 'interval', 'never')
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_.-]+$')
+# 加载会话时恢复到对话历史中的字段，其余为时间戳、模型、推理过程等元数据
+MESSAGE_FIELDS = ('role', 'content', 'tool_calls', 'tool_call_id')
+
+
+class JournalHandler:
+    """会话日志处理器，负责追加写入、加载和列出会话"""
+
+    def __init__(self, session_id: Optional[str] = None, journal_dir: str = JOURNAL_DIR,
+                 fsync_policy: str = JOURNAL_FSYNC, fsync_interval: float = JOURNAL_FSYNC_INTERVAL):
+        """
+        初始化会话日志
+        :param session_id: 会话ID，为None时自动生成
+        :param journal_dir: 日志目录
+        :param fsync_policy: fsync策略，可选 always/turn/interval/never
+        :param fsync_interval: interval策略下两次fsync的最小间隔(秒)
+        """
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"无效的fsync策略: {fsync_policy}，允许的策略: {'/'.join(FSYNC_POLICIES)}")
+        self.journal_dir = journal_dir
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.session_id = self._check_session_id(session_id) if session_id else self.new_session_id()
+        self._journal_file = None
+        self._index_file = None
+        self._last_fsync = 0.0
+
+    @staticmethod
+    def new_session_id() -> str:
+        """生成新的会话ID（时间戳+随机后缀，按时间排序）"""
+        return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+    @staticmethod
+    def _check_session_id(session_id: str) -> str:
+        """校验会话ID，防止路径穿越"""
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise ValueError(f"无效的会话ID: {session_id}，只允许字母、数字以及 _ . -")
+        return session_id
+
+    def _paths(self, session_id: str):
+        return (os.path.join(self.journal_dir, f"{session_id}.jsonl"),
+                os.path.join(self.journal_dir, f"{session_id}.idx"))
+
+    def _open(self) -> None:
+        """延迟打开日志文件，只有真正写入时才创建"""
+        if self._journal_file is None:
+            os.makedirs(self.journal_dir, exist_ok=True)
+            journal_path, index_path = self._paths(self.session_id)
+            self._journal_file = open(journal_path, 'ab')
+            self._index_file = open(index_path, 'ab')
+            self._repair_index(journal_path)
+
+    def _repair_index(self, journal_path: str) -> None:
+        """补齐索引：崩溃可能导致日志已写入但索引缺失，只扫描未索引的尾部"""
+        index_size = os.path.getsize(self._index_file.name)
+        if index_size % INDEX_RECORD.size:
+            # 丢弃不完整的索引记录，保证后续记录对齐
+            self._index_file.truncate(index_size - index_size % INDEX_RECORD.size)
+            self._index_file.seek(0, os.SEEK_END)
+        indexed_end = self._indexed_end(self._index_file.name)
+        journal_size = os.path.getsize(journal_path)
+        if indexed_end >= journal_size:
+            return
+        with open(journal_path, 'rb') as f:
+            f.seek(indexed_end)
+            offset = indexed_end
+            for line in f:
+                if not line.endswith(b'\n'):
+                    # 不完整的尾行（写入时崩溃），截断后丢弃
+                    self._journal_file.truncate(offset)
+                    # truncate不移动文件位置，append按tell()记录偏移量，需要重新定位到末尾
+                    self._journal_file.seek(0, os.SEEK_END)
+                    break
+                self._index_file.write(INDEX_RECORD.pack(offset, len(line)))
+                offset += len(line)
+        self._index_file.flush()
+
+    @staticmethod
+    def _indexed_end(index_path: str) -> int:
+        """返回索引覆盖到的日志末尾偏移量"""
+        size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+        size -= size % INDEX_RECORD.size
+        if size == 0:
+            return 0
+        with open(index_path, 'rb') as f:
+            f.seek(size - INDEX_RECORD.size)
+            offset, length = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+        return offset + length
+
+    def append(self, message: Dict[str, str], end_of_turn: bool = False, **meta) -> None:
+        """
+        追加一条消息记录
+        :param message: 消息字典，包含role和content
+        :param end_of_turn: 是否为一轮对话的结束（用于turn策略的fsync）
+        :param meta: 附加元数据，如model
+        """
+        self._open()
+        record = dict(message, ts=time.time(), **meta)
+        line = json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n'
+        offset = self._journal_file.tell()
+        self._journal_file.write(line)
+        self._journal_file.flush()
+        # 先写日志再写索引，崩溃时最多丢失一条索引，可由_repair_index补齐
+        self._index_file.write(INDEX_RECORD.pack(offset, len(line)))
+        self._index_file.flush()
+        if self._should_fsync(end_of_turn):
+            self.sync()
+
+    def _should_fsync(self, end_of_turn: bool) -> bool:
+        if self.fsync_policy == 'always':
+            return True
+        if self.fsync_policy == 'turn':
+            return end_of_turn
+        if self.fsync_policy == 'interval':
+            return time.monotonic() - self._last_fsync >= self.fsync_interval
+        return False
+
+    def sync(self) -> None:
+        """将日志和索引强制落盘"""
+        if self._journal_file is None:
+            return
+        self._journal_file.flush()
+        self._index_file.flush()
+        os.fsync(self._journal_file.fileno())
+        os.fsync(self._index_file.fileno())
+        self._last_fsync = time.monotonic()
+
+    def close(self) -> None:
+        """关闭日志文件"""
+        if self._journal_file is not None:
+            self.sync()
+            self._journal_file.close()
+            self._index_file.close()
+            self._journal_file = None
+            self._index_file = None
+
+    def switch(self, session_id: Optional[str] = None) -> str:
+        """
+        切换到另一个会话日志（后续消息写入该会话）
+        :param session_id: 目标会话ID，为None时新建会话
+        :return: 新的会话ID
+        """
+        self.close()
+        self.session_id = self._check_session_id(session_id) if session_id else self.new_session_id()
+        return self.session_id
+
+    def save_as(self, session_id: str, messages: List[Dict[str, str]]) -> str:
+        """
+        将当前对话完整写入指定ID的新会话，并切换到该会话继续记录
+        :param session_id: 目标会话ID
+        :param messages: 对话消息列表
+        :return: 会话ID
+        """
+        self.switch(session_id)
+        for path in self._paths(self.session_id):
+            if os.path.exists(path):
+                os.remove(path)
+        for message in messages:
+            self.append(message)
+        self.sync()
+        return session_id
+
+    def load(self, session_id: str, last_n: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        加载会话消息：按索引一次性读取日志并直接切片，无需逐行扫描
+        :param session_id: 会话ID
+        :param last_n: 只加载最后N条消息，为None时加载全部
+        :return: 消息列表（包含role、content以及工具调用相关字段）
+        """
+        count = self.message_count(session_id)
+        start = max(0, count - last_n) if last_n else 0
+        return [{key: record[key] for key in MESSAGE_FIELDS if key in record}
+                for record in self.read_records(session_id, start)]
+
+    def message_count(self, session_id: str) -> int:
+        """由索引文件大小直接计算会话的消息数量"""
+        _, index_path = self._paths(self._check_session_id(session_id))
+        return os.path.getsize(index_path) // INDEX_RECORD.size if os.path.exists(index_path) else 0
+
+    def exists(self, session_id: str) -> bool:
+        """
+        会话日志是否存在
+        :raises ValueError: 会话ID无效
+        """
+        return os.path.exists(self._paths(self._check_session_id(session_id))[0])
+
+    def _checked_paths(self, session_id: str):
+        """返回已存在会话的日志和索引路径，索引缺失或不完整时先补齐"""
+        session_id = self._check_session_id(session_id)
+        journal_path, index_path = self._paths(session_id)
+        if not os.path.exists(journal_path):
+            raise FileNotFoundError(f"会话不存在: {session_id}")
+        if not os.path.exists(index_path) or self._indexed_end(index_path) < os.path.getsize(journal_path):
+            # 索引缺失或不完整时，通过一次写打开补齐
+            repair = JournalHandler(session_id, self.journal_dir, 'never')
+            repair._open()
+            repair.close()
+        return journal_path, index_path
+
+    def read_records(self, session_id: str, start: int = 0) -> List[Dict[str, object]]:
+        """
+        读取会话中从第start条开始的完整记录（包含时间戳等元数据）
+        :param session_id: 会话ID
+        :param start: 起始消息序号
+        :return: 记录列表
+        """
+        journal_path, index_path = self._checked_paths(session_id)
+        with open(index_path, 'rb') as f:
+            f.seek(start * INDEX_RECORD.size)
+            index_data = f.read()
+        count = len(index_data) // INDEX_RECORD.size
+        if count == 0:
+            return []
+        first_offset, _ = INDEX_RECORD.unpack_from(index_data, 0)
+        with open(journal_path, 'rb') as f:
+            f.seek(first_offset)
+            data = f.read()
+        records = []
+        for offset, length in INDEX_RECORD.iter_unpack(index_data[:count * INDEX_RECORD.size]):
+            records.append(json.loads(data[offset - first_offset:offset - first_offset + length]))
+        return records
+
+    def read_record(self, session_id: str, index: int) -> Optional[Dict[str, object]]:
+        """
+        通过索引文件中的偏移量只读取并解析第index条记录
+        :param session_id: 会话ID
+        :param index: 消息序号
+        :return: 记录，序号超出范围时返回None
+        """
+        journal_path, index_path = self._checked_paths(session_id)
+        if index < 0:
+            return None
+        with open(index_path, 'rb') as f:
+            f.seek(index * INDEX_RECORD.size)
+            entry = f.read(INDEX_RECORD.size)
+        if len(entry) < INDEX_RECORD.size:
+            return None
+        offset, length = INDEX_RECORD.unpack(entry)
+        with open(journal_path, 'rb') as f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def iter_records(self, session_id: str, start: int = 0, block: int = 1024) -> Iterator[Dict[str, object]]:
+        """
+        按块流式读取会话记录，每次只载入block条记录，内存占用与会话长度无关（用于导出）
+        :param session_id: 会话ID
+        :param start: 起始消息序号
+        :param block: 每次读取的记录数
+        """
+        journal_path, index_path = self._checked_paths(session_id)
+        with open(index_path, 'rb') as index_file, open(journal_path, 'rb') as journal_file:
+            index_file.seek(start * INDEX_RECORD.size)
+            while True:
+                index_data = index_file.read(block * INDEX_RECORD.size)
+                count = len(index_data) // INDEX_RECORD.size
+                if count == 0:
+                    return
+                entries = list(INDEX_RECORD.iter_unpack(index_data[:count * INDEX_RECORD.size]))
+                first_offset = entries[0][0]
+                journal_file.seek(first_offset)
+                data = journal_file.read(entries[-1][0] + entries[-1][1] - first_offset)
+                for offset, length in entries:
+                    yield json.loads(data[offset - first_offset:offset - first_offset + length])
+
+    def list_sessions(self) -> List[Dict[str, object]]:
+        """
+        列出所有会话，消息数量直接由索引文件大小计算
+        :return: 会话信息列表，按修改时间倒序
+        """
+        if not os.path.isdir(self.journal_dir):
+            return []
+        sessions = []
+        for name in os.listdir(self.journal_dir):
+            if not name.endswith('.jsonl'):
+                continue
+            session_id = name[:-len('.jsonl')]
+            journal_path, index_path = self._paths(session_id)
+            index_size = os.path.getsize(index_path) if os.path.exists(index_path) else 0
+            sessions.append({
+                "session_id": session_id,
+                "messages": index_size // INDEX_RECORD.size,
+                "size": os.path.getsize(journal_path),
+                "mtime": os.path.getmtime(journal_path),
+            })
+        sessions.sort(key=lambda s: s["mtime"], reverse=True)
+        return sessions
@@ -0,0 +1,146 @@
+"""
+推理过程显示模块，控制推理模型的推理过程在终端中的输出量
+
+显示模式:
+  full     - 逐块输出全部推理过程（原有行为）
+  hidden   - 只显示动态指示器、token计数和耗时，结束后输出一行摘要
+  tail     - 固定高度的窗口滚动显示最后N行，结束后保留窗口
+  collapse - 生成时与tail相同，结束后折叠为一行摘要
+除full外，终端按固定频率重绘固定行数，写入量与推理长度无关。
+显示模式只影响终端输出，推理过程仍完整保存在内存和会话日志中，可通过 /reasoning 查看。
+"""
+import sys
+import time
+import threading
+from collections import deque
+from typing import Optional
+from rich.console import Console, Group
+from rich.live import Live
+from rich.markdown import Markdown
+from rich.spinner import Spinner
+from rich.text import Text
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from handler.color_handler import ColorHandler
+    from handler.attachment_handler import estimate_tokens
+    from config.setting import REASONING_DISPLAY, REASONING_TAIL_LINES, REASONING_REFRESH_PER_SECOND
+except ImportError:
+    # 开发模式导入
+    from src.handler.color_handler import ColorHandler
+    from src.handler.attachment_handler import estimate_tokens
+    from src.config.setting import REASONING_DISPLAY, REASONING_TAIL_LINES, REASONING_REFRESH_PER_SECOND
+
+DISPLAY_MODES = ("full", "hidden", "tail", "collapse")
+
+
+class ReasoningDisplay:
+    # 当前显示模式，所有会话共用，由 /reasoning <模式> 切换
+    _mode = REASONING_DISPLAY if REASONING_DISPLAY in DISPLAY_MODES else "full"
+
+    @classmethod
+    def get_mode(cls) -> str:
+        return cls._mode
+
+    @classmethod
+    def set_mode(cls, mode: str) -> None:
+        """设置显示模式
+        :param mode: full / hidden / tail / collapse
+        """
+        if mode not in DISPLAY_MODES:
+            raise ValueError(f"未知的推理显示模式: {mode}，可选: {', '.join(DISPLAY_MODES)}")
+        cls._mode = mode
+
+    def __init__(self, mode: Optional[str] = None, console: Optional[Console] = None,
+                 tail_lines: int = REASONING_TAIL_LINES, refresh_per_second: float = REASONING_REFRESH_PER_SECOND):
+        """
+        初始化一次回复的推理过程显示
+        :param mode: 显示模式，默认使用当前全局模式
+        :param console: 输出用的控制台
+        :param tail_lines: tail/collapse模式下窗口显示的行数
+        :param refresh_per_second: 窗口重绘频率，决定终端写入量的上限
+        """
+        self.mode = mode or self._mode
+        self.console = console or Console()
+        self.refresh_per_second = refresh_per_second
+        self.tokens = 0
+        self.started: Optional[float] = None
+        self.elapsed = 0.0
+        self.done = False
+        # 窗口只保留最后几行，完整推理过程由调用方保存
+        self._lines = deque(maxlen=tail_lines)
+        self._partial = ''
+        self._lock = threading.Lock()
+        self._live: Optional[Live] = None
+        self._spinner = Spinner("dots", style="yellow")
+
+    def write(self, chunk: str) -> None:
+        """输入一段推理内容"""
+        if not chunk or self.done:
+            return
+        if self.started is None:
+            self._start()
+        if self.mode == "full":
+            sys.stdout.write(ColorHandler.reasoning_text(chunk))
+            sys.stdout.flush()
+            return
+        with self._lock:
+            self.tokens += estimate_tokens(chunk)
+            lines = chunk.split('\n')
+            self._partial += lines[0]
+            for line in lines[1:]:
+                self._lines.append(self._partial)
+                self._partial = line
+
+    def _start(self) -> None:
+        self.started = time.monotonic()
+        if self.mode == "full":
+            self.console.print("推理过程：\n")
+            return
+        # 窗口由Live的刷新线程按固定频率重绘，推理内容到达得再快也不会增加终端输出
+        self._live = Live(self, console=self.console, refresh_per_second=self.refresh_per_second,
+                          transient=self.mode != "tail")
+        self._live.start()
+
+    def _status(self) -> str:
+        elapsed = self.elapsed if self.done else time.monotonic() - self.started
+        return f"{'推理完成' if self.done else '推理中'} 约{self.tokens} tokens {elapsed:.1f}s"
+
+    def __rich__(self):
+        with self._lock:
+            self._spinner.update(text=Text(self._status(), style="dim"))
+            if self.mode == "hidden":
+                return self._spinner
+            lines = list(self._lines) + ([self._partial] if self._partial else [])
+            tail = Text("\n".join(lines[-self._lines.maxlen:]), style="yellow dim", no_wrap=True,
+                        overflow="ellipsis")
+            status = Text(self._status(), style="dim") if self.done else self._spinner
+            return Group(tail, status)
+
+    def finish(self) -> None:
+        """推理结束（开始输出正式回复、中断或出错时调用，可重复调用）"""
+        if self.done or self.started is None:
+            self.done = True
+            return
+        with self._lock:
+            self.elapsed = time.monotonic() - self.started
+            self.done = True
+        if self.mode == "full":
+            return
+        self._live.stop()
+        if self.mode != "tail":
+            self.console.print(f"[dim]推理过程已{'隐藏' if self.mode == 'hidden' else '折叠'}"
+                               f"（约{self.tokens} tokens，{self.elapsed:.1f}s），输入 /reasoning 查看[/dim]",
+                               highlight=False)
+
+    def show(self, reasoning: str) -> None:
+        """非流式回复：按显示模式一次性输出完整的推理过程"""
+        if self.mode == "full":
+            self.console.print("推理过程:")
+            self.console.print(Markdown(ColorHandler.reasoning_text(reasoning)))
+            return
+        self.tokens = estimate_tokens(reasoning)
+        if self.mode == "tail":
+            lines = reasoning.rstrip('\n').split('\n')[-self._lines.maxlen:]
+            self.console.print(Text("\n".join(lines), style="yellow dim", no_wrap=True, overflow="ellipsis"))
+        self.console.print(f"[dim]推理过程约{self.tokens} tokens，输入 /reasoning 查看完整内容[/dim]", highlight=False)
@@ -0,0 +1,217 @@
+"""
+自动模型路由模块（/model auto），按轮为每条用户消息选择模型
+
+路由依据两部分:
+  提示特征 - 证明/推导类关键词、数学表达式、代码、多个问题、长度等，每项计入得分
+  延迟统计 - 本客户端最近请求的首字延迟、总耗时和吞吐量（按模型滚动统计）
+得分达到阈值才使用推理模型；推理模型比快速模型预期慢得越多，阈值越高。
+推理模型已熔断时直接使用快速模型。每次决策都写入日志，消息可用前缀（如@reasoner）覆盖本轮模型。
+"""
+import re
+import time
+import logging
+import threading
+from collections import deque
+from statistics import median
+from typing import Dict, List, NamedTuple, Optional, Tuple
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from handler.debug_handler import DebugHandler
+    from handler.attachment_handler import estimate_tokens
+    from config.setting import (ROUTER_FAST_MODEL, ROUTER_REASONING_MODEL, ROUTER_THRESHOLD,
+                                ROUTER_LATENCY_WEIGHT, ROUTER_STATS_WINDOW, ROUTER_PRIOR_LATENCY, ROUTER_OVERRIDES)
+except ImportError:
+    # 开发模式导入
+    from src.handler.debug_handler import DebugHandler
+    from src.handler.attachment_handler import estimate_tokens
+    from src.config.setting import (ROUTER_FAST_MODEL, ROUTER_REASONING_MODEL, ROUTER_THRESHOLD,
+                                    ROUTER_LATENCY_WEIGHT, ROUTER_STATS_WINDOW, ROUTER_PRIOR_LATENCY,
+                                    ROUTER_OVERRIDES)
+
+logger = logging.getLogger(__name__)
+
+# 提示特征，各项得分见ModelRouter.score
+STRONG_REASONING = re.compile(
+    r'证明|推导|求解|解方程|数学归纳|反证|时间复杂度|空间复杂度|一步一步|逐步推理|'
+    r'\bprove\b|\bproof\b|\bderive\b|step[- ]by[- ]step|\bsolve\b|complexity', re.I)
+WEAK_REASONING = re.compile(
+    r'为什么|原因|分析|比较|对比|权衡|设计|架构|优化|算法|计算|概率|排查|调试|报错|'
+    r'\bwhy\b|analy[sz]e|compare|trade-?off|design|architect|optimi[sz]e|algorithm|calculate|debug', re.I)
+MATH = re.compile(r'\d\s*[-+*/^=<>]\s*\d|\\(?:frac|sum|int|sqrt)|[∑∫√≤≥≠∞]|\b(?:sin|cos|log)\s*\(')
+CODE = re.compile(r'```|^\s*(?:def|class|function|public|#include|import)\s', re.M)
+QUESTION = re.compile(r'[?？]')
+LIST_ITEM = re.compile(r'^\s*(?:\d+[.、)]|[-*])\s+', re.M)
+TRIVIAL = re.compile(r'^(?:你好|您好|谢谢|多谢|早上好|晚安|hi|hello|hey|thanks?|thank you)\b|'
+                     r'翻译|润色|改写|总结|摘要|\btranslate\b|\brephrase\b|\bsummari[sz]e\b', re.I)
+# 简短的追问沿用上一轮的模型
+CONTINUATION = re.compile(r'^(?:继续|接着说?|然后呢|详细点|展开说说|还有呢|continue|go on|more)[。.!！]?$', re.I)
+
+
+class RouteDecision(NamedTuple):
+    model: str
+    reason: str
+    score: float = 0.0
+    threshold: float = 0.0
+
+
+class LatencyStats:
+    """单个模型最近请求的耗时样本"""
+
+    def __init__(self, window: int = ROUTER_STATS_WINDOW):
+        # (首字延迟或None, 总耗时, 生成token数)
+        self.samples = deque(maxlen=window)
+
+    def add(self, ttft: Optional[float], latency: float, tokens: int) -> None:
+        self.samples.append((ttft, latency, tokens))
+
+    def summary(self) -> Dict[str, Optional[float]]:
+        ttfts = [ttft for ttft, _, _ in self.samples if ttft is not None]
+        latencies = [latency for _, latency, _ in self.samples]
+        rates = [tokens / (latency - (ttft or 0)) for ttft, latency, tokens in self.samples
+                 if latency - (ttft or 0) > 0]
+        return {
+            "samples": len(self.samples),
+            "ttft": median(ttfts) if ttfts else None,
+            "latency": median(latencies) if latencies else None,
+            "tokens_per_second": median(rates) if rates else None,
+        }
+
+
+class ModelRouter:
+    """自动模型路由器，多个会话可共享同一个实例（共享延迟统计），线程安全"""
+
+    def __init__(self, fast_model: str = ROUTER_FAST_MODEL, reasoning_model: str = ROUTER_REASONING_MODEL,
+                 threshold: float = ROUTER_THRESHOLD, latency_weight: float = ROUTER_LATENCY_WEIGHT,
+                 window: int = ROUTER_STATS_WINDOW, prior_latency: Optional[Dict[str, float]] = None):
+        """
+        初始化路由器
+        :param fast_model: 默认使用的快速模型
+        :param reasoning_model: 需要推理时使用的模型
+        :param threshold: 使用推理模型的基础得分阈值
+        :param latency_weight: 推理模型每多1秒预期耗时，阈值提高的分数
+        :param window: 每个模型保留的耗时样本数
+        :param prior_latency: 尚无样本时各模型的预期耗时(秒)
+        """
+        self.fast_model = fast_model
+        self.reasoning_model = reasoning_model
+        self.threshold = threshold
+        self.latency_weight = latency_weight
+        self.window = window
+        self.prior_latency = ROUTER_PRIOR_LATENCY if prior_latency is None else prior_latency
+        self._stats: Dict[str, LatencyStats] = {}
+        self._lock = threading.Lock()
+        self.decisions = deque(maxlen=50)
+
+    @staticmethod
+    def parse_override(content: str) -> Tuple[str, Optional[str]]:
+        """
+        解析消息开头的单轮覆盖前缀
+        :return: (去掉前缀后的消息, 覆盖的模型)，没有前缀时模型为None
+        """
+        head, _, rest = content.lstrip().partition(' ')
+        model = ROUTER_OVERRIDES.get(head.lower())
+        if model is None or not rest.strip():
+            return content, None
+        return rest.lstrip(), model
+
+    def record(self, model: str, ttft: Optional[float], latency: float, tokens: int) -> None:
+        """
+        记录一次成功请求的耗时
+        :param ttft: 首个正式回复内容的延迟(秒)，非流式请求为None
+        :param latency: 请求总耗时(秒)
+        :param tokens: 生成的token数（含推理过程）
+        """
+        with self._lock:
+            stats = self._stats.get(model)
+            if stats is None:
+                stats = self._stats[model] = LatencyStats(self.window)
+            stats.add(ttft, latency, tokens)
+
+    def expected_latency(self, model: str) -> float:
+        """模型的预期耗时：最近样本的中位数，没有样本时使用先验值"""
+        with self._lock:
+            stats = self._stats.get(model)
+            latency = stats.summary()["latency"] if stats else None
+        return latency if latency is not None else self.prior_latency.get(model, 0.0)
+
+    def stats(self) -> Dict[str, Dict[str, Optional[float]]]:
+        with self._lock:
+            return {model: stats.summary() for model, stats in self._stats.items()}
+
+    @staticmethod
+    def score(prompt: str) -> Tuple[float, List[str]]:
+        """
+        按提示特征打分，分数越高越需要推理模型
+        :return: (得分, 命中的特征说明)
+        """
+        score = 0.0
+        reasons = []
+        strong = {match.lower() for match in STRONG_REASONING.findall(prompt)}
+        if strong:
+            score += 3.0 * min(len(strong), 2)
+            reasons.append(f"推理关键词({'/'.join(sorted(strong))})")
+        weak = {match.lower() for match in WEAK_REASONING.findall(prompt)}
+        if weak:
+            score += min(len(weak), 2)
+            reasons.append(f"分析关键词({'/'.join(sorted(weak))})")
+        if MATH.search(prompt):
+            score += 1.5
+            reasons.append("数学表达式")
+        if CODE.search(prompt):
+            score += 1.0
+            reasons.append("代码")
+        if len(QUESTION.findall(prompt)) >= 2 or len(LIST_ITEM.findall(prompt)) >= 3:
+            score += 1.0
+            reasons.append("多个问题")
+        tokens = estimate_tokens(prompt)
+        if tokens > 800:
+            score += 1.0
+            reasons.append(f"长提示(约{tokens} tokens)")
+        if TRIVIAL.search(prompt.strip()):
+            score -= 1.5
+            reasons.append("寒暄/翻译/改写类")
+        if tokens < 20 and not (strong or weak):
+            score -= 1.0
+            reasons.append("简短提示")
+        return score, reasons
+
+    def _circuit_open(self, api, model: str) -> bool:
+        circuits = api.circuit_stats() if api is not None and hasattr(api, 'circuit_stats') else {}
+        # 多上游时只有所有上游上该模型都已熔断才视为不可用
+        states = [circuit["state"] for name, circuit in circuits.items() if name.endswith(f":{model}")]
+        return bool(states) and all(state == "open" for state in states)
+
+    def route(self, prompt: str, previous: Optional[str] = None, api=None) -> RouteDecision:
+        """
+        为一条用户消息选择模型
+        :param prompt: 用户消息（不含附件内容）
+        :param previous: 上一轮自动选择的模型，简短追问时沿用
+        :param api: API客户端，用于检查推理模型是否已熔断
+        """
+        if previous and CONTINUATION.match(prompt.strip()):
+            decision = RouteDecision(previous, "简短追问，沿用上一轮模型")
+        elif self._circuit_open(api, self.reasoning_model):
+            decision = RouteDecision(self.fast_model, "推理模型已熔断")
+        else:
+            score, reasons = self.score(prompt)
+            # 推理模型比快速模型预期慢得越多，需要越强的特征才值得等待
+            extra = max(0.0, self.expected_latency(self.reasoning_model) - self.expected_latency(self.fast_model))
+            threshold = self.threshold + self.latency_weight * extra
+            model = self.reasoning_model if score >= threshold else self.fast_model
+            reason = '、'.join(reasons) or "无明显推理特征"
+            decision = RouteDecision(model, f"{reason}；得分{score:.1f}/阈值{threshold:.1f}", score, threshold)
+        self._log(decision)
+        return decision
+
+    def _log(self, decision: RouteDecision) -> None:
+        logger.info(f"自动路由 -> {decision.model}: {decision.reason}")
+        DebugHandler.debug(f"自动路由 -> {decision.model}: {decision.reason}")
+        with self._lock:
+            self.decisions.append((time.time(), decision))
+
+    def override(self, model: str) -> RouteDecision:
+        """记录单轮覆盖"""
+        decision = RouteDecision(model, "单轮覆盖")
+        self._log(decision)
+        return decision
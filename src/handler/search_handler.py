@@ -0,0 +1,192 @@
+"""
+全文检索模块，基于SQLite FTS5为历史对话建立增量索引
+"""
+import os
+import re
+import time
+import sqlite3
+import threading
+from typing import List, Dict
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from config.setting import SEARCH_INDEX_PATH, SEARCH_TOKENIZER, SEARCH_RESULT_LIMIT
+except ImportError:
+    # 开发模式导入
+    import sys
+    from pathlib import Path
+    current_file = Path(__file__).resolve()
+    project_root = current_file.parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+    from src.config.setting import SEARCH_INDEX_PATH, SEARCH_TOKENIZER, SEARCH_RESULT_LIMIT
+
+# 摘要中命中词的起止标记，展示时再替换为终端高亮
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+
+class SearchHandler:
+    """对话全文检索处理器"""
+
+    def __init__(self, db_path: str = SEARCH_INDEX_PATH, tokenizer: str = SEARCH_TOKENIZER):
+        """
+        初始化全文索引
+        :param db_path: SQLite数据库路径
+        :param tokenizer: FTS5分词器
+        """
+        if db_path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # 后台会话可能在其他线程中完成回复，统一通过锁串行访问连接
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self.tokenizer = self._create_schema(tokenizer)
+
+    def _create_schema(self, tokenizer: str) -> str:
+        """创建索引表，分词器不可用时回退到unicode61"""
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'tokenizer'").fetchone() \
+            if self._table_exists('meta') else None
+        if row:
+            return row[0]
+        for candidate in (tokenizer, 'unicode61'):
+            try:
+                self._conn.execute(
+                    "CREATE VIRTUAL TABLE IF NOT EXISTS messages USING fts5("
+                    "content, role UNINDEXED, session_id UNINDEXED, msg_index UNINDEXED, ts UNINDEXED, "
+                    f"tokenize='{candidate}')"
+                )
+                break
+            except sqlite3.OperationalError:
+                continue
+        else:
+            raise RuntimeError("当前SQLite不支持FTS5全文索引")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS ingest_state (session_id TEXT PRIMARY KEY, indexed INTEGER)")
+        self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('tokenizer', ?)", (candidate,))
+        self._conn.commit()
+        return candidate
+
+    def _table_exists(self, name: str) -> bool:
+        return self._conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+        ).fetchone() is not None
+
+    def indexed_count(self, session_id: str) -> int:
+        """返回会话已索引的消息数量"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT indexed FROM ingest_state WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def add_messages(self, session_id: str, start: int, messages: List[Dict[str, object]]) -> int:
+        """
+        增量写入消息，已索引过的序号会被跳过，可重复调用
+        :param session_id: 会话ID
+        :param start: messages中第一条消息在会话中的序号
+        :param messages: 消息或日志记录列表
+        :return: 新写入的消息数量
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT indexed FROM ingest_state WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            indexed = row[0] if row else 0
+            now = time.time()
+            rows = [
+                (message.get('content') or '', message.get('role'), session_id, start + i, message.get('ts', now))
+                for i, message in enumerate(messages) if start + i >= indexed
+            ]
+            if not rows:
+                return 0
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT INTO messages (content, role, session_id, msg_index, ts) VALUES (?, ?, ?, ?, ?)", rows
+                )
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO ingest_state VALUES (?, ?)", (session_id, start + len(messages))
+                )
+        return len(rows)
+
+    def remove_session(self, session_id: str) -> None:
+        """删除会话的索引（会话被覆盖保存时调用）"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+            self._conn.execute("DELETE FROM ingest_state WHERE session_id = ?", (session_id,))
+
+    def sync_journals(self, journal) -> int:
+        """
+        将会话日志中尚未索引的消息补充到索引中，只读取每个会话新增的部分
+        :param journal: JournalHandler实例
+        :return: 新写入的消息数量
+        """
+        added = 0
+        for session in journal.list_sessions():
+            session_id = session["session_id"]
+            indexed = self.indexed_count(session_id)
+            if session["messages"] > indexed:
+                added += self.add_messages(session_id, indexed, journal.read_records(session_id, indexed))
+        return added
+
+    def _build_query(self, query: str):
+        """构建MATCH表达式；trigram分词下不足3个字符的词改用LIKE匹配"""
+        terms = query.split()
+        match_terms, like_terms = [], []
+        for term in terms:
+            if self.tokenizer == 'trigram' and len(term) < 3:
+                like_terms.append(term)
+            else:
+                match_terms.append('"' + term.replace('"', '""') + '"')
+        return ' AND '.join(match_terms), like_terms
+
+    def search(self, query: str, limit: int = SEARCH_RESULT_LIMIT) -> List[Dict[str, object]]:
+        """
+        检索历史消息，按BM25相关度排序
+        :param query: 检索关键词，多个关键词以空格分隔（同时命中）
+        :param limit: 最多返回结果数
+        :return: 结果列表，snippet中命中词以HIGHLIGHT_START/HIGHLIGHT_END标记
+        """
+        match_expr, like_terms = self._build_query(query)
+        if not match_expr and not like_terms:
+            return []
+        like_sql = ''.join(" AND content LIKE ? ESCAPE '\\'" for _ in like_terms)
+        like_args = ['%' + t.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%' for t in like_terms]
+        if match_expr:
+            sql = ("SELECT session_id, msg_index, role, ts, "
+                   f"snippet(messages, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 16) "
+                   f"FROM messages WHERE messages MATCH ?{like_sql} ORDER BY rank LIMIT ?")
+            args = [match_expr] + like_args + [limit]
+        else:
+            # 只有短词时无法使用全文索引，按时间倒序返回最近的匹配
+            sql = f"SELECT session_id, msg_index, role, ts, content FROM messages WHERE 1{like_sql} ORDER BY rowid DESC LIMIT ?"
+            args = like_args + [limit]
+        with self._lock:
+            rows = self._conn.execute(sql, args).fetchall()
+        results = []
+        for session_id, msg_index, role, ts, snippet in rows:
+            if not match_expr:
+                snippet = self._like_snippet(snippet, like_terms)
+            results.append({"session_id": session_id, "msg_index": msg_index, "role": role, "ts": ts, "snippet": snippet})
+        return results
+
+    @staticmethod
+    def _like_snippet(content: str, terms: List[str], width: int = 40) -> str:
+        """为LIKE匹配结果生成摘要并标记命中词"""
+        lowered = content.lower()
+        # 以实际出现的第一个命中词为中心截取，LIKE不区分大小写，查找和标记也不区分
+        hits = [(position, len(term)) for term in terms
+                for position in (lowered.find(term.lower()),) if position >= 0]
+        position, length = min(hits) if hits else (0, 0)
+        start = max(0, position - width)
+        snippet = content[start:position + length + width]
+        for term in terms:
+            snippet = re.sub(re.escape(term), lambda m: f"{HIGHLIGHT_START}{m.group(0)}{HIGHLIGHT_END}",
+                             snippet, flags=re.IGNORECASE)
+        return ('…' if start > 0 else '') + snippet
+
+    def close(self) -> None:
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
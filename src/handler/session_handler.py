@@ -0,0 +1,215 @@
+"""
+多会话管理模块，同时持有多个相互独立的对话，并在后台线程中生成回复
+
+每个会话有自己的ChatHandler（对话历史、模型、会话日志），所有会话共享同一个DeepSeekAPI客户端，
+因此共享连接池和熔断状态。后台生成完成的回复先缓存在会话中，切换到该会话时再展示。
+对话记录输出（/tee、--tee）由管理器持有，所有会话（包括之后新建的）写入同一个文件，每轮标注会话名称。
+"""
+import re
+import time
+import queue
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from handler.debug_handler import DebugHandler
+    from handler.tee_handler import TranscriptTee
+    from config.setting import SESSION_MAX_WORKERS
+except ImportError:
+    # 开发模式导入
+    from src.handler.debug_handler import DebugHandler
+    from src.handler.tee_handler import TranscriptTee
+    from src.config.setting import SESSION_MAX_WORKERS
+
+SESSION_NAME_PATTERN = re.compile(r'^\S+$')
+
+
+class ChatSession:
+    """单个会话：对话处理器、后台生成状态和已完成但尚未查看的回复"""
+
+    def __init__(self, name: str, chat_handler):
+        self.name = name
+        self.chat_handler = chat_handler
+        self.created = time.time()
+        self.worker: Optional[threading.Thread] = None
+        self.started: Optional[float] = None
+        # 后台生成完成的结果，切换到该会话时展示并清空
+        self.completed = deque()
+
+    @property
+    def busy(self) -> bool:
+        return self.worker is not None and self.worker.is_alive()
+
+    @property
+    def status(self) -> str:
+        if self.busy:
+            return f"生成中 {time.monotonic() - self.started:.0f}s"
+        if self.completed:
+            return f"{len(self.completed)}条新回复"
+        return "空闲"
+
+
+class SessionManager:
+    def __init__(self, chat_handler_factory: Callable, first_handler=None, max_workers: int = SESSION_MAX_WORKERS):
+        """
+        初始化会话管理器
+        :param chat_handler_factory: 创建新会话对话处理器的函数
+        :param first_handler: 第一个会话使用的对话处理器，为None时由工厂创建
+        :param max_workers: 同时在后台生成回复的会话数上限，超出的排队等待
+        """
+        self._factory = chat_handler_factory
+        self._lock = threading.RLock()
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._counter = 0
+        self.sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        # 后台生成完成的会话名称，供前台在下次提示输入前通知用户
+        self.finished = queue.Queue()
+        # 所有会话共用的对话记录输出器
+        self.tee: Optional[TranscriptTee] = None
+        self.current = self.new(handler=first_handler)
+
+    def _next_name(self) -> str:
+        while True:
+            self._counter += 1
+            name = str(self._counter)
+            if name not in self.sessions:
+                return name
+
+    def new(self, name: Optional[str] = None, handler=None) -> ChatSession:
+        """
+        新建会话并切换到该会话
+        :param name: 会话名称，为None时自动编号
+        :param handler: 使用已有的对话处理器，为None时由工厂创建
+        """
+        with self._lock:
+            if name is not None:
+                if not SESSION_NAME_PATTERN.match(name):
+                    raise ValueError("会话名称不能包含空白字符")
+                if name in self.sessions:
+                    raise ValueError(f"会话已存在: {name}")
+            else:
+                name = self._next_name()
+            session = ChatSession(name, handler if handler is not None else self._factory())
+            if self.tee is not None:
+                self._attach_tee(session)
+            self.sessions[name] = session
+            self.current = session
+            return session
+
+    def _attach_tee(self, session: ChatSession) -> None:
+        session.chat_handler.tee = self.tee
+        session.chat_handler.tee_session = session.name if self.tee is not None else None
+
+    def start_tee(self, path: str, fmt: Optional[str] = None) -> TranscriptTee:
+        """开始把所有会话的对话记录追加写入同一个文件，已在输出时先关闭原来的文件"""
+        tee = TranscriptTee(path, fmt) if fmt else TranscriptTee(path)
+        self.stop_tee()
+        with self._lock:
+            self.tee = tee
+            for session in self.sessions.values():
+                self._attach_tee(session)
+        return tee
+
+    def stop_tee(self) -> Optional[TranscriptTee]:
+        """停止输出对话记录，写入剩余内容后关闭文件"""
+        with self._lock:
+            tee, self.tee = self.tee, None
+            for session in self.sessions.values():
+                if session.chat_handler.tee is tee:
+                    self._attach_tee(session)
+        if tee:
+            tee.close()
+        return tee
+
+    def get(self, name: str) -> ChatSession:
+        with self._lock:
+            session = self.sessions.get(name)
+        if session is None:
+            raise KeyError(f"会话不存在: {name}")
+        return session
+
+    def switch(self, name: str) -> Tuple[ChatSession, List[Dict[str, object]]]:
+        """
+        切换当前会话
+        :return: (会话, 切换前在后台完成、尚未查看的回复)
+        """
+        session = self.get(name)
+        with self._lock:
+            self.current = session
+        return session, self.take_completed(session)
+
+    @staticmethod
+    def take_completed(session: ChatSession) -> List[Dict[str, object]]:
+        """取出会话中已完成的后台回复"""
+        results = []
+        while session.completed:
+            results.append(session.completed.popleft())
+        return results
+
+    def list_sessions(self) -> List[Dict[str, object]]:
+        with self._lock:
+            sessions = list(self.sessions.values())
+        return [{
+            "name": session.name,
+            "current": session is self.current,
+            "model": session.chat_handler.model,
+            "messages": len(session.chat_handler.messages),
+            "status": session.status,
+        } for session in sessions]
+
+    def submit(self, prompt: str, session: Optional[ChatSession] = None) -> ChatSession:
+        """
+        把用户消息加入会话并在后台线程中生成回复，立即返回
+        :param prompt: 用户消息
+        :param session: 目标会话，默认为当前会话
+        """
+        session = session or self.current
+        with self._lock:
+            if session.busy:
+                raise RuntimeError(f"会话 {session.name} 正在生成回复，请等待完成")
+            session.chat_handler.add_user_message(prompt)
+            # 后台线程不阻止进程退出，未完成的回复在退出时丢弃（用户消息已写入会话日志）
+            session.worker = threading.Thread(target=self._generate, args=(session, prompt),
+                                              name=f"session-{session.name}", daemon=True)
+            session.started = time.monotonic()
+            session.worker.start()
+        return session
+
+    def _generate(self, session: ChatSession, prompt: str) -> None:
+        handler = session.chat_handler
+        DebugHandler.set_background(True)
+        result = {"prompt": prompt, "reply": "", "reasoning": "", "notices": [], "error": None}
+        with self._slots:
+            start = time.monotonic()
+            handler.quiet = True
+            try:
+                result["reply"] = handler.get_assistant_reply(stream=False)
+                result["reasoning"] = handler.get_reasoning()
+            except Exception as e:
+                DebugHandler.debug(f"会话 {session.name} 后台生成失败: {str(e)}")
+                result["error"] = str(e)
+            finally:
+                handler.quiet = False
+                result["notices"], handler.notices = handler.notices, []
+            result["elapsed"] = time.monotonic() - start
+        session.completed.append(result)
+        self.finished.put(session.name)
+
+    def drain_finished(self) -> List[str]:
+        """返回自上次调用以来完成后台生成的会话名称"""
+        names = []
+        while True:
+            try:
+                names.append(self.finished.get_nowait())
+            except queue.Empty:
+                return names
+
+    def close(self) -> None:
+        """关闭共用的对话记录输出，并释放所有会话的资源（日志、工具线程池、全文索引等）"""
+        self.stop_tee()
+        with self._lock:
+            sessions = list(self.sessions.values())
+        for session in sessions:
+            session.chat_handler.close()
@@ -0,0 +1,320 @@
+"""
+对话记录输出模块（/tee、--tee），把交互会话的完整记录同步写入文本或Markdown文件，供审计留档
+
+流式回复循环只把数据块放入有界队列（不做任何文件I/O），由后台线程合并成批后写入：
+  批量写入   - 缓冲达到TEE_BATCH_BYTES、停留超过TEE_FLUSH_INTERVAL或一轮结束时写入
+  fsync策略  - always(每批) / turn(每轮结束) / interval(按时间间隔) / never，与会话日志相同
+  队列溢出   - drop: 丢弃数据块并在记录中注明丢弃数量；block: 等待写入线程腾出空间（回复输出随之变慢）
+               每轮的开始/结束标记在两种方式下都不会被丢弃
+输出不含ANSI控制字符，每轮以时间戳和模型开头，以耗时、首字延迟和token用量结尾。
+多个会话共用同一个输出器时，每轮标注会话名称；某个会话的一轮写完之前，其他会话的内容暂缓写入，避免交错。
+"""
+import os
+import re
+import time
+import queue
+import threading
+from typing import Dict, List, Optional
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from config.setting import (TEE_FORMAT, TEE_QUEUE_SIZE, TEE_OVERFLOW, TEE_BATCH_BYTES, TEE_FLUSH_INTERVAL,
+                                TEE_FSYNC, TEE_FSYNC_INTERVAL)
+    from handler.journal_handler import FSYNC_POLICIES
+except ImportError:
+    # 开发模式导入
+    import sys
+    from pathlib import Path
+    current_file = Path(__file__).resolve()
+    project_root = current_file.parent.parent.parent
+    sys.path.insert(0, str(project_root))
+
+    from src.config.setting import (TEE_FORMAT, TEE_QUEUE_SIZE, TEE_OVERFLOW, TEE_BATCH_BYTES, TEE_FLUSH_INTERVAL,
+                                    TEE_FSYNC, TEE_FSYNC_INTERVAL)
+    from src.handler.journal_handler import FSYNC_POLICIES
+
+FORMATS = ('markdown', 'text')
+OVERFLOW_POLICIES = ('drop', 'block')
+# CSI序列（颜色、光标移动等）和OSC序列（窗口标题、超链接）
+ANSI_PATTERN = re.compile(r'\x1b\[[0-9;?]*[ -/]*[@-~]|\x1b\][^\x07\x1b]*(?:\x07|\x1b\\)|\x1b[@-_]')
+SECTION_TITLES = {
+    'markdown': {'user': '**用户**', 'reasoning': '**推理过程**', 'content': '**助手**'},
+    'text': {'user': '[用户]', 'reasoning': '[推理过程]', 'content': '[助手]'},
+}
+# 队列中的控制项
+_TURN, _CHUNK, _NOTE, _END, _FLUSH, _CLOSE = range(6)
+
+
+def strip_ansi(text: str) -> str:
+    """去除ANSI控制序列"""
+    return ANSI_PATTERN.sub('', text) if '\x1b' in text else text
+
+
+class TranscriptTee:
+    """对话记录输出器，写入操作只入队，由后台线程批量写入文件，线程安全"""
+
+    def __init__(self, path: str, fmt: str = TEE_FORMAT, queue_size: int = TEE_QUEUE_SIZE,
+                 overflow: str = TEE_OVERFLOW, batch_bytes: int = TEE_BATCH_BYTES,
+                 flush_interval: float = TEE_FLUSH_INTERVAL, fsync_policy: str = TEE_FSYNC,
+                 fsync_interval: float = TEE_FSYNC_INTERVAL):
+        """
+        打开记录文件（追加写入）并启动写入线程
+        :param path: 记录文件路径
+        :param fmt: markdown / text
+        :param queue_size: 待写入队列的最大条目数
+        :param overflow: 队列已满时的处理方式 drop / block
+        :param batch_bytes: 缓冲达到该字节数时写入
+        :param flush_interval: 数据在缓冲中的最长停留时间(秒)
+        :param fsync_policy: fsync策略，可选 always/turn/interval/never
+        :param fsync_interval: interval策略下两次fsync的最小间隔(秒)
+        """
+        if fmt not in FORMATS:
+            raise ValueError(f"无效的记录格式: {fmt}，可选: {'/'.join(FORMATS)}")
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"无效的队列溢出处理方式: {overflow}，可选: {'/'.join(OVERFLOW_POLICIES)}")
+        if fsync_policy not in FSYNC_POLICIES:
+            raise ValueError(f"无效的fsync策略: {fsync_policy}，允许的策略: {'/'.join(FSYNC_POLICIES)}")
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.format = fmt
+        self.overflow = overflow
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        # 在调用线程中打开文件，路径无效时立即报错
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._lock = threading.Lock()
+        self._turns = 0
+        self.stats = {"chunks": 0, "dropped": 0, "dropped_chars": 0, "bytes": 0, "batches": 0, "fsyncs": 0,
+                      "errors": 0}
+        # 以下状态只由写入线程访问
+        self._section: Optional[str] = None
+        self._reported_drops = 0
+        self._turn_open = False
+        self._turn_session: Optional[str] = None
+        # 其他会话的一轮正在写入时暂缓的条目
+        self._held: List[tuple] = []
+        self._last_fsync = time.monotonic()
+        self.error: Optional[str] = None
+        self._thread = threading.Thread(target=self._run, name="transcript-tee", daemon=True)
+        self._thread.start()
+
+    # ---- 调用线程（流式回复循环）使用的接口，只入队 ----
+
+    def _put(self, item, droppable: bool) -> bool:
+        if not self._thread.is_alive():
+            # 已关闭，不再入队（否则队列满时会永久阻塞）
+            return False
+        if droppable and self.overflow == 'drop':
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                with self._lock:
+                    self.stats["dropped"] += 1
+                    self.stats["dropped_chars"] += sum(len(part) for part in item[2:])
+                return False
+        self._queue.put(item)
+        return True
+
+    def begin_turn(self, model: str, prompt: str, session: Optional[str] = None) -> None:
+        """
+        开始新的一轮，写入时间戳、模型和用户消息
+        :param session: 会话名称，多个会话共用输出器时标注在每轮开头
+        """
+        with self._lock:
+            self._turns += 1
+            turn = self._turns
+        self._put((_TURN, session, turn, time.time(), model, prompt), droppable=False)
+
+    def write(self, content: str = '', reasoning: str = '', session: Optional[str] = None) -> None:
+        """写入回复的数据块（流式回复时每个数据块调用一次）"""
+        if content or reasoning:
+            with self._lock:
+                self.stats["chunks"] += 1
+            self._put((_CHUNK, session, content, reasoning), droppable=True)
+
+    def note(self, text: str, session: Optional[str] = None) -> None:
+        """写入提示信息（工具调用、中断、重试等）"""
+        self._put((_NOTE, session, text), droppable=True)
+
+    def end_turn(self, metrics: Optional[Dict[str, object]] = None, error: Optional[str] = None,
+                 session: Optional[str] = None) -> None:
+        """结束本轮，写入耗时/用量，turn策略下在写入后fsync"""
+        self._put((_END, session, dict(metrics or {}), error), droppable=False)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """等待已入队的内容全部写入文件，返回是否在超时前完成"""
+        done = threading.Event()
+        return self._put((_FLUSH, done), droppable=False) and done.wait(timeout)
+
+    def close(self, timeout: float = 5.0) -> None:
+        """写入剩余内容、fsync并关闭文件"""
+        if self._thread.is_alive():
+            self._put((_CLOSE,), droppable=False)
+            self._thread.join(timeout)
+
+    @property
+    def active(self) -> bool:
+        return self._thread.is_alive()
+
+    def snapshot(self) -> Dict[str, object]:
+        with self._lock:
+            return dict(self.stats, path=self.path, format=self.format, overflow=self.overflow,
+                        queued=self._queue.qsize(), turns=self._turns, error=self.error)
+
+    # ---- 写入线程 ----
+
+    def _run(self) -> None:
+        buffer: List[str] = []
+        size = 0
+        first_buffered = 0.0
+        while True:
+            timeout = None if not buffer else max(0.0, first_buffered + self.flush_interval - time.monotonic())
+            try:
+                items = [self._queue.get(timeout=timeout)]
+            except queue.Empty:
+                items = []
+            # 一次取出队列中已有的全部条目，合并为一批
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            end_of_turn = flush = closing = False
+            waiters = []
+            ready = []
+            for item in items:
+                if item[0] == _FLUSH:
+                    flush = True
+                    waiters.append(item[1])
+                    continue
+                if item[0] == _CLOSE:
+                    closing = True
+                    continue
+                ready.extend(self._route(item))
+            if closing:
+                # 关闭时写出所有暂缓的条目
+                ready.extend(self._held)
+                self._held = []
+            for item in ready:
+                end_of_turn = end_of_turn or item[0] == _END
+                text = self._render(item)
+                if text:
+                    if not buffer:
+                        first_buffered = time.monotonic()
+                    buffer.append(text)
+                    size += len(text)
+            drops = self._drop_marker()
+            if drops:
+                buffer.append(drops)
+            expired = buffer and time.monotonic() - first_buffered >= self.flush_interval
+            if buffer and (size >= self.batch_bytes or end_of_turn or flush or closing or expired):
+                self._write(''.join(buffer), end_of_turn or closing)
+                buffer, size = [], 0
+            for waiter in waiters:
+                waiter.set()
+            if closing:
+                try:
+                    self._file.close()
+                except OSError:
+                    pass
+                return
+
+    def _route(self, item: tuple) -> List[tuple]:
+        """返回可以立即写入的条目：其他会话的一轮未结束时暂缓，该轮结束后按原顺序放行"""
+        session = item[1]
+        if self._turn_open and session != self._turn_session:
+            self._held.append(item)
+            return []
+        ready = [item]
+        if item[0] == _TURN:
+            self._turn_open, self._turn_session = True, session
+        elif item[0] == _END:
+            self._turn_open = False
+            held, self._held = self._held, []
+            for pending in held:
+                ready.extend(self._route(pending))
+        return ready
+
+    def _write(self, text: str, end_of_turn: bool) -> None:
+        try:
+            self._file.write(text)
+            self._file.flush()
+            now = time.monotonic()
+            if (self.fsync_policy == 'always' or (self.fsync_policy == 'turn' and end_of_turn)
+                    or (self.fsync_policy == 'interval' and now - self._last_fsync >= self.fsync_interval)):
+                os.fsync(self._file.fileno())
+                self._last_fsync = now
+                with self._lock:
+                    self.stats["fsyncs"] += 1
+            with self._lock:
+                self.stats["bytes"] += len(text.encode('utf-8'))
+                self.stats["batches"] += 1
+        except (OSError, ValueError) as e:
+            # 写入失败不影响对话，记录错误供 /tee 查看
+            with self._lock:
+                self.stats["errors"] += 1
+                self.error = str(e)
+
+    def _drop_marker(self) -> str:
+        with self._lock:
+            dropped = self.stats["dropped"]
+            chars = self.stats["dropped_chars"]
+        if dropped == self._reported_drops:
+            return ''
+        count, self._reported_drops = dropped - self._reported_drops, dropped
+        return self._line(f"[记录队列已满，丢弃了{count}个数据块，累计丢弃{chars}字符]")
+
+    def _line(self, text: str) -> str:
+        text = strip_ansi(text)
+        return f"\n\n_{text}_\n\n" if self.format == 'markdown' else f"\n\n{text}\n\n"
+
+    def _section_title(self, section: str) -> str:
+        """数据块类型变化时输出小节标题"""
+        if self._section == section:
+            return ''
+        self._section = section
+        return f"\n\n{SECTION_TITLES[self.format][section]}\n\n"
+
+    def _render(self, item) -> str:
+        kind = item[0]
+        if kind == _TURN:
+            _, session, turn, started, model, prompt = item
+            stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))
+            self._section = None
+            label = f"会话{session}" if session is not None else ''
+            if self.format == 'markdown':
+                header = f"\n## 第{turn}轮 · {label + ' · ' if label else ''}{stamp} · {model}\n"
+            else:
+                header = f"\n==== 第{turn}轮  {label + '  ' if label else ''}{stamp}  {model} ====\n"
+            return header + self._section_title('user') + strip_ansi(prompt)
+        if kind == _CHUNK:
+            _, _, content, reasoning = item
+            parts = []
+            if reasoning:
+                parts.append(self._section_title('reasoning') + strip_ansi(reasoning))
+            if content:
+                parts.append(self._section_title('content') + strip_ansi(content))
+            return ''.join(parts)
+        if kind == _NOTE:
+            self._section = None
+            return self._line(item[2].strip())
+        if kind == _END:
+            _, _, metrics, error = item
+            self._section = None
+            timing = [f"耗时 {metrics['latency']:.2f}s"] if 'latency' in metrics else []
+            if metrics.get('ttft') is not None:
+                timing.append(f"首字 {metrics['ttft']:.2f}s")
+            if metrics.get('prompt_tokens') is not None:
+                timing.append(f"提示 {metrics['prompt_tokens']} tokens")
+            if metrics.get('completion_tokens') is not None:
+                timing.append(f"回复 {metrics['completion_tokens']} tokens")
+            if error:
+                timing.append(f"错误: {error}")
+            return self._line(" · ".join(timing) if timing else "本轮结束").rstrip('\n') + "\n"
+        return ''
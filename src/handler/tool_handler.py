@@ -0,0 +1,160 @@
+"""
+工具调用模块，管理本地工具注册，拼装流式返回的tool_calls增量，并发执行同一轮中的多个工具调用
+"""
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable, Dict, List, Optional
+# 尝试兼容包模式和开发模式的导入
+try:
+    # 包模式导入
+    from handler.debug_handler import DebugHandler
+    from config.setting import TOOL_TIMEOUT, TOOL_MAX_WORKERS
+except ImportError:
+    # 开发模式导入
+    from src.handler.debug_handler import DebugHandler
+    from src.config.setting import TOOL_TIMEOUT, TOOL_MAX_WORKERS
+
+
+class Tool:
+    """已注册的本地工具"""
+
+    def __init__(self, name: str, func: Callable, description: str = '', parameters: Optional[dict] = None,
+                 timeout: Optional[float] = None):
+        self.name = name
+        self.func = func
+        self.description = description or (func.__doc__ or '').strip()
+        self.parameters = parameters or {"type": "object", "properties": {}}
+        self.timeout = timeout
+
+    def schema(self) -> dict:
+        """生成API请求中tools字段使用的工具定义"""
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters}
+        }
+
+
+class ToolCallAssembler:
+    """按index拼装流式返回的tool_calls增量：id和name只出现一次，arguments分多个数据块到达"""
+
+    def __init__(self):
+        self._calls: Dict[int, dict] = {}
+
+    def add(self, deltas: List[dict]) -> None:
+        for delta in deltas:
+            index = delta.get('index', len(self._calls))
+            call = self._calls.setdefault(index, {"id": "", "type": "function",
+                                                  "function": {"name": "", "arguments": ""}})
+            if delta.get('id'):
+                call['id'] = delta['id']
+            if delta.get('type'):
+                call['type'] = delta['type']
+            function = delta.get('function') or {}
+            if function.get('name'):
+                call['function']['name'] += function['name']
+            if function.get('arguments'):
+                call['function']['arguments'] += function['arguments']
+
+    def calls(self) -> List[dict]:
+        """按index顺序返回拼装完成的工具调用"""
+        return [self._calls[index] for index in sorted(self._calls)]
+
+    def __bool__(self):
+        return bool(self._calls)
+
+
+class ToolHandler:
+    def __init__(self, max_workers: int = TOOL_MAX_WORKERS, default_timeout: float = TOOL_TIMEOUT):
+        """
+        初始化工具处理器
+        :param max_workers: 并发执行工具的线程数
+        :param default_timeout: 工具未指定超时时使用的默认超时(秒)
+        """
+        self.tools: Dict[str, Tool] = {}
+        self.max_workers = max_workers
+        self.default_timeout = default_timeout
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def add_tool(self, name: str, func: Callable, description: str = '', parameters: Optional[dict] = None,
+                 timeout: Optional[float] = None) -> None:
+        """
+        注册工具
+        :param name: 工具名称
+        :param func: 工具函数，以关键字参数接收模型给出的参数
+        :param description: 工具说明，默认使用函数的文档字符串
+        :param parameters: 参数的JSON Schema
+        :param timeout: 执行超时(秒)，默认使用default_timeout
+        """
+        self.tools[name] = Tool(name, func, description, parameters, timeout)
+
+    def remove_tool(self, name: str) -> None:
+        self.tools.pop(name, None)
+
+    def schemas(self) -> List[dict]:
+        return [tool.schema() for tool in self.tools.values()]
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            return self._executor
+
+    def _invoke(self, call: dict):
+        tool = self.tools[call['function']['name']]
+        arguments = call['function']['arguments'] or '{}'
+        kwargs = json.loads(arguments)
+        if not isinstance(kwargs, dict):
+            raise ValueError(f"工具参数必须是JSON对象: {arguments}")
+        return tool.func(**kwargs)
+
+    @staticmethod
+    def _format_result(result) -> str:
+        if isinstance(result, str):
+            return result
+        return json.dumps(result, ensure_ascii=False, default=str)
+
+    def execute(self, tool_calls: List[dict]) -> List[Dict[str, str]]:
+        """
+        并发执行一轮中的全部工具调用，总耗时取决于最慢的工具而不是所有工具之和
+        :param tool_calls: 拼装完成的工具调用列表
+        :return: 与工具调用一一对应的tool角色消息，出错或超时时内容为错误说明
+        """
+        executor = self._get_executor()
+        pending = []
+        for call in tool_calls:
+            name = call['function']['name']
+            tool = self.tools.get(name)
+            timeout = tool.timeout if tool and tool.timeout is not None else self.default_timeout
+            future = executor.submit(self._invoke, call) if tool else None
+            # 每个工具的截止时间从提交时开始计算，互不累加
+            pending.append((call, future, time.monotonic() + timeout, timeout))
+
+        messages = []
+        for call, future, deadline, timeout in pending:
+            name = call['function']['name']
+            if future is None:
+                content = f"错误: 未注册的工具 {name}"
+            else:
+                try:
+                    content = self._format_result(future.result(timeout=max(0.0, deadline - time.monotonic())))
+                except FutureTimeoutError:
+                    # 线程无法被强制终止，超时的工具在后台继续运行，结果被丢弃
+                    future.cancel()
+                    content = f"错误: 工具 {name} 执行超时({timeout}秒)"
+                except Exception as e:
+                    content = f"错误: 工具 {name} 执行失败: {str(e)}"
+            DebugHandler.debug(f"工具 {name} 返回: {content[:200]}")
+            messages.append({"role": "tool", "tool_call_id": call['id'], "content": content})
+        return messages
+
+    def close(self) -> None:
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+    def __len__(self):
+        return len(self.tools)
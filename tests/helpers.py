@@ -0,0 +1,30 @@
+"""
+测试公共辅助：替代输入监听器，以及不写会话日志的ChatHandler（单元测试和基准测试共用）
+"""
+import os
+from unittest.mock import patch
+from src.handler.chat_handler import ChatHandler
+
+
+class IdleInputHandler:
+    """替代InputHandler，测试中不监听标准输入"""
+
+    def start_listening(self):
+        pass
+
+    def stop_listening(self):
+        pass
+
+    def check_for_stop_command(self):
+        return False
+
+
+def make_chat_handler(api=None) -> ChatHandler:
+    """
+    创建不写会话日志的ChatHandler，初始化时不会交互式提示输入API密钥
+    :param api: API客户端，为None时新建
+    """
+    with patch.dict(os.environ, {"DEEPSEEK_API_KEY": "test-key"}):
+        handler = ChatHandler(api=api)
+    handler.journal = None
+    return handler
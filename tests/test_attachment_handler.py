@@ -0,0 +1,59 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.handler.attachment_handler import AttachmentHandler
+
+
+class TestAttachmentHandler(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.handler = AttachmentHandler(chunk_chars=100, read_block=64)
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _write(self, name, data: bytes):
+        path = os.path.join(self.work_dir, name)
+        with open(path, 'wb') as f:
+            f.write(data)
+        return path
+
+    def test_chunks_on_line_boundaries_across_read_blocks(self):
+        text = "".join(f"第{i}行日志 line {i}\r\n" for i in range(50))
+        attachment, cached = self.handler.load(self._write('log.txt', text.encode('utf-8')))
+        self.assertFalse(cached)
+        self.assertEqual(attachment.encoding, 'utf-8')
+        self.assertEqual("".join(attachment.chunks), text)
+        self.assertTrue(all(len(chunk) <= 100 for chunk in attachment.chunks))
+        self.assertTrue(all(chunk.endswith("\r\n") for chunk in attachment.chunks))
+
+    def test_detects_gb18030_and_bom(self):
+        gbk, _ = self.handler.load(self._write('gbk.txt', "中文内容，编码检测".encode('gb18030')))
+        self.assertEqual(gbk.encoding, 'gb18030')
+        self.assertEqual(gbk.chunks, ["中文内容，编码检测"])
+        utf16, _ = self.handler.load(self._write('u16.txt', "hello 世界".encode('utf-16')))
+        self.assertEqual(utf16.chunks, ["hello 世界"])
+        with self.assertRaises(ValueError):
+            self.handler.load(self._write('bin.dat', b'\x7fELF\x00\x00\x01'))
+
+    def test_dedup_by_content_hash(self):
+        first = self._write('a.txt', b"same content\n" * 20)
+        second = self._write('b.txt', b"same content\n" * 20)
+        attachment, _ = self.handler.load(first)
+        again, cached = self.handler.load(first)
+        copy, copy_cached = self.handler.load(second)
+        self.assertTrue(cached and copy_cached)
+        self.assertIs(again, attachment)
+        self.assertIs(copy, attachment)
+        self.assertEqual(self.handler.stats, {"reads": 1, "hits": 2})
+
+    def test_select_chunks_within_budget(self):
+        attachment, _ = self.handler.load(self._write("big.txt", (b"x" * 59 + b"\n") * 10))
+        self.assertEqual(len(attachment.chunks), 10)
+        self.assertEqual(self.handler.select_chunks(attachment, 0, 250), range(0, 4))
+        self.assertEqual(self.handler.select_chunks(attachment, 8, 250), range(8, 10))
+
+
+if __name__ == '__main__':
+    unittest.main()
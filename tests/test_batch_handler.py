@@ -0,0 +1,70 @@
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from src.handler.batch_handler import BatchHandler
+
+
+class FakeAPI:
+    def __init__(self):
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def chat_completion(self, messages, model, temperature):
+        with self._lock:
+            self.calls.append(messages[-1]["content"])
+        return {"choices": [{"message": {"content": messages[-1]["content"].upper(), "reasoning_content": ""}}],
+                "usage": None}
+
+
+class TestBatchHandler(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.input_path = os.path.join(self.work_dir, 'in.jsonl')
+        self.output_path = os.path.join(self.work_dir, 'out.jsonl')
+        with open(self.input_path, 'w', encoding='utf-8') as f:
+            for i in range(20):
+                f.write(json.dumps({"id": f"q{i}", "prompt": f"p{i}"}) + '\n')
+            f.write('\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir)
+
+    def _read_output(self):
+        with open(self.output_path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_run_writes_all_results_with_ids(self):
+        api = FakeAPI()
+        stats = BatchHandler(api, self.input_path, self.output_path, concurrency=4).run()
+        self.assertEqual(stats["completed"], 20)
+        results = self._read_output()
+        self.assertEqual(sorted(r["id"] for r in results), sorted(f"q{i}" for i in range(20)))
+        self.assertTrue(all(r["content"] == r["id"].replace('q', 'P') for r in results))
+
+    def test_rerun_does_not_redo_finished_items(self):
+        BatchHandler(FakeAPI(), self.input_path, self.output_path, concurrency=4).run()
+        api = FakeAPI()
+        BatchHandler(api, self.input_path, self.output_path, concurrency=4).run()
+        self.assertEqual(api.calls, [])
+        self.assertEqual(len(self._read_output()), 20)
+
+    def test_resume_uses_results_written_after_checkpoint(self):
+        # 模拟崩溃：检查点只记录到开头，但输出中已有前5条结果
+        with open(self.output_path, 'w', encoding='utf-8') as f:
+            for i in range(5):
+                f.write(json.dumps({"id": f"q{i}", "line": i, "content": f"P{i}", "error": None}) + '\n')
+            f.write('{"id": "q5", "li')
+        with open(f"{self.output_path}.ckpt", 'w', encoding='utf-8') as f:
+            json.dump({"input": os.path.abspath(self.input_path), "watermark": 0, "resume_line": 0, "resume_offset": 0,
+                       "done_above": [], "output_offset": 0}, f)
+        api = FakeAPI()
+        BatchHandler(api, self.input_path, self.output_path, concurrency=2).run()
+        self.assertEqual(sorted(api.calls), sorted(f"p{i}" for i in range(5, 20)))
+        self.assertEqual(len(self._read_output()), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
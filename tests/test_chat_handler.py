@@ -0,0 +1,73 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.handler.chat_handler import ChatHandler
+from src.handler.journal_handler import JournalHandler
+from src.handler.search_handler import SearchHandler
+
+
+class FakeAPI:
+    def __init__(self):
+        self.sent = []
+
+    def chat_completion(self, messages, model, temperature):
+        self.sent.append(messages)
+        return {"choices": [{"message": {"content": f"回答{len(self.sent)}",
+                                         "reasoning_content": f"思考{len(self.sent)}"}}]}
+
+
+class TestChatHandlerReasoning(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        with patch.dict(os.environ, {"DEEPSEEK_API_KEY": "test-key"}):
+            self.chat_handler = ChatHandler()
+        self.chat_handler.api = FakeAPI()
+        self.chat_handler.model = "deepseek-reasoner"
+        self.chat_handler.journal = JournalHandler('reasoning-test', journal_dir=self.work_dir, fsync_policy='never')
+        self.chat_handler._search_index = SearchHandler(os.path.join(self.work_dir, 'search.db'))
+
+    def tearDown(self):
+        self.chat_handler.journal.close()
+        self.chat_handler._search_index.close()
+        shutil.rmtree(self.work_dir)
+
+    def test_reasoning_is_kept_out_of_resent_history(self):
+        for prompt in ["问题1", "问题2"]:
+            self.chat_handler.add_user_message(prompt)
+            self.assertEqual(self.chat_handler.get_assistant_reply(stream=False), f"回答{prompt[-1]}")
+        second_request = self.chat_handler.api.sent[1]
+        self.assertEqual(second_request[1], {"role": "assistant", "content": "回答1"})
+        self.assertTrue(all(set(message) == {"role", "content"} for message in second_request))
+        self.assertEqual(self.chat_handler.get_reasoning(), "思考2")
+
+    def test_reasoning_is_read_back_from_journal(self):
+        self.chat_handler.add_user_message("问题")
+        self.chat_handler.get_assistant_reply(stream=False)
+        self.chat_handler.load_session('reasoning-test')
+        self.assertEqual(self.chat_handler.reasoning, {})
+        self.assertEqual(self.chat_handler.messages[1], {"role": "assistant", "content": "回答1"})
+        self.assertEqual(self.chat_handler.get_reasoning(1), "思考1")
+
+    def test_search_index_follows_journal_records(self):
+        other = JournalHandler('shared', journal_dir=self.work_dir, fsync_policy='never')
+        for content in ["旧问题", "旧回答"]:
+            other.append({"role": "user" if content == "旧问题" else "assistant", "content": content})
+        self.chat_handler.load_session('shared')
+        # 加载后会话日志被其他实例继续写入，内存中的序号与日志不再一致
+        other.append({"role": "user", "content": "另一个实例的提问"})
+        other.close()
+        with patch('src.handler.chat_handler.SEARCH_ENABLED', True):
+            self.chat_handler.add_user_message("新问题")
+            self.chat_handler.get_assistant_reply(stream=False)
+        index = self.chat_handler._search_index
+        records = self.chat_handler.journal.read_records('shared')
+        self.assertEqual(index.indexed_count('shared'), len(records))
+        for record_index, record in enumerate(records):
+            results = index.search(record["content"])
+            self.assertIn(('shared', record_index), [(r["session_id"], r["msg_index"]) for r in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
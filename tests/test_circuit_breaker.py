@@ -0,0 +1,62 @@
+import time
+import unittest
+from src.api.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from src.api.deepseek_api import DeepSeekAPI
+
+
+class TestCircuitBreaker(unittest.TestCase):
+    def _breaker(self):
+        return CircuitBreaker("chat/completions:deepseek-chat", failure_rate=0.5, min_requests=4,
+                              window=60.0, cooldown=0.05, half_open_probes=1)
+
+    def _fail(self, breaker, times):
+        for _ in range(times):
+            breaker.allow()
+            breaker.record_failure()
+
+    def test_opens_after_threshold_and_recovers_through_probe(self):
+        breaker = self._breaker()
+        breaker.allow()
+        breaker.record_success()
+        self._fail(breaker, 2)
+        self.assertEqual(breaker.state, CLOSED)  # 请求数未达下限
+        self._fail(breaker, 1)
+        self.assertEqual(breaker.state, OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()
+
+        time.sleep(0.06)
+        breaker.allow()  # 冷却结束，放行一个探测请求
+        self.assertEqual(breaker.state, HALF_OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.allow()  # 探测名额已用完
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+        snapshot = breaker.snapshot()
+        self.assertEqual((snapshot["opened"], snapshot["rejected"], snapshot["requests"]), (1, 2, 0))
+
+    def test_failed_probe_reopens(self):
+        breaker = self._breaker()
+        self._fail(breaker, 4)
+        time.sleep(0.06)
+        breaker.allow()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertEqual(breaker.snapshot()["opened"], 2)
+
+    def test_api_fails_fast_when_upstream_is_down(self):
+        api = DeepSeekAPI("test-key", base_url="http://127.0.0.1:1", transport="http1", circuit_breaker=True)
+        messages = [{"role": "user", "content": "hi"}]
+        for _ in range(5):
+            with self.assertRaises(Exception) as ctx:
+                api.chat_completion(messages)
+            self.assertNotIsInstance(ctx.exception, CircuitOpenError)
+        with self.assertRaises(CircuitOpenError):
+            list(api.chat_completion_stream(messages))
+        # 熔断按端点/模型划分，其他模型不受影响
+        self.assertEqual(api.circuit_stats()["chat/completions:deepseek-chat"]["state"], OPEN)
+        self.assertNotIn("chat/completions:deepseek-reasoner", api.circuit_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
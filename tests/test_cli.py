@@ -1,12 +1,20 @@
+import os
+import shutil
+import tempfile
 import unittest
 from unittest.mock import patch
 from io import StringIO
+from rich.console import Console
+from src.handler import command_handler
 from src.handler.command_handler import CommandHandler
 from src.handler.chat_handler import ChatHandler
+from src.handler.journal_handler import JournalHandler
 
 class TestCLIFunctionality(unittest.TestCase):
     def setUp(self):
-        self.chat_handler = ChatHandler()
+        # 避免ChatHandler初始化时交互式提示输入API密钥
+        with patch.dict(os.environ, {"DEEPSEEK_API_KEY": "test-key"}):
+            self.chat_handler = ChatHandler()
         self.command_handler = CommandHandler(chat_handler=self.chat_handler)
 
     def test_quit_command(self):
@@ -30,5 +38,18 @@ class TestCLIFunctionality(unittest.TestCase):
             lines.append(line)
         self.assertEqual(len(lines), 2)
 
+    def test_open_does_not_show_current_messages_when_load_fails(self):
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir, True)
+        self.chat_handler.journal = JournalHandler('current', journal_dir=work_dir, fsync_policy='never')
+        self.chat_handler.messages.append({"role": "user", "content": "当前对话中无关的消息"})
+        self.command_handler.last_search_results = [{"session_id": "missing", "msg_index": 0}]
+        output = StringIO()
+        with patch.object(command_handler, "console", Console(file=output, width=100)), \
+                patch('sys.stdout', new=StringIO()) as fake_out:
+            self.assertIsNone(self.command_handler.handle_command('/open 1'))
+        self.assertIn('加载会话失败', fake_out.getvalue())
+        self.assertNotIn('无关的消息', output.getvalue())
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
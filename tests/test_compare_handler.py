@@ -0,0 +1,89 @@
+import io
+import os
+import shutil
+import tempfile
+import unittest
+from rich.console import Console
+from src.handler.compare_handler import CompareHandler
+from tests.helpers import make_chat_handler
+
+
+class FakeAPI:
+    def chat_completion_stream(self, messages, model, temperature):
+        if model == "broken":
+            raise Exception("流式API请求失败")
+        for token in ["你好", f"，我是{model}"]:
+            yield {"choices": [{"delta": {"reasoning_content": "", "content": token}}]}
+        yield {"choices": [{"delta": {"reasoning_content": "", "content": ""}}],
+               "usage": {"prompt_tokens": 3, "completion_tokens": 7, "total_tokens": 10}}
+
+
+class FakeChatHandler:
+    def __init__(self, messages=None):
+        self.api = FakeAPI()
+        self.temperature = 0.7
+        self.messages = messages or []
+        self.committed = []
+        self.raw = []
+
+    def request_messages(self):
+        return [dict(message) for message in self.messages]
+
+    def add_user_message(self, content, model=None, raw=False):
+        self.messages.append({"role": "user", "content": content})
+        self.raw.append(raw)
+
+    def add_assistant_message(self, content, model=None, reasoning=None):
+        self.messages.append({"role": "assistant", "content": content})
+        self.committed.append(model)
+
+
+class TestCompareHandler(unittest.TestCase):
+    def _handler(self, chat_handler, models):
+        console = Console(file=io.StringIO(), width=100, height=30)
+        return CompareHandler(chat_handler, models=models, console=console)
+
+    def test_run_collects_each_model_and_commits_choice(self):
+        chat_handler = FakeChatHandler()
+        handler = self._handler(chat_handler, ["model-a", "model-b", "broken"])
+        results = handler.run("介绍一下你自己")
+        self.assertEqual([r.model for r in results], ["model-a", "model-b", "broken"])
+        self.assertEqual(results[1].content.getvalue(), "你好，我是model-b")
+        self.assertEqual(results[0].completion_tokens, 7)
+        self.assertIsNotNone(results[0].ttft)
+        self.assertIsNotNone(results[2].error)
+        # 对比本身不修改对话历史
+        self.assertEqual(chat_handler.messages, [])
+
+        handler.commit(results[1], "介绍一下你自己")
+        self.assertEqual([m["role"] for m in chat_handler.messages], ["user", "assistant"])
+        self.assertEqual(chat_handler.messages[1]["content"], "你好，我是model-b")
+        self.assertEqual(chat_handler.committed, ["model-b"])
+        self.assertEqual(chat_handler.raw, [True])
+
+    def test_commit_records_the_compared_message(self):
+        chat_handler = make_chat_handler(FakeAPI())
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir, True)
+        path = os.path.join(work_dir, "notes.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("附件内容")
+        chat_handler.attach(path)
+        handler = self._handler(chat_handler, ["model-a"])
+        results = handler.run("@reasoner 介绍一下你自己")
+        handler.commit(results[0], "@reasoner 介绍一下你自己")
+        # 对比请求中没有附件、保留了前缀，历史中记录的必须是同一条消息
+        self.assertEqual(chat_handler.messages[0], {"role": "user", "content": "@reasoner 介绍一下你自己"})
+        self.assertEqual(len(chat_handler.pending_attachments), 1)
+
+    def test_build_messages_requires_pending_user_message(self):
+        handler = self._handler(FakeChatHandler([{"role": "user", "content": "hi"}]), ["model-a"])
+        self.assertEqual(handler.build_messages()[-1]["content"], "hi")
+        with self.assertRaises(ValueError):
+            handler.build_messages("again")
+        with self.assertRaises(ValueError):
+            self._handler(FakeChatHandler(), ["model-a"]).build_messages()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,82 @@
+import os
+import shutil
+import tempfile
+import tracemalloc
+import unittest
+from unittest.mock import patch
+from src.handler.chat_handler import ChatHandler
+from src.handler.conversation_handler import ConversationStore
+from src.handler.journal_handler import JournalHandler
+
+
+def make_message(i, size=500):
+    return {"role": "user" if i % 2 == 0 else "assistant", "content": f"第{i}条" + "长" * size}
+
+
+class TestConversationStore(unittest.TestCase):
+    def test_spilled_messages_read_back_like_a_list(self):
+        messages = [make_message(i) for i in range(50)]
+        store = ConversationStore(hot_bytes=4096)
+        store.extend(messages)
+        self.assertGreater(store.hot_start, 0)
+        self.assertLessEqual(store.memory_stats()["hot_bytes"], 4096)
+        self.assertEqual(len(store), 50)
+        self.assertEqual(store, messages)
+        self.assertEqual(store[3], messages[3])
+        self.assertEqual(store[-1], messages[-1])
+        self.assertEqual(store[10:48], messages[10:48])
+        self.assertEqual(store[::7], messages[::7])
+        with self.assertRaises(IndexError):
+            store[50]
+        store.clear()
+        self.assertEqual((len(store), store.hot_start), (0, 0))
+
+    def test_resident_memory_stays_flat(self):
+        store = ConversationStore(hot_bytes=32 * 1024)
+        tracemalloc.start()
+        try:
+            for i in range(200):
+                store.append(make_message(i, 2000))
+            after_short, _ = tracemalloc.get_traced_memory()
+            for i in range(200, 2000):
+                store.append(make_message(i, 2000))
+            after_long, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+            store.close()
+        # 消息数增加到10倍（约12MB内容），常驻内存只增加索引的几十KB
+        self.assertLess(after_long - after_short, 64 * 1024)
+
+
+class TestChatHandlerSpill(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        with patch.dict(os.environ, {"DEEPSEEK_API_KEY": "test-key"}):
+            self.chat_handler = ChatHandler()
+        self.chat_handler.messages = ConversationStore(hot_bytes=2048)
+        self.chat_handler.journal = JournalHandler('spill-test', journal_dir=self.work_dir, fsync_policy='never')
+
+    def tearDown(self):
+        self.chat_handler.journal.close()
+        shutil.rmtree(self.work_dir)
+
+    @patch('src.handler.chat_handler.SEARCH_ENABLED', False)
+    def test_cold_turns_are_sent_and_reasoning_read_from_journal(self):
+        for i in range(20):
+            self.chat_handler.add_user_message(f"问题{i}" + "问" * 300)
+            self.chat_handler.add_assistant_message(f"回答{i}", reasoning=f"思考{i}")
+        self.assertGreater(self.chat_handler.messages.hot_start, 10)
+        self.assertTrue(all(index >= self.chat_handler.messages.hot_start for index in self.chat_handler.reasoning))
+        sent = self.chat_handler.request_messages()
+        self.assertEqual(len(sent), 40)
+        self.assertEqual(sent[1], {"role": "assistant", "content": "回答0"})
+        self.assertEqual(self.chat_handler.get_reasoning(1), "思考0")
+
+        self.chat_handler.reset_conversation()
+        self.assertEqual(len(self.chat_handler.messages), 0)
+        self.assertEqual(self.chat_handler.load_session('spill-test'), 40)
+        self.assertEqual(self.chat_handler.messages[0]["content"][:3], "问题0")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import io
+import unittest
+from types import SimpleNamespace
+from unittest.mock import patch
+import requests
+from src.api import deepseek_api
+from src.api.deepseek_api import DeepSeekAPI
+from src.cli.deepseek_client import DeepSeekCLI
+
+BASE_URL = "https://api.example.com/v1"
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class FakeSession:
+    """记录预热请求，is_warm返回预设值"""
+
+    def __init__(self, status_code=200, warm=True, error=None):
+        self.status_code = status_code
+        self.warm = warm
+        self.error = error
+        self.calls = []
+
+    def get(self, url, headers=None, timeout=None):
+        self.calls.append(("GET", url, headers))
+        if self.error:
+            raise self.error
+        return FakeResponse(self.status_code)
+
+    def head(self, url, timeout=None):
+        self.calls.append(("HEAD", url, None))
+        return FakeResponse(self.status_code)
+
+    def is_warm(self, url):
+        return self.warm
+
+
+class TestWarmup(unittest.TestCase):
+    def make_api(self, session):
+        api = DeepSeekAPI(api_key="test-key", base_url=BASE_URL, circuit_breaker=False)
+        api.session = session
+        return api
+
+    def warmup(self, api, **kwargs):
+        with patch.object(deepseek_api.socket, "getaddrinfo", return_value=[]):
+            return api.warmup(**kwargs)
+
+    def test_warmup_succeeds(self):
+        session = FakeSession(200)
+        api = self.make_api(session)
+        result = self.warmup(api, probe=True)
+        self.assertEqual((result["dns"], result["connected"], result["auth_ok"], result["error"]),
+                         (True, True, True, None))
+        self.assertEqual(session.calls[0][:2], ("GET", f"{BASE_URL}/models"))
+        self.assertEqual(session.calls[0][2]["Authorization"], "Bearer test-key")
+        self.assertIs(api.warmup_result, result)
+        # 不探测时只发HEAD请求建立连接，不校验密钥
+        result = self.warmup(self.make_api(FakeSession(404)), probe=False)
+        self.assertEqual((result["connected"], result["auth_ok"]), (True, None))
+
+    def test_warmup_reports_auth_failure(self):
+        api = self.make_api(FakeSession(401))
+        result = self.warmup(api, probe=True)
+        self.assertEqual((result["connected"], result["auth_ok"]), (True, False))
+        cli = SimpleNamespace(dialog_handler=SimpleNamespace(api=api), _warmup_reported=False,
+                              _first_request_reported=False)
+        with patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            DeepSeekCLI._report_warmup(cli)
+            DeepSeekCLI._report_warmup(cli)
+        # 只报告一次
+        self.assertEqual(stdout.getvalue().count("API密钥校验失败"), 1)
+        self.assertTrue(cli._warmup_reported)
+        self.assertFalse(cli._first_request_reported)
+
+    def test_warmup_connection_error(self):
+        api = self.make_api(FakeSession(error=requests.exceptions.ConnectTimeout("超时")))
+        result = self.warmup(api, probe=True)
+        self.assertEqual((result["dns"], result["connected"], result["auth_ok"]), (True, False, None))
+        self.assertIn("超时", result["error"])
+
+    def test_first_request_reuses_warm_connection(self):
+        api = self.make_api(FakeSession(warm=True))
+        api._note_first_request(f"{BASE_URL}/chat/completions")
+        self.assertTrue(api.first_request_warm)
+        # 只记录首个请求
+        api.session.warm = False
+        api._note_first_request(f"{BASE_URL}/chat/completions")
+        self.assertTrue(api.first_request_warm)
+        cli = SimpleNamespace(dialog_handler=SimpleNamespace(api=api), _warmup_reported=False,
+                              _first_request_reported=False)
+        DeepSeekCLI._report_warmup(cli)
+        self.assertTrue(cli._first_request_reported)
+
+    def test_pool_inspection_falls_back_when_internals_change(self):
+        api = DeepSeekAPI(api_key="test-key", base_url=BASE_URL, transport="http1", circuit_breaker=False)
+        url = f"{BASE_URL}/chat/completions"
+        self.assertFalse(api._connection_is_warm(url))
+        # 模拟urllib3内部结构变化：连接池不再有poolmanager属性
+        adapter = api.session.get_adapter(url)
+        with patch.object(adapter, "poolmanager", None), \
+                self.assertLogs(deepseek_api.logger, level="DEBUG") as logs:
+            self.assertFalse(api._connection_is_warm(url))
+        self.assertIn("无法读取连接池状态", logs.output[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
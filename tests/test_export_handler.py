@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.handler.journal_handler import JournalHandler
+from src.handler.export_handler import ExportHandler, iter_turns, PYARROW_AVAILABLE
+
+if PYARROW_AVAILABLE:
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+
+
+def write_turns(journal, start, count):
+    for i in range(start, start + count):
+        journal.append({"role": "user", "content": f"问题{i}"})
+        journal.append({"role": "assistant", "content": f"回答{i}"}, end_of_turn=True, model="deepseek-chat",
+                       reasoning_content="思考" * i, latency=0.5 + i, completion_tokens=10 + i)
+    journal.sync()
+
+
+class TestIterTurns(unittest.TestCase):
+    def test_groups_tool_calls_failed_and_pending_turns(self):
+        records = [
+            {"role": "user", "content": "失败的问题"},
+            {"role": "user", "content": "查天气"},
+            {"role": "assistant", "content": "", "tool_calls": [{"id": "a"}, {"id": "b"}]},
+            {"role": "tool", "tool_call_id": "a", "content": "晴"},
+            {"role": "tool", "tool_call_id": "b", "content": "雨"},
+            {"role": "assistant", "content": "一晴一雨", "model": "deepseek-chat", "latency": 1.5},
+            {"role": "user", "content": "尚未回复"},
+        ]
+        turns = list(iter_turns(records, start=10))
+        self.assertEqual([(turn["prompt"], turn.get("reply"), end) for turn, end in turns],
+                         [("失败的问题", None, 11), ("查天气", "一晴一雨", 16)])
+        self.assertEqual((turns[1][0]["tool_calls"], turns[1][0]["latency"]), (2, 1.5))
+
+
+@unittest.skipUnless(PYARROW_AVAILABLE, "需要pyarrow")
+class TestExportHandler(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp()
+        self.journal_dir = os.path.join(self.work_dir, "sessions")
+        self.out_dir = os.path.join(self.work_dir, "export")
+        self.journal = JournalHandler("s1", journal_dir=self.journal_dir, fsync_policy='never')
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.work_dir)
+
+    def _parts(self):
+        return sorted(name for name in os.listdir(self.out_dir) if name.startswith("part-"))
+
+    def _export(self, **options):
+        with ExportHandler(self.out_dir, **options) as exporter:
+            exporter.export_journal(JournalHandler(journal_dir=self.journal_dir))
+        return exporter
+
+    def test_incremental_parquet_export_in_row_groups(self):
+        write_turns(self.journal, 0, 5)
+        exporter = self._export(row_group_rows=2)
+        self.assertEqual(exporter.stats, {"sessions": 1, "turns": 5, "row_groups": 3})
+        parquet = pq.ParquetFile(os.path.join(self.out_dir, exporter.part_name))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        table = parquet.read()
+        self.assertEqual(table.column("prompt").to_pylist(), [f"问题{i}" for i in range(5)])
+        self.assertEqual(table.column("latency_s").to_pylist()[4], 4.5)
+        self.assertEqual(table.column("reasoning_chars").to_pylist()[3], 6)
+        self.assertEqual(table.column("reasoning").null_count, 5)
+
+        # 再次导出只写出新增的完整轮次，没有新增时不产生分片
+        write_turns(self.journal, 5, 2)
+        self.journal.append({"role": "user", "content": "尚未回复"})
+        self.journal.sync()
+        exporter = self._export()
+        self.assertEqual(exporter.stats["turns"], 2)
+        self.assertEqual(self._export().stats["turns"], 0)
+        self.assertEqual(len(self._parts()), 2)
+        table = pq.read_table(self.out_dir)
+        self.assertEqual(sorted(table.column("turn").to_pylist()), list(range(7)))
+
+    def test_failed_export_leaves_no_part_and_keeps_state(self):
+        write_turns(self.journal, 0, 3)
+        with self.assertRaises(KeyboardInterrupt):
+            with ExportHandler(self.out_dir, row_group_rows=1) as exporter:
+                exporter.export_journal(JournalHandler(journal_dir=self.journal_dir))
+                raise KeyboardInterrupt
+        self.assertEqual(self._parts(), [])
+        self.assertEqual(self._export().stats["turns"], 3)
+
+    def test_arrow_format(self):
+        write_turns(self.journal, 0, 3)
+        exporter = self._export(fmt="arrow", include_reasoning=True)
+        with pyarrow.ipc.open_file(os.path.join(self.out_dir, exporter.part_name)) as reader:
+            table = reader.read_all()
+        self.assertEqual(table.column("reasoning").to_pylist(), ["", "思考", "思考思考"])
+        with self.assertRaises(ValueError):
+            ExportHandler(self.out_dir, fmt="parquet")
+
+
+if __name__ == '__main__':
+    unittest.main()
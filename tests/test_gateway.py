@@ -0,0 +1,165 @@
+import json
+import threading
+import unittest
+from unittest.mock import patch
+import requests
+from src.api.gateway import GatewayServer, ResponseCache
+# 使用网关实际导入的异常类（src已在sys.path中时网关会以包模式导入circuit_breaker）
+from src.api.gateway import CircuitOpenError
+from src.api.rate_limiter import RateLimiter
+
+COMPLETION = {"choices": [{"message": {"role": "assistant", "content": "好"}}]}
+
+
+class FakeUpstreamResponse:
+    def __init__(self, status_code, body=b"", headers=None, blocks=None, fail_after=None):
+        self.status_code = status_code
+        self.content = body
+        self.headers = headers or {"Content-Type": "application/json"}
+        self.blocks = blocks or []
+        self.fail_after = fail_after
+
+    def iter_content(self, chunk_size=None):
+        for i, block in enumerate(self.blocks):
+            if i == self.fail_after:
+                raise requests.exceptions.ConnectionError("上游连接中断")
+            yield block
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+class FakeAPI:
+    """按顺序返回预设的上游响应（或抛出预设的异常），记录收到的请求"""
+
+    base_url = "https://upstream.example.com/v1"
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.requests = []
+
+    def raw_request(self, endpoint, data=None, method="POST", stream=False, timeout=None):
+        self.requests.append((endpoint, data, stream))
+        response = self.responses.pop(0) if len(self.responses) > 1 else self.responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def circuit_stats(self):
+        return {"chat/completions:deepseek-chat": {"state": "closed"}}
+
+    def compression_stats(self):
+        return {"encoding": "off"}
+
+
+def ok_response():
+    return FakeUpstreamResponse(200, json.dumps(COMPLETION).encode('utf-8'))
+
+
+class TestGateway(unittest.TestCase):
+    def start(self, api, **options):
+        options.setdefault("rate_limiter", RateLimiter(0))
+        server = GatewayServer(("127.0.0.1", 0), api, **options)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.url = f"http://127.0.0.1:{server.server_port}"
+        return server
+
+    def post(self, payload, **kwargs):
+        return requests.post(f"{self.url}/v1/chat/completions", json=payload, timeout=5, **kwargs)
+
+    def test_token_auth(self):
+        api = FakeAPI(ok_response())
+        self.start(api, token="secret")
+        payload = {"model": "deepseek-chat", "messages": [{"role": "user", "content": "hi"}]}
+        response = self.post(payload)
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.json()["error"]["type"], "authentication_error")
+        self.assertEqual(api.requests, [])
+        self.assertEqual(self.post(payload, headers={"Authorization": "Bearer secret"}).status_code, 200)
+
+    def test_non_stream_passthrough_and_cache_hit(self):
+        api = FakeAPI(ok_response())
+        server = self.start(api, token=None, cache=ResponseCache(max_entries=8, ttl=60))
+        payload = {"model": "deepseek-chat", "temperature": 0, "messages": [{"role": "user", "content": "hi"}]}
+        first, second = self.post(payload), self.post(payload)
+        self.assertEqual(first.json(), COMPLETION)
+        self.assertEqual(second.json(), COMPLETION)
+        self.assertEqual((first.headers["X-Gateway-Cache"], second.headers["X-Gateway-Cache"]), ("miss", "hit"))
+        self.assertEqual(len(api.requests), 1)
+        # temperature不为0的请求默认不缓存
+        self.post(dict(payload, temperature=0.7))
+        self.assertEqual(len(api.requests), 2)
+        self.assertEqual(server.metrics.get("cache_hits"), 1)
+
+    def test_stream_passthrough(self):
+        blocks = [b'data: {"choices": [{"delta": {"content": "A"}}]}\n\n', b"data: [DONE]\n\n"]
+        api = FakeAPI(FakeUpstreamResponse(200, headers={"Content-Type": "text/event-stream"}, blocks=blocks))
+        self.start(api, token=None)
+        response = self.post({"model": "deepseek-chat", "stream": True, "messages": []}, stream=True)
+        self.assertEqual(response.headers["Transfer-Encoding"], "chunked")
+        self.assertEqual(b"".join(response.iter_content(chunk_size=None)), b"".join(blocks))
+        self.assertTrue(api.requests[0][2])
+
+    def test_upstream_failure_mid_stream_ends_chunked_body(self):
+        blocks = [b'data: {"choices": [{"delta": {"content": "A"}}]}\n\n', b"data: [DONE]\n\n"]
+        api = FakeAPI(FakeUpstreamResponse(200, headers={"Content-Type": "text/event-stream"}, blocks=blocks,
+                                           fail_after=1))
+        server = self.start(api, token=None)
+        response = self.post({"model": "deepseek-chat", "stream": True, "messages": []}, stream=True)
+        body = b"".join(response.iter_content(chunk_size=None)).decode('utf-8')
+        # 已发出200头部后不能再发送502，改为以SSE error事件结束流，而不是插入第二个状态行
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(body.startswith(blocks[0].decode('utf-8')))
+        self.assertIn("event: error", body)
+        self.assertNotIn("HTTP/1.1", body)
+        self.assertEqual(server.metrics.get("stream_errors"), 1)
+
+    def test_retries_429_then_succeeds(self):
+        throttled = FakeUpstreamResponse(429, b"{}", headers={"Retry-After": "0"})
+        api = FakeAPI(throttled, FakeUpstreamResponse(503, b"{}"), ok_response())
+        server = self.start(api, token=None, max_retries=3)
+        with patch("src.api.gateway.time.sleep"):
+            response = self.post({"model": "deepseek-chat", "messages": []})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(api.requests), 3)
+        self.assertEqual(server.metrics.get("upstream_retries"), 2)
+        self.assertEqual(server.metrics.get("upstream_status_429"), 1)
+        # 重试次数用尽后返回上游最后的状态码
+        api.responses = [FakeUpstreamResponse(502, b'{"error": "bad gateway"}')]
+        with patch("src.api.gateway.time.sleep"):
+            self.assertEqual(self.post({"model": "deepseek-chat", "messages": []}).status_code, 502)
+
+    def test_circuit_open_returns_503_with_retry_after(self):
+        api = FakeAPI(CircuitOpenError("chat/completions:deepseek-chat", 12.3))
+        server = self.start(api, token=None)
+        response = self.post({"model": "deepseek-chat", "messages": []})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.headers["Retry-After"], "13")
+        self.assertEqual(response.json()["error"]["type"], "circuit_open")
+        self.assertEqual(server.metrics.get("circuit_rejected"), 1)
+
+    def test_health_and_metrics(self):
+        api = FakeAPI(ok_response())
+        self.start(api, token="secret")
+        self.assertEqual(requests.get(f"{self.url}/health", timeout=5).json(), {"status": "ok"})
+        self.post({"model": "deepseek-chat", "messages": []}, headers={"Authorization": "Bearer secret"})
+        metrics = requests.get(f"{self.url}/metrics", timeout=5).json()
+        self.assertEqual(metrics["counters"]["requests"], 1)
+        self.assertEqual(metrics["circuits"], api.circuit_stats())
+        self.assertEqual(metrics["upstream_compression"], {"encoding": "off"})
+        self.assertIn("paused_for", metrics["rate_limiter"])
+        self.assertEqual(metrics["cache_entries"], 0)
+        self.assertEqual(requests.get(f"{self.url}/unknown", timeout=5).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
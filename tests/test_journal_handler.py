@@ -0,0 +1,81 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.handler.journal_handler import JournalHandler, INDEX_RECORD
+
+
+class TestJournalHandler(unittest.TestCase):
+    def setUp(self):
+        self.journal_dir = tempfile.mkdtemp()
+        self.journal = JournalHandler('test-session', journal_dir=self.journal_dir, fsync_policy='never')
+
+    def tearDown(self):
+        self.journal.close()
+        shutil.rmtree(self.journal_dir)
+
+    def test_append_and_load(self):
+        self.journal.append({"role": "user", "content": "你好"})
+        self.journal.append({"role": "assistant", "content": "hello\nworld"}, end_of_turn=True, model="deepseek-chat")
+        messages = self.journal.load('test-session')
+        self.assertEqual(messages, [
+            {"role": "user", "content": "你好"},
+            {"role": "assistant", "content": "hello\nworld"},
+        ])
+        self.assertEqual(self.journal.load('test-session', last_n=1)[0]["role"], "assistant")
+
+    def test_read_single_record(self):
+        for i in range(3):
+            self.journal.append({"role": "user", "content": str(i)}, model=f"m{i}")
+        self.assertEqual(self.journal.read_record('test-session', 1)["model"], "m1")
+        self.assertIsNone(self.journal.read_record('test-session', 3))
+        self.assertIsNone(self.journal.read_record('test-session', -1))
+
+    def test_list_sessions_counts_from_index(self):
+        for i in range(3):
+            self.journal.append({"role": "user", "content": str(i)})
+        sessions = self.journal.list_sessions()
+        self.assertEqual(len(sessions), 1)
+        self.assertEqual(sessions[0]["messages"], 3)
+
+    def test_repair_missing_index_and_torn_tail(self):
+        self.journal.append({"role": "user", "content": "a"})
+        self.journal.append({"role": "assistant", "content": "b"})
+        self.journal.close()
+        journal_path = os.path.join(self.journal_dir, 'test-session.jsonl')
+        index_path = os.path.join(self.journal_dir, 'test-session.idx')
+        # 模拟崩溃：最后一条索引丢失，日志尾部写了一半
+        with open(index_path, 'r+b') as f:
+            f.truncate(INDEX_RECORD.size)
+        with open(journal_path, 'ab') as f:
+            f.write(b'{"role": "user", "con')
+        messages = self.journal.load('test-session')
+        self.assertEqual([m["content"] for m in messages], ["a", "b"])
+
+    def test_append_after_torn_tail_is_repaired(self):
+        self.journal.append({"role": "user", "content": "a"})
+        self.journal.append({"role": "assistant", "content": "b"})
+        self.journal.close()
+        with open(os.path.join(self.journal_dir, 'test-session.jsonl'), 'ab') as f:
+            f.write(b'{"role": "user", "con')
+        # 重新打开后截断尾部，新记录的偏移量必须指向截断后的末尾
+        self.journal = JournalHandler('test-session', journal_dir=self.journal_dir, fsync_policy='never')
+        self.journal.append({"role": "user", "content": "c"})
+        messages = self.journal.load('test-session')
+        self.assertEqual([m["content"] for m in messages], ["a", "b", "c"])
+
+    def test_invalid_session_id(self):
+        with self.assertRaises(ValueError):
+            self.journal.load('../etc/passwd')
+        with self.assertRaises(ValueError):
+            self.journal.exists('../etc/passwd')
+
+    def test_exists(self):
+        self.assertFalse(self.journal.exists('test-session'))
+        self.journal.append({"role": "user", "content": "a"})
+        self.assertTrue(self.journal.exists('test-session'))
+        self.assertFalse(self.journal.exists('other-session'))
+
+
+if __name__ == '__main__':
+    unittest.main()
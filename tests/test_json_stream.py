@@ -0,0 +1,90 @@
+import io
+import json
+import random
+import time
+import unittest
+from src.api.json_stream import IncrementalJSONParser, iter_json_events
+from src.cli.print_mode import write_json_events
+
+DOCUMENT = {
+    "items": [{"id": i, "name": f"记录\"{i}\"\n", "score": i * -1.5e-3, "ok": i % 2 == 0, "note": None,
+               "tags": [], "meta": {}} for i in range(30)],
+    "total": 30,
+    "nested": [1, [2, [3.25]], "x"],
+}
+
+
+def as_chunks(text, size):
+    for start in range(0, len(text), size):
+        yield {"choices": [{"delta": {"content": text[start:start + size], "reasoning_content": ""}}]}
+
+
+class TestIncrementalJSONParser(unittest.TestCase):
+    def test_any_chunking_rebuilds_document(self):
+        text = json.dumps(DOCUMENT, ensure_ascii=False, indent=1)
+        rng = random.Random(42)
+        for _ in range(50):
+            parser = IncrementalJSONParser(max_depth=2)
+            events = []
+            pos = 0
+            while pos < len(text):
+                step = rng.randint(1, 9)
+                events.extend(parser.feed(text[pos:pos + step]))
+                pos += step
+            events.extend(parser.close())
+            self.assertEqual(parser.result, DOCUMENT)
+            self.assertEqual(events[-1], ((), DOCUMENT))
+            records = [event.value for event in events if len(event.path) == 2 and event.path[0] == "items"]
+            self.assertEqual(records, DOCUMENT["items"])
+
+    def test_records_are_emitted_before_stream_ends(self):
+        text = "```json\n" + json.dumps(DOCUMENT, ensure_ascii=False)
+        consumed = []
+
+        def chunks():
+            for index, chunk in enumerate(as_chunks(text, 16)):
+                consumed.append(index)
+                yield chunk
+
+        events = iter_json_events(chunks(), max_depth=2)
+        first = next(event for event in events if event.path == ("items", 0))
+        self.assertEqual(first.value, DOCUMENT["items"][0])
+        self.assertLess(len(consumed), len(text) // 16 // 10)
+
+    def test_long_string_value_in_small_chunks(self):
+        value = '长文本"引号\\反斜杠\n' * 20000
+        document = {"items": [{"text": value}, {"text": "短"}], "key\\": "\\"}
+        text = json.dumps(document, ensure_ascii=False)
+        parser = IncrementalJSONParser(max_depth=2)
+        events = []
+        start = time.perf_counter()
+        # 未结束的字符串每次只扫描新文本，耗时随长度线性增长（逐次重新匹配时需要数十秒）
+        for pos in range(0, len(text), 12):
+            events.extend(parser.feed(text[pos:pos + 12]))
+        events.extend(parser.close())
+        self.assertLess(time.perf_counter() - start, 2.0)
+        self.assertEqual(parser.result, document)
+        self.assertEqual(events[0], (("items", 0), {"text": value}))
+        # 转义符恰好位于数据块末尾时也能正确续接
+        parser = IncrementalJSONParser()
+        for char in '["a\\"b\\\\", "c"]':
+            parser.feed(char)
+        parser.close()
+        self.assertEqual(parser.result, ['a"b\\', "c"])
+
+    def test_invalid_and_truncated_json(self):
+        for bad in ['{"a" 1}', '[1,,2]', '{"a": tru e}', '[1.]', '{"a": 1', '["未结束', '{"a": "\\']:
+            parser = IncrementalJSONParser()
+            with self.assertRaises(ValueError, msg=bad):
+                parser.feed(bad)
+                parser.close()
+
+    def test_print_mode_writes_jsonl_events(self):
+        out = io.StringIO()
+        write_json_events(as_chunks('{"items": [{"id": 1}, {"id": 2}], "total": 2}', 5), 2, out)
+        self.assertEqual([json.loads(line) for line in out.getvalue().splitlines()],
+                         [{"path": ["items", 0], "value": {"id": 1}}, {"path": ["items", 1], "value": {"id": 2}}])
+
+
+if __name__ == '__main__':
+    unittest.main()
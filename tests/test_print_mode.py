@@ -0,0 +1,155 @@
+import io
+import os
+import sys
+import unittest
+from unittest.mock import patch
+import requests
+from src.cli import print_mode
+from src.cli.main import build_parser, main
+from src.cli.print_mode import (run_print, read_prompt, EXIT_OK, EXIT_USAGE, EXIT_AUTH, EXIT_BAD_REQUEST,
+                                EXIT_UNAVAILABLE, EXIT_API_ERROR)
+
+
+class FakeStdin(io.StringIO):
+    def __init__(self, text='', tty=False):
+        super().__init__(text)
+        self.tty = tty
+
+    def isatty(self):
+        return self.tty
+
+
+class FakeAPI:
+    """回放预设的回复，或在第一个数据块前抛出预设的异常"""
+
+    def __init__(self, content="好的", error=None):
+        self.content = content
+        self.error = error
+        self.messages = None
+
+    def chat_completion_stream(self, messages, **kwargs):
+        self.messages = messages
+        if self.error:
+            raise self.error
+        for char in self.content:
+            yield {"choices": [{"delta": {"content": char, "reasoning_content": None}}]}
+
+
+def _wrap(error):
+    """与DeepSeekAPI一致：requests异常被包装为通用异常，原始异常保存在__cause__中"""
+    wrapped = Exception(f"API请求失败: {str(error)}")
+    wrapped.__cause__ = error
+    return wrapped
+
+
+def http_error_response(status_code):
+    response = requests.Response()
+    response.status_code = status_code
+    return requests.exceptions.HTTPError(f"{status_code} Error", response=response)
+
+
+class TestPrintMode(unittest.TestCase):
+    def run_print(self, argv, stdin='', api=None, env=None):
+        args = build_parser().parse_args(argv)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        env = {"DEEPSEEK_API_KEY": "test-key"} if env is None else env
+        with patch.dict(os.environ, env, clear=True), patch.object(print_mode, "UPSTREAMS", None), \
+                patch.object(print_mode, "create_api", lambda *a, **k: api or FakeAPI()), \
+                patch("sys.stdin", FakeStdin(stdin, tty=not stdin)), \
+                patch("sys.stdout", stdout), patch("sys.stderr", stderr):
+            code = run_print(args)
+        return code, stdout.getvalue(), stderr.getvalue()
+
+    def test_prompt_from_argument_and_stdin(self):
+        api = FakeAPI("回复")
+        code, out, _ = self.run_print(["-p", "总结"], stdin="日志内容", api=api)
+        self.assertEqual((code, out), (EXIT_OK, "回复"))
+        self.assertEqual(api.messages[0]["content"], "总结\n\n日志内容")
+        api = FakeAPI()
+        self.run_print(["-p"], stdin="只有标准输入", api=api)
+        self.assertEqual(api.messages[0]["content"], "只有标准输入")
+        with patch("sys.stdin", FakeStdin(tty=True)):
+            self.assertEqual(read_prompt("只有参数"), "只有参数")
+
+    def test_empty_prompt_and_missing_key(self):
+        code, out, err = self.run_print(["-p", "  "])
+        self.assertEqual((code, out), (EXIT_USAGE, ""))
+        self.assertIn("提示为空", err)
+        code, _, err = self.run_print(["-p", "你好"], env={})
+        self.assertEqual(code, EXIT_AUTH)
+        self.assertIn("DEEPSEEK_API_KEY", err)
+
+    def test_classified_errors_map_to_exit_codes(self):
+        cases = [
+            (_wrap(http_error_response(401)), EXIT_AUTH),
+            (_wrap(http_error_response(400)), EXIT_BAD_REQUEST),
+            (_wrap(requests.exceptions.ConnectionError("连接被拒绝")), EXIT_UNAVAILABLE),
+            (_wrap(http_error_response(500)), EXIT_API_ERROR),
+            (RuntimeError("其他错误"), EXIT_API_ERROR),
+        ]
+        for error, expected in cases:
+            code, out, err = self.run_print(["-p", "你好"], api=FakeAPI(error=error))
+            self.assertEqual(code, expected, repr(error.__cause__ or error))
+            self.assertEqual(out, "")
+            self.assertTrue(err.startswith("错误: "))
+
+
+class TestMainDispatch(unittest.TestCase):
+    def test_dispatch(self):
+        # main优先以包模式导入cli.print_mode，统一指向同一模块，保证替换生效
+        with patch.dict(sys.modules, {"cli.print_mode": print_mode}), \
+                patch("src.cli.print_mode.run_print", return_value=EXIT_AUTH) as run:
+            with self.assertRaises(SystemExit) as cm:
+                main(["-p", "你好", "--model", "deepseek-reasoner"])
+        self.assertEqual(cm.exception.code, EXIT_AUTH)
+        self.assertEqual((run.call_args[0][0].print_prompt, run.call_args[0][0].model), ("你好", "deepseek-reasoner"))
+        for command, target, argv in (("batch", "run_batch", ["batch", "in.jsonl", "-o", "out.jsonl"]),
+                                      ("serve", "run_serve", ["serve", "--port", "9000"])):
+            with patch(f"src.cli.main.{target}", return_value=0) as run, self.assertRaises(SystemExit) as cm:
+                main(argv)
+            self.assertEqual(cm.exception.code, 0)
+            self.assertEqual(run.call_args[0][0].command, command)
+        self.assertEqual(run.call_args[0][0].port, 9000)
+
+    def test_interactive_mode_uses_model_and_temperature(self):
+        from src.cli import deepseek_client
+        with patch.dict(sys.modules, {"cli.deepseek_client": deepseek_client}), \
+                patch.object(deepseek_client.DeepSeekCLI, "run", autospec=True) as run, \
+                patch.object(deepseek_client, "create_api", lambda: FakeAPI()), \
+                patch.dict(os.environ, {"DEEPSEEK_API_KEY": "test-key"}):
+            main(["--model", "deepseek-reasoner", "--temperature", "0.2"])
+        cli = run.call_args[0][0]
+        self.assertEqual((cli.dialog_handler.model, cli.dialog_handler.temperature), ("deepseek-reasoner", 0.2))
+        # 之后新建的会话同样使用启动参数
+        session = cli.sessions.new("work")
+        self.assertEqual((session.chat_handler.model, session.chat_handler.temperature), ("deepseek-reasoner", 0.2))
+        cli.sessions.close()
+
+    def test_failed_turn_does_not_show_previous_reasoning(self):
+        from src.cli import deepseek_client
+
+        class FailingAPI(FakeAPI):
+            warmup_result = first_request_warm = None
+
+            def chat_completion(self, messages, **kwargs):
+                raise Exception("上游错误")
+
+        with patch.object(deepseek_client, "create_api", lambda: FailingAPI()), \
+                patch.dict(os.environ, {"DEEPSEEK_API_KEY": "test-key"}):
+            cli = deepseek_client.DeepSeekCLI()
+        self.addCleanup(cli.sessions.close)
+        handler = cli.dialog_handler
+        handler.journal = None
+        handler.messages = [{"role": "user", "content": "旧问题"}, {"role": "assistant", "content": "旧回答"}]
+        handler.reasoning = {1: "上一轮的推理"}
+        cli.command_handler.stream_mode = False
+        with patch.object(deepseek_client, "ReasoningDisplay") as display, \
+                patch.object(deepseek_client, "WARMUP_ENABLED", False), \
+                patch("builtins.input", side_effect=["新问题", "/quit"]), \
+                patch("sys.stdout", io.StringIO()), patch.object(deepseek_client, "Console"):
+            cli.run()
+        display.return_value.show.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from rich.console import Console
+from src.handler.reasoning_handler import ReasoningDisplay
+from tests.helpers import IdleInputHandler, make_chat_handler
+
+
+class ReasoningAPI:
+    def __init__(self, steps):
+        self.steps = steps
+
+    def chat_completion_stream(self, messages, model, temperature):
+        for i in range(self.steps):
+            yield {"choices": [{"delta": {"reasoning_content": f"第{i}步推理\n", "content": ""}}]}
+        yield {"choices": [{"delta": {"reasoning_content": "", "content": "答案"}}]}
+
+
+class TestReasoningDisplay(unittest.TestCase):
+    def _console(self):
+        return Console(file=io.StringIO(), force_terminal=True, width=80, height=40)
+
+    def test_terminal_output_is_bounded(self):
+        sizes = {}
+        for mode in ("full", "hidden", "tail", "collapse"):
+            console = self._console()
+            display = ReasoningDisplay(mode, console=console, tail_lines=5)
+            with redirect_stdout(io.StringIO()) as stdout:
+                for i in range(20000):
+                    display.write(f"第{i}步推理\n")
+                display.finish()
+            sizes[mode] = len(console.file.getvalue()) + len(stdout.getvalue())
+            if mode == "tail":
+                self.assertIn("第19999步推理", console.file.getvalue())
+            if mode == "collapse":
+                self.assertIn("推理过程已折叠", console.file.getvalue())
+        self.assertGreater(sizes["full"], 200000)
+        for mode in ("hidden", "tail", "collapse"):
+            self.assertLess(sizes[mode], 20000, mode)
+
+    def test_show_non_streaming(self):
+        console = self._console()
+        ReasoningDisplay("tail", console=console, tail_lines=2).show("一\n二\n三\n")
+        output = console.file.getvalue()
+        self.assertIn("三", output)
+        self.assertNotIn("一", output)
+
+    def test_chat_handler_keeps_full_reasoning(self):
+        chat_handler = make_chat_handler(ReasoningAPI(500))
+        chat_handler.model = "deepseek-reasoner"
+        chat_handler.add_user_message("问题")
+        with patch.object(ReasoningDisplay, "_mode", "hidden"), \
+                patch("src.handler.input_handler.InputHandler", IdleInputHandler), \
+                redirect_stdout(io.StringIO()) as stdout:
+            self.assertEqual(chat_handler.get_assistant_reply(stream=True), "答案")
+        self.assertNotIn("第499步推理", stdout.getvalue())
+        self.assertIn("推理过程已隐藏", stdout.getvalue())
+        self.assertEqual(chat_handler.get_reasoning().count("推理"), 500)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import unittest
+from src.api.deepseek_api import DeepSeekAPI
+from src.api.request_compression import (RequestCompressor, compress, decompress, ZSTD_AVAILABLE, ACCEPTED,
+                                         REJECTED, UNKNOWN)
+
+URL = "https://api.example.com/v1/chat/completions"
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+    def json(self):
+        return {"choices": [{"message": {"content": "好", "reasoning_content": ""}}]}
+
+    def raise_for_status(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class FakeSession:
+    """记录请求，accept为False时拒绝压缩的请求体(415)"""
+
+    def __init__(self, accept):
+        self.accept = accept
+        self.sent = []
+
+    def request(self, method, url, headers=None, data=None, stream=False, timeout=None):
+        encoding = headers.get("Content-Encoding")
+        self.sent.append((encoding, len(data)))
+        if encoding and not self.accept:
+            return FakeResponse(415)
+        json.loads(decompress(data, encoding))
+        return FakeResponse(200)
+
+
+def long_history():
+    return [{"role": "user", "content": "请总结下面的日志：\n" + "2024-01-01 INFO request ok\n" * 2000}]
+
+
+class TestRequestCompressor(unittest.TestCase):
+    def test_threshold_and_round_trip(self):
+        compressor = RequestCompressor('gzip', min_bytes=1024)
+        self.assertEqual(compressor.encode(URL, b'{"a": 1}'), (b'{"a": 1}', None))
+        body = json.dumps(long_history()).encode('utf-8')
+        compressed, encoding = compressor.encode(URL, body)
+        self.assertEqual(encoding, 'gzip')
+        self.assertEqual(decompress(compressed, encoding), body)
+        stats = compressor.snapshot()
+        self.assertEqual((stats["compressed"], stats["skipped"]), (1, 1))
+        self.assertGreater(stats["bytes_saved"], len(body) * 0.9)
+        with self.assertRaises(ValueError):
+            decompress(compress(b'0' * 4096, 'gzip'), 'gzip', max_size=1024)
+
+    @unittest.skipUnless(ZSTD_AVAILABLE, "需要安装zstandard")
+    def test_zstd(self):
+        body = json.dumps(long_history()).encode('utf-8')
+        self.assertEqual(decompress(compress(body, 'zstd'), 'zstd'), body)
+
+
+class TestCompressedRequests(unittest.TestCase):
+    def _api(self, accept):
+        api = DeepSeekAPI(api_key="test-key", compression="gzip")
+        api.session = FakeSession(accept)
+        return api
+
+    def test_rejecting_endpoint_falls_back_and_is_remembered(self):
+        api = self._api(accept=False)
+        api.chat_completion(long_history())
+        api.chat_completion(long_history())
+        # 首次压缩被拒后以原始请求体重发，之后不再压缩
+        self.assertEqual([encoding for encoding, _ in api.session.sent], ['gzip', None, None])
+        self.assertEqual(api.compressor.state(api.base_url), REJECTED)
+        self.assertEqual(api.compression_stats()["fallbacks"], 1)
+
+    def test_transient_error_on_retry_does_not_disable_compression(self):
+        compressor = RequestCompressor("gzip")
+        for status in (429, 500, 503, 400):
+            self.assertTrue(compressor.should_fallback(URL, 415))
+            # 重发遇到限流或服务端错误时无法判断端点是否接受压缩，下次仍会探测
+            compressor.record_fallback(URL, status)
+            self.assertEqual(compressor.state(URL), UNKNOWN)
+        compressor.record_fallback(URL, 200)
+        self.assertEqual(compressor.state(URL), REJECTED)
+
+    def test_accepting_endpoint_keeps_compressing(self):
+        api = self._api(accept=True)
+        api.chat_completion(long_history())
+        api.chat_completion([{"role": "user", "content": "短消息"}])
+        api.chat_completion(long_history())
+        sent = api.session.sent
+        self.assertEqual([encoding for encoding, _ in sent], ['gzip', None, 'gzip'])
+        self.assertLess(sent[0][1], len(json.dumps(long_history())) // 10)
+        self.assertEqual(api.compressor.state(api.base_url), ACCEPTED)
+
+
+if __name__ == '__main__':
+    unittest.main()
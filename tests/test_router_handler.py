@@ -0,0 +1,102 @@
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.handler.journal_handler import JournalHandler
+from src.handler.router_handler import ModelRouter
+from tests.helpers import make_chat_handler
+
+
+class FakeAPI:
+    def __init__(self, circuits=None):
+        self.models = []
+        self.circuits = circuits or {}
+
+    def chat_completion(self, messages, model, temperature):
+        self.models.append(model)
+        return {"choices": [{"message": {"content": messages[-1]["content"], "reasoning_content": ""}}],
+                "usage": {"completion_tokens": 10}}
+
+    def circuit_stats(self):
+        return self.circuits
+
+
+class TestModelRouter(unittest.TestCase):
+    def setUp(self):
+        self.router = ModelRouter(prior_latency={"deepseek-chat": 4.0, "deepseek-reasoner": 30.0})
+
+    def test_routes_by_prompt_features(self):
+        self.assertEqual(self.router.route("你好").model, "deepseek-chat")
+        self.assertEqual(self.router.route("把这段话翻译成英文：今天天气很好").model, "deepseek-chat")
+        self.assertEqual(self.router.route("证明根号2是无理数").model, "deepseek-reasoner")
+        self.assertEqual(self.router.route("求解方程 x^2 - 5x + 6 = 0，并说明为什么有两个根").model,
+                         "deepseek-reasoner")
+        self.assertEqual(len(self.router.decisions), 4)
+
+    def test_slow_reasoner_raises_threshold(self):
+        prompt = "证明根号2是无理数"
+        for _ in range(5):
+            self.router.record("deepseek-chat", 0.5, 3.0, 300)
+            self.router.record("deepseek-reasoner", 40.0, 120.0, 3000)
+        decision = self.router.route(prompt)
+        self.assertEqual(decision.model, "deepseek-chat")
+        self.assertGreater(decision.threshold, decision.score)
+        stats = self.router.stats()["deepseek-reasoner"]
+        self.assertEqual((stats["samples"], stats["ttft"], stats["latency"]), (5, 40.0, 120.0))
+        self.assertAlmostEqual(stats["tokens_per_second"], 3000 / 80.0)
+
+    def test_open_circuit_and_continuation(self):
+        api = FakeAPI({"chat/completions:deepseek-reasoner": {"state": "open"}})
+        self.assertEqual(self.router.route("证明根号2是无理数", api=api).model, "deepseek-chat")
+        self.assertEqual(self.router.route("继续", previous="deepseek-reasoner").model, "deepseek-reasoner")
+
+    def test_parse_override(self):
+        self.assertEqual(ModelRouter.parse_override("@reasoner 9.11和9.8哪个大"),
+                         ("9.11和9.8哪个大", "deepseek-reasoner"))
+        self.assertEqual(ModelRouter.parse_override("@someone 你好"), ("@someone 你好", None))
+        self.assertEqual(ModelRouter.parse_override("@chat"), ("@chat", None))
+
+
+class TestChatHandlerAutoModel(unittest.TestCase):
+    def setUp(self):
+        self.chat_handler = make_chat_handler(FakeAPI())
+        self.chat_handler.quiet = True
+
+    def test_auto_model_routes_each_turn_and_records_latency(self):
+        self.chat_handler.model = "auto"
+        for prompt in ["你好", "证明根号2是无理数", "@chat 证明根号3是无理数"]:
+            self.chat_handler.add_user_message(prompt)
+            self.chat_handler.get_assistant_reply(stream=False)
+        self.assertEqual(self.chat_handler.api.models, ["deepseek-chat", "deepseek-reasoner", "deepseek-chat"])
+        # 覆盖前缀不会发送给模型
+        self.assertEqual(self.chat_handler.messages[4]["content"], "证明根号3是无理数")
+        self.assertEqual(self.chat_handler.model, "auto")
+        self.assertEqual(self.chat_handler.router.stats()["deepseek-chat"]["samples"], 2)
+
+    def test_override_with_fixed_model(self):
+        self.chat_handler.add_user_message("@reasoner 9.11和9.8哪个大")
+        self.chat_handler.get_assistant_reply(stream=False)
+        self.chat_handler.add_user_message("9.11和9.8哪个大")
+        self.chat_handler.get_assistant_reply(stream=False)
+        self.assertEqual(self.chat_handler.api.models, ["deepseek-reasoner", "deepseek-chat"])
+
+    @patch('src.handler.chat_handler.SEARCH_ENABLED', False)
+    def test_auto_model_journals_and_validates_resolved_model(self):
+        work_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, work_dir, True)
+        journal = self.chat_handler.journal = JournalHandler('auto-test', journal_dir=work_dir, fsync_policy='never')
+        self.addCleanup(journal.close)
+        self.chat_handler.model = "auto"
+        for prompt in ["你好", "证明根号2是无理数"]:
+            self.chat_handler.add_user_message(prompt)
+            self.chat_handler.get_assistant_reply(stream=False)
+        self.assertEqual([record["model"] for record in journal.read_records('auto-test')],
+                         ["deepseek-chat", "deepseek-chat", "deepseek-reasoner", "deepseek-reasoner"])
+        # 推理模型的回复必须包含reasoning_content，按本轮实际模型而不是auto检查
+        response = {"choices": [{"message": {"content": "答", "reasoning_content": None}}]}
+        self.assertFalse(self.chat_handler.validate_response_structure(response, False, model="deepseek-reasoner"))
+        self.assertTrue(self.chat_handler.validate_response_structure(response, False, model="deepseek-chat"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import tempfile
+import unittest
+from src.handler.journal_handler import JournalHandler
+from src.handler.search_handler import SearchHandler, HIGHLIGHT_START, HIGHLIGHT_END
+
+
+class TestSearchHandler(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchHandler(':memory:')
+
+    def tearDown(self):
+        self.index.close()
+
+    def test_incremental_ingest_skips_indexed_messages(self):
+        messages = [{"role": "user", "content": "如何配置连接池"}, {"role": "assistant", "content": "使用Session"}]
+        self.assertEqual(self.index.add_messages('s1', 0, messages), 2)
+        messages.append({"role": "user", "content": "连接池大小"})
+        self.assertEqual(self.index.add_messages('s1', 0, messages), 1)
+        self.assertEqual(self.index.indexed_count('s1'), 3)
+
+    def test_search_highlights_match(self):
+        self.index.add_messages('s1', 0, [{"role": "assistant", "content": "使用requests.Session复用连接池"}])
+        results = self.index.search('连接池')
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]["session_id"], 's1')
+        self.assertIn(f"{HIGHLIGHT_START}连接池{HIGHLIGHT_END}", results[0]["snippet"])
+        self.assertEqual(self.index.search('不存在的内容'), [])
+
+    def test_sync_journals_indexes_only_new_records(self):
+        with tempfile.TemporaryDirectory() as journal_dir:
+            journal = JournalHandler('s1', journal_dir=journal_dir, fsync_policy='never')
+            journal.append({"role": "user", "content": "如何配置连接池"})
+            journal.append({"role": "assistant", "content": "使用Session"})
+            self.assertEqual(self.index.sync_journals(journal), 2)
+            self.assertEqual(self.index.sync_journals(journal), 0)
+            journal.append({"role": "user", "content": "连接池大小"})
+            # 水位线之后的记录才会被读取和写入
+            self.assertEqual(self.index.sync_journals(journal), 1)
+            self.assertEqual(self.index.indexed_count('s1'), 3)
+            journal.close()
+        self.assertEqual(sorted(r["msg_index"] for r in self.index.search('连接池')), [0, 2])
+
+    def test_short_terms_fall_back_to_like(self):
+        self.index.add_messages('s1', 0, [{"role": "user", "content": "用Python写爬虫"},
+                                          {"role": "assistant", "content": "可以用PY脚本，python也行"}])
+        results = self.index.search('py')
+        # 只有短词时按时间倒序返回
+        self.assertEqual([r["msg_index"] for r in results], [1, 0])
+        # 标记不区分大小写，并保留原文的大小写
+        self.assertEqual(results[0]["snippet"],
+                         f"可以用{HIGHLIGHT_START}PY{HIGHLIGHT_END}脚本，{HIGHLIGHT_START}py{HIGHLIGHT_END}thon也行")
+        self.assertIn(f"用{HIGHLIGHT_START}Py{HIGHLIGHT_END}thon", results[1]["snippet"])
+
+    def test_like_snippet_centers_on_first_matched_term(self):
+        content = "前缀" * 40 + "命中Go语言"
+        snippet = SearchHandler._like_snippet(content, ["C", "go"], width=4)
+        self.assertEqual(snippet, f"…前缀命中{HIGHLIGHT_START}Go{HIGHLIGHT_END}语言")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import os
+import time
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+from src.handler.chat_handler import ChatHandler
+from src.handler.search_handler import SearchHandler
+from src.handler.session_handler import SessionManager
+
+
+class SlowAPI:
+    """按消息内容决定耗时的假API，可被多个会话并发调用"""
+
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def chat_completion(self, messages, model, temperature):
+        prompt = messages[-1]["content"]
+        with self._lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(0.3 if prompt.startswith("慢") else 0.0)
+        with self._lock:
+            self.active -= 1
+        return {"choices": [{"message": {"content": f"回答:{prompt}", "reasoning_content": f"思考:{prompt}"}}]}
+
+
+@patch('src.handler.chat_handler.SEARCH_ENABLED', False)
+class TestSessionManager(unittest.TestCase):
+    def setUp(self):
+        self.api = SlowAPI()
+
+        def factory():
+            handler = ChatHandler(api=self.api)
+            handler.journal = None
+            return handler
+
+        self.manager = SessionManager(factory)
+
+    def _wait(self, session):
+        session.worker.join(2)
+        self.assertFalse(session.busy)
+
+    def test_background_generations_run_concurrently_and_buffer_replies(self):
+        first = self.manager.submit("慢问题A")
+        second = self.manager.new("second")
+        self.manager.submit("慢问题B", second)
+        with self.assertRaises(RuntimeError):
+            self.manager.submit("再问", second)
+
+        # 后台生成期间在第三个会话中前台对话，不受阻塞
+        third = self.manager.new()
+        start = time.monotonic()
+        third.chat_handler.add_user_message("快问题")
+        self.assertEqual(third.chat_handler.get_assistant_reply(stream=False), "回答:快问题")
+        self.assertLess(time.monotonic() - start, 0.2)
+
+        self._wait(first)
+        self._wait(second)
+        self.assertGreaterEqual(self.api.max_active, 2)
+        self.assertEqual(sorted(self.manager.drain_finished()), ["1", "second"])
+
+        session, results = self.manager.switch("1")
+        self.assertIs(self.manager.current, session)
+        self.assertEqual([(r["reply"], r["reasoning"]) for r in results], [("回答:慢问题A", "思考:慢问题A")])
+        self.assertEqual(self.manager.switch("1")[1], [])
+        self.assertEqual([m["role"] for m in session.chat_handler.messages], ["user", "assistant"])
+        self.assertEqual(len(second.chat_handler.messages), 2)
+
+    def test_list_and_invalid_names(self):
+        self.manager.new("work")
+        with self.assertRaises(ValueError):
+            self.manager.new("work")
+        with self.assertRaises(KeyError):
+            self.manager.switch("missing")
+        self.assertEqual([(s["name"], s["current"]) for s in self.manager.list_sessions()],
+                         [("1", False), ("work", True)])
+
+    def test_close_releases_every_session(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, True)
+        work = self.manager.new("work")
+        handlers = [self.manager.get("1").chat_handler, work.chat_handler]
+        for index, handler in enumerate(handlers):
+            handler.tools._get_executor()
+            handler._search_index = SearchHandler(os.path.join(temp_dir, f"search{index}.db"))
+        self.manager.close()
+        for handler in handlers:
+            self.assertIsNone(handler.tools._executor)
+            self.assertIsNone(handler._search_index)
+
+    def test_tee_covers_sessions_created_later(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir, True)
+        path = os.path.join(temp_dir, "transcript.md")
+        tee = self.manager.start_tee(path)
+        work = self.manager.new("work")
+        self.assertIs(work.chat_handler.tee, tee)
+        for session, prompt in ((self.manager.get("1"), "问题一"), (work, "问题二")):
+            session.chat_handler.add_user_message(prompt)
+            session.chat_handler.get_assistant_reply(stream=False)
+        self.manager.close()
+        self.assertFalse(tee.active)
+        self.assertIsNone(work.chat_handler.tee)
+        with open(path, encoding='utf-8') as f:
+            transcript = f.read()
+        self.assertRegex(transcript, r"## 第1轮 · 会话1 · .*\n+\*\*用户\*\*\n\n问题一")
+        self.assertRegex(transcript, r"## 第2轮 · 会话work · .*\n+\*\*用户\*\*\n\n问题二")
+        self.assertIn("回答:问题二", transcript)
+
+
+if __name__ == '__main__':
+    unittest.main()
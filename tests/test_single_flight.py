@@ -0,0 +1,127 @@
+import time
+import threading
+import unittest
+from src.api.single_flight import SingleFlight
+
+
+class TestSingleFlight(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+        self.release = threading.Event()
+
+    def _upstream(self, count=5, error=None):
+        def factory():
+            self.calls += 1
+            self.release.wait(2)
+            for i in range(count):
+                yield i
+            if error:
+                raise error
+        return factory
+
+    def _collect(self, iterator, results, delay=0.0):
+        try:
+            for item in iterator:
+                results.append(item)
+                time.sleep(delay)
+        except Exception as e:
+            results.append(e)
+
+    def test_concurrent_identical_requests_share_one_upstream_call(self):
+        flight = SingleFlight()
+        factory = self._upstream()
+        outputs = [[] for _ in range(5)]
+        streams = [flight.stream('k', factory) for _ in range(5)]
+        threads = [threading.Thread(target=self._collect, args=(s, out)) for s, out in zip(streams, outputs)]
+        for t in threads:
+            t.start()
+        self.release.set()
+        for t in threads:
+            t.join(2)
+        self.assertEqual(self.calls, 1)
+        self.assertTrue(all(out == [0, 1, 2, 3, 4] for out in outputs))
+        self.assertEqual(flight.stats["joined"], 4)
+
+    def test_late_joiner_gets_replay(self):
+        flight = SingleFlight()
+        resume = threading.Event()
+
+        def factory():
+            self.calls += 1
+            yield 0
+            yield 1
+            resume.wait(2)
+            yield 2
+
+        first = flight.stream('k', factory)
+        self.assertEqual([next(first), next(first)], [0, 1])
+        late = flight.stream('k', factory)
+        # 首次迭代时订阅，回放已收到的数据块
+        self.assertEqual(next(late), 0)
+        resume.set()
+        self.assertEqual(list(late), [1, 2])
+        self.assertEqual(list(first), [2])
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(flight.stats["late_joined"], 1)
+
+    def test_slow_subscriber_catches_up_from_replay(self):
+        flight = SingleFlight(buffer_size=1, put_timeout=0.01)
+        fast, slow = [], []
+        factory = self._upstream(count=20)
+        streams = [flight.stream('k', factory), flight.stream('k', factory)]
+        threads = [threading.Thread(target=self._collect, args=(streams[0], fast)),
+                   threading.Thread(target=self._collect, args=(streams[1], slow, 0.02))]
+        for t in threads:
+            t.start()
+        self.release.set()
+        for t in threads:
+            t.join(5)
+        self.assertEqual(fast, list(range(20)))
+        self.assertEqual(slow, list(range(20)))
+        self.assertGreaterEqual(flight.stats["lagging"], 1)
+
+    def test_stream_is_not_started_until_iterated(self):
+        flight = SingleFlight()
+        self.release.set()
+        unused = flight.stream('k', self._upstream())
+        self.assertEqual((self.calls, flight.stats["flights"]), (0, 0))
+        del unused
+        # 从未迭代的生成器不占住进行中的调用，之后的请求正常发起
+        self.assertEqual(list(flight.stream('k', self._upstream(count=2))), [0, 1])
+        self.assertEqual(self.calls, 1)
+
+    def test_slow_subscribers_share_one_put_timeout(self):
+        flight = SingleFlight(buffer_size=1, put_timeout=0.5)
+        factory = self._upstream(count=3)
+        stalled = [flight.stream('k', factory) for _ in range(3)]
+        for stream in stalled:
+            # 订阅后不再消费，缓冲区写满
+            threading.Thread(target=next, args=(stream,), daemon=True).start()
+        fast = []
+        time.sleep(0.05)
+        start = time.monotonic()
+        self.release.set()
+        self._collect(flight.stream('k', factory), fast)
+        # 三个慢订阅者共用一次等待，而不是各自让分发等待put_timeout
+        self.assertLess(time.monotonic() - start, 1.0)
+        self.assertEqual(fast, [0, 1, 2])
+        self.assertEqual(flight.stats["lagging"], 3)
+
+    def test_error_propagates_to_every_subscriber(self):
+        flight = SingleFlight()
+        factory = self._upstream(count=2, error=RuntimeError("boom"))
+        outputs = [[], []]
+        streams = [flight.stream('k', factory) for _ in outputs]
+        threads = [threading.Thread(target=self._collect, args=(s, out)) for s, out in zip(streams, outputs)]
+        for t in threads:
+            t.start()
+        self.release.set()
+        for t in threads:
+            t.join(2)
+        for out in outputs:
+            self.assertEqual(out[:2], [0, 1])
+            self.assertIsInstance(out[2], RuntimeError)
+
+
+if __name__ == '__main__':
+    unittest.main()
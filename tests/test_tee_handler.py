@@ -0,0 +1,128 @@
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from src.handler.reasoning_handler import ReasoningDisplay
+from src.handler.tee_handler import TranscriptTee, strip_ansi
+from tests.helpers import IdleInputHandler, make_chat_handler
+
+
+class StreamAPI:
+    def chat_completion_stream(self, messages, model, temperature):
+        for i in range(3):
+            yield {"choices": [{"delta": {"reasoning_content": f"第{i}步\n", "content": ""}}]}
+        for word in ("**答", "案**"):
+            yield {"choices": [{"delta": {"content": word}}]}
+        yield {"choices": [], "usage": {"prompt_tokens": 12, "completion_tokens": 34}}
+
+
+class StalledFile:
+    """第一次写入时阻塞，直到测试放行，模拟磁盘卡顿"""
+
+    def __init__(self):
+        self.buffer = io.StringIO()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, text):
+        self.writing.set()
+        self.release.wait(5)
+        self.buffer.write(text)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class TestTranscriptTee(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.temp_dir, "transcript.md")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def _read(self):
+        with open(self.path, encoding='utf-8') as f:
+            return f.read()
+
+    def test_streamed_turn_is_written_with_timing(self):
+        chat_handler = make_chat_handler(StreamAPI())
+        chat_handler.model = "deepseek-reasoner"
+        chat_handler.start_tee(self.path)
+        chat_handler.add_user_message("\x1b[31m问题\x1b[0m")
+        with patch.object(ReasoningDisplay, "_mode", "hidden"), \
+                patch("src.handler.input_handler.InputHandler", IdleInputHandler), \
+                redirect_stdout(io.StringIO()):
+            chat_handler.get_assistant_reply(stream=True)
+        tee = chat_handler.stop_tee()
+        transcript = self._read()
+        self.assertRegex(transcript, r"## 第1轮 · \d{4}-\d\d-\d\d \d\d:\d\d:\d\d · deepseek-reasoner")
+        self.assertLess(transcript.index("**用户**\n\n问题"), transcript.index("**推理过程**\n\n第0步\n第1步"))
+        self.assertLess(transcript.index("第2步"), transcript.index("**助手**\n\n**答案**"))
+        self.assertRegex(transcript, r"_耗时 \d+\.\d\ds · 首字 \d+\.\d\ds · 提示 12 tokens · 回复 34 tokens_")
+        self.assertNotIn("\x1b", transcript)
+        self.assertEqual((tee.snapshot()["dropped"], tee.snapshot()["fsyncs"]), (0, 1))
+        self.assertIsNone(chat_handler.tee)
+
+    def test_full_queue_drops_chunks_and_records_the_gap(self):
+        tee = TranscriptTee(self.path, fmt="text", queue_size=4, overflow="drop", flush_interval=0,
+                            fsync_policy="never")
+        tee._file.close()
+        stalled = tee._file = StalledFile()
+        tee.begin_turn("deepseek-chat", "问题")
+        self.assertTrue(stalled.writing.wait(5))
+        # 写入线程卡在磁盘写入上，回复循环不被阻塞，超出队列容量的数据块被丢弃
+        for i in range(10):
+            tee.write(f"块{i} ")
+        stalled.release.set()
+        tee.end_turn({"latency": 1.5})
+        tee.close()
+        transcript = stalled.buffer.getvalue()
+        self.assertEqual(tee.snapshot()["dropped"], 6)
+        self.assertIn("块0 块1 块2 块3", transcript)
+        self.assertNotIn("块4", transcript)
+        self.assertIn("丢弃了6个数据块", transcript)
+        self.assertIn("耗时 1.50s", transcript)
+
+    def test_block_overflow_keeps_every_chunk(self):
+        tee = TranscriptTee(self.path, queue_size=2, overflow="block", batch_bytes=64, fsync_policy="never")
+        tee.begin_turn("deepseek-chat", "问题")
+        for i in range(2000):
+            tee.write(f"{i},")
+        tee.end_turn()
+        self.assertTrue(tee.flush(5))
+        self.assertIn(",".join(str(i) for i in range(2000)), self._read())
+        tee.close()
+        self.assertFalse(tee.active)
+        self.assertEqual(strip_ansi("\x1b[1;32m绿\x1b[0m\x1b]0;标题\x07"), "绿")
+        with self.assertRaises(ValueError):
+            TranscriptTee(self.path, overflow="grow")
+
+    def test_turns_from_other_sessions_are_not_interleaved(self):
+        tee = TranscriptTee(self.path, fmt="text", fsync_policy="never")
+        tee.begin_turn("deepseek-chat", "前台问题", session="1")
+        tee.write("前台回复上半", session="1")
+        # 后台会话在前台流式回复期间完成了一整轮
+        tee.begin_turn("deepseek-reasoner", "后台问题", session="bg")
+        tee.write("后台回复", session="bg")
+        tee.end_turn(session="bg")
+        tee.write("前台回复下半", session="1")
+        tee.end_turn(session="1")
+        self.assertTrue(tee.flush(5))
+        tee.close()
+        transcript = self._read()
+        self.assertIn("==== 第1轮  会话1  ", transcript)
+        self.assertIn("前台回复上半前台回复下半", transcript)
+        self.assertLess(transcript.index("前台回复下半"), transcript.index("==== 第2轮  会话bg  "))
+        self.assertLess(transcript.index("后台问题"), transcript.index("后台回复"))
+
+
+if __name__ == '__main__':
+    unittest.main()
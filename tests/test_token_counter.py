@@ -0,0 +1,86 @@
+import unittest
+import requests
+from src.api.circuit_breaker import CircuitOpenError, OPEN
+from src.api.deepseek_api import DeepSeekAPI
+from src.api.token_counter import TokenCounter, ContextLimitError, estimate_tokens
+from src.handler.error_handler import ErrorHandler
+
+
+def make_history(size):
+    return [{"role": "user" if i % 2 == 0 else "assistant", "content": f"第{i}条消息 hello world"}
+            for i in range(size)]
+
+
+class TestTokenCounter(unittest.TestCase):
+    def test_growing_history_only_counts_new_messages(self):
+        counter = TokenCounter(tokenizer_file=None)
+        history = make_history(50)
+        first = counter.count_messages(history)
+        self.assertEqual(counter.stats, {"hits": 0, "misses": 50})
+        # 每轮请求重新构建消息字典，内容相同的消息仍命中缓存
+        history = [dict(message) for message in history] + [{"role": "user", "content": "新的问题"}]
+        second = counter.count_messages(history)
+        self.assertEqual(counter.stats, {"hits": 50, "misses": 51})
+        self.assertEqual(second - first, counter.count_message(history[-1]))
+        self.assertEqual(counter.breakdown(history)["user"], sum(counter.count_message(m) for m in history[::2]))
+        self.assertGreater(counter.count_message({"role": "assistant", "content": "",
+                                                  "tool_calls": [{"id": "a", "function": {"name": "f"}}]}), 4)
+
+    def test_calibrate_and_check(self):
+        counter = TokenCounter(tokenizer_file=None)
+        history = make_history(10)
+        estimate = counter.count_messages(history)
+        for _ in range(30):
+            counter.calibrate(counter.count_messages(history), estimate * 2)
+        self.assertAlmostEqual(counter.count_messages(history) / estimate, 2.0, delta=0.05)
+        self.assertGreater(estimate_tokens("中文" * 100), estimate_tokens("ab" * 100))
+        with self.assertRaises(ContextLimitError) as cm:
+            counter.check([{"role": "user", "content": "字" * 300000}], "deepseek-chat")
+        self.assertEqual(ErrorHandler().classify_error(cm.exception), 'context_limit')
+
+
+class TestPreflight(unittest.TestCase):
+    def test_oversized_request_is_not_sent(self):
+        api = DeepSeekAPI(api_key="test-key", tokens_per_minute=60000)
+        api._make_request = lambda *args, **kwargs: self.fail("请求不应被发送")
+        with self.assertRaises(ContextLimitError):
+            api.chat_completion([{"role": "user", "content": "字" * 300000}])
+        stream = api.chat_completion_stream([{"role": "user", "content": "字" * 300000}])
+        with self.assertRaises(ContextLimitError):
+            next(stream)
+
+    def test_usage_settles_token_budget(self):
+        api = DeepSeekAPI(api_key="test-key", tokens_per_minute=60000)
+        api._make_request = lambda *args, **kwargs: {
+            "choices": [{"message": {"content": "好", "reasoning_content": ""}}],
+            "usage": {"prompt_tokens": 500, "completion_tokens": 2000}}
+        api.chat_completion(make_history(1))
+        # 预算按实际消耗（提示+回复）扣减，而不只是请求前的估算值
+        self.assertLess(api.token_stats()["budget"]["tokens"], 60000 - 2400)
+
+    def test_rejected_and_failed_requests_do_not_keep_budget(self):
+        api = DeepSeekAPI(api_key="test-key", tokens_per_minute=60000, circuit_breaker=True)
+
+        def fail(*args, **kwargs):
+            raise requests.exceptions.ConnectionError("连接被拒绝")
+        api._make_request = fail
+        api._send = fail
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            api.chat_completion(make_history(1))
+        with self.assertRaises(Exception):
+            next(api.chat_completion_stream(make_history(1)))
+        # 请求失败、没有返回用量时退还预扣的估算值
+        self.assertEqual(api.token_stats()["budget"]["tokens"], 60000)
+        breaker = api.breakers.get("chat/completions", "deepseek-chat")
+        while breaker.state != OPEN:
+            breaker.allow()
+            breaker.record_failure()
+        api.token_budget.acquire = lambda *args, **kwargs: self.fail("熔断中的请求不应扣减预算")
+        with self.assertRaises(CircuitOpenError):
+            api.chat_completion(make_history(1))
+        with self.assertRaises(CircuitOpenError):
+            next(api.chat_completion_stream(make_history(1)))
+
+
+if __name__ == '__main__':
+    unittest.main()
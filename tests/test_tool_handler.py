@@ -0,0 +1,86 @@
+import io
+import json
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest.mock import patch
+from src.handler.tool_handler import ToolHandler, ToolCallAssembler
+from tests.helpers import IdleInputHandler, make_chat_handler
+
+
+def make_call(call_id, name, arguments):
+    return {"id": call_id, "type": "function", "function": {"name": name, "arguments": json.dumps(arguments)}}
+
+
+class ToolCallingAPI:
+    """第一次请求以流式增量返回两个工具调用，第二次请求根据工具结果给出回复"""
+
+    def __init__(self):
+        self.requests = []
+
+    def chat_completion_stream(self, messages, model, temperature, tools=None, tool_choice=None):
+        self.requests.append((messages, tools))
+        if messages[-1]["role"] == "tool":
+            results = [m["content"] for m in messages if m["role"] == "tool"]
+            yield {"choices": [{"delta": {"reasoning_content": "", "content": "结果: " + ",".join(results)}}]}
+            return
+        deltas = [
+            {"index": 0, "id": "call_0", "type": "function", "function": {"name": "add", "arguments": ""}},
+            {"index": 1, "id": "call_1", "type": "function", "function": {"name": "add", "arguments": '{"a": 10,'}},
+            {"index": 0, "function": {"arguments": '{"a": 1, '}},
+            {"index": 0, "function": {"arguments": '"b": 2}'}},
+            {"index": 1, "function": {"arguments": ' "b": 20}'}},
+        ]
+        for delta in deltas:
+            yield {"choices": [{"delta": {"reasoning_content": "", "content": "", "tool_calls": [delta]}}]}
+
+
+class TestToolHandler(unittest.TestCase):
+    def setUp(self):
+        self.tools = ToolHandler(max_workers=4, default_timeout=2.0)
+
+    def tearDown(self):
+        self.tools.close()
+
+    def test_assembler_joins_argument_fragments_by_index(self):
+        assembler = ToolCallAssembler()
+        assembler.add([{"index": 0, "id": "a", "function": {"name": "f", "arguments": '{"x":'}}])
+        assembler.add([{"index": 1, "id": "b", "function": {"name": "g", "arguments": '{}'}}])
+        assembler.add([{"index": 0, "function": {"arguments": ' 1}'}}])
+        calls = assembler.calls()
+        self.assertEqual([call["id"] for call in calls], ["a", "b"])
+        self.assertEqual(json.loads(calls[0]["function"]["arguments"]), {"x": 1})
+
+    def test_calls_run_concurrently_with_per_tool_timeout(self):
+        self.tools.add_tool("sleep", lambda seconds: time.sleep(seconds) or f"slept {seconds}")
+        self.tools.add_tool("slow", lambda: time.sleep(1.0), timeout=0.2)
+        start = time.perf_counter()
+        results = self.tools.execute([make_call("1", "sleep", {"seconds": 0.3}),
+                                      make_call("2", "sleep", {"seconds": 0.3}),
+                                      make_call("3", "slow", {}),
+                                      make_call("4", "missing", {})])
+        elapsed = time.perf_counter() - start
+        self.assertLess(elapsed, 0.55)
+        self.assertEqual([m["tool_call_id"] for m in results], ["1", "2", "3", "4"])
+        self.assertEqual(results[0]["content"], "slept 0.3")
+        self.assertIn("超时", results[2]["content"])
+        self.assertIn("未注册", results[3]["content"])
+
+    def test_chat_handler_feeds_tool_results_back(self):
+        chat_handler = make_chat_handler(ToolCallingAPI())
+        chat_handler.add_tool("add", lambda a, b: a + b, "两数相加",
+                              {"type": "object", "properties": {"a": {"type": "number"}, "b": {"type": "number"}}})
+        chat_handler.add_user_message("算一下")
+        with patch("src.handler.input_handler.InputHandler", IdleInputHandler), redirect_stdout(io.StringIO()):
+            reply = chat_handler.get_assistant_reply(stream=True)
+        self.assertEqual(reply, "结果: 3,30")
+        self.assertEqual([m["role"] for m in chat_handler.messages], ["user", "assistant", "tool", "tool", "assistant"])
+        second_request, tools = chat_handler.api.requests[1]
+        self.assertEqual(second_request[1]["tool_calls"][1]["function"]["arguments"], '{"a": 10, "b": 20}')
+        self.assertEqual(second_request[2]["tool_call_id"], "call_0")
+        self.assertEqual(tools[0]["function"]["name"], "add")
+        chat_handler.tools.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
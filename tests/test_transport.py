@@ -0,0 +1,61 @@
+import os
+import sys
+import subprocess
+import unittest
+import requests
+from src.api.transport import create_session, HTTP2_AVAILABLE, HTTP2Session
+
+if HTTP2_AVAILABLE:
+    import httpx
+
+
+class TestTransport(unittest.TestCase):
+    def test_http1_transport_uses_requests_session(self):
+        session = create_session('http1', pool_maxsize=4)
+        self.assertIsInstance(session, requests.Session)
+        self.assertEqual(session.get_adapter('https://api.deepseek.com')._pool_maxsize, 4)
+        with self.assertRaises(ValueError):
+            create_session('spdy')
+
+    @unittest.skipUnless(HTTP2_AVAILABLE, "需要安装httpx[http2]")
+    def test_http2_session_matches_requests_interface(self):
+        def handler(request):
+            if request.url.path == "/down":
+                raise httpx.ConnectError("connection refused", request=request)
+            if request.url.path == "/missing":
+                return httpx.Response(404, json={"error": "not found"})
+            blocks = [b"data: {\"a\"", b": 1}\r\n\r\nda", b"ta: [DONE]\n\n"]
+            return httpx.Response(200, headers={"Content-Type": "text/event-stream"}, content=iter(blocks))
+
+        session = HTTP2Session()
+        session.client = httpx.Client(transport=httpx.MockTransport(handler))
+        with session.post("http://stub/chat", json={}, stream=True) as response:
+            response.raise_for_status()
+            lines = [line for line in response.iter_lines() if line]
+        self.assertEqual(lines, [b'data: {"a": 1}', b'data: [DONE]'])
+
+        missing = session.get("http://stub/missing")
+        self.assertFalse(missing)
+        with self.assertRaises(requests.exceptions.HTTPError):
+            missing.raise_for_status()
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            session.get("http://stub/down")
+        session.close()
+
+    def test_optional_dependencies_are_imported_lazily(self):
+        # 使用HTTP/1.1且未启用压缩时，创建客户端不应导入httpx/h2/zstandard（影响管道模式启动时间）
+        code = ("import sys\n"
+                "from src.api.upstream_pool import create_api\n"
+                "create_api()\n"
+                "print(','.join(m for m in ('httpx', 'h2', 'zstandard') if m in sys.modules))")
+        env = dict(os.environ, DEEPSEEK_API_KEY="test-key", DEEPSEEK_HTTP_TRANSPORT="http1",
+                   DEEPSEEK_REQUEST_COMPRESSION="off")
+        env.pop("DEEPSEEK_UPSTREAMS", None)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True,
+                                check=True).stdout
+        self.assertEqual(output.strip(), "")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+import requests
+from src.api.deepseek_api import DeepSeekAPI
+from src.api.upstream_pool import UpstreamPool, affinity_key, upstream_fault
+
+
+class FakeAPI:
+    """记录收到的请求，fail为True时模拟连接失败，为异常实例时直接抛出"""
+
+    def __init__(self, base_url, fail=False):
+        self.base_url = base_url
+        self.fail = fail
+        self.calls = []
+
+    def chat_completion(self, messages, **kwargs):
+        self.calls.append(messages)
+        if isinstance(self.fail, Exception):
+            raise self.fail
+        if self.fail:
+            try:
+                raise requests.exceptions.ConnectionError("连接被拒绝")
+            except requests.exceptions.RequestException as e:
+                # 与DeepSeekAPI一致：包装为通用异常
+                raise Exception(f"API请求失败: {str(e)}")
+        return {"content": self.base_url, "reasoning_content": ""}
+
+    def chat_completion_stream(self, messages, **kwargs):
+        self.calls.append(messages)
+        if self.fail:
+            raise Exception("网络请求异常") from requests.exceptions.Timeout("读取超时")
+        yield {"choices": [{"delta": {"content": self.base_url}}]}
+
+
+def conversation(topic, turns=1):
+    messages = [{"role": "system", "content": "你是助手"}, {"role": "user", "content": topic}]
+    for i in range(turns - 1):
+        messages += [{"role": "assistant", "content": f"回答{i}"}, {"role": "user", "content": f"追问{i}"}]
+    return messages
+
+
+def make_pool(*apis, **options):
+    return UpstreamPool([{"name": f"u{i}", "api": api} for i, api in enumerate(apis)], **options)
+
+
+class TestUpstreamPool(unittest.TestCase):
+    def test_conversation_sticks_to_one_upstream(self):
+        apis = [FakeAPI("a"), FakeAPI("b")]
+        pool = make_pool(*apis)
+        self.assertEqual(affinity_key(conversation("话题", 3)), affinity_key(conversation("话题", 1)))
+        first = pool.chat_completion(conversation("话题一"))["content"]
+        other = pool.chat_completion(conversation("话题二"))["content"]
+        # 最少进行中请求数相同时按已处理请求数分散
+        self.assertNotEqual(first, other)
+        for turns in range(2, 6):
+            self.assertEqual(pool.chat_completion(conversation("话题一", turns))["content"], first)
+
+    def test_weighted_round_robin(self):
+        apis = [FakeAPI("a"), FakeAPI("b")]
+        pool = UpstreamPool([{"api": apis[0], "weight": 3}, {"api": apis[1], "weight": 1}], policy="weighted")
+        for i in range(8):
+            pool.chat_completion(conversation(f"话题{i}"))
+        self.assertEqual((len(apis[0].calls), len(apis[1].calls)), (6, 2))
+        with self.assertRaises(ValueError):
+            make_pool(FakeAPI("a"), policy="random")
+
+    def test_failing_upstream_is_ejected_and_requests_fail_over(self):
+        bad, good = FakeAPI("bad", fail=True), FakeAPI("good")
+        pool = make_pool(bad, good, eject_failures=1, eject_base=60)
+        for i in range(4):
+            self.assertEqual(pool.chat_completion(conversation(f"话题{i}"))["content"], "good")
+        chunks = list(pool.chat_completion_stream(conversation("流式")))
+        self.assertEqual(chunks[0]["choices"][0]["delta"]["content"], "good")
+        # 剔除后不再向故障上游发送请求
+        self.assertEqual(len(bad.calls), 1)
+        stats = pool.upstream_stats()
+        self.assertGreater(stats["u0"]["ejected_for"], 0)
+        self.assertEqual((stats["u0"]["failures"], stats["u0"]["failovers"]), (1, 1))
+        self.assertEqual((stats["u1"]["requests"], stats["u1"]["outstanding"]), (5, 0))
+
+    def test_request_errors_are_not_retried_elsewhere(self):
+        first, second = FakeAPI("a", fail=ValueError("无效的消息角色")), FakeAPI("b")
+        pool = make_pool(first, second)
+        with self.assertRaises(ValueError):
+            pool.chat_completion(conversation("话题"))
+        self.assertEqual(second.calls, [])
+        self.assertEqual(upstream_fault(ValueError("无效的消息角色")), (False, None))
+        response = requests.Response()
+        response.status_code, response.headers["Retry-After"] = 429, "30"
+        self.assertEqual(upstream_fault(requests.exceptions.HTTPError(response=response)), (True, 30.0))
+
+    def test_pool_of_real_clients_shares_token_counter(self):
+        pool = UpstreamPool([{"base_url": "https://a.example.com/v1", "api_key": "key-a"},
+                             {"base_url": "https://b.example.com/v1", "api_key": "key-b", "weight": 2}])
+        self.assertIsInstance(pool.upstreams[1].api, DeepSeekAPI)
+        self.assertIs(pool.upstreams[0].api.tokens, pool.upstreams[1].api.tokens)
+        self.assertEqual(pool.base_url, "https://a.example.com/v1")
+        self.assertEqual(set(pool.upstream_stats()), {"upstream-1", "upstream-2"})
+        with self.assertRaises(ValueError):
+            UpstreamPool([{"base_url": "https://a.example.com/v1", "api_key_env": "UNSET_TEST_KEY_VAR"}])
+
+
+if __name__ == '__main__':
+    unittest.main()